@@ -0,0 +1,32 @@
+"""
+Internal clients: the addresses in METRICS["ALLOWED_IPS"] and staff users.
+
+They get /internal/metrics, the profiles (staff only) and the Server-Timing header.
+"""
+from __future__ import annotations
+
+import ipaddress
+
+from django.conf import settings
+
+
+def internal_address(request) -> bool:
+    try:
+        address = ipaddress.ip_address(request.META.get("REMOTE_ADDR", ""))
+    except ValueError:
+        return False
+    return any(address in ipaddress.ip_network(net, strict=False) for net in settings.METRICS["ALLOWED_IPS"])
+
+
+def is_staff(request) -> bool:
+    user = getattr(request, "user", None)
+    return bool(user is not None and user.is_authenticated and user.is_staff)
+
+
+async def ais_staff(request) -> bool:
+    """is_staff() for async code: the user is loaded with request.auser()."""
+    auser = getattr(request, "auser", None)
+    if auser is None:
+        return False
+    user = await auser()
+    return bool(user.is_authenticated and user.is_staff)
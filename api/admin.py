@@ -1,7 +1,74 @@
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils.functional import cached_property
+
 from .models import City, WeatherDataset, WeatherHour
 
 
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that avoids an exact COUNT(*) over an unfiltered table.
+
+    The hourly table grows to millions of rows; an estimate is good enough to render
+    page links. Filtered/searched querysets still get an exact count.
+    """
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, "query", None)
+        if query is not None and not query.where:
+            estimate = estimated_row_count(self.object_list.model)
+            if estimate is not None:
+                return estimate
+        return super().count
+
+
+def estimated_row_count(model):
+    """
+    Cheap row count estimate for a whole table.
+    PostgreSQL: planner statistics. Other backends: MAX(pk), served from the pk index.
+    """
+    connection = connections[model.objects.db]
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE relname = %s", [model._meta.db_table])
+            row = cursor.fetchone()
+        if row and row[0] > 0:
+            return int(row[0])
+    return model.objects.order_by().aggregate(n=Max("pk"))["n"] or 0
+
+
+class CityListFilter(admin.SimpleListFilter):
+    """City filter whose choices come from the (small) City table, not from the hourly rows."""
+    title = "city"
+    parameter_name = "city"
+
+    def lookups(self, request, model_admin):
+        return [(c.pk, f"{c.name} ({c.country_code})") for c in City.objects.order_by("name").only("name", "country_code")]
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(dataset__city_id=self.value())
+        return queryset
+
+
+class CountryCodeListFilter(admin.SimpleListFilter):
+    title = "country code"
+    parameter_name = "country_code"
+
+    def lookups(self, request, model_admin):
+        codes = City.objects.order_by("country_code").values_list("country_code", flat=True).distinct()
+        return [(code, code) for code in codes]
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(dataset__city__country_code=self.value())
+        return queryset
+
+
 @admin.register(City)
 class CityAdmin(admin.ModelAdmin):
     list_display = ("id", "name", "country_code", "country", "timezone", "latitude", "longitude")
@@ -13,20 +80,43 @@ class CityAdmin(admin.ModelAdmin):
 @admin.register(WeatherDataset)
 class WeatherDatasetAdmin(admin.ModelAdmin):
     list_display = ("id", "city", "start_date", "end_date", "source", "created_at", "hours_count")
+    list_select_related = ("city",)
     search_fields = ("city__name", "city__country", "city__country_code")
     list_filter = ("city__country_code", "source", "start_date", "end_date")
     ordering = ("-created_at",)
     readonly_fields = ("data",)  # JSON can be big
 
+    def get_queryset(self, request):
+        # Materialized count from the range index; for datasets without one, a correlated subquery
+        # only evaluated for the rows on the page, using the (dataset, timestamp) index
+        hours = (
+            WeatherHour.objects.filter(dataset=OuterRef("pk"))
+            .order_by()
+            .values("dataset")
+            .annotate(n=Count("pk"))
+            .values("n")
+        )
+        return super().get_queryset(request).defer("data").annotate(
+            _hours_count=Coalesce("range_index__hours_count", Subquery(hours))
+        )
+
     def hours_count(self, obj):
-        return obj.hours.count()
+        return obj._hours_count or 0
     hours_count.short_description = "hours"
+    hours_count.admin_order_field = "_hours_count"
 
 
 @admin.register(WeatherHour)
 class WeatherHourAdmin(admin.ModelAdmin):
     list_display = ("id", "dataset", "timestamp", "temperature", "precipitation")
+    list_select_related = ("dataset__city",)
     search_fields = ("dataset__city__name", "dataset__city__country_code")
-    list_filter = ("dataset__city__country_code", "dataset__city__name")
-    ordering = ("-timestamp",)
-    date_hierarchy = "timestamp"
+    list_filter = (CountryCodeListFilter, CityListFilter)
+    # Sorting millions of rows by timestamp on every page load is expensive; the pk follows insert order
+    ordering = ("-id",)
+    raw_id_fields = ("dataset",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).defer("dataset__data")
@@ -0,0 +1,385 @@
+"""
+Cost-aware admission control for the weather endpoints.
+
+Each limited endpoint (by URL name) gets a pool of cost units per worker process. A request
+estimates its cost from the hours it will scan, waits briefly in a short queue when the pool
+is busy, and is rejected fast otherwise:
+  - 503 + Retry-After when the endpoint is over budget (pool and queue full, or queue timeout)
+  - 429 + Retry-After when a single client already holds too many units in flight
+
+The middleware runs natively in both modes: under ASGI a queued request awaits its turn on the
+event loop (WeightedLimiter.aacquire) instead of blocking a thread. Configured by
+settings.ADMISSION_CONTROL; counters are exposed by snapshot().
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import math
+import threading
+import time
+from datetime import date
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import JsonResponse
+
+from api.models import WeatherDatasetIndex
+from services.timing import phase
+
+logger = logging.getLogger('app')
+
+# Limiters of this process, by endpoint URL name (see snapshot())
+_LIMITERS: Dict[str, "WeightedLimiter"] = {}
+
+
+class WeightedLimiter:
+    """Semaphore with `capacity` units where each holder takes `cost` units, plus a bounded wait queue."""
+
+    def __init__(self, name: str, *, capacity: int, queue_size: int, queue_timeout: float):
+        self.name = name
+        self.capacity = max(1, int(capacity))
+        self.queue_size = max(0, int(queue_size))
+        self.queue_timeout = queue_timeout
+        self._cond = threading.Condition()
+        self._in_use = 0
+        self._waiting = 0
+        self._async_waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+        # rejected: pool and queue full, timed_out: queued too long, rejected_client: per-client budget (429)
+        self.counters = {
+            "admitted": 0, "queued": 0, "rejected": 0, "timed_out": 0, "rejected_client": 0, "wait_seconds": 0.0,
+        }
+
+    def clamp(self, cost: int) -> int:
+        # A request bigger than the whole pool still runs, alone
+        return min(max(1, cost), self.capacity)
+
+    def acquire(self, cost: int) -> bool:
+        cost = self.clamp(cost)
+        with self._cond:
+            if self._waiting == 0 and self._in_use + cost <= self.capacity:
+                self._in_use += cost
+                self.counters["admitted"] += 1
+                return True
+            if self._waiting >= self.queue_size:
+                self.counters["rejected"] += 1
+                return False
+
+            self._waiting += 1
+            self.counters["queued"] += 1
+            started = time.monotonic()
+            try:
+                ok = self._cond.wait_for(lambda: self._in_use + cost <= self.capacity, timeout=self.queue_timeout)
+            finally:
+                self._waiting -= 1
+                self.counters["wait_seconds"] += time.monotonic() - started
+            if not ok:
+                self.counters["timed_out"] += 1
+                return False
+            self._in_use += cost
+            self.counters["admitted"] += 1
+            return True
+
+    async def aacquire(self, cost: int) -> bool:
+        """acquire() for the event loop: a queued request awaits a release instead of blocking a thread."""
+        cost = self.clamp(cost)
+        with self._cond:
+            if self._waiting == 0 and self._in_use + cost <= self.capacity:
+                self._in_use += cost
+                self.counters["admitted"] += 1
+                return True
+            if self._waiting >= self.queue_size:
+                self.counters["rejected"] += 1
+                return False
+            self._waiting += 1
+            self.counters["queued"] += 1
+
+        loop = asyncio.get_running_loop()
+        started = time.monotonic()
+        try:
+            while True:
+                with self._cond:
+                    if self._in_use + cost <= self.capacity:
+                        self._in_use += cost
+                        self.counters["admitted"] += 1
+                        return True
+                    remaining = started + self.queue_timeout - time.monotonic()
+                    if remaining <= 0:
+                        self.counters["timed_out"] += 1
+                        return False
+                    waiter = (loop, loop.create_future())
+                    self._async_waiters.append(waiter)
+                try:
+                    await asyncio.wait_for(waiter[1], remaining)
+                except asyncio.TimeoutError:
+                    with self._cond:
+                        if waiter in self._async_waiters:
+                            self._async_waiters.remove(waiter)
+        finally:
+            with self._cond:
+                self._waiting -= 1
+                self.counters["wait_seconds"] += time.monotonic() - started
+
+    def release(self, cost: int) -> None:
+        with self._cond:
+            self._in_use -= self.clamp(cost)
+            self._cond.notify_all()
+            waiters, self._async_waiters = self._async_waiters, []
+        # Released from any thread: wake the waiters on their own loops
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_wake, future)
+
+    def count_client_rejection(self) -> None:
+        with self._cond:
+            self.counters["rejected_client"] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "capacity": self.capacity,
+                "in_use": self._in_use,
+                "waiting": self._waiting,
+                **self.counters,
+            }
+
+
+def _wake(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class ClientBudget:
+    """Units in flight per client, across all limited endpoints."""
+
+    def __init__(self, max_cost: int):
+        self.max_cost = max_cost
+        self._lock = threading.Lock()
+        self._in_flight: Dict[str, int] = {}
+
+    def acquire(self, client: str, cost: int) -> bool:
+        with self._lock:
+            current = self._in_flight.get(client, 0)
+            # A client with nothing in flight is always let through (cost is clamped per endpoint anyway)
+            if current and current + cost > self.max_cost:
+                return False
+            self._in_flight[client] = current + cost
+            return True
+
+    def release(self, client: str, cost: int) -> None:
+        with self._lock:
+            remaining = self._in_flight.get(client, 0) - cost
+            if remaining > 0:
+                self._in_flight[client] = remaining
+            else:
+                self._in_flight.pop(client, None)
+
+
+def snapshot() -> Dict[str, Dict[str, Any]]:
+    """Per-endpoint admission counters of this process (for metrics)."""
+    return {name: limiter.snapshot() for name, limiter in _LIMITERS.items()}
+
+
+# -----------------------
+# Cost estimation
+# -----------------------
+
+def _range_hours(params: Mapping[str, Any]) -> int:
+    """Hours covered by start_date..end_date; 0 when invalid (validation rejects it cheaply anyway)."""
+    try:
+        start = date.fromisoformat(str(params["start_date"]))
+        end = date.fromisoformat(str(params["end_date"]))
+    except (KeyError, ValueError):
+        return 0
+    return max(0, (end - start).days + 1) * 24
+
+
+_DATASET_HOURS: Dict[str, Any] = {"value": {}, "expires": 0.0}
+
+
+def _dataset_hours_qs():
+    return WeatherDatasetIndex.objects.values_list(
+        "dataset__city__name", "dataset__start_date", "dataset__end_date", "hours_count")
+
+
+def _store_dataset_hours(rows, ttl: float) -> Dict[Tuple[str, date, date], int]:
+    value = {(name.lower(), start, end): hours for name, start, end, hours in rows}
+    _DATASET_HOURS.update(value=value, expires=time.monotonic() + ttl)
+    return value
+
+
+def dataset_hours(ttl: float = 60.0) -> Dict[Tuple[str, date, date], int]:
+    """
+    Stored hours per dataset key (lowercased city, start, end), from the range index counts;
+    loaded with one query and cached for `ttl` seconds.
+    """
+    if time.monotonic() >= _DATASET_HOURS["expires"]:
+        return _store_dataset_hours(_dataset_hours_qs(), ttl)
+    return _DATASET_HOURS["value"]
+
+
+async def adataset_hours(ttl: float = 60.0) -> Dict[Tuple[str, date, date], int]:
+    """Async ORM variant of dataset_hours(), for the middleware under ASGI."""
+    if time.monotonic() >= _DATASET_HOURS["expires"]:
+        return _store_dataset_hours([row async for row in _dataset_hours_qs()], ttl)
+    return _DATASET_HOURS["value"]
+
+
+def _query_hours(params: Mapping[str, Any], stored_hours: Mapping, city: Any = None) -> int:
+    """
+    Hours a query on one dataset scans: its stored hours clipped to the requested range, or the
+    range itself for a dataset not indexed (yet).
+    """
+    hours = _range_hours(params)
+    if not hours:
+        return 0
+    key = (str(city if city is not None else params.get("city", "")).strip().lower(),
+           date.fromisoformat(str(params["start_date"])), date.fromisoformat(str(params["end_date"])))
+    stored = stored_hours.get(key)
+    return hours if stored is None else min(hours, stored)
+
+
+def estimate_hours(url_name: str, request, stored_hours: Optional[Mapping] = None) -> int:
+    """Hourly rows a request is expected to scan (`stored_hours`: dataset_hours(), loaded if not given)."""
+    params = request.GET
+    if stored_hours is None:
+        stored_hours = dataset_hours()
+    if url_name in ("weather-temperature-stats", "weather-precipitation-stats", "weather-analytics",
+                    "weather-export"):
+        return _query_hours(params, stored_hours)
+    if url_name == "weather-range-stats":
+        # Answered from the range index; only the daily breakdown grows with the range
+        daily = params.get("daily", "").lower() in ("1", "true", "yes")
+        return _query_hours(params, stored_hours) if daily else 0
+    if url_name == "weather-distribution-stats":
+        # Merges per-day histograms: priced like scanning one row per day
+        return _range_hours(params) // 24
+    if url_name == "weather-compare-stats":
+        cities = [c for c in params.get("cities", "").split(",") if c.strip()]
+        return sum(_query_hours(params, stored_hours, city) for city in cities)
+    if url_name == "weather-batch-stats":
+        try:
+            items = json.loads(request.body or b"null")["items"]
+            return sum(_query_hours(item, stored_hours) for item in items if isinstance(item, dict))
+        except (ValueError, KeyError, TypeError):
+            return 0
+    if url_name == "weather-summary-stats":
+        return sum(stored_hours.values())
+    return 0
+
+
+def estimate_cost(url_name: str, request, unit_hours: int, stored_hours: Optional[Mapping] = None) -> int:
+    """Cost in units of `unit_hours` scanned hours (at least 1)."""
+    return max(1, math.ceil(estimate_hours(url_name, request, stored_hours) / unit_hours))
+
+
+# -----------------------
+# Middleware
+# -----------------------
+
+class AdmissionControlMiddleware:
+    """Applies the ADMISSION_CONTROL limits to the endpoints listed in its ENDPOINTS setting."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+            # Django adapts the hooks to the mode of the chain: keep them native
+            self.process_view = self.aprocess_view
+        config = getattr(settings, "ADMISSION_CONTROL", {})
+        self.enabled = bool(config.get("ENABLED", False))
+        self.unit_hours = int(config.get("COST_UNIT_HOURS", 24 * 365))
+        self.retry_after = int(config.get("RETRY_AFTER", 5))
+        self.client_budget = ClientBudget(int(config.get("PER_CLIENT_MAX_COST", 8)))
+        self.limiters: Dict[str, WeightedLimiter] = {}
+        for name, limits in config.get("ENDPOINTS", {}).items():
+            self.limiters[name] = WeightedLimiter(
+                name,
+                capacity=limits["capacity"],
+                queue_size=limits.get("queue", 0),
+                queue_timeout=limits.get("queue_timeout", config.get("QUEUE_TIMEOUT", 2.0)),
+            )
+        _LIMITERS.clear()
+        _LIMITERS.update(self.limiters)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        response = None
+        try:
+            response = self.get_response(request)
+            return response
+        finally:
+            self._done(request, response)
+
+    async def __acall__(self, request):
+        response = None
+        try:
+            response = await self.get_response(request)
+            return response
+        finally:
+            self._done(request, response)
+
+    def _done(self, request, response) -> None:
+        admitted = getattr(request, "_admission", None)
+        if admitted is not None:
+            if response is not None and response.streaming:
+                # The rows are read while the body streams: hold the units until it is closed
+                response._resource_closers.append(lambda: self._release(*admitted))
+            else:
+                self._release(*admitted)
+
+    def _release(self, limiter: WeightedLimiter, client: str, cost: int) -> None:
+        limiter.release(cost)
+        self.client_budget.release(client, cost)
+
+    def _limiter(self, request) -> Optional[WeightedLimiter]:
+        if not self.enabled or request.resolver_match is None:
+            return None
+        return self.limiters.get(request.resolver_match.url_name)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        limiter = self._limiter(request)
+        if limiter is None:
+            return None
+        cost = limiter.clamp(estimate_cost(limiter.name, request, self.unit_hours))
+        client = request.META.get("REMOTE_ADDR", "")
+        if not self.client_budget.acquire(client, cost):
+            return self._reject_client(limiter, cost)
+        with phase("admission"):
+            admitted = limiter.acquire(cost)
+        return self._admitted(request, admitted, limiter, client, cost)
+
+    async def aprocess_view(self, request, view_func, view_args, view_kwargs):
+        limiter = self._limiter(request)
+        if limiter is None:
+            return None
+        stored_hours = await adataset_hours()
+        cost = limiter.clamp(estimate_cost(limiter.name, request, self.unit_hours, stored_hours))
+        client = request.META.get("REMOTE_ADDR", "")
+        if not self.client_budget.acquire(client, cost):
+            return self._reject_client(limiter, cost)
+        with phase("admission"):
+            admitted = await limiter.aacquire(cost)
+        return self._admitted(request, admitted, limiter, client, cost)
+
+    def _admitted(self, request, admitted: bool, limiter: WeightedLimiter, client: str, cost: int):
+        if not admitted:
+            self.client_budget.release(client, cost)
+            return self._reject(503, "Server busy, retry later.", limiter, cost)
+        request._admission = (limiter, client, cost)
+        return None
+
+    def _reject_client(self, limiter: WeightedLimiter, cost: int) -> JsonResponse:
+        limiter.count_client_rejection()
+        return self._reject(429, "Too many concurrent expensive requests from this client.", limiter, cost)
+
+    def _reject(self, status: int, detail: str, limiter: WeightedLimiter, cost: int) -> JsonResponse:
+        logger.warning("Admission %s for %s (cost=%s): %s", status, limiter.name, cost, limiter.snapshot())
+        response = JsonResponse({"detail": detail}, status=status)
+        response["Retry-After"] = str(self.retry_after)
+        return response
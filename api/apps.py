@@ -3,3 +3,10 @@ from django.apps import AppConfig
 
 class ApiConfig(AppConfig):
     name = 'api'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from api.server_timing import track_queries
+
+        connection_created.connect(track_queries, dispatch_uid="api.server_timing.track_queries")
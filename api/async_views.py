@@ -0,0 +1,264 @@
+"""
+Async (ASGI) versions of the weather views in api/views.py.
+
+Same URLs, query params and response contracts; they are routed instead of the DRF views
+when ASYNC_VIEWS is enabled (see api/urls.py). DRF's APIView is sync-only, so these are plain
+Django views that reuse the DRF serializers for validation and output.
+"""
+import json
+from abc import ABCMeta, abstractmethod
+
+from django.http import JsonResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+
+from api.query_budget import QueryBudget
+from api.views import export_response
+from api.serializers import (
+    TemperatureStatsQuerySerializer,
+    PrecipitationStatsQuerySerializer,
+    SummaryQuerySerializer,
+    RangeStatsQuerySerializer,
+    BatchStatsRequestSerializer,
+    BatchItemSerializer,
+    CompareStatsQuerySerializer,
+    AnalyticsQuerySerializer,
+    DistributionQuerySerializer,
+    ExportQuerySerializer,
+    TemperatureStatsResponseSerializer,
+    PrecipitationStatsResponseSerializer,
+    SummaryStatsResponseSerializer,
+    RangeStatsResponseSerializer,
+    BatchStatsResponseSerializer,
+    CompareStatsResponseSerializer,
+    AnalyticsResponseSerializer,
+    DistributionResponseSerializer,
+)
+from services.async_stats import (
+    atemperature_stats,
+    aprecipitation_stats,
+    asummary_stats,
+    arange_stats,
+    abatch_stats,
+    acompare_stats,
+    aanalytics_stats,
+    adistribution_stats,
+)
+from services.exceptions import DatasetNotFound, InvalidDateRange
+from services.export import arrow_available
+from services.queries import aget_covering_dataset_or_raise
+from services.timing import phase
+
+
+class _AsyncStatsView(View, metaclass=ABCMeta):
+    """Validate query params, await compute(), validate and return the result (like the DRF views)."""
+    http_method_names = ["get", "options"]
+    query_serializer_class = None
+    response_serializer_class = None
+
+    @abstractmethod
+    async def compute(self, data):
+        """The stats of the validated query params (may raise InvalidDateRange or DatasetNotFound)."""
+
+    def get_response_context(self, data):
+        return {}
+
+    async def get(self, request):
+        in_ser = self.query_serializer_class(data=request.GET)
+        if not in_ser.is_valid():
+            return JsonResponse(in_ser.errors, status=status.HTTP_400_BAD_REQUEST)
+        data = in_ser.validated_data
+
+        try:
+            result = await self.compute(data)
+        except InvalidDateRange as e:
+            return JsonResponse({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except DatasetNotFound as e:
+            return JsonResponse({"detail": str(e)}, status=status.HTTP_404_NOT_FOUND)
+
+        with phase("serialize"):
+            out_ser = self.response_serializer_class(data=result, context=self.get_response_context(data))
+            out_ser.is_valid(raise_exception=True)
+            payload = out_ser.data
+        with phase("render"):
+            return JsonResponse(payload, status=status.HTTP_200_OK)
+
+
+class AsyncTemperatureStatsView(_AsyncStatsView):
+    query_budget = QueryBudget(queries=3, rows_per_hour=1)
+    query_serializer_class = TemperatureStatsQuerySerializer
+    response_serializer_class = TemperatureStatsResponseSerializer
+
+    async def compute(self, data):
+        return await atemperature_stats(
+            city_name=data["city"],
+            start_date=data["start_date"],
+            end_date=data["end_date"],
+            above=data["above"],
+            below=data["below"],
+            tz=data["tz"],
+            fields=data.get("fields"),
+        )
+
+    def get_response_context(self, data):
+        return {"fields": data.get("fields")}
+
+
+class AsyncPrecipitationStatsView(_AsyncStatsView):
+    query_budget = QueryBudget(queries=3, rows_per_hour=1)
+    query_serializer_class = PrecipitationStatsQuerySerializer
+    response_serializer_class = PrecipitationStatsResponseSerializer
+
+    async def compute(self, data):
+        return await aprecipitation_stats(
+            city_name=data["city"],
+            start_date=data["start_date"],
+            end_date=data["end_date"],
+            tz=data["tz"],
+            fields=data.get("fields"),
+        )
+
+    def get_response_context(self, data):
+        return {"fields": data.get("fields")}
+
+
+class AsyncRangeStatsView(_AsyncStatsView):
+    query_budget = QueryBudget(queries=3, rows=0)
+    query_serializer_class = RangeStatsQuerySerializer
+    response_serializer_class = RangeStatsResponseSerializer
+
+    async def compute(self, data):
+        return await arange_stats(
+            city_name=data["city"],
+            start_date=data["start_date"],
+            end_date=data["end_date"],
+            daily=data["daily"],
+        )
+
+
+class AsyncCompareStatsView(_AsyncStatsView):
+    query_budget = QueryBudget(queries=3, rows_per_hour=1)
+    query_serializer_class = CompareStatsQuerySerializer
+    response_serializer_class = CompareStatsResponseSerializer
+
+    async def compute(self, data):
+        return await acompare_stats(
+            city_names=data["cities"],
+            start_date=data["start_date"],
+            end_date=data["end_date"],
+            above=data["above"],
+            below=data["below"],
+        )
+
+
+class AsyncDistributionStatsView(_AsyncStatsView):
+    query_budget = QueryBudget(queries=3, rows=0)
+    query_serializer_class = DistributionQuerySerializer
+    response_serializer_class = DistributionResponseSerializer
+
+    async def compute(self, data):
+        return await adistribution_stats(
+            city_name=data["city"],
+            start_date=data["start_date"],
+            end_date=data["end_date"],
+            percentiles=data["percentiles"],
+            bin_width=data["bin_width"],
+        )
+
+
+class AsyncAnalyticsView(_AsyncStatsView):
+    query_budget = QueryBudget(queries=3, rows_per_hour=1)
+    query_serializer_class = AnalyticsQuerySerializer
+    response_serializer_class = AnalyticsResponseSerializer
+
+    async def compute(self, data):
+        return await aanalytics_stats(
+            city_name=data["city"],
+            start_date=data["start_date"],
+            end_date=data["end_date"],
+            windows=data["windows"],
+            heating_base=data["heating_base"],
+            cooling_base=data["cooling_base"],
+            heatwave_threshold=data["heatwave_threshold"],
+            heatwave_min_days=data["heatwave_min_days"],
+            tz=data["tz"],
+        )
+
+
+class AsyncSummaryStatsView(_AsyncStatsView):
+    query_budget = QueryBudget(queries=3)
+    query_serializer_class = SummaryQuerySerializer
+    response_serializer_class = SummaryStatsResponseSerializer
+
+    async def compute(self, data):
+        return await asummary_stats()
+
+
+class AsyncExportView(View):
+    """
+    The export of api.views.ExportView, streamed from an async iterator: a sync streaming response
+    would be read whole (sync_to_async(list)) by Django under ASGI before its first byte is sent.
+    """
+    query_budget = QueryBudget(queries=1)
+    http_method_names = ["get", "options"]
+
+    async def get(self, request):
+        in_ser = ExportQuerySerializer(data=request.GET)
+        if not in_ser.is_valid():
+            return JsonResponse(in_ser.errors, status=status.HTTP_400_BAD_REQUEST)
+        data = in_ser.validated_data
+
+        if data["output"] == "arrow" and not arrow_available():
+            return JsonResponse({"detail": "Arrow export requires pyarrow."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            dataset = await aget_covering_dataset_or_raise(
+                city_name=data["city"],
+                start_date=data["start_date"],
+                end_date=data["end_date"],
+            )
+        except InvalidDateRange as e:
+            return JsonResponse({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except DatasetNotFound as e:
+            return JsonResponse({"detail": str(e)}, status=status.HTTP_404_NOT_FOUND)
+
+        return export_response(request, dataset, data, asynchronous=True)
+
+
+# JSON API without session auth, like the DRF views (APIView is csrf-exempt too)
+@method_decorator(csrf_exempt, name="dispatch")
+class AsyncBatchStatsView(View):
+    query_budget = QueryBudget(queries=4, rows_per_hour=1)
+    http_method_names = ["post", "options"]
+
+    async def post(self, request):
+        try:
+            payload = json.loads(request.body or b"null")
+        except ValueError as e:
+            return JsonResponse({"detail": f"JSON parse error - {e}"}, status=status.HTTP_400_BAD_REQUEST)
+
+        in_ser = BatchStatsRequestSerializer(data=payload)
+        if not in_ser.is_valid():
+            return JsonResponse(in_ser.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        results = [None] * len(in_ser.validated_data["items"])
+        valid_items, valid_positions = [], []
+        for i, raw_item in enumerate(in_ser.validated_data["items"]):
+            item_ser = BatchItemSerializer(data=raw_item)
+            if item_ser.is_valid():
+                valid_items.append(item_ser.validated_data)
+                valid_positions.append(i)
+            else:
+                results[i] = {"status": status.HTTP_400_BAD_REQUEST, "errors": item_ser.errors}
+
+        for i, result in zip(valid_positions, await abatch_stats(valid_items)):
+            results[i] = result
+
+        with phase("serialize"):
+            out_ser = BatchStatsResponseSerializer(data={"results": results})
+            out_ser.is_valid(raise_exception=True)
+            payload = out_ser.data
+        with phase("render"):
+            return JsonResponse(payload, status=status.HTTP_200_OK)
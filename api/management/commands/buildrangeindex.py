@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+import logging
+from typing import Optional
+
+from django.core.management.base import BaseCommand
+
+from api.models import WeatherDataset
+from services.ingest import rebuild_range_index
+from services.range_index import RangeIndex
+
+logger = logging.getLogger('app')
+
+
+class Command(BaseCommand):
+    help = "Build (or rebuild) the precomputed range index for stored datasets."
+
+    def add_arguments(self, parser):
+        parser.add_argument("-c", "--city", type=str, default=None, help="Only datasets for this city")
+        parser.add_argument("--missing", action="store_true",
+                            help="Only datasets without an index or with an outdated index version")
+
+    def handle(self, *args, **options):
+        city_name: Optional[str] = options["city"]
+
+        datasets = WeatherDataset.objects.select_related("city").defer("data")
+        if city_name:
+            datasets = datasets.filter(city__name__iexact=city_name)
+        if options["missing"]:
+            datasets = datasets.exclude(range_index__version=RangeIndex.VERSION)
+
+        built = 0
+        for dataset in datasets:
+            index = rebuild_range_index(dataset)
+            built += 1
+            logger.info("Range index built for %s (%s hours)", dataset, index.hours_count)
+
+        self.stdout.write(self.style.SUCCESS(f"Built {built} range indexes."))
@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+import logging
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.schema import render_schema
+
+logger = logging.getLogger('app')
+
+
+class Command(BaseCommand):
+    help = "Generate the OpenAPI schema into the file served by /swagger.json (OPENAPI_SCHEMA['FILE'])."
+
+    def add_arguments(self, parser):
+        parser.add_argument("-o", "--output", type=str, default=None,
+                            help="Output file (defaults to OPENAPI_SCHEMA['FILE'])")
+
+    def handle(self, *args, **options):
+        output = options["output"] or settings.OPENAPI_SCHEMA["FILE"]
+        if not output:
+            raise CommandError("No output file: pass --output or set OPENAPI_SCHEMA_FILE.")
+
+        body = render_schema()
+        path = Path(output)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write then rename, so running workers never read a partial file
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_bytes(body)
+        tmp.replace(path)
+
+        logger.info("OpenAPI schema written to %s (%s bytes)", path, len(body))
+        self.stdout.write(self.style.SUCCESS(f"OpenAPI schema written to {path} ({len(body)} bytes)."))
@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import logging
+from pathlib import Path
+from typing import Optional
+
+import pandas as pd
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.text import slugify
+
+from api.models import City, WeatherDataset
+
+logger = logging.getLogger('app')
+
+CITIES_FILE = "cities.parquet"
+DATASETS_FILE = "datasets.parquet"
+HOURS_DIR = "hours"
+
+
+def city_partition(city: City) -> str:
+    # Filesystem-safe partition value, unique per (name, country_code)
+    return slugify(f"{city.name}-{city.country_code}") or f"city-{city.pk}"
+
+
+class Command(BaseCommand):
+    help = (
+        "Export cities, datasets and hourly rows to Parquet. "
+        "Hours are partitioned as hours/city=<slug>/year=<YYYY>/ (hive layout)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("output_dir", type=str, help="Directory to write the Parquet files into")
+        parser.add_argument("-c", "--city", type=str, default=None, help="Only export datasets for this city")
+        parser.add_argument("--compression", type=str, default="zstd", help="Parquet codec (default: zstd)")
+
+    def handle(self, *args, **options):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise CommandError("pyarrow is required for Parquet export (pip install pyarrow).")
+
+        output_dir = Path(options["output_dir"])
+        city_name: Optional[str] = options["city"]
+        compression: str = options["compression"]
+
+        datasets = WeatherDataset.objects.select_related("city").order_by("city__name", "start_date")
+        if city_name:
+            datasets = datasets.filter(city__name__iexact=city_name)
+        datasets = list(datasets)
+        if not datasets:
+            raise CommandError("No datasets to export.")
+
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+        cities = {ds.city_id: ds.city for ds in datasets}
+        cities_df = pd.DataFrame([
+            {
+                "name": c.name,
+                "country_code": c.country_code,
+                "country": c.country,
+                "timezone": c.timezone,
+                "latitude": c.latitude,
+                "longitude": c.longitude,
+            }
+            for c in cities.values()
+        ])
+        pq.write_table(pa.Table.from_pandas(cities_df, preserve_index=False),
+                       output_dir / CITIES_FILE, compression=compression)
+
+        datasets_df = pd.DataFrame([
+            {
+                "city_name": ds.city.name,
+                "country_code": ds.city.country_code,
+                "start_date": ds.start_date,
+                "end_date": ds.end_date,
+                "source": ds.source,
+                "created_at": ds.created_at,
+            }
+            for ds in datasets
+        ])
+        pq.write_table(pa.Table.from_pandas(datasets_df, preserve_index=False),
+                       output_dir / DATASETS_FILE, compression=compression)
+
+        total_rows, total_files = 0, 0
+        for ds in datasets:
+            # Stream from the DB cursor: one dataset in memory at a time
+            rows = ds.hours.order_by("timestamp").values_list(
+                "timestamp", "temperature", "precipitation"
+            ).iterator(chunk_size=10_000)
+            df = pd.DataFrame.from_records(rows, columns=["timestamp", "temperature", "precipitation"])
+            if df.empty:
+                continue
+
+            df["timestamp"] = pd.to_datetime(df["timestamp"], utc=True)
+            df["temperature"] = df["temperature"].astype("float64")
+            df["precipitation"] = df["precipitation"].astype("float64")
+            df.insert(0, "city_name", ds.city.name)
+            df.insert(1, "country_code", ds.city.country_code)
+            df.insert(2, "start_date", ds.start_date)
+            df.insert(3, "end_date", ds.end_date)
+
+            partition = city_partition(ds.city)
+            for year, part in df.groupby(df["timestamp"].dt.year):
+                part_dir = output_dir / HOURS_DIR / f"city={partition}" / f"year={year}"
+                part_dir.mkdir(parents=True, exist_ok=True)
+                part_path = part_dir / f"{ds.start_date}_{ds.end_date}.parquet"
+                pq.write_table(pa.Table.from_pandas(part, preserve_index=False),
+                               part_path, compression=compression)
+                total_files += 1
+            total_rows += len(df)
+
+        logger.info("Exported %s datasets / %s hourly rows to %s", len(datasets), total_rows, output_dir)
+        self.stdout.write(self.style.SUCCESS(
+            f"Exported {len(cities)} cities, {len(datasets)} datasets, "
+            f"{total_rows} hourly rows in {total_files} files to {output_dir}"
+        ))
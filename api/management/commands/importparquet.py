@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import logging
+from pathlib import Path
+from datetime import datetime
+from typing import Dict, Optional, Set, Tuple
+
+import pandas as pd
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api.management.commands.exportparquet import CITIES_FILE, DATASETS_FILE, HOURS_DIR
+from api.models import City, WeatherDataset, WeatherHour
+from services.ingest import bulk_insert_hours, existing_timestamps, rebuild_range_index
+
+logger = logging.getLogger('app')
+
+DatasetKey = Tuple[str, str, object, object]
+
+
+class Command(BaseCommand):
+    help = "Import cities, datasets and hourly rows from a directory written by exportparquet."
+
+    def add_arguments(self, parser):
+        parser.add_argument("input_dir", type=str, help="Directory written by exportparquet")
+        parser.add_argument("-r", "--replace", action="store_true", help="If dataset exists, replace its hours.")
+
+    def handle(self, *args, **options):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise CommandError("pyarrow is required for Parquet import (pip install pyarrow).")
+
+        input_dir = Path(options["input_dir"])
+        replace: bool = bool(options["replace"])
+
+        for name in (CITIES_FILE, DATASETS_FILE):
+            if not (input_dir / name).is_file():
+                raise CommandError(f"Missing {name} in {input_dir}")
+
+        cities_df = pq.read_table(input_dir / CITIES_FILE).to_pandas()
+        datasets_df = pq.read_table(input_dir / DATASETS_FILE).to_pandas()
+        hour_files = sorted((input_dir / HOURS_DIR).glob("city=*/year=*/*.parquet"))
+
+        loaded, skipped = 0, 0
+        with transaction.atomic():
+            cities: Dict[Tuple[str, str], City] = {}
+            for row in cities_df.itertuples(index=False):
+                city_obj, _ = City.objects.get_or_create(
+                    name=row.name,
+                    country_code=row.country_code,
+                    defaults=dict(
+                        country=row.country,
+                        timezone=row.timezone,
+                        latitude=row.latitude,
+                        longitude=row.longitude,
+                    ),
+                )
+                cities[(row.name, row.country_code)] = city_obj
+
+            datasets: Dict[DatasetKey, WeatherDataset] = {}
+            # Stored timestamps of the datasets kept without --replace, loaded once (not per file)
+            existing: Dict[DatasetKey, Optional[Set[datetime]]] = {}
+            for row in datasets_df.itertuples(index=False):
+                city_obj = cities.get((row.city_name, row.country_code))
+                if city_obj is None:
+                    raise CommandError(f"Dataset references unknown city {row.city_name} ({row.country_code}).")
+                start_d, end_d = pd.Timestamp(row.start_date).date(), pd.Timestamp(row.end_date).date()
+                dataset, created = WeatherDataset.objects.get_or_create(
+                    city=city_obj,
+                    start_date=start_d,
+                    end_date=end_d,
+                    defaults={"source": row.source},
+                )
+                # Replace once per dataset, before any of its (per-year) files are inserted
+                if not created and replace:
+                    WeatherHour.objects.filter(dataset=dataset).delete()
+                key = (row.city_name, row.country_code, start_d, end_d)
+                datasets[key] = dataset
+                existing[key] = existing_timestamps(dataset) if not created and not replace else None
+
+            for path in hour_files:
+                # One partition file at a time keeps memory bounded by the largest city-year
+                df = pq.read_table(path).to_pandas()
+                group_cols = ["city_name", "country_code", "start_date", "end_date"]
+                for (city_name, country_code, start_date, end_date), part in df.groupby(group_cols, sort=False):
+                    key = (city_name, country_code, pd.Timestamp(start_date).date(), pd.Timestamp(end_date).date())
+                    dataset = datasets.get(key)
+                    if dataset is None:
+                        raise CommandError(f"{path} references a dataset missing from {DATASETS_FILE}: {key}")
+                    created_rows, skipped_rows = bulk_insert_hours(dataset, part, existing=existing[key])
+                    loaded += created_rows
+                    skipped += skipped_rows
+
+            for dataset in datasets.values():
+                rebuild_range_index(dataset)
+
+        logger.info("Imported %s datasets / %s hourly rows from %s", len(datasets), loaded, input_dir)
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {len(cities)} cities, {len(datasets)} datasets, "
+            f"{loaded} hourly rows ({skipped} skipped) from {input_dir}"
+        ))
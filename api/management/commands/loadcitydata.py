@@ -1,10 +1,13 @@
 from __future__ import annotations
 
+import contextlib
 import json
 import logging
+import time
 from datetime import date, datetime
 from typing import Optional, Tuple
 
+from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
 from django.db import transaction
 from django.utils import timezone
@@ -12,9 +15,15 @@ from django.utils import timezone
 logger = logging.getLogger('app')
 from api.models import City, WeatherDataset, WeatherHour
 from clients.open_meteo import get_city_weather
+from services import metrics
+from services.ingest import bulk_insert_hours, ingest_telemetry, rebuild_range_index
+from services.timing import phase, recording
 
 
 class Command(BaseCommand):
+    help = ("Download the hourly archive of a city from Open-Meteo and store it as a dataset. "
+            "With -v 2, report per-phase timings, throughput, bytes downloaded, HTTP cache hits and progress.")
+
     def add_arguments(self, parser):
         parser.add_argument("city", type=str, help="City name, e.g. Madrid")
         parser.add_argument("start_date", type=str, help="Start date (YYYY-MM-DD), must be in the past")
@@ -31,10 +40,18 @@ class Command(BaseCommand):
 
         # Validate date imput
         start_d, end_d = self._validate_date_range(start_date_str, end_date_str)
+        # Telemetry only when asked for: otherwise phase() is a no-op and nothing is counted
+        telemetry = options["verbosity"] >= 2
+        with recording() if telemetry else contextlib.nullcontext() as recorder:
+            self._load(city_query, start_date_str, end_date_str, country, replace, start_d, end_d, recorder)
+
+    def _load(self, city_query, start_date_str, end_date_str, country, replace, start_d, end_d, recorder):
+        started = time.perf_counter()
         try:
             city_weather_info = get_city_weather(city_query, start_date_str, end_date_str, country)
         except Exception as e:
             raise CommandError(str(e))
+        fetch_seconds = time.perf_counter() - started
 
         df = city_weather_info.get("hourly_data")
 
@@ -43,65 +60,54 @@ class Command(BaseCommand):
         if missing:
             raise CommandError(f"Unexpected dataframe columns. Missing: {sorted(missing)}")
 
-        # Ensure datetime is aware (UTC). Your client uses utc=True already.
-        # But we still coerce to be safe.
-        df["date"] = df["date"].apply(self._ensure_aware_utc)
-        data_json = json.loads(df.to_json(orient="records"))
+        with phase("transform"):
+            # Ensure datetime is aware (UTC). Your client uses utc=True already.
+            # But we still coerce to be safe.
+            df["date"] = df["date"].apply(self._ensure_aware_utc)
+            data_json = json.loads(df.to_json(orient="records"))
+            hours_df = df.rename(columns={"date": "timestamp", "temperature_2m": "temperature"})
         # 3) Persist into DB (atomic)
         with transaction.atomic():
-            defaults = dict(
-                country=city_weather_info["country"],
-                timezone=city_weather_info["timezone"]
-            )
-            city_obj, _ = City.objects.get_or_create(
-                name=city_weather_info["city"],
-                country_code=city_weather_info["country_iso"],
-                latitude=city_weather_info["latitude"],
-                longitude=city_weather_info["longitude"],
-                defaults=defaults,
-            )
-
-            dataset, created = WeatherDataset.objects.get_or_create(
-                city=city_obj,
-                start_date=start_d,
-                end_date=end_d,
-                defaults={"source": "open-meteo", "data": data_json},
-            )
-
-            if not created and replace:
-                WeatherHour.objects.filter(dataset=dataset).delete()
-
-            # If not replacing and dataset exists, we prevent duplicates by skipping existing timestamps.
-            existing_ts = set()
-            if not created and not replace:
-                existing_ts = set(
-                    WeatherHour.objects.filter(dataset=dataset)
-                    .values_list("timestamp", flat=True)
+            with phase("insert"):
+                defaults = dict(
+                    country=city_weather_info["country"],
+                    timezone=city_weather_info["timezone"]
+                )
+                city_obj, _ = City.objects.get_or_create(
+                    name=city_weather_info["city"],
+                    country_code=city_weather_info["country_iso"],
+                    latitude=city_weather_info["latitude"],
+                    longitude=city_weather_info["longitude"],
+                    defaults=defaults,
                 )
 
-            hours_to_create, skipped = [], []
-            for row in df.itertuples(index=False):
-                ts = row.date
-                if existing_ts and ts in existing_ts:
-                    skipped.append(ts)
-                    continue
-
-                hours_to_create.append(
-                    WeatherHour(
-                        dataset=dataset,
-                        timestamp=ts,
-                        precipitation=float(row.precipitation) if row.precipitation is not None else None,
-                        temperature=float(row.temperature_2m) if row.temperature_2m is not None else None,
-                    )
+                dataset, created = WeatherDataset.objects.get_or_create(
+                    city=city_obj,
+                    start_date=start_d,
+                    end_date=end_d,
+                    defaults={"source": "open-meteo", "data": data_json},
                 )
-            if hours_to_create:
-                WeatherHour.objects.bulk_create(hours_to_create, batch_size=2000)
 
+                if not created and replace:
+                    WeatherHour.objects.filter(dataset=dataset).delete()
 
-        self.print_stdout(f"Loaded {len(hours_to_create)} hourly rows for {city_obj} ")
-        self.print_stdout(f"Skipped {len(skipped)} rows")
+                # If not replacing and dataset exists, we prevent duplicates by skipping existing timestamps.
+                loaded, skipped = bulk_insert_hours(dataset, hours_df, skip_existing=not created and not replace,
+                                                    progress=self._progress if recorder is not None else None)
+            with phase("index"):
+                rebuild_range_index(dataset)
+
+        if settings.METRICS["ENABLED"]:
+            metrics.record_ingest(source="open-meteo", rows=loaded, fetch_seconds=fetch_seconds,
+                                  total_seconds=time.perf_counter() - started)
+            metrics.flush(force=True)
+
+        self.print_stdout(f"Loaded {loaded} hourly rows for {city_obj} ")
+        self.print_stdout(f"Skipped {skipped} rows")
         self.print_stdout(f"[{start_date_str}..{end_date_str}]. ")
         self.print_stdout(f"Dataset {'created' if created else 'updated'}.")
+        if recorder is not None:
+            self._report(ingest_telemetry(recorder, loaded), city_obj, start_date_str, end_date_str)
 
     # -----------------------
     # Helpers
@@ -134,6 +140,18 @@ class Command(BaseCommand):
             return dt
         return timezone.make_aware(dt, timezone=timezone.utc)
 
+    def _progress(self, done: int, total: int):
+        self.stdout.write(f"Inserted {done}/{total} rows")
+
+    def _report(self, summary: dict, city_obj: City, start_date_str: str, end_date_str: str):
+        logger.info("Ingest telemetry for %s [%s..%s]: %s", city_obj, start_date_str, end_date_str,
+                    json.dumps(summary))
+        phases = ", ".join(f"{name} {ms:.1f} ms" for name, ms in summary["phases_ms"].items())
+        self.stdout.write(f"Phases: {phases}")
+        self.stdout.write(f"Throughput: {summary['rows_per_second'] or 0:,.0f} rows/s; "
+                          f"downloaded {summary['bytes_downloaded']:,} bytes; HTTP cache "
+                          f"{summary['http_cache']['hits']} hits / {summary['http_cache']['misses']} misses")
+
     def print_stdout(self, msg: str):
         self.stdout.write(
             self.style.SUCCESS(msg)
@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from clients.open_meteo import cache_kinds
+
+
+def _size(n: int) -> str:
+    return f"{n / 2 ** 20:.1f} MB" if n >= 2 ** 20 else f"{n / 1024:.1f} kB"
+
+
+class Command(BaseCommand):
+    help = ("Show the Open-Meteo HTTP response cache per policy (entries, size, budget, hits, misses, "
+            "evictions); --prune drops expired entries and evicts down to the budgets, --clear empties it.")
+
+    def add_arguments(self, parser):
+        group = parser.add_mutually_exclusive_group()
+        group.add_argument("--prune", action="store_true", help="Drop expired responses and evict over-budget ones")
+        group.add_argument("--clear", action="store_true", help="Delete every cached response and the counters")
+        parser.add_argument("--json", action="store_true", help="Print the statistics as JSON")
+
+    def handle(self, *args, **options):
+        from clients.http_cache import BoundedCachedSession, CacheConfig
+
+        try:
+            config = CacheConfig.from_env()
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        if config.backend == "none":
+            raise CommandError("The HTTP cache is disabled (OPEN_METEO_CACHE_BACKEND=none).")
+
+        session = BoundedCachedSession(config, cache_kinds())
+        try:
+            if options["clear"]:
+                session.clear()
+                self.stdout.write("Cache cleared.")
+            elif options["prune"]:
+                evicted = session.prune()
+                self.stdout.write("Evicted: " + ", ".join(f"{kind} {n}" for kind, n in evicted.items()))
+            stats = session.stats()
+        finally:
+            session.close()
+
+        if options["json"]:
+            self.stdout.write(json.dumps({"backend": config.backend, "location": config.location, "policies": stats},
+                                         indent=2))
+            return
+        self.stdout.write(f"Backend: {config.backend} ({config.location})")
+        for kind, s in stats.items():
+            expiry = "never expires" if s["expire_after"] < 0 else f"expires after {s['expire_after']} s"
+            ratio = "-" if s["hit_ratio"] is None else f"{s['hit_ratio']:.1%}"
+            self.stdout.write(
+                f"{kind}: {s['entries']} entries, {_size(s['bytes'])} of {_size(s['max_bytes'])}, "
+                f"{expiry}; {s['hits']} hits, {s['misses']} misses ({ratio} hit ratio), {s['evictions']} evictions"
+            )
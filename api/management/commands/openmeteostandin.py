@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import zlib
+
+from django.core.management.base import BaseCommand, CommandError
+
+from clients.open_meteo_standin import StandInConfig, StandInServer
+from services.synthetic import SYNTHETIC_CITIES, synthetic_hourly_frame
+
+
+def synthetic_cities():
+    return [
+        {"name": name, "country_code": code, "country": country, "latitude": latitude, "longitude": longitude,
+         "timezone": tz}
+        for name, code, country, latitude, longitude, tz in SYNTHETIC_CITIES
+    ]
+
+
+def synthetic_hourly(seed: int):
+    def hourly(latitude, longitude, start, end):
+        # Same coordinates, same series: repeated ingests of a range are identical
+        location_seed = zlib.crc32(f"{latitude:.4f},{longitude:.4f}".encode("utf-8")) ^ seed
+        return synthetic_hourly_frame(start, end, latitude=latitude, seed=location_seed)
+    return hourly
+
+
+class Command(BaseCommand):
+    help = ("Serve a local stand-in for the Open-Meteo geocoding and archive APIs with synthetic data, "
+            "for offline ingest tests and benchmarks.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8090)
+        parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every response")
+        parser.add_argument("--jitter", type=float, default=0.0, help="Up to this many extra seconds, uniformly")
+        parser.add_argument("--error-rate", type=float, default=0.0,
+                            help="Share of requests answered with a 500 (0..1)")
+        parser.add_argument("--rate-limit", type=float, default=None,
+                            help="Requests per second before answering 429, like the real API")
+        parser.add_argument("--seed", type=int, default=0, help="Random seed (data, jitter and errors)")
+
+    def handle(self, *args, **options):
+        if not 0 <= options["error_rate"] <= 1:
+            raise CommandError("--error-rate must be between 0 and 1.")
+        if options["latency"] < 0 or options["jitter"] < 0:
+            raise CommandError("--latency and --jitter must be >= 0.")
+        if options["rate_limit"] is not None and options["rate_limit"] <= 0:
+            raise CommandError("--rate-limit must be > 0.")
+
+        config = StandInConfig(
+            cities=synthetic_cities(),
+            hourly=synthetic_hourly(options["seed"]),
+            latency=options["latency"],
+            jitter=options["jitter"],
+            error_rate=options["error_rate"],
+            rate_limit=options["rate_limit"],
+            seed=options["seed"],
+        )
+        server = StandInServer((options["host"], options["port"]), config)
+        self.stdout.write(
+            f"Open-Meteo stand-in on {server.base_url} (Ctrl+C to stop). Point the client at it with:\n"
+            f"  OPEN_METEO_GEOCODING_URL={server.base_url}/v1/search\n"
+            f"  OPEN_METEO_ARCHIVE_URL={server.base_url}/v1/archive"
+        )
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            for key, count in sorted(server.stats.items()):
+                self.stdout.write(f"{key}: {count}")
@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from services.synthetic import SYNTHETIC_CITIES, seed_synthetic_data
+
+logger = logging.getLogger('app')
+
+
+class Command(BaseCommand):
+    help = "Store deterministic synthetic weather datasets (cities x years), e.g. for benchmarks."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--cities", type=int, default=3,
+                            help=f"Number of cities (first {len(SYNTHETIC_CITIES)} are distinct, then numbered)")
+        parser.add_argument("--years", type=int, default=1, help="Full years per dataset")
+        parser.add_argument("--end-year", type=int, default=None, help="Last year (default: last year)")
+        parser.add_argument("--seed", type=int, default=0, help="Random seed")
+        parser.add_argument("--ranges", type=str, default="",
+                            help="Extra datasets per city of these lengths in days, ending with the last one "
+                                 "(e.g. 7,30,90), for load tests")
+        parser.add_argument("-r", "--replace", action="store_true", help="Regenerate existing datasets.")
+
+    def handle(self, *args, **options):
+        if options["cities"] < 1 or options["years"] < 1:
+            raise CommandError("--cities and --years must be >= 1.")
+        try:
+            ranges = [int(days) for days in options["ranges"].split(",") if days.strip()]
+        except ValueError:
+            raise CommandError("--ranges must be comma-separated day counts.")
+        if any(days < 1 for days in ranges):
+            raise CommandError("--ranges must be >= 1.")
+        end_year = options["end_year"] or timezone.localdate().year - 1
+        if end_year >= timezone.localdate().year:
+            raise CommandError("--end-year must be in the past.")
+
+        datasets = seed_synthetic_data(cities=options["cities"], years=options["years"], end_year=end_year,
+                                       seed=options["seed"], replace=options["replace"], ranges=ranges)
+        for dataset in datasets:
+            logger.info("Synthetic dataset ready: %s", dataset)
+        self.stdout.write(self.style.SUCCESS(f"{len(datasets)} synthetic datasets ready."))
@@ -0,0 +1,105 @@
+"""
+Request metrics and the Prometheus endpoint (see services.metrics for the shared store).
+
+MetricsMiddleware records, per API endpoint (URL name): request counts by status, errors,
+a latency histogram, the hourly rows read (from the request's services.timing recorder) and
+response cache hits/misses (X-Cache header). metrics_view serves every worker's merged
+metrics in the Prometheus text format, only to the addresses in METRICS["ALLOWED_IPS"].
+"""
+from __future__ import annotations
+
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.urls import Resolver404, resolve
+
+from api import admission
+from api.access import internal_address
+from api.server_timing import request_recording
+from services import metrics
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_ADMISSION_RESULTS = ("admitted", "queued", "rejected", "timed_out", "rejected_client")
+
+
+def collect_admission() -> None:
+    """Copy this process's admission counters (api.admission.snapshot) into the metrics."""
+    for endpoint, snap in admission.snapshot().items():
+        metrics.set_value("admission_capacity_units", snap["capacity"], endpoint=endpoint)
+        metrics.set_value("admission_in_use_units", snap["in_use"], endpoint=endpoint)
+        metrics.set_value("admission_waiting_requests", snap["waiting"], endpoint=endpoint)
+        metrics.set_value("admission_wait_seconds_total", snap["wait_seconds"], endpoint=endpoint)
+        for result in _ADMISSION_RESULTS:
+            metrics.set_value("admission_requests_total", snap[result], endpoint=endpoint, result=result)
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        config = getattr(settings, "METRICS", {})
+        self.enabled = bool(config.get("ENABLED", False))
+        self.prefixes = tuple(config.get("PATHS", ("/api/",)))
+        if self.enabled:
+            metrics.register_collector(collect_admission)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not self.enabled or not request.path.startswith(self.prefixes):
+            return self.get_response(request)
+
+        started = time.perf_counter()
+        # Reuses the Server-Timing recorder when there is one, for the rows counter
+        with request_recording() as recorder:
+            response = self.get_response(request)
+        self._record(request, response, recorder, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        if not self.enabled or not request.path.startswith(self.prefixes):
+            return await self.get_response(request)
+
+        started = time.perf_counter()
+        with request_recording() as recorder:
+            response = await self.get_response(request)
+        self._record(request, response, recorder, time.perf_counter() - started)
+        return response
+
+    def _record(self, request, response, recorder, elapsed: float) -> None:
+        endpoint = _endpoint(request)
+        metrics.inc("http_requests_total", endpoint=endpoint, method=request.method, status=response.status_code)
+        if response.status_code >= 400:
+            metrics.inc("http_request_errors_total", endpoint=endpoint, status=response.status_code)
+        metrics.observe("http_request_duration_seconds", elapsed, endpoint=endpoint)
+        metrics.observe("http_request_rows_scanned", recorder.counters.get("rows", 0), endpoint=endpoint)
+        cache_status = response.get("X-Cache")
+        if cache_status:
+            metrics.inc("response_cache_requests_total", endpoint=endpoint, result=cache_status.lower())
+        metrics.flush()  # throttled: one small file write every FLUSH_INTERVAL
+
+
+def _endpoint(request) -> str:
+    match = request.resolver_match
+    if match is None:  # answered before URL resolution (response cache hit, middleware rejection)
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return "unmatched"
+    return match.url_name or "unmatched"
+
+
+def metrics_view(request):
+    if not settings.METRICS["ENABLED"]:
+        return HttpResponse("Metrics are disabled.\n", status=404, content_type="text/plain")
+    if not internal_address(request):
+        return HttpResponseForbidden("Forbidden\n", content_type="text/plain")
+    return HttpResponse(metrics.render_prometheus(), content_type=PROMETHEUS_CONTENT_TYPE)
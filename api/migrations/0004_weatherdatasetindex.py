@@ -0,0 +1,28 @@
+# Generated by Django 6.0.2 on 2026-10-19 00:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_alter_weatherhour_precipitation_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WeatherDatasetIndex',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveSmallIntegerField()),
+                ('hours_count', models.PositiveIntegerField(default=0)),
+                ('payload', models.BinaryField()),
+                ('built_at', models.DateTimeField(auto_now=True)),
+                ('dataset', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='range_index', to='api.weatherdataset')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
@@ -52,15 +52,44 @@ class WeatherDataset(DefaultModel):
         ]
 
 
+class WeatherHourQuerySet(models.QuerySet):
+    """
+    Changing hours through the ORM (admin included) drops the range indexes of their datasets,
+    which are rebuilt on next use. Overridden here rather than with post_delete receivers, which
+    would turn the bulk deletes of a reingest into one query per row.
+    """
+
+    def _drop_range_indexes(self):
+        WeatherDatasetIndex.objects.filter(dataset__in=self.order_by().values("dataset_id")).delete()
+
+    def update(self, **kwargs):
+        self._drop_range_indexes()
+        return super().update(**kwargs)
+
+    def delete(self):
+        self._drop_range_indexes()
+        return super().delete()
+
+
 class WeatherHour(DefaultModel):
     dataset = models.ForeignKey(WeatherDataset, related_name='hours', on_delete=models.CASCADE)
     timestamp = models.DateTimeField()
     temperature = models.FloatField(null=True)
     precipitation = models.FloatField(null=True)
 
+    objects = WeatherHourQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.dataset} [{self.timestamp}]"
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        WeatherDatasetIndex.objects.filter(dataset_id=self.dataset_id).delete()
+
+    def delete(self, *args, **kwargs):
+        WeatherDatasetIndex.objects.filter(dataset_id=self.dataset_id).delete()
+        return super().delete(*args, **kwargs)
+
     class Meta:
         ordering = ['-timestamp']
         constraints = [
@@ -69,3 +98,15 @@ class WeatherHour(DefaultModel):
         indexes = [
             models.Index(fields=["dataset", "timestamp"]),
         ]
+
+
+class WeatherDatasetIndex(DefaultModel):
+    """Precomputed range index (see services.range_index) built at ingest for a dataset."""
+    dataset = models.OneToOneField(WeatherDataset, related_name='range_index', on_delete=models.CASCADE)
+    version = models.PositiveSmallIntegerField()
+    hours_count = models.PositiveIntegerField(default=0)
+    payload = models.BinaryField()
+    built_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.dataset} index v{self.version}"
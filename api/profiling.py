@@ -0,0 +1,231 @@
+"""
+On-demand request profiling (cProfile), usable in production; debug_toolbar stays dev-only.
+
+A request is profiled when a staff user asks for it, with the `X-Profile: 1` header or the
+`_profile=1` query parameter, or when it is drawn by PROFILING["SAMPLE_RATE"] (a fraction of the
+requests to PATHS). The profile covers everything below the middleware that runs in the
+request thread: view, services, SQL and rendering. Under ASGI that thread is the event loop's:
+other requests served meanwhile show up too, and what runs in the ORM or stats threads does
+not. Each report is stored in PROFILING["DIR"] as `<id>.prof` (pstats format, for
+snakeviz/pstats) plus `<id>.json` with the request metadata; only the newest MAX_REPORTS are
+kept.
+
+Staff users list the reports at /internal/profiles/ and download one at
+/internal/profiles/<id>/ (`?format=text` for the pstats summary). Requested profiles answer
+with an X-Profile-Id header.
+"""
+from __future__ import annotations
+
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import random
+import re
+import time
+import uuid
+from datetime import datetime, timezone as dt_timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseForbidden, JsonResponse
+
+from api.access import is_staff
+from services.timing import current_recorder
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "HTTP_X_PROFILE"
+PROFILE_PARAM = "_profile"
+_ID_RE = re.compile(r"^[0-9T]{15}-[0-9a-f]{8}$")
+_TRUE = ("1", "true", "yes")
+
+
+def profile_requested(request) -> bool:
+    """The client asked for a profile (whether it gets one depends on being staff, see profiling_trigger)."""
+    return (request.META.get(PROFILE_HEADER, "").lower() in _TRUE
+            or request.GET.get(PROFILE_PARAM, "").lower() in _TRUE)
+
+
+def profiling_trigger(request) -> Optional[str]:
+    """
+    Why this request is profiled ("requested" by staff, "sampled") or None. Decided once per
+    request: the response cache asks first, so that profiled requests reach the view.
+    """
+    try:
+        return request._profiling_trigger
+    except AttributeError:
+        pass
+    config = getattr(settings, "PROFILING", {})
+    trigger = None
+    if config.get("ENABLED", False) and request.path.startswith(tuple(config.get("PATHS", ("/api/weather/",)))):
+        sample_rate = float(config.get("SAMPLE_RATE", 0.0))
+        if profile_requested(request) and is_staff(request):
+            trigger = "requested"
+        elif sample_rate > 0 and random.random() < sample_rate:
+            trigger = "sampled"
+    request._profiling_trigger = trigger
+    return trigger
+
+
+async def aprofiling_trigger(request) -> Optional[str]:
+    """profiling_trigger() for async middleware: the user of a flagged request is loaded with auser()."""
+    if not hasattr(request, "_profiling_trigger") and profile_requested(request) and hasattr(request, "auser"):
+        request.user = await request.auser()
+    return profiling_trigger(request)
+
+
+def _profiles_dir() -> Path:
+    return Path(settings.PROFILING["DIR"])
+
+
+class ProfilingMiddleware:
+    """Profiles the requests selected as described in the module docstring (after authentication)."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        self.max_reports = int(getattr(settings, "PROFILING", {}).get("MAX_REPORTS", 200))
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        trigger = profiling_trigger(request)
+        profiler = self._start(request, trigger)
+        if profiler is None:
+            return self.get_response(request)
+
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.disable()
+        return self._store(profiler, request, response, trigger, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        trigger = await aprofiling_trigger(request)
+        profiler = self._start(request, trigger)
+        if profiler is None:
+            return await self.get_response(request)
+
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            profiler.disable()
+        # File writes (and the lazy user of sampled requests) off the event loop
+        return await sync_to_async(self._store)(profiler, request, response, trigger,
+                                                time.perf_counter() - started)
+
+    def _start(self, request, trigger: Optional[str]) -> Optional[cProfile.Profile]:
+        if trigger is None:
+            return None
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:  # another profiler is active in this process (thread)
+            logger.warning("Profiling skipped for %s: another profiler is active", request.path)
+            return None
+        return profiler
+
+    def _store(self, profiler: cProfile.Profile, request, response, trigger: str, elapsed: float):
+        try:
+            report_id = self._save(profiler, request, response, trigger, elapsed)
+        except OSError:
+            logger.exception("Could not store the profile of %s", request.path)
+            return response
+        if trigger == "requested":
+            response["X-Profile-Id"] = report_id
+        return response
+
+    def _save(self, profiler: cProfile.Profile, request, response, trigger: str, elapsed: float) -> str:
+        now = datetime.now(dt_timezone.utc)
+        report_id = f"{now:%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+        recorder = current_recorder()
+        meta = {
+            "id": report_id,
+            "timestamp": now.isoformat(timespec="seconds"),
+            "trigger": trigger,
+            "method": request.method,
+            "path": request.path,
+            "query": request.GET.urlencode(),
+            "user": request.user.get_username() if is_staff(request) else None,
+            "status": response.status_code,
+            "duration_ms": round(elapsed * 1000, 3),
+            "queries": recorder.counters.get("queries") if recorder is not None else None,
+            "rows": recorder.counters.get("rows") if recorder is not None else None,
+            "pid": os.getpid(),
+        }
+        directory = _profiles_dir()
+        directory.mkdir(parents=True, exist_ok=True)
+        profiler.dump_stats(str(directory / f"{report_id}.prof"))
+        (directory / f"{report_id}.json").write_text(json.dumps(meta), encoding="utf-8")
+        logger.info("Stored %s profile %s of %s %s (%.1f ms)", trigger, report_id, request.method, request.path,
+                    meta["duration_ms"])
+        _prune(directory, self.max_reports)
+        return report_id
+
+
+def _prune(directory: Path, keep: int) -> None:
+    """Delete all but the newest `keep` reports (ids sort chronologically)."""
+    for meta_path in sorted(directory.glob("*.json"), reverse=True)[keep:]:
+        for path in (meta_path, meta_path.with_suffix(".prof")):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass  # pruned concurrently by another worker
+
+
+def list_reports() -> List[Dict[str, Any]]:
+    """Metadata of the stored reports, newest first."""
+    reports = []
+    for path in sorted(_profiles_dir().glob("*.json"), reverse=True):
+        try:
+            reports.append(json.loads(path.read_text(encoding="utf-8")))
+        except (OSError, ValueError):
+            continue  # pruned or being written
+    return reports
+
+
+def report_text(report_id: str, limit: int = 60) -> str:
+    stream = io.StringIO()
+    stats = pstats.Stats(str(_profiles_dir() / f"{report_id}.prof"), stream=stream)
+    stats.sort_stats("cumulative").print_stats(limit)
+    return stream.getvalue()
+
+
+# -----------------------
+# Views (staff only)
+# -----------------------
+
+def _report_path(report_id: str) -> Optional[Path]:
+    if not _ID_RE.match(report_id):
+        return None
+    path = _profiles_dir() / f"{report_id}.prof"
+    return path if path.exists() else None
+
+
+def profiles_list_view(request):
+    if not is_staff(request):
+        return HttpResponseForbidden("Forbidden\n", content_type="text/plain")
+    return JsonResponse({"profiles": list_reports()})
+
+
+def profile_download_view(request, report_id: str):
+    if not is_staff(request):
+        return HttpResponseForbidden("Forbidden\n", content_type="text/plain")
+    path = _report_path(report_id)
+    if path is None:
+        raise Http404("Unknown profile")
+    if request.GET.get("format") == "text":
+        return HttpResponse(report_text(report_id), content_type="text/plain; charset=utf-8")
+    return FileResponse(path.open("rb"), as_attachment=True, filename=path.name,
+                        content_type="application/octet-stream")
@@ -0,0 +1,195 @@
+"""
+Query budgets: the SQL queries and hourly rows one request to a view may use.
+
+Views declare theirs as a class attribute, `query_budget = QueryBudget(queries=3, rows_per_hour=1)`.
+QueryBudgetMiddleware counts both for every request to such a view (through the request's
+services.timing recorder, see api.server_timing.request_recording) and, when the request goes
+over, logs a warning and increments the query_budget_exceeded_total metric. In tests,
+enforce_query_budgets() turns an overrun into a failure listing the SQL the request ran.
+
+Counts cover the whole request, middleware included (response cache data version...), so a
+budget pins the end-to-end cost of the endpoint. The dataset hours behind the admission estimate
+are reloaded once a minute per process, not per request: budgets count them warm. Requests with
+a session cookie get SESSION_QUERIES more (session and user lookups of DRF's session
+authentication).
+Rows are the hourly rows read into memory; index-backed endpoints declare rows=0.
+"""
+from __future__ import annotations
+
+import contextlib
+import logging
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Iterator, List, Optional
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from api.admission import adataset_hours, estimate_hours
+from api.server_timing import request_recording
+from services import metrics
+
+logger = logging.getLogger(__name__)
+
+SESSION_QUERIES = 2
+
+
+@dataclass(frozen=True)
+class QueryBudget:
+    """At most `queries` SQL queries; rows capped absolutely (`rows`) and/or per requested hour."""
+    queries: int
+    rows: Optional[int] = None
+    # Cap relative to the hours the request covers (api.admission.estimate_hours)
+    rows_per_hour: Optional[float] = None
+
+    def max_rows(self, url_name: str, request, stored_hours=None) -> Optional[int]:
+        limits = []
+        if self.rows is not None:
+            limits.append(self.rows)
+        if self.rows_per_hour is not None:
+            limits.append(int(self.rows_per_hour * estimate_hours(url_name, request, stored_hours)))
+        return min(limits) if limits else None
+
+
+@dataclass
+class BudgetReport:
+    endpoint: str
+    path: str
+    queries: int
+    rows: int
+    max_queries: int
+    max_rows: Optional[int]
+    sql: List[str] = field(default_factory=list)  # only collected inside enforce_query_budgets()
+
+    @property
+    def violations(self) -> List[str]:
+        out = []
+        if self.queries > self.max_queries:
+            out.append(f"queries: {self.queries} > {self.max_queries}")
+        if self.max_rows is not None and self.rows > self.max_rows:
+            out.append(f"rows: {self.rows} > {self.max_rows}")
+        return out
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def view_budget(view_func) -> Optional[QueryBudget]:
+    """Budget declared by a view (class attribute of class-based views, or function attribute)."""
+    view_class = getattr(view_func, "view_class", None)
+    return getattr(view_class or view_func, "query_budget", None)
+
+
+# Reports of the requests made inside enforce_query_budgets()
+_reports: ContextVar[Optional[List[BudgetReport]]] = ContextVar("query_budget_reports", default=None)
+
+
+class QueryBudgetMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+            # Django adapts the hooks to the mode of the chain: keep them native
+            self.process_view = self.aprocess_view
+        config = getattr(settings, "QUERY_BUDGET", {})
+        self.enabled = bool(config.get("ENABLED", False))
+        self.prefixes = tuple(config.get("PATHS", ("/api/weather/",)))
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not self.enabled or not request.path.startswith(self.prefixes):
+            return self.get_response(request)
+        with self._counting(request):
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        if not self.enabled or not request.path.startswith(self.prefixes):
+            return await self.get_response(request)
+        with self._counting(request):
+            return await self.get_response(request)
+
+    @contextlib.contextmanager
+    def _counting(self, request) -> Iterator[None]:
+        reports = _reports.get()
+        with request_recording() as recorder:
+            if reports is not None:  # enforce_query_budgets(): keep the SQL for the failure message
+                recorder.statements = []
+            # Counted from here: the queries of outer middleware, if any, are theirs
+            queries_before = recorder.counters.get("queries", 0)
+            rows_before = recorder.counters.get("rows", 0)
+            yield
+
+        limits = getattr(request, "_query_budget", None)
+        if limits is not None:
+            self._check(request, BudgetReport(
+                endpoint=request.resolver_match.url_name,
+                path=request.path,
+                queries=recorder.counters.get("queries", 0) - queries_before,
+                rows=recorder.counters.get("rows", 0) - rows_before,
+                max_queries=limits[0],
+                max_rows=limits[1],
+                sql=recorder.statements or [],
+            ), reports)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        budget = view_budget(view_func) if self.enabled else None
+        if budget is not None:
+            self._set_limits(request, budget, None)
+        return None
+
+    async def aprocess_view(self, request, view_func, view_args, view_kwargs):
+        budget = view_budget(view_func) if self.enabled else None
+        if budget is not None:
+            self._set_limits(request, budget, await adataset_hours())
+        return None
+
+    def _set_limits(self, request, budget: QueryBudget, stored_hours) -> None:
+        # Resolved before the view runs: the batch estimate reads the request body
+        max_queries = budget.queries
+        if settings.SESSION_COOKIE_NAME in request.COOKIES:
+            max_queries += SESSION_QUERIES
+        request._query_budget = (max_queries, budget.max_rows(request.resolver_match.url_name, request, stored_hours))
+
+    def _check(self, request, report: BudgetReport, reports: Optional[List[BudgetReport]]) -> None:
+        if reports is not None:
+            reports.append(report)
+        violations = report.violations
+        if not violations:
+            return
+        logger.warning("Query budget exceeded by %s %s: %s", request.method, report.path, ", ".join(violations))
+        if settings.METRICS["ENABLED"]:
+            for violation in violations:
+                metrics.inc("query_budget_exceeded_total", endpoint=report.endpoint, kind=violation.split(":")[0])
+
+
+@contextlib.contextmanager
+def enforce_query_budgets() -> Iterator[List[BudgetReport]]:
+    """
+    Test helper: raise QueryBudgetExceeded when a request made inside the block goes over its
+    view's budget, or when none of them reached a view with a budget.
+
+        with enforce_query_budgets():
+            self.client.get("/api/weather/temperature/", params)
+    """
+    reports: List[BudgetReport] = []
+    token = _reports.set(reports)
+    try:
+        yield reports
+    finally:
+        _reports.reset(token)
+
+    if not reports:
+        raise QueryBudgetExceeded("No request reached a view with a query budget (is QUERY_BUDGET enabled?)")
+    failed = [r for r in reports if r.violations]
+    if failed:
+        lines = []
+        for r in failed:
+            lines.append(f"{r.endpoint} ({r.path}): {', '.join(r.violations)}")
+            lines += [f"  {statement}" for statement in r.sql]
+        raise QueryBudgetExceeded("Query budget exceeded by\n" + "\n".join(lines))
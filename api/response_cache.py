@@ -0,0 +1,201 @@
+"""
+Negotiated gzip/brotli compression for API responses, with a cache of precompressed bodies.
+
+Successful GET responses of the cached paths are stored once per data version and Accept
+header (DRF renders JSON or the browsable API's HTML from it) with their identity, gzip and
+(if the brotli package is installed) br encodings, so a hit is served with the client's
+preferred encoding without recompressing. Other API responses are compressed on the fly.
+Streaming responses (the export endpoint) are left untouched.
+
+The data version comes from one small aggregate over the datasets and their range indexes
+(count, latest creation, indexes and their latest build): any ingest changes it, in every worker process,
+whatever the cache backend. The middleware runs natively under ASGI, where the lookup (data
+version query and cache read) is the only step sent to a thread. Configured by
+settings.API_RESPONSE_CACHE.
+"""
+from __future__ import annotations
+
+import gzip
+import hashlib
+import re
+from typing import Any, Dict, Optional, Tuple
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Count, Max
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+
+from api.models import WeatherDataset
+from api.profiling import PROFILE_PARAM, aprofiling_trigger, profiling_trigger
+from services.timing import phase
+
+try:  # optional dependency
+    import brotli
+except ImportError:  # pragma: no cover - depends on the environment
+    brotli = None
+
+# Most preferred first
+_ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+_SKIP_HEADERS = {"content-length", "content-encoding"}
+
+
+def _compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=5)
+    return gzip.compress(data, compresslevel=6, mtime=0)
+
+
+def _accepted_encodings(accept_encoding: str) -> Dict[str, float]:
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        match = re.search(r"q=([0-9.]+)", params)
+        try:
+            accepted[name.strip().lower()] = float(match.group(1)) if match else 1.0
+        except ValueError:  # malformed q value
+            accepted[name.strip().lower()] = 0.0
+    return accepted
+
+
+def accepts_encoding(accept_encoding: str, encoding: str) -> bool:
+    """The client accepts `encoding` (listed, or through "*", with q > 0)."""
+    accepted = _accepted_encodings(accept_encoding)
+    return accepted.get(encoding, accepted.get("*", 0.0)) > 0
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """Preferred supported encoding accepted by the client (q=0 means refused), or None."""
+    accepted = _accepted_encodings(accept_encoding)
+    for encoding in _ENCODINGS:
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+def data_version() -> str:
+    """Changes whenever a dataset is added, removed or (re)indexed, or its hours are edited (index dropped)."""
+    stamp = WeatherDataset.objects.order_by().aggregate(
+        n=Count("pk"), created=Max("created_at"), indexed=Count("range_index"), built=Max("range_index__built_at"),
+    )
+    created, built = stamp["created"], stamp["built"]
+    return f"{stamp['n']}:{created and created.timestamp()}:{stamp['indexed']}:{built and built.timestamp()}"
+
+
+class CompressedResponseCacheMiddleware:
+    """Compress API responses and cache the compressed bodies of successful GETs (see module docstring)."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        config = getattr(settings, "API_RESPONSE_CACHE", {})
+        self.enabled = bool(config.get("ENABLED", False))
+        self.cache = caches[config.get("CACHE_ALIAS", "default")]
+        self.timeout = config.get("TIMEOUT", 300)
+        self.min_size = int(config.get("MIN_SIZE", 512))
+        self.compress_prefixes = tuple(config.get("COMPRESS_PATHS", ("/api/",)))
+        self.cache_prefixes = tuple(config.get("CACHE_PATHS", ("/api/weather/",)))
+        self.exclude = tuple(config.get("EXCLUDE_PATHS", ()))
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not self.enabled or not request.path.startswith(self.compress_prefixes):
+            return self.get_response(request)
+
+        encoding = negotiate_encoding(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        key = None
+        # Profiled requests must reach the view (api.profiling); a flag from anyone else is ignored
+        if self._cacheable(request) and profiling_trigger(request) is None:
+            with phase("cache"):
+                key, entry = self._lookup(request)
+            if entry is not None:
+                return self._build(entry, encoding, "HIT")
+
+        response = self.get_response(request)
+        response, entry = self._finish(response, key, encoding)
+        if entry is not None:
+            self.cache.set(key, entry, self.timeout)
+        return response
+
+    async def __acall__(self, request):
+        if not self.enabled or not request.path.startswith(self.compress_prefixes):
+            return await self.get_response(request)
+
+        encoding = negotiate_encoding(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        key = None
+        if self._cacheable(request) and await aprofiling_trigger(request) is None:
+            with phase("cache"):
+                key, entry = await sync_to_async(self._lookup)(request)
+            if entry is not None:
+                return self._build(entry, encoding, "HIT")
+
+        response = await self.get_response(request)
+        response, entry = self._finish(response, key, encoding)
+        if entry is not None:
+            await self.cache.aset(key, entry, self.timeout)
+        return response
+
+    def _cacheable(self, request) -> bool:
+        return (request.method in ("GET", "HEAD") and request.path.startswith(self.cache_prefixes)
+                and not request.path.startswith(self.exclude))
+
+    def _lookup(self, request) -> Tuple[str, Optional[Dict[str, Any]]]:
+        key = self._cache_key(request)
+        return key, self.cache.get(key)
+
+    def _finish(self, response, key: Optional[str], encoding: Optional[str]):
+        """The response to send, compressed if worth it, and the entry to cache (or None)."""
+        if response.streaming or response.has_header("Content-Encoding"):
+            return response, None
+
+        if key is not None and response.status_code == 200 and not response.cookies:
+            with phase("compress"):
+                entry = self._entry(response)
+            return self._build(entry, encoding, "MISS"), entry
+
+        if encoding and len(response.content) >= self.min_size:
+            with phase("compress"):
+                response.content = _compress(response.content, encoding)
+            response["Content-Encoding"] = encoding
+            response["Content-Length"] = str(len(response.content))
+        patch_vary_headers(response, ("Accept-Encoding",))
+        return response, None
+
+    def _cache_key(self, request) -> str:
+        # The profiling flag does not change the response (nor, for non-staff, whether it is cached)
+        params = [p for p in request.GET.urlencode().split("&") if p.split("=", 1)[0] != PROFILE_PARAM]
+        query = "&".join(sorted(params))
+        # DRF picks the renderer from Accept (JSON, or the browsable API's HTML)
+        accept = request.META.get("HTTP_ACCEPT", "")
+        digest = hashlib.sha256(f"{request.path}?{query}\n{accept}".encode()).hexdigest()
+        return f"api-response:{data_version()}:{digest}"
+
+    def _entry(self, response) -> Dict[str, Any]:
+        # Every supported encoding is compressed once, here; hits only pick one
+        body = response.content
+        bodies = {None: body}
+        if len(body) >= self.min_size:
+            for name in _ENCODINGS:
+                bodies[name] = _compress(body, name)
+        headers = {k: v for k, v in response.headers.items() if k.lower() not in _SKIP_HEADERS}
+        return {"status": response.status_code, "headers": headers, "bodies": bodies}
+
+    def _build(self, entry: Dict[str, Any], encoding: Optional[str], cache_status: str) -> HttpResponse:
+        if encoding not in entry["bodies"]:
+            encoding = None
+        response = HttpResponse(entry["bodies"][encoding], status=entry["status"])
+        for name, value in entry["headers"].items():
+            response[name] = value
+        if encoding:
+            response["Content-Encoding"] = encoding
+        response["Content-Length"] = str(len(response.content))
+        patch_vary_headers(response, ("Accept", "Accept-Encoding"))
+        response["X-Cache"] = cache_status
+        return response
@@ -0,0 +1,108 @@
+"""
+OpenAPI schema generated once and served from memory.
+
+drf_yasg introspects every view and serializer to build the schema, so instead of doing it
+per request the JSON document is rendered once per process: read from
+settings.OPENAPI_SCHEMA["FILE"] when it exists (written at deploy time by
+`manage.py buildschema`), otherwise generated on the first request. It is served with an
+ETag, a public Cache-Control max-age and a gzip variant, and answers 304 to revalidations.
+The swagger/redoc UIs load it from this view (SPEC_URL in SWAGGER_SETTINGS / REDOC_SETTINGS).
+"""
+from __future__ import annotations
+
+import functools
+import gzip
+import hashlib
+import logging
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+from django.urls import include, path
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views import View
+from drf_yasg import openapi
+from drf_yasg.codecs import OpenAPICodecJson
+from drf_yasg.views import get_schema_view
+from rest_framework import permissions
+
+from api.response_cache import accepts_encoding
+from api.urls import sync_urlpatterns
+
+logger = logging.getLogger('app')
+
+API_INFO = openapi.Info(
+    title="OpenMeteoAPI",
+    default_version="v1",
+    description="Weather statistics API (Open-Meteo) – Django/DRF",
+)
+# The async views are not DRF views; document the equivalent sync ones
+SCHEMA_PATTERNS = [path("api/", include(sync_urlpatterns))]
+
+schema_view = get_schema_view(
+    API_INFO,
+    public=True,
+    permission_classes=[permissions.AllowAny],
+    patterns=SCHEMA_PATTERNS,
+)
+
+
+@dataclass(frozen=True)
+class SchemaDocument:
+    body: bytes
+    gzipped: bytes
+    etag: str
+
+    @classmethod
+    def from_bytes(cls, body: bytes) -> "SchemaDocument":
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        return cls(body=body, gzipped=gzip.compress(body, compresslevel=9, mtime=0), etag=f'"{digest}"')
+
+
+def render_schema() -> bytes:
+    """Generate the OpenAPI (Swagger 2.0) JSON document of the API."""
+    generator = schema_view.generator_class(API_INFO, patterns=SCHEMA_PATTERNS)
+    # No request: host/schemes are left out, so clients resolve paths against the serving host
+    schema = generator.get_schema(request=None, public=True)
+    return OpenAPICodecJson(validators=[]).encode(schema)
+
+
+def _schema_file() -> Optional[Path]:
+    file = settings.OPENAPI_SCHEMA["FILE"]
+    return Path(file) if file else None
+
+
+@functools.lru_cache(maxsize=1)
+def get_schema_document() -> SchemaDocument:
+    """The schema of this process: the prebuilt file if present, else generated now (once)."""
+    file = _schema_file()
+    if file is not None and file.is_file():
+        return SchemaDocument.from_bytes(file.read_bytes())
+    if file is not None:
+        logger.warning("OpenAPI schema file %s not found; generating the schema", file)
+    return SchemaDocument.from_bytes(render_schema())
+
+
+class OpenAPISchemaView(View):
+    http_method_names = ["get", "head", "options"]
+
+    def get(self, request):
+        document = get_schema_document()
+        max_age = settings.OPENAPI_SCHEMA["MAX_AGE"]
+
+        # Weak comparison: proxies that recompress the body mark the tag as W/
+        if_none_match = request.headers.get("If-None-Match", "")
+        if document.etag in {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}:
+            response = HttpResponseNotModified()
+        elif accepts_encoding(request.META.get("HTTP_ACCEPT_ENCODING", ""), "gzip"):
+            response = HttpResponse(document.gzipped, content_type="application/json")
+            response["Content-Encoding"] = "gzip"
+        else:
+            response = HttpResponse(document.body, content_type="application/json")
+
+        response["ETag"] = document.etag
+        patch_cache_control(response, public=True, max_age=max_age)
+        patch_vary_headers(response, ("Accept-Encoding",))
+        return response
@@ -3,13 +3,37 @@ from __future__ import annotations
 from django.utils import timezone
 from rest_framework import serializers
 
+from services.analytics import COOLING_BASE, HEATING_BASE, HEATWAVE_MIN_DAYS, HEATWAVE_THRESHOLD
+from services.export import EXPORT_FORMATS
+from services.queries import TZ_LOCAL, TZ_UTC
+from services.range_index import HIST_STEP
+from services.stats import TEMPERATURE_FIELDS, PRECIPITATION_FIELDS
+
+
+def _parse_fields_param(value: str, allowed) -> list:
+    """'average,max' -> ['average', 'max'], rejecting unknown names."""
+    names = list(dict.fromkeys(name.strip() for name in value.split(",") if name.strip()))
+    unknown = [name for name in names if name not in allowed]
+    if unknown:
+        raise serializers.ValidationError(
+            f"Unknown field(s): {', '.join(unknown)}. Allowed: {', '.join(allowed)}.")
+    if not names:
+        raise serializers.ValidationError("At least one field is required.")
+    return names
+
 
 # -----------------------
 # Input serializers (query params)
 # -----------------------
 
-class _BaseCityRangeQuerySerializer(serializers.Serializer):
-    city = serializers.CharField(trim_whitespace=True, max_length=255)
+BATCH_MAX_ITEMS = 50
+COMPARE_MAX_CITIES = 20
+ANALYTICS_MAX_WINDOWS = 5
+ANALYTICS_MAX_WINDOW_DAYS = 366
+DISTRIBUTION_MAX_PERCENTILES = 20
+
+
+class _BaseRangeQuerySerializer(serializers.Serializer):
     start_date = serializers.DateField()
     end_date = serializers.DateField()
 
@@ -26,9 +50,19 @@ class _BaseCityRangeQuerySerializer(serializers.Serializer):
         return attrs
 
 
+class _BaseCityRangeQuerySerializer(_BaseRangeQuerySerializer):
+    city = serializers.CharField(trim_whitespace=True, max_length=255)
+
+
 class TemperatureStatsQuerySerializer(_BaseCityRangeQuerySerializer):
     above = serializers.FloatField(required=False, default=30.0)
     below = serializers.FloatField(required=False, default=0.0)
+    tz = serializers.ChoiceField(choices=[TZ_UTC, TZ_LOCAL], required=False, default=TZ_UTC)
+    # Comma-separated subset of TEMPERATURE_FIELDS; omitted -> all
+    fields = serializers.CharField(required=False)
+
+    def validate_fields(self, value):
+        return _parse_fields_param(value, TEMPERATURE_FIELDS)
 
     def validate(self, attrs):
         attrs = super().validate(attrs)
@@ -41,7 +75,117 @@ class TemperatureStatsQuerySerializer(_BaseCityRangeQuerySerializer):
 
 
 class PrecipitationStatsQuerySerializer(_BaseCityRangeQuerySerializer):
-    pass
+    tz = serializers.ChoiceField(choices=[TZ_UTC, TZ_LOCAL], required=False, default=TZ_UTC)
+    # Comma-separated subset of PRECIPITATION_FIELDS; omitted -> all
+    fields = serializers.CharField(required=False)
+
+    def validate_fields(self, value):
+        return _parse_fields_param(value, PRECIPITATION_FIELDS)
+
+
+class RangeStatsQuerySerializer(_BaseCityRangeQuerySerializer):
+    daily = serializers.BooleanField(required=False, default=False)
+
+
+class AnalyticsQuerySerializer(_BaseCityRangeQuerySerializer):
+    # Comma-separated window lengths in days, e.g. "7,30"
+    windows = serializers.CharField(required=False, default="7")
+    heating_base = serializers.FloatField(required=False, default=HEATING_BASE)
+    cooling_base = serializers.FloatField(required=False, default=COOLING_BASE)
+    heatwave_threshold = serializers.FloatField(required=False, default=HEATWAVE_THRESHOLD)
+    heatwave_min_days = serializers.IntegerField(required=False, default=HEATWAVE_MIN_DAYS, min_value=1)
+    tz = serializers.ChoiceField(choices=[TZ_UTC, TZ_LOCAL], required=False, default=TZ_UTC)
+
+    def validate_windows(self, value):
+        try:
+            windows = sorted({int(w) for w in value.split(",") if w.strip()})
+        except ValueError:
+            raise serializers.ValidationError("windows must be comma-separated integers (days).")
+        if not windows:
+            raise serializers.ValidationError("At least one window is required.")
+        if len(windows) > ANALYTICS_MAX_WINDOWS:
+            raise serializers.ValidationError(f"At most {ANALYTICS_MAX_WINDOWS} windows are allowed.")
+        if windows[0] < 1 or windows[-1] > ANALYTICS_MAX_WINDOW_DAYS:
+            raise serializers.ValidationError(f"Windows must be between 1 and {ANALYTICS_MAX_WINDOW_DAYS} days.")
+        return windows
+
+
+class DistributionQuerySerializer(_BaseCityRangeQuerySerializer):
+    # Comma-separated percentiles in [0, 100], e.g. "5,50,95"
+    percentiles = serializers.CharField(required=False, default="5,50,95")
+    bin_width = serializers.FloatField(required=False, default=1.0, min_value=HIST_STEP, max_value=20.0)
+
+    def validate_percentiles(self, value):
+        try:
+            percentiles = sorted({float(p) for p in value.split(",") if p.strip()})
+        except ValueError:
+            raise serializers.ValidationError("percentiles must be comma-separated numbers.")
+        if not percentiles:
+            raise serializers.ValidationError("At least one percentile is required.")
+        if len(percentiles) > DISTRIBUTION_MAX_PERCENTILES:
+            raise serializers.ValidationError(f"At most {DISTRIBUTION_MAX_PERCENTILES} percentiles are allowed.")
+        if percentiles[0] < 0 or percentiles[-1] > 100:
+            raise serializers.ValidationError("Percentiles must be between 0 and 100.")
+        return percentiles
+
+    def validate_bin_width(self, value):
+        steps = value / HIST_STEP
+        if abs(steps - round(steps)) > 1e-9:
+            raise serializers.ValidationError(f"bin_width must be a multiple of {HIST_STEP}.")
+        return value
+
+
+class ExportQuerySerializer(_BaseCityRangeQuerySerializer):
+    # "format" is reserved by DRF for renderer selection
+    output = serializers.ChoiceField(choices=EXPORT_FORMATS, required=False, default="csv")
+
+
+class BatchThresholdsSerializer(serializers.Serializer):
+    above = serializers.FloatField(required=False, default=30.0)
+    below = serializers.FloatField(required=False, default=0.0)
+
+    def validate(self, attrs):
+        if attrs["above"] < attrs["below"]:
+            raise serializers.ValidationError("above must be >= below.")
+        return attrs
+
+
+class BatchItemSerializer(_BaseCityRangeQuerySerializer):
+    metrics = serializers.MultipleChoiceField(
+        choices=["temperature", "precipitation"], required=False, default=["temperature", "precipitation"])
+    thresholds = BatchThresholdsSerializer(required=False)
+    tz = serializers.ChoiceField(choices=[TZ_UTC, TZ_LOCAL], required=False, default=TZ_UTC)
+
+    def validate_metrics(self, value):
+        if not value:
+            raise serializers.ValidationError("At least one metric is required.")
+        return value
+
+
+class BatchStatsRequestSerializer(serializers.Serializer):
+    # Items are validated one by one (BatchItemSerializer) so errors are reported per item
+    items = serializers.ListField(child=serializers.DictField(), min_length=1, max_length=BATCH_MAX_ITEMS)
+
+
+class CompareStatsQuerySerializer(_BaseRangeQuerySerializer):
+    # Comma-separated city names, e.g. "Madrid,Paris,Berlin"
+    cities = serializers.CharField(trim_whitespace=True)
+    above = serializers.FloatField(required=False, default=30.0)
+    below = serializers.FloatField(required=False, default=0.0)
+
+    def validate_cities(self, value):
+        names = list(dict.fromkeys(name.strip() for name in value.split(",") if name.strip()))
+        if not names:
+            raise serializers.ValidationError("At least one city is required.")
+        if len(names) > COMPARE_MAX_CITIES:
+            raise serializers.ValidationError(f"At most {COMPARE_MAX_CITIES} cities can be compared.")
+        return names
+
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+        if attrs["above"] < attrs["below"]:
+            raise serializers.ValidationError("above must be >= below.")
+        return attrs
 
 
 class SummaryQuerySerializer(serializers.Serializer):
@@ -53,12 +197,24 @@ class SummaryQuerySerializer(serializers.Serializer):
 # Output serializers (response contracts)
 # -----------------------
 
+class _RequestedFieldsMixin:
+    """Keeps only the fields listed in context["fields"] (the fields= query param), if any."""
+
+    def get_fields(self):
+        fields = super().get_fields()
+        requested = self.context.get("fields")
+        if requested:
+            for name in set(fields) - set(requested):
+                fields.pop(name)
+        return fields
+
+
 class TemperatureExtremaSerializer(serializers.Serializer):
     value = serializers.FloatField()
     date_time = serializers.CharField()  # "YYYY-MM-DDTHH:MM"
 
 
-class TemperatureStatsInnerSerializer(serializers.Serializer):
+class TemperatureStatsInnerSerializer(_RequestedFieldsMixin, serializers.Serializer):
     average = serializers.FloatField(allow_null=True)
     average_by_day = serializers.DictField(child=serializers.FloatField(), required=True)
 
@@ -79,7 +235,7 @@ class PrecipitationMaxSerializer(serializers.Serializer):
     date = serializers.CharField()  # "YYYY-MM-DD"
 
 
-class PrecipitationStatsInnerSerializer(serializers.Serializer):
+class PrecipitationStatsInnerSerializer(_RequestedFieldsMixin, serializers.Serializer):
     total = serializers.FloatField()
     total_by_day = serializers.DictField(child=serializers.FloatField(), required=True)
     days_with_precipitation = serializers.IntegerField()
@@ -92,6 +248,119 @@ class PrecipitationStatsResponseSerializer(serializers.Serializer):
     precipitation = PrecipitationStatsInnerSerializer()
 
 
+class RangeTemperatureSerializer(serializers.Serializer):
+    average = serializers.FloatField(allow_null=True)
+    max = TemperatureExtremaSerializer(allow_null=True)
+    min = TemperatureExtremaSerializer(allow_null=True)
+    # only present when daily=true
+    average_by_day = serializers.DictField(child=serializers.FloatField(), required=False)
+
+
+class RangePrecipitationSerializer(serializers.Serializer):
+    total = serializers.FloatField()
+    days_with_precipitation = serializers.IntegerField()
+    max = PrecipitationMaxSerializer(allow_null=True)
+    average = serializers.FloatField()
+    # only present when daily=true
+    total_by_day = serializers.DictField(child=serializers.FloatField(), required=False)
+
+
+class RangeStatsResponseSerializer(serializers.Serializer):
+    city = serializers.CharField()
+    start_date = serializers.CharField()
+    end_date = serializers.CharField()
+    hours = serializers.IntegerField()
+    temperature = RangeTemperatureSerializer()
+    precipitation = RangePrecipitationSerializer()
+
+
+class BatchItemResultSerializer(serializers.Serializer):
+    status = serializers.IntegerField()
+    # errors: per-field validation errors, detail: lookup errors (400/404)
+    detail = serializers.CharField(required=False)
+    errors = serializers.DictField(required=False)
+    temperature = TemperatureStatsInnerSerializer(required=False)
+    precipitation = PrecipitationStatsInnerSerializer(required=False)
+
+
+class BatchStatsResponseSerializer(serializers.Serializer):
+    results = BatchItemResultSerializer(many=True)
+
+
+class CompareTemperatureSerializer(serializers.Serializer):
+    average = serializers.FloatField(allow_null=True)
+    max = TemperatureExtremaSerializer(allow_null=True)
+    min = TemperatureExtremaSerializer(allow_null=True)
+    hours_above_threshold = serializers.IntegerField()
+    hours_below_threshold = serializers.IntegerField()
+
+
+class ComparePrecipitationSerializer(serializers.Serializer):
+    total = serializers.FloatField()
+    days_with_precipitation = serializers.IntegerField()
+    max = PrecipitationMaxSerializer(allow_null=True)
+    average = serializers.FloatField()
+
+
+class CompareCitySerializer(serializers.Serializer):
+    temperature = CompareTemperatureSerializer()
+    precipitation = ComparePrecipitationSerializer()
+
+
+class CompareStatsResponseSerializer(serializers.Serializer):
+    start_date = serializers.CharField()
+    end_date = serializers.CharField()
+    cities = serializers.DictField(child=CompareCitySerializer())
+    # requested cities without a dataset for the range
+    missing = serializers.ListField(child=serializers.CharField())
+
+
+class AnalyticsDegreeDaysSerializer(serializers.Serializer):
+    heating_base = serializers.FloatField()
+    cooling_base = serializers.FloatField()
+    heating_total = serializers.FloatField()
+    cooling_total = serializers.FloatField()
+
+
+class AnalyticsHeatWaveSerializer(serializers.Serializer):
+    start_date = serializers.CharField()
+    end_date = serializers.CharField()
+    days = serializers.IntegerField()
+    max_temperature = serializers.FloatField()
+
+
+class AnalyticsResponseSerializer(serializers.Serializer):
+    city = serializers.CharField()
+    start_date = serializers.CharField()
+    end_date = serializers.CharField()
+    windows = serializers.ListField(child=serializers.IntegerField())
+    # day -> {temperature_mean, precipitation, heating/cooling_degree_days, temperature_mean_<w>d, ...}
+    daily = serializers.DictField(child=serializers.DictField(child=serializers.FloatField(allow_null=True)))
+    degree_days = AnalyticsDegreeDaysSerializer()
+    heat_waves = AnalyticsHeatWaveSerializer(many=True)
+
+
+class HistogramBinSerializer(serializers.Serializer):
+    lower = serializers.FloatField()
+    upper = serializers.FloatField()
+    count = serializers.IntegerField()
+
+
+class HistogramSerializer(serializers.Serializer):
+    bin_width = serializers.FloatField()
+    bins = HistogramBinSerializer(many=True)
+
+
+class DistributionResponseSerializer(serializers.Serializer):
+    city = serializers.CharField()
+    start_date = serializers.CharField()
+    end_date = serializers.CharField()
+    hours = serializers.IntegerField()
+    # "p5" -> value (null when the range has no temperature data)
+    percentiles = serializers.DictField(child=serializers.FloatField(allow_null=True))
+    histogram = HistogramSerializer()
+
+
 class SummaryPrecipitationMaxSerializer(serializers.Serializer):
     date = serializers.CharField()
     value = serializers.FloatField()
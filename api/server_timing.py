@@ -0,0 +1,138 @@
+"""
+Server-Timing header and one structured log line per weather request.
+
+The middleware binds a services.timing.PhaseRecorder to the request, counts the SQL queries
+(and their time, as the "db" phase) through the execute wrapper track_queries() installs on
+every connection, and times DRF rendering via process_template_response. It runs natively in
+both modes: under ASGI the queries of the async ORM are counted in the threads that run them.
+Phases recorded by the services and views (resolve, fetch, frame, index, compute, serialize,
+...) are reported in milliseconds:
+
+    Server-Timing: resolve;dur=1.2, fetch;dur=35.1, frame;dur=8.4, compute;dur=12.0,
+                   serialize;dur=0.9, render;dur=0.4, db;dur=33.8, queries;desc="2",
+                   rows;desc="8760", total;dur=62.3
+
+The header tells how the server spends its time, so by default only internal clients get it
+(SERVER_TIMING["HEADER"] = "internal": the addresses in METRICS["ALLOWED_IPS"] and staff users;
+"all" or "none" otherwise); the log line is written for every request. Configured by
+settings.SERVER_TIMING; when disabled (or outside PATHS) requests go straight through and the
+service instrumentation is a no-op.
+"""
+from __future__ import annotations
+
+import contextlib
+import json
+import logging
+import time
+from typing import Iterator
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from api.access import ais_staff, internal_address, is_staff
+from services.timing import PhaseRecorder, current_recorder, phase, query_wrapper, recording
+
+logger = logging.getLogger('app.timing')
+
+
+def track_queries(sender, connection, **kwargs) -> None:
+    """connection_created receiver (see api.apps): count the connection's queries into the request's recorder."""
+    if query_wrapper not in connection.execute_wrappers:
+        # First: connection.execute_wrapper() blocks pop the last wrapper on exit
+        connection.execute_wrappers.insert(0, query_wrapper)
+
+
+@contextlib.contextmanager
+def request_recording() -> Iterator[PhaseRecorder]:
+    """The request's recorder if one is active, else a new one counting the queries."""
+    recorder = current_recorder()
+    if recorder is not None:
+        yield recorder
+        return
+    with recording(track_queries=True) as recorder:
+        yield recorder
+
+
+def server_timing_header(recorder, total: float) -> str:
+    metrics = [f"{name};dur={ms}" for name, ms in recorder.durations_ms().items()]
+    metrics += [f'{name};desc="{value}"' for name, value in recorder.counters.items()]
+    metrics.append(f"total;dur={round(total * 1000, 3)}")
+    return ", ".join(metrics)
+
+
+class ServerTimingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+            # Django adapts the hooks to the mode of the chain: keep them native
+            self.process_template_response = self.aprocess_template_response
+        config = getattr(settings, "SERVER_TIMING", {})
+        self.enabled = bool(config.get("ENABLED", False))
+        self.prefixes = tuple(config.get("PATHS", ("/api/weather/",)))
+        self.log = bool(config.get("LOG", True))
+        self.header = config.get("HEADER", "internal")
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not self.enabled or not request.path.startswith(self.prefixes):
+            return self.get_response(request)
+
+        started = time.perf_counter()
+        with request_recording() as recorder:
+            response = self.get_response(request)
+        total = time.perf_counter() - started
+        staff = self.header == "internal" and not internal_address(request) and is_staff(request)
+        return self._finish(request, response, recorder, total, self._shows_header(request, staff))
+
+    async def __acall__(self, request):
+        if not self.enabled or not request.path.startswith(self.prefixes):
+            return await self.get_response(request)
+
+        started = time.perf_counter()
+        with request_recording() as recorder:
+            response = await self.get_response(request)
+        total = time.perf_counter() - started
+        staff = self.header == "internal" and not internal_address(request) and await ais_staff(request)
+        return self._finish(request, response, recorder, total, self._shows_header(request, staff))
+
+    def _shows_header(self, request, staff: bool) -> bool:
+        # `staff` is only looked up (a session read) for internal mode and outside addresses
+        if self.header == "internal":
+            return staff or internal_address(request)
+        return self.header == "all"
+
+    def _finish(self, request, response, recorder: PhaseRecorder, total: float, show_header: bool):
+        if show_header:
+            response["Server-Timing"] = server_timing_header(recorder, total)
+        if self.log:
+            logger.info("request timing %s", json.dumps({
+                "method": request.method,
+                "path": request.path,
+                "status": response.status_code,
+                "total_ms": round(total * 1000, 3),
+                "phases_ms": recorder.durations_ms(),
+                "queries": recorder.counters.get("queries", 0),
+                "rows": recorder.counters.get("rows", 0),
+            }))
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after the view returns, just after this hook
+        if current_recorder() is not None:
+            render = phase("render")
+            render.__enter__()
+
+            def stop(rendered):
+                render.__exit__(None, None, None)
+
+            response.add_post_render_callback(stop)
+        return response
+
+    async def aprocess_template_response(self, request, response):
+        return ServerTimingMiddleware.process_template_response(self, request, response)
@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta, timezone as pytimezone
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from api.admin import EstimatedCountPaginator
+from api.models import City, WeatherDataset, WeatherHour
+
+
+class TestAdminPages(TestCase):
+    def setUp(self):
+        user = get_user_model().objects.create_superuser("admin", "admin@example.com", "pass")
+        self.client.force_login(user)
+
+        self.city = City.objects.create(
+            name="Madrid", latitude=40.4168, longitude=-3.7038,
+            country_code="ES", country="Spain", timezone="UTC",
+        )
+        base_dt = datetime(2024, 7, 1, tzinfo=pytimezone.utc)
+        for i in range(3):
+            ds = WeatherDataset.objects.create(
+                city=self.city,
+                start_date=base_dt.date() + timedelta(days=i * 10),
+                end_date=base_dt.date() + timedelta(days=i * 10 + 1),
+                source="open-meteo",
+            )
+            WeatherHour.objects.bulk_create([
+                WeatherHour(dataset=ds, timestamp=base_dt + timedelta(days=i * 10, hours=h), temperature=20.0,
+                            precipitation=0.0)
+                for h in range(i + 1)
+            ])
+
+    def test_dataset_changelist_counts_hours_without_n_plus_one(self):
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get("/admin/api/weatherdataset/")
+        self.assertEqual(resp.status_code, 200)
+        counts = sorted(ds._hours_count for ds in resp.context["cl"].result_list)
+        self.assertEqual(counts, [1, 2, 3])
+
+        WeatherDataset.objects.create(
+            city=self.city, start_date=datetime(2020, 1, 1).date(), end_date=datetime(2020, 1, 2).date(),
+            source="open-meteo",
+        )
+        with CaptureQueriesContext(connection) as ctx_more:
+            self.client.get("/admin/api/weatherdataset/")
+        self.assertEqual(len(ctx_more.captured_queries), len(ctx.captured_queries))
+
+    def test_hour_changelist_and_filters(self):
+        resp = self.client.get("/admin/api/weatherhour/")
+        self.assertEqual(resp.status_code, 200)
+
+        resp = self.client.get("/admin/api/weatherhour/", {"city": self.city.pk, "country_code": "ES"})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.context["cl"].result_count, 6)
+
+    def test_hour_change_form(self):
+        hour = WeatherHour.objects.first()
+        resp = self.client.get(f"/admin/api/weatherhour/{hour.pk}/change/")
+        self.assertEqual(resp.status_code, 200)
+
+    def test_estimated_paginator_only_estimates_unfiltered_querysets(self):
+        WeatherHour.objects.filter(pk=WeatherHour.objects.order_by("pk").first().pk).delete()
+
+        unfiltered = EstimatedCountPaginator(WeatherHour.objects.all(), 100)
+        # MAX(pk) estimate: deleted rows are still counted
+        self.assertEqual(unfiltered.count, 6)
+
+        filtered = EstimatedCountPaginator(WeatherHour.objects.filter(temperature=20.0), 100)
+        self.assertEqual(filtered.count, 5)
@@ -0,0 +1,158 @@
+import asyncio
+import json
+from datetime import date
+
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import resolve
+
+from api import admission
+from api.admission import AdmissionControlMiddleware, ClientBudget, WeightedLimiter, estimate_cost, snapshot
+from api.models import City, WeatherDataset, WeatherDatasetIndex
+
+ADMISSION = {
+    "ENABLED": True,
+    "COST_UNIT_HOURS": 24 * 365,
+    "QUEUE_TIMEOUT": 0.01,
+    "RETRY_AFTER": 7,
+    "PER_CLIENT_MAX_COST": 2,
+    "ENDPOINTS": {"weather-temperature-stats": {"capacity": 3, "queue": 0},
+                  "weather-export": {"capacity": 1, "queue": 0}},
+}
+
+
+class TestWeightedLimiter(SimpleTestCase):
+    def test_capacity_in_cost_units(self):
+        limiter = WeightedLimiter("x", capacity=3, queue_size=0, queue_timeout=0)
+        self.assertTrue(limiter.acquire(2))
+        self.assertFalse(limiter.acquire(2))
+        self.assertTrue(limiter.acquire(1))
+        limiter.release(2)
+        self.assertTrue(limiter.acquire(2))
+        self.assertEqual(limiter.snapshot()["rejected"], 1)
+
+    def test_cost_is_clamped_to_capacity(self):
+        limiter = WeightedLimiter("x", capacity=2, queue_size=0, queue_timeout=0)
+        self.assertTrue(limiter.acquire(50))
+        self.assertEqual(limiter.snapshot()["in_use"], 2)
+        limiter.release(50)
+        self.assertEqual(limiter.snapshot()["in_use"], 0)
+
+    def test_queued_request_times_out(self):
+        limiter = WeightedLimiter("x", capacity=1, queue_size=1, queue_timeout=0.01)
+        self.assertTrue(limiter.acquire(1))
+        self.assertFalse(limiter.acquire(1))
+        stats = limiter.snapshot()
+        self.assertEqual((stats["queued"], stats["timed_out"]), (1, 1))
+
+    def test_async_waiter_is_woken_by_a_release_from_another_thread(self):
+        limiter = WeightedLimiter("x", capacity=1, queue_size=1, queue_timeout=5)
+        self.assertTrue(limiter.acquire(1))
+
+        async def scenario():
+            waiter = asyncio.ensure_future(limiter.aacquire(1))
+            await asyncio.sleep(0.01)  # the event loop keeps running while the request waits
+            self.assertEqual(limiter.snapshot()["waiting"], 1)
+            await asyncio.get_running_loop().run_in_executor(None, limiter.release, 1)
+            return await waiter
+
+        self.assertTrue(asyncio.run(scenario()))
+        stats = limiter.snapshot()
+        self.assertEqual((stats["admitted"], stats["queued"], stats["in_use"], stats["waiting"]), (2, 1, 1, 0))
+
+    def test_async_waiter_times_out(self):
+        limiter = WeightedLimiter("x", capacity=1, queue_size=1, queue_timeout=0.01)
+        self.assertTrue(limiter.acquire(1))
+        self.assertFalse(asyncio.run(limiter.aacquire(1)))
+        stats = limiter.snapshot()
+        self.assertEqual((stats["queued"], stats["timed_out"], stats["waiting"]), (1, 1, 0))
+
+
+class TestClientBudget(SimpleTestCase):
+    def test_per_client_limit(self):
+        budget = ClientBudget(max_cost=2)
+        self.assertTrue(budget.acquire("a", 2))
+        self.assertFalse(budget.acquire("a", 1))
+        self.assertTrue(budget.acquire("b", 1))
+        budget.release("a", 2)
+        self.assertTrue(budget.acquire("a", 1))
+
+
+@override_settings(ADMISSION_CONTROL=ADMISSION)
+class TestAdmissionControlMiddleware(TestCase):
+    url = "/api/weather/temperature/"
+
+    def setUp(self):
+        admission._DATASET_HOURS["expires"] = 0.0
+
+    def _request(self, remote_addr="10.0.0.1", url=None, **params):
+        request = RequestFactory().get(url or self.url, params, REMOTE_ADDR=remote_addr)
+        request.resolver_match = resolve(url or self.url)
+        return request
+
+    def _params(self, days):
+        end = date(2024, 12, 31)
+        return {"start_date": str(date.fromordinal(end.toordinal() - days + 1)), "end_date": str(end)}
+
+    def test_cost_from_range_hours(self):
+        self.assertEqual(estimate_cost("weather-temperature-stats", self._request(**self._params(10)), 24 * 365), 1)
+        self.assertEqual(estimate_cost("weather-temperature-stats", self._request(**self._params(730)), 24 * 365), 2)
+
+    def test_cost_from_the_stored_hours_of_the_dataset(self):
+        city = City.objects.create(name="Madrid", latitude=40.4, longitude=-3.7, country_code="ES",
+                                   country="Spain", timezone="UTC")
+        params = self._params(730)
+        dataset = WeatherDataset.objects.create(city=city, start_date=params["start_date"],
+                                                end_date=params["end_date"], source="test")
+        WeatherDatasetIndex.objects.create(dataset=dataset, version=1, hours_count=48, payload=b"")
+
+        # Two years requested, two days stored
+        self.assertEqual(admission.estimate_hours("weather-temperature-stats", self._request(city="madrid", **params)),
+                         48)
+        self.assertEqual(admission.estimate_hours("weather-temperature-stats", self._request(city="Paris", **params)),
+                         730 * 24)
+
+    def test_streamed_export_holds_its_slot_until_closed(self):
+        middleware = AdmissionControlMiddleware(lambda request: StreamingHttpResponse(iter([b"a", b"b"])))
+        request = self._request(url="/api/weather/export/")
+        self.assertIsNone(middleware.process_view(request, None, (), {}))
+
+        response = middleware(request)
+        self.assertEqual(snapshot()["weather-export"]["in_use"], 1)
+        self.assertEqual(b"".join(response.streaming_content), b"ab")
+        response.close()
+        self.assertEqual(snapshot()["weather-export"]["in_use"], 0)
+
+    def test_slot_released_after_response(self):
+        middleware = AdmissionControlMiddleware(lambda request: HttpResponse("ok"))
+        request = self._request()
+        self.assertIsNone(middleware.process_view(request, None, (), {}))
+        self.assertEqual(snapshot()["weather-temperature-stats"]["in_use"], 1)
+
+        middleware(request)
+        self.assertEqual(snapshot()["weather-temperature-stats"]["in_use"], 0)
+
+    def test_over_budget_returns_503_with_retry_after(self):
+        middleware = AdmissionControlMiddleware(lambda request: HttpResponse("ok"))
+        middleware.limiters["weather-temperature-stats"].acquire(3)
+
+        response = middleware.process_view(self._request(), None, (), {})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "7")
+        self.assertIn("detail", json.loads(response.content))
+
+    def test_client_over_budget_returns_429(self):
+        middleware = AdmissionControlMiddleware(lambda request: HttpResponse("ok"))
+        self.assertIsNone(middleware.process_view(self._request(**self._params(730)), None, (), {}))
+
+        response = middleware.process_view(self._request(), None, (), {})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "7")
+        # Other clients are not affected by that budget
+        self.assertIsNone(middleware.process_view(self._request("10.0.0.2"), None, (), {}))
+
+    def test_unlisted_endpoint_is_not_limited(self):
+        middleware = AdmissionControlMiddleware(lambda request: HttpResponse("ok"))
+        request = RequestFactory().get("/api/weather/summary/")
+        request.resolver_match = resolve("/api/weather/summary/")
+        self.assertIsNone(middleware.process_view(request, None, (), {}))
@@ -0,0 +1,169 @@
+import gzip
+from datetime import timedelta
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import AsyncClient, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from api.admission import AdmissionControlMiddleware
+from api.metrics import MetricsMiddleware
+from api.models import City
+from api.profiling import ProfilingMiddleware
+from api.query_budget import QueryBudgetMiddleware
+from api.response_cache import CompressedResponseCacheMiddleware
+from api.server_timing import ServerTimingMiddleware
+from api.tests.test_views import _insert_dataset
+from services.ingest import rebuild_range_index
+
+
+@override_settings(ROOT_URLCONF="api.tests.async_urls")
+class TestAsyncWeatherViews(TestCase):
+    def setUp(self):
+        self.client = AsyncClient()
+        self.today = timezone.localdate()
+        self.start_date = self.today - timedelta(days=10)
+        self.end_date = self.today - timedelta(days=8)
+
+        self.city = City.objects.create(
+            name="Madrid",
+            latitude=40.4168,
+            longitude=-3.7038,
+            country_code="ES",
+            country="Spain",
+            timezone="UTC"
+        )
+
+    def _params(self, **extra):
+        return {"city": "Madrid", "start_date": str(self.start_date), "end_date": str(self.end_date), **extra}
+
+    async def test_temperature_ok(self):
+        await sync_to_async(_insert_dataset)(self.city, self.start_date, self.end_date)
+
+        resp = await self.client.get("/api/weather/temperature/", self._params(above=15, below=12))
+        self.assertEqual(resp.status_code, 200)
+        temp = resp.json()["temperature"]
+        self.assertEqual(temp["average"], 15.0)
+        self.assertEqual(temp["max"]["value"], 20.0)
+        self.assertEqual(temp["hours_above_threshold"], 1)
+        self.assertEqual(temp["hours_below_threshold"], 1)
+
+    async def test_temperature_fields(self):
+        await sync_to_async(_insert_dataset)(self.city, self.start_date, self.end_date)
+
+        resp = await self.client.get("/api/weather/temperature/", self._params(fields="average,max"))
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(set(resp.json()["temperature"]), {"average", "max"})
+
+    async def test_precipitation_ok(self):
+        await sync_to_async(_insert_dataset)(self.city, self.start_date, self.end_date)
+
+        resp = await self.client.get("/api/weather/precipitation/", self._params())
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()["precipitation"]["total"], 1.0)
+
+    async def test_validation_error_returns_400(self):
+        resp = await self.client.get("/api/weather/temperature/")
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn("city", resp.json())
+
+    async def test_dataset_not_found_returns_404(self):
+        resp = await self.client.get("/api/weather/precipitation/", self._params())
+        self.assertEqual(resp.status_code, 404)
+        self.assertIn("detail", resp.json())
+
+    async def test_range_ok(self):
+        def setup():
+            _insert_dataset(self.city, self.start_date, self.end_date)
+            rebuild_range_index(self.city.datasets.get())
+
+        await sync_to_async(setup)()
+
+        resp = await self.client.get("/api/weather/range/", self._params())
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()["hours"], 2)
+
+    async def test_batch_ok(self):
+        await sync_to_async(_insert_dataset)(self.city, self.start_date, self.end_date)
+
+        item = {"city": "Madrid", "start_date": str(self.start_date), "end_date": str(self.end_date),
+                "metrics": ["precipitation"]}
+        resp = await self.client.post("/api/weather/batch/", {"items": [item, {"city": "Madrid"}]},
+                                      content_type="application/json")
+        self.assertEqual(resp.status_code, 200)
+        results = resp.json()["results"]
+        self.assertEqual(results[0]["status"], 200)
+        self.assertEqual(results[0]["precipitation"]["total"], 1.0)
+        self.assertEqual(results[1]["status"], 400)
+
+    async def test_export_streams_from_an_async_iterator(self):
+        await sync_to_async(_insert_dataset)(self.city, self.start_date, self.end_date)
+
+        for headers, decode in (({}, bytes), ({"Accept-Encoding": "gzip"}, gzip.decompress)):
+            resp = await self.client.get("/api/weather/export/", self._params(), headers=headers)
+            self.assertEqual(resp.status_code, 200)
+            self.assertTrue(resp.is_async)  # not read whole by Django before the first byte
+            body = decode(b"".join([chunk async for chunk in resp.streaming_content]))
+            lines = body.decode().splitlines()
+            self.assertEqual(lines[0], "timestamp,temperature,precipitation")
+            self.assertEqual(len(lines), 3)
+
+        resp = await self.client.get("/api/weather/export/", {**self._params(), "city": "Paris"})
+        self.assertEqual(resp.status_code, 404)
+
+    async def test_server_timing_covers_offloaded_computation(self):
+        await sync_to_async(_insert_dataset)(self.city, self.start_date, self.end_date)
+
+        resp = await self.client.get("/api/weather/temperature/", self._params())
+        self.assertEqual(resp.status_code, 200)
+        phases = {part.split(";")[0].strip() for part in resp["Server-Timing"].split(",")}
+        self.assertTrue({"resolve", "fetch", "frame", "compute", "serialize", "render", "queries"} <= phases)
+
+    async def test_queries_run_by_the_async_orm_are_counted(self):
+        await sync_to_async(_insert_dataset)(self.city, self.start_date, self.end_date)
+
+        resp = await self.client.get("/api/weather/temperature/", self._params())
+        queries = next(part for part in resp["Server-Timing"].split(",") if part.strip().startswith("queries;"))
+        self.assertGreaterEqual(int(queries.split('"')[1]), 2)
+
+    @override_settings(METRICS={**settings.METRICS, "ALLOWED_IPS": ["10.0.0.0/8"]})  # not the test client
+    async def test_server_timing_header_only_for_internal_clients(self):
+        await sync_to_async(_insert_dataset)(self.city, self.start_date, self.end_date)
+        client = AsyncClient()
+
+        resp = await client.get("/api/weather/temperature/", self._params())
+        self.assertEqual(resp.status_code, 200)
+        self.assertFalse(resp.has_header("Server-Timing"))
+
+        staff = await get_user_model().objects.acreate_user("ops", password="pass", is_staff=True)
+        await client.aforce_login(staff)
+        resp = await client.get("/api/weather/precipitation/", self._params())
+        self.assertTrue(resp.has_header("Server-Timing"))
+
+
+class TestMiddlewareModes(SimpleTestCase):
+    classes = (ServerTimingMiddleware, MetricsMiddleware, QueryBudgetMiddleware, CompressedResponseCacheMiddleware,
+               ProfilingMiddleware, AdmissionControlMiddleware)
+
+    def test_native_in_an_async_chain(self):
+        async def get_response(request):
+            return None
+
+        for cls in self.classes:
+            with self.subTest(middleware=cls.__name__):
+                middleware = cls(get_response)
+                self.assertTrue(cls.sync_capable and cls.async_capable)
+                self.assertTrue(iscoroutinefunction(middleware))
+                for hook in ("process_view", "process_template_response"):
+                    if hasattr(middleware, hook):
+                        self.assertTrue(iscoroutinefunction(getattr(middleware, hook)), hook)
+
+    def test_sync_in_a_sync_chain(self):
+        for cls in self.classes:
+            with self.subTest(middleware=cls.__name__):
+                middleware = cls(lambda request: None)
+                self.assertFalse(iscoroutinefunction(middleware))
+                for hook in ("process_view", "process_template_response"):
+                    if hasattr(middleware, hook):
+                        self.assertFalse(iscoroutinefunction(getattr(middleware, hook)), hook)
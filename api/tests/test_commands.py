@@ -1,9 +1,15 @@
+import calendar
+import io
+import tempfile
 from datetime import datetime, timedelta, timezone as pytimezone
+from pathlib import Path
 from unittest.mock import patch
 
 import pandas as pd
 from django.core.management import call_command, CommandError
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 
 from api.models import City, WeatherDataset, WeatherHour
@@ -70,6 +76,7 @@ class TestLoadCityDataCommand(TestCase):
         self.assertEqual(ds.source, "open-meteo")
 
         self.assertEqual(WeatherHour.objects.count(), 3)
+        self.assertEqual(ds.range_index.hours_count, 3)
 
     @patch("api.management.commands.loadcitydata.get_city_weather")
     def test_command_replace_deletes_and_reinserts_hours(self, mock_get_city_weather):
@@ -116,3 +123,111 @@ class TestLoadCityDataCommand(TestCase):
         # Second run WITHOUT --replace should skip duplicates
         call_command("loadcitydata", "Madrid", self.start_date, self.end_date, "--countryISO", "ES")
         self.assertEqual(WeatherHour.objects.count(), 3)
+
+
+class TestParquetCommands(TestCase):
+    def setUp(self):
+        self.city = City.objects.create(
+            name="Madrid",
+            latitude=40.4168,
+            longitude=-3.7038,
+            country_code="ES",
+            country="Spain",
+            timezone="Europe/Madrid",
+        )
+        # Range crossing a year boundary -> two partitions
+        self.dataset = WeatherDataset.objects.create(
+            city=self.city,
+            start_date=datetime(2023, 12, 31).date(),
+            end_date=datetime(2024, 1, 1).date(),
+            source="open-meteo",
+        )
+        base_dt = datetime(2023, 12, 31, 22, 0, tzinfo=pytimezone.utc)
+        WeatherHour.objects.bulk_create([
+            WeatherHour(dataset=self.dataset, timestamp=base_dt + timedelta(hours=0), temperature=1.0, precipitation=0.0),
+            WeatherHour(dataset=self.dataset, timestamp=base_dt + timedelta(hours=1), temperature=2.0, precipitation=None),
+            WeatherHour(dataset=self.dataset, timestamp=base_dt + timedelta(hours=2), temperature=3.0, precipitation=0.5),
+        ])
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_export_writes_city_year_partitions(self):
+        call_command("exportparquet", self.tmp.name, stdout=io.StringIO())
+
+        root = Path(self.tmp.name)
+        self.assertTrue((root / "cities.parquet").is_file())
+        self.assertTrue((root / "datasets.parquet").is_file())
+        self.assertEqual(len(list((root / "hours" / "city=madrid-es" / "year=2023").glob("*.parquet"))), 1)
+        self.assertEqual(len(list((root / "hours" / "city=madrid-es" / "year=2024").glob("*.parquet"))), 1)
+
+    def test_export_import_roundtrip(self):
+        call_command("exportparquet", self.tmp.name, stdout=io.StringIO())
+        City.objects.all().delete()
+
+        call_command("importparquet", self.tmp.name, stdout=io.StringIO())
+
+        self.assertEqual(City.objects.get().timezone, "Europe/Madrid")
+        ds = WeatherDataset.objects.get()
+        hours = list(ds.hours.order_by("timestamp").values_list("temperature", "precipitation"))
+        self.assertEqual(hours, [(1.0, 0.0), (2.0, None), (3.0, 0.5)])
+
+    def test_import_without_replace_skips_existing_hours(self):
+        call_command("exportparquet", self.tmp.name, stdout=io.StringIO())
+
+        call_command("importparquet", self.tmp.name, stdout=io.StringIO())
+        self.assertEqual(WeatherHour.objects.count(), 3)
+
+        call_command("importparquet", self.tmp.name, "--replace", stdout=io.StringIO())
+        self.assertEqual(WeatherHour.objects.count(), 3)
+
+    def test_import_loads_existing_timestamps_once_per_dataset(self):
+        call_command("exportparquet", self.tmp.name, stdout=io.StringIO())
+        WeatherHour.objects.filter(temperature=3.0).delete()  # 2024 partition: to insert again
+
+        with CaptureQueriesContext(connection) as queries:
+            call_command("importparquet", self.tmp.name, stdout=io.StringIO())
+
+        lookups = [q["sql"] for q in queries if '"timestamp" FROM "api_weatherhour"' in q["sql"]]
+        self.assertEqual(len(lookups), 1)  # not once per year partition
+        self.assertEqual(sorted(self.dataset.hours.values_list("temperature", flat=True)), [1.0, 2.0, 3.0])
+
+
+class TestSeedSyntheticCommand(TestCase):
+    def test_seeds_deterministic_datasets_with_range_index(self):
+        end_year = timezone.localdate().year - 1
+        call_command("seedsynthetic", "--cities", "2", "--years", "1", stdout=io.StringIO())
+
+        datasets = WeatherDataset.objects.order_by("city__name")
+        self.assertEqual([d.city.name for d in datasets], ["Madrid", "Paris"])
+        madrid = datasets[0]
+        self.assertEqual((madrid.start_date.isoformat(), madrid.end_date.isoformat()),
+                         (f"{end_year}-01-01", f"{end_year}-12-31"))
+        self.assertEqual(madrid.source, "synthetic")
+        self.assertEqual(madrid.hours.count(), (madrid.end_date - madrid.start_date).days * 24 + 24)
+        self.assertEqual(madrid.range_index.hours_count, madrid.hours.count())
+
+        before = list(madrid.hours.order_by("timestamp").values_list("temperature", flat=True)[:48])
+        call_command("seedsynthetic", "--cities", "1", "--years", "1", "--replace", stdout=io.StringIO())
+        after = list(madrid.hours.order_by("timestamp").values_list("temperature", flat=True)[:48])
+        self.assertEqual(before, after)
+        self.assertEqual(WeatherDataset.objects.count(), 2)
+
+    def test_extra_ranges(self):
+        end_year = timezone.localdate().year - 1
+        call_command("seedsynthetic", "--cities", "1", "--years", "1", "--ranges", "7,30", stdout=io.StringIO())
+
+        datasets = WeatherDataset.objects.order_by("start_date")
+        self.assertEqual([(d.end_date - d.start_date).days + 1 for d in datasets],
+                         [366 if calendar.isleap(end_year) else 365, 30, 7])
+        full, week = datasets[0], datasets[2]
+        self.assertEqual(week.end_date, full.end_date)
+        self.assertEqual(week.hours.count(), 7 * 24)
+        self.assertEqual(
+            list(week.hours.order_by("timestamp").values_list("temperature", flat=True)),
+            list(full.hours.filter(timestamp__gte=week.hours.order_by("timestamp").first().timestamp)
+                 .order_by("timestamp").values_list("temperature", flat=True)),
+        )
+
+    def test_rejects_current_year(self):
+        with self.assertRaisesRegex(CommandError, "must be in the past"):
+            call_command("seedsynthetic", "--end-year", str(timezone.localdate().year), stdout=io.StringIO())
@@ -0,0 +1,141 @@
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from datetime import timedelta
+from pathlib import Path
+from unittest.mock import patch
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from api.models import City
+from api.tests.test_commands import _fake_hourly_df
+from api.tests.test_views import _insert_dataset
+from services import metrics
+
+
+class TestMetrics(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = Path(tmp.name)
+        overrides = override_settings(METRICS={**settings.METRICS, "ENABLED": True, "DIR": tmp.name})
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+        cache.clear()
+
+        self.client = APIClient()
+        today = timezone.localdate()
+        self.start_date = today - timedelta(days=10)
+        self.end_date = today - timedelta(days=8)
+        self.city = City.objects.create(
+            name="Madrid", latitude=40.4168, longitude=-3.7038, country_code="ES", country="Spain", timezone="UTC",
+        )
+        self.params = {"city": "Madrid", "start_date": str(self.start_date), "end_date": str(self.end_date)}
+
+    def _scrape(self, **extra):
+        resp = self.client.get("/internal/metrics", **extra)
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp["Content-Type"].startswith("text/plain; version=0.0.4"))
+        return resp.content.decode()
+
+    def test_request_latency_rows_and_cache_metrics(self):
+        _insert_dataset(self.city, self.start_date, self.end_date)
+        self.client.get("/api/weather/temperature/", self.params)
+        self.client.get("/api/weather/temperature/", self.params)
+        self.client.get("/api/weather/temperature/", {**self.params, "city": "Atlantis"})
+
+        text = self._scrape()
+        self.assertIn('http_requests_total{endpoint="weather-temperature-stats",method="GET",status="200"} 2', text)
+        self.assertIn('http_request_errors_total{endpoint="weather-temperature-stats",status="404"} 1', text)
+        self.assertIn('http_request_duration_seconds_count{endpoint="weather-temperature-stats"} 3', text)
+        self.assertIn('http_request_duration_seconds_bucket{endpoint="weather-temperature-stats",le="+Inf"} 3',
+                      text)
+        # Cache hit: no rows read
+        self.assertIn('http_request_rows_scanned_sum{endpoint="weather-temperature-stats"} 2.0', text)
+        self.assertIn('response_cache_requests_total{endpoint="weather-temperature-stats",result="hit"} 1', text)
+        self.assertIn("response_cache_hit_ratio 0.5", text)
+        self.assertIn('admission_requests_total{endpoint="weather-temperature-stats",result="admitted"}', text)
+
+    def test_merges_other_processes(self):
+        self.client.get("/api/weather/summary/")
+        other = {"pid": 1, "updated": 0, "metrics": {
+            "http_requests_total": [[{"endpoint": "weather-summary-stats", "method": "GET", "status": "200"}, 4]],
+            "ingest_rows_per_second": [[{"source": "open-meteo"}, 10.0]],
+        }}
+        (self.dir / "1.json").write_text(json.dumps(other))
+        (self.dir / "2.json").write_text("{not json")
+
+        text = self._scrape()
+        self.assertIn('http_requests_total{endpoint="weather-summary-stats",method="GET",status="200"} 5', text)
+        self.assertIn('ingest_rows_per_second{source="open-meteo"} 10.0', text)
+
+    def test_summed_gauges_of_exited_processes_are_ignored(self):
+        exited = subprocess.Popen([sys.executable, "-c", "pass"])
+        exited.wait()
+        payload = {"pid": exited.pid, "updated": 0, "metrics": {
+            "admission_in_use_units": [[{"endpoint": "weather-summary-stats"}, 3.0]],
+            "ingest_rows_per_second": [[{"source": "open-meteo"}, 10.0]],
+            "ingest_rows_total": [[{"source": "open-meteo"}, 5]],
+        }}
+        (self.dir / f"{exited.pid}.json").write_text(json.dumps(payload))
+
+        text = self._scrape()
+        self.assertNotIn('admission_in_use_units{endpoint="weather-summary-stats"} 3.0', text)
+        self.assertIn('ingest_rows_per_second{source="open-meteo"} 10.0', text)  # last value, not a state
+        self.assertIn('ingest_rows_total{source="open-meteo"} 5', text)
+
+    def test_retire_folds_exited_processes(self):
+        labels = {"endpoint": "weather-summary-stats", "method": "GET", "status": "200"}
+        for pid, requests in ((1, 4), (2, 3)):
+            payload = {"pid": pid, "updated": pid, "metrics": {
+                "http_requests_total": [[labels, requests]],
+                "ingest_rows_per_second": [[{"source": "open-meteo"}, 10.0]],
+            }}
+            (self.dir / f"{pid}-0a1b2c.json").write_text(json.dumps(payload))
+            metrics.retire(pid)
+        metrics.retire(3)  # no file: nothing to fold
+
+        self.assertEqual(sorted(p.name for p in self.dir.glob("*.json")), ["retired.json"])
+        text = self._scrape()
+        self.assertIn('http_requests_total{endpoint="weather-summary-stats",method="GET",status="200"} 7', text)
+        self.assertNotIn("ingest_rows_per_second{", text)  # gauges of exited processes are dropped
+
+        metrics.clear_files()
+        self.assertEqual(list(self.dir.glob("*.json")), [])
+
+    def test_processes_fold_their_file_at_exit(self):
+        env = {**os.environ, "METRICS_DIR": str(self.dir), "DJANGO_METRICS": "1"}
+        script = ("import django; django.setup(); from services import metrics; "
+                  "metrics.inc('ingest_rows_total', 5, source='open-meteo'); metrics.flush(force=True)")
+        for _ in range(2):
+            subprocess.run([sys.executable, "-c", script], cwd=settings.BASE_DIR, env=env, check=True)
+
+        self.assertEqual(sorted(p.name for p in self.dir.glob("*.json")), ["retired.json"])
+        self.assertIn('ingest_rows_total{source="open-meteo"} 10', self._scrape())
+
+    @patch("api.management.commands.loadcitydata.get_city_weather")
+    def test_ingest_metrics(self, mock_get_city_weather):
+        mock_get_city_weather.return_value = {
+            "city": "Madrid", "country": "Spain", "country_iso": "ES", "latitude": 40.4168, "longitude": -3.7038,
+            "timezone": "Europe/Madrid", "hourly_data": _fake_hourly_df(str(self.start_date)),
+        }
+        call_command("loadcitydata", "Madrid", str(self.start_date), str(self.end_date), stdout=io.StringIO())
+
+        text = self._scrape()
+        self.assertIn('ingest_rows_total{source="open-meteo"} 3', text)
+        self.assertIn('ingest_fetch_duration_seconds_count{source="open-meteo"} 1', text)
+        self.assertIn('ingest_rows_per_second{source="open-meteo"}', text)
+
+    def test_internal_addresses_only(self):
+        resp = self.client.get("/internal/metrics", REMOTE_ADDR="203.0.113.7")
+        self.assertEqual(resp.status_code, 403)
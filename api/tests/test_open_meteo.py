@@ -0,0 +1,262 @@
+import contextlib
+import io
+import json
+import os
+import tempfile
+import threading
+from datetime import date
+from unittest import mock
+
+import numpy as np
+import requests
+import requests_cache
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+from openmeteo_requests.Client import OpenMeteoRequestsError
+
+from api.management.commands.openmeteostandin import synthetic_cities, synthetic_hourly
+from api.models import WeatherDataset
+from clients import open_meteo
+from clients.cassette import CassetteMiss, CassetteSession
+from clients.http_cache import BoundedCachedSession, CacheConfig, CachePolicy, LruIndex, normalize_url
+from clients.open_meteo_standin import StandInConfig, StandInServer
+from services.synthetic import SYNTHETIC_CITIES
+
+START, END = date(2024, 7, 1), date(2024, 7, 3)
+
+
+class StandInTestCase(SimpleTestCase):
+    """Runs the stand-in on a free port and points the client at it (plain session: no cache, no retries)."""
+
+    def setUp(self):
+        self.server = self.start_server()
+        self.session = requests.Session()
+        self.addCleanup(self.session.close)
+        for patcher in (
+            mock.patch.dict(os.environ, {"OPEN_METEO_GEOCODING_URL": f"{self.server.base_url}/v1/search",
+                                         "OPEN_METEO_ARCHIVE_URL": f"{self.server.base_url}/v1/archive"}),
+            mock.patch.object(open_meteo, "_session", self.session),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def start_server(self, **options):
+        server = StandInServer(("127.0.0.1", 0), StandInConfig(cities=synthetic_cities(), hourly=synthetic_hourly(0),
+                                                               **options))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server
+
+    def get_city_weather(self, name="Madrid", country="ES"):
+        return open_meteo.get_city_weather(name, str(START), str(END), country)
+
+
+class TestStandInServer(StandInTestCase):
+    def test_client_decodes_the_archive_response(self):
+        weather = self.get_city_weather()
+        self.assertEqual((weather["city"], weather["country_iso"], weather["timezone"]),
+                         ("Madrid", "ES", "Europe/Madrid"))
+        df = weather["hourly_data"]
+        self.assertEqual(len(df), 72)
+        self.assertEqual(str(df["date"].iloc[0]), "2024-07-01 00:00:00+00:00")
+        self.assertEqual(str(df["date"].iloc[-1]), "2024-07-03 23:00:00+00:00")
+
+        expected = synthetic_hourly(0)(SYNTHETIC_CITIES[0][3], SYNTHETIC_CITIES[0][4], START, END)
+        np.testing.assert_array_equal(df["temperature_2m"].to_numpy(), expected["temperature_2m"].to_numpy())
+        np.testing.assert_array_equal(df["precipitation"].to_numpy(), expected["precipitation"].to_numpy())
+
+    def test_unknown_city(self):
+        with self.assertRaises(ValueError):
+            self.get_city_weather("Atlantis", None)
+        with self.assertRaises(ValueError):
+            self.get_city_weather("Madrid", "FR")
+
+    def test_invalid_archive_request_is_a_client_error(self):
+        with self.assertRaisesMessage(OpenMeteoRequestsError, "End-date must be larger"):
+            open_meteo.archive(40.4, -3.7, str(END), str(START))
+
+
+class TestStandInFaults(StandInTestCase):
+    def test_errors(self):
+        self.server.config.error_rate = 1.0
+        with self.assertRaisesMessage(OpenMeteoRequestsError, "500"):
+            open_meteo.archive(40.4, -3.7, str(START), str(END))
+        self.assertEqual(self.server.stats, {"/v1/archive 500": 1})
+
+    def test_rate_limit(self):
+        server = self.start_server(rate_limit=1)
+        with mock.patch.dict(os.environ, {"OPEN_METEO_ARCHIVE_URL": f"{server.base_url}/v1/archive"}):
+            open_meteo.archive(40.4, -3.7, str(START), str(END))
+            with self.assertRaisesMessage(OpenMeteoRequestsError, "limit exceeded"):
+                open_meteo.archive(40.4, -3.7, str(START), str(END))
+        self.assertEqual(server.stats, {"/v1/archive 200": 1, "/v1/archive 429": 1})
+
+
+class TestLoadCityDataAgainstStandIn(StandInTestCase, TestCase):
+    def load(self, **options):
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):  # nothing may bypass the command's stdout
+            call_command("loadcitydata", "Paris", str(START), str(END), "--countryISO", "FR", stdout=out, **options)
+        return out.getvalue()
+
+    @staticmethod
+    def telemetry(logs):
+        return [json.loads(record.args[-1]) for record in logs.records if record.msg.startswith("Ingest telemetry")]
+
+    def test_ingest_is_quiet_by_default(self):
+        with mock.patch("api.management.commands.loadcitydata.ingest_telemetry") as telemetry:
+            out = self.load()
+        dataset = WeatherDataset.objects.get(city__name="Paris")
+        self.assertEqual(dataset.hours.count(), 72)
+        self.assertNotIn("Phases", out)
+        self.assertNotIn("Hourly data", out)
+        telemetry.assert_not_called()
+
+    def test_ingest_telemetry(self):
+        with self.assertLogs("app", level="INFO") as logs:
+            out = self.load(verbosity=2)
+        self.assertIn("Inserted 72/72 rows", out)
+        self.assertIn("Phases: geocode", out)
+        [summary] = self.telemetry(logs)
+        self.assertEqual(set(summary["phases_ms"]), {"geocode", "fetch", "transform", "insert", "index"})
+        self.assertTrue(all(ms > 0 for ms in summary["phases_ms"].values()))
+        self.assertEqual(summary["rows"], 72)
+        self.assertGreater(summary["rows_per_second"], 0)
+        self.assertGreater(summary["bytes_downloaded"], 72 * 4 * 2)  # two float32 series
+        self.assertEqual(summary["http_cache"], {"hits": 0, "misses": 2})
+
+    def test_http_cache_hits_are_counted(self):
+        cached = requests_cache.CachedSession(backend="memory")
+        with mock.patch.object(open_meteo, "_session", cached), self.assertLogs("app", level="INFO") as logs:
+            self.load(verbosity=2)
+            self.load(verbosity=2, replace=True)
+        summary = self.telemetry(logs)[-1]
+        self.assertEqual(summary["http_cache"], {"hits": 2, "misses": 0})
+
+
+class TestHttpCache(StandInTestCase):
+    def setUp(self):
+        super().setUp()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.location = os.path.join(tmp.name, "open_meteo")
+
+    def cached_session(self, archive_bytes=0, backend="memory"):
+        config = CacheConfig(backend=backend, location=self.location, policies={
+            "archive": CachePolicy(expire_after=-1, max_bytes=archive_bytes),
+            "geocoding": CachePolicy(expire_after=3600, max_bytes=0),
+        })
+        session = BoundedCachedSession(config, open_meteo.cache_kinds())
+        self.addCleanup(session.close)
+        return session
+
+    def archive(self, day):
+        return open_meteo.archive(40.4168, -3.7038, f"2024-07-{day:02d}", f"2024-07-{day:02d}")
+
+    def test_normalized_keys(self):
+        base = "https://example.com/v1/archive"
+        self.assertEqual(normalize_url(f"{base}?longitude=-3.70380&latitude=40.4168&hourly=precipitation"),
+                         normalize_url(f"{base}?latitude=40.4168&hourly=precipitation&longitude=-3.7038"))
+        self.assertEqual(normalize_url(f"{base}?hourly=precipitation,temperature_2m&count=10.0"),
+                         normalize_url(f"{base}?count=10&hourly=precipitation&hourly=temperature_2m"))
+        # Open-Meteo answers variables in the order requested: a different order is a different response
+        self.assertNotEqual(normalize_url(f"{base}?hourly=precipitation&hourly=temperature_2m"),
+                            normalize_url(f"{base}?hourly=temperature_2m&hourly=precipitation"))
+
+        session = self.cached_session()
+        geocoding = f"{self.server.base_url}/v1/search"
+        session.get(geocoding, params={"name": "Madrid", "count": 10, "language": "EN"})
+        self.assertTrue(session.get(geocoding, params={"language": "EN", "count": "10", "name": "Madrid"}).from_cache)
+
+    def test_least_recently_used_archive_responses_are_evicted(self):
+        size = len(self.session.get(f"{self.server.base_url}/v1/archive", params={
+            "latitude": 40.4168, "longitude": -3.7038, "start_date": "2024-07-01", "end_date": "2024-07-01",
+            "hourly": ["precipitation", "temperature_2m"], "format": "flatbuffers"}).content)
+        session = self.cached_session(archive_bytes=int(size * 2.5))
+        with mock.patch.object(open_meteo, "_session", session):
+            self.archive(1)
+            self.archive(2)
+            self.archive(1)  # hit: day 2 is now the least recently used
+            self.archive(3)
+            requests_before = self.server.stats["/v1/archive 200"]
+            self.archive(1)
+            self.archive(3)
+            self.assertEqual(self.server.stats["/v1/archive 200"], requests_before)
+            self.archive(2)  # evicted: fetched again
+            self.assertEqual(self.server.stats["/v1/archive 200"], requests_before + 1)
+
+        stats = session.stats()["archive"]
+        self.assertEqual((stats["entries"], stats["hits"], stats["misses"], stats["evictions"]), (2, 3, 4, 2))
+        self.assertLessEqual(stats["bytes"], stats["max_bytes"])
+
+    def test_index_totals_are_shared_between_processes(self):
+        os.makedirs(self.location)
+        path = os.path.join(self.location, "index.sqlite")
+        indexes = [LruIndex(path), LruIndex(path)]  # one connection per process
+        for index in indexes:
+            self.addCleanup(index.close)
+
+        def work(index, offset):
+            for i in range(50):
+                index.count("archive", "misses")
+                index.touch(f"key-{offset + i}", "archive", 10)
+
+        threads = [threading.Thread(target=work, args=(index, n * 50)) for n, index in enumerate(indexes)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        indexes[0].touch("key-0", "archive", 30)  # response replaced: the total follows its size
+
+        self.assertEqual(indexes[1].summary()["archive"],
+                         {"entries": 100, "bytes": 1020, "hits": 0, "misses": 100, "evictions": 0})
+        self.assertEqual(len(indexes[1].evict("archive", 1000)), 2)
+        summary = indexes[0].summary()["archive"]
+        self.assertEqual((summary["entries"], summary["bytes"], summary["evictions"]), (98, 1000, 2))
+
+    def test_stats_command(self):
+        session = self.cached_session(archive_bytes=2 ** 20, backend="sqlite")
+        with mock.patch.object(open_meteo, "_session", session):
+            self.get_city_weather()
+            self.get_city_weather()
+        env = {"OPEN_METEO_CACHE_PATH": self.location, "OPEN_METEO_CACHE_ARCHIVE_MB": "1"}
+        with mock.patch.dict(os.environ, env):
+            out = io.StringIO()
+            call_command("openmeteocache", "--json", stdout=out)
+            stats = json.loads(out.getvalue())["policies"]
+            self.assertEqual(stats["archive"]["entries"], 1)
+            self.assertEqual((stats["geocoding"]["hits"], stats["geocoding"]["misses"]), (1, 1))
+            self.assertEqual(stats["archive"]["hit_ratio"], 0.5)
+
+            call_command("openmeteocache", "--clear", stdout=io.StringIO())
+            out = io.StringIO()
+            call_command("openmeteocache", stdout=out)
+        self.assertIn("archive: 0 entries", out.getvalue())
+
+
+class TestCassette(StandInTestCase):
+    def setUp(self):
+        super().setUp()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+
+    def test_record_then_replay_offline(self):
+        with mock.patch.object(open_meteo, "_session", CassetteSession(self.session, self.dir, "record")):
+            recorded = self.get_city_weather()
+        self.assertEqual(len(os.listdir(self.dir)), 2)  # geocoding + archive
+
+        self.server.shutdown()
+        with mock.patch.object(open_meteo, "_session", CassetteSession(self.session, self.dir, "replay")):
+            replayed = self.get_city_weather()
+            with self.assertRaises(CassetteMiss):
+                open_meteo.get_session().get(f"{self.server.base_url}/v1/search", params={"name": "Oslo"})
+        self.assertTrue(recorded["hourly_data"].equals(replayed["hourly_data"]))
+
+    def test_server_errors_are_not_recorded(self):
+        self.server.config.error_rate = 1.0
+        with mock.patch.object(open_meteo, "_session", CassetteSession(self.session, self.dir, "record")):
+            with self.assertRaises(ValueError):
+                self.get_city_weather()
+        self.assertEqual(os.listdir(self.dir), [])
@@ -0,0 +1,125 @@
+import pstats
+import tempfile
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from asgiref.sync import sync_to_async
+from django.test import AsyncClient, TestCase, override_settings
+from django.utils import timezone
+
+from api.models import City
+from api.tests.test_views import _insert_dataset
+
+
+class ProfilingTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.dir = Path(self.tmp.name)
+        overrides = override_settings(PROFILING={**settings.PROFILING, "DIR": self.tmp.name, "SAMPLE_RATE": 0.0})
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+        today = timezone.localdate()
+        start, end = today - timedelta(days=10), today - timedelta(days=8)
+        city = City.objects.create(
+            name="Madrid", latitude=40.4168, longitude=-3.7038, country_code="ES", country="Spain", timezone="UTC",
+        )
+        _insert_dataset(city, start, end)
+        self.params = {"city": "Madrid", "start_date": str(start), "end_date": str(end)}
+        self.staff = get_user_model().objects.create_user("ops", password="pass", is_staff=True)
+
+    def reports(self):
+        return sorted(path.stem for path in self.dir.glob("*.prof"))
+
+
+class TestProfilingMiddleware(ProfilingTestCase):
+    def test_staff_request_is_profiled_and_downloadable(self):
+        self.client.force_login(self.staff)
+        resp = self.client.get("/api/weather/temperature/", self.params, HTTP_X_PROFILE="1")
+        self.assertEqual(resp.status_code, 200)
+        report_id = resp["X-Profile-Id"]
+        self.assertEqual(self.reports(), [report_id])
+
+        listing = self.client.get("/internal/profiles/").json()["profiles"]
+        self.assertEqual(len(listing), 1)
+        meta = listing[0]
+        self.assertEqual((meta["id"], meta["trigger"], meta["user"], meta["status"]),
+                         (report_id, "requested", "ops", 200))
+        self.assertEqual(meta["path"], "/api/weather/temperature/")
+        self.assertGreater(meta["queries"], 0)
+
+        download = self.client.get(f"/internal/profiles/{report_id}/")
+        self.assertEqual(download.status_code, 200)
+        downloaded = self.dir / "downloaded.prof"
+        downloaded.write_bytes(b"".join(download.streaming_content))
+        functions = {func[2] for func in pstats.Stats(str(downloaded)).stats}
+        self.assertIn("temperature_stats", functions)
+
+        text = self.client.get(f"/internal/profiles/{report_id}/", {"format": "text"})
+        self.assertIn("temperature_stats", text.content.decode())
+
+    def test_query_flag_bypasses_the_response_cache(self):
+        self.client.force_login(self.staff)
+        self.client.get("/api/weather/precipitation/", self.params)  # cached
+        resp = self.client.get("/api/weather/precipitation/", {**self.params, "_profile": "1"})
+        self.assertIn("X-Profile-Id", resp)
+        self.assertNotIn("X-Cache", resp)
+
+    def test_flag_ignored_for_anonymous_and_non_staff_users(self):
+        self.client.get("/api/weather/temperature/", self.params, HTTP_X_PROFILE="1")
+        self.client.force_login(get_user_model().objects.create_user("someone", password="pass"))
+        resp = self.client.get("/api/weather/temperature/", {**self.params, "_profile": "1"})
+        self.assertNotIn("X-Profile-Id", resp)
+        self.assertEqual(self.reports(), [])
+
+    def test_flag_from_anonymous_users_does_not_bypass_the_response_cache(self):
+        self.client.get("/api/weather/precipitation/", self.params)  # cached
+        for extra in ({"data": {**self.params, "_profile": "1"}}, {"data": self.params, "HTTP_X_PROFILE": "1"}):
+            resp = self.client.get("/api/weather/precipitation/", **extra)
+            self.assertEqual(resp["X-Cache"], "HIT")
+            self.assertNotIn("X-Profile-Id", resp)
+
+    def test_sampled_requests_and_retention(self):
+        with self.settings(PROFILING={**settings.PROFILING, "SAMPLE_RATE": 1.0, "MAX_REPORTS": 2}):
+            for _ in range(3):
+                cache.clear()
+                resp = self.client.get("/api/weather/temperature/", self.params)
+                self.assertNotIn("X-Profile-Id", resp)  # only requested profiles are announced
+
+        self.assertEqual(len(self.reports()), 2)
+        self.assertEqual(len(list(self.dir.glob("*.json"))), 2)
+
+    @override_settings(ROOT_URLCONF="api.tests.async_urls")
+    async def test_async_chain(self):
+        client = AsyncClient()
+        await client.aforce_login(self.staff)
+        resp = await client.get("/api/weather/temperature/", self.params, headers={"X-Profile": "1"})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(await sync_to_async(self.reports)(), [resp["X-Profile-Id"]])
+
+        await client.alogout()
+        await client.get("/api/weather/temperature/", self.params)  # cached
+        resp = await client.get("/api/weather/temperature/", self.params, headers={"X-Profile": "1"})
+        self.assertEqual(resp["X-Cache"], "HIT")
+
+    @override_settings(PROFILING={"ENABLED": False})
+    def test_disabled(self):
+        self.client.force_login(self.staff)
+        resp = self.client.get("/api/weather/temperature/", self.params, HTTP_X_PROFILE="1")
+        self.assertNotIn("X-Profile-Id", resp)
+
+
+class TestProfileViews(ProfilingTestCase):
+    def test_staff_only(self):
+        self.assertEqual(self.client.get("/internal/profiles/").status_code, 403)
+        self.assertEqual(self.client.get("/internal/profiles/20260101T000000-0123abcd/").status_code, 403)
+
+    def test_unknown_or_malformed_id_returns_404(self):
+        self.client.force_login(self.staff)
+        self.assertEqual(self.client.get("/internal/profiles/20260101T000000-0123abcd/").status_code, 404)
+        self.assertEqual(self.client.get("/internal/profiles/..%2Fsecret/").status_code, 404)
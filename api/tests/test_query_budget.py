@@ -0,0 +1,181 @@
+from datetime import timedelta
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import AsyncClient, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from api import admission
+from api.models import City
+from api.query_budget import BudgetReport, QueryBudget, QueryBudgetExceeded, enforce_query_budgets, view_budget
+from api.tests.test_views import _insert_dataset
+from api.urls import async_urlpatterns, sync_urlpatterns
+from services import metrics
+from services.ingest import rebuild_range_index
+
+
+class TestQueryBudget(SimpleTestCase):
+    def test_report_violations(self):
+        report = BudgetReport("weather-temperature-stats", "/api/weather/temperature/", queries=4, rows=50,
+                              max_queries=3, max_rows=48)
+        self.assertEqual(report.violations, ["queries: 4 > 3", "rows: 50 > 48"])
+        report.max_rows = None
+        self.assertEqual(report.violations, ["queries: 4 > 3"])
+
+    def test_every_weather_view_declares_a_budget(self):
+        for patterns in (sync_urlpatterns, async_urlpatterns):
+            for pattern in patterns:
+                with self.subTest(name=pattern.name):
+                    self.assertIsInstance(view_budget(pattern.callback), QueryBudget)
+
+
+class QueryBudgetTestCase(TestCase):
+    def setUp(self):
+        cache.clear()  # a response cache hit never reaches the view
+        self.client = APIClient()
+        today = timezone.localdate()
+        self.start_date = today - timedelta(days=10)
+        self.end_date = today - timedelta(days=8)
+        self.cities = [
+            City.objects.create(name=name, latitude=40.0, longitude=0.0, country_code=code, country=country,
+                                timezone="UTC")
+            for name, code, country in (("Madrid", "ES", "Spain"), ("Paris", "FR", "France"),
+                                        ("Berlin", "DE", "Germany"))
+        ]
+        for city in self.cities:
+            _insert_dataset(city, self.start_date, self.end_date)
+            rebuild_range_index(city.datasets.get())
+        self.params = {"city": "Madrid", "start_date": str(self.start_date), "end_date": str(self.end_date)}
+        # Loaded once a minute per process, not per request: kept out of the counts
+        admission._DATASET_HOURS["expires"] = 0.0
+        admission.dataset_hours()
+
+
+class TestEndpointQueryBudgets(QueryBudgetTestCase):
+    """Every endpoint within its declared budget: a query added to a hot path fails here."""
+
+    def assertWithinBudget(self, method, path, data=None, **extra):
+        with enforce_query_budgets() as reports:
+            resp = getattr(self.client, method)(path, data, **extra)
+        self.assertEqual(resp.status_code, 200)
+        return reports[0]
+
+    def test_temperature(self):
+        self.assertWithinBudget("get", "/api/weather/temperature/", {**self.params, "above": 15})
+
+    def test_precipitation(self):
+        self.assertWithinBudget("get", "/api/weather/precipitation/", self.params)
+
+    def test_range(self):
+        report = self.assertWithinBudget("get", "/api/weather/range/", {**self.params, "daily": "true"})
+        self.assertEqual(report.rows, 0)
+
+    def test_distribution(self):
+        report = self.assertWithinBudget("get", "/api/weather/distribution/", self.params)
+        self.assertEqual(report.rows, 0)
+
+    def test_analytics(self):
+        self.assertWithinBudget("get", "/api/weather/analytics/", self.params)
+
+    def test_compare(self):
+        self.assertWithinBudget("get", "/api/weather/compare/", {**self.params, "cities": "Madrid,Paris,Berlin"})
+
+    def test_batch(self):
+        items = [{**self.params, "city": city.name} for city in self.cities]
+        self.assertWithinBudget("post", "/api/weather/batch/", {"items": items}, format="json")
+
+    def test_batch_queries_do_not_grow_with_datasets(self):
+        earlier = self.start_date - timedelta(days=20), self.start_date - timedelta(days=19)
+        for city in self.cities:
+            _insert_dataset(city, *earlier)
+        items = [{**self.params, "city": city.name, "tz": tz} for city in self.cities for tz in ("utc", "local")]
+        items += [{"city": city.name, "start_date": str(earlier[0]), "end_date": str(earlier[1])}
+                  for city in self.cities]  # 6 datasets
+        report = self.assertWithinBudget("post", "/api/weather/batch/", {"items": items}, format="json")
+        self.assertLessEqual(report.queries, 2)
+
+    def test_summary_queries_do_not_grow_with_datasets(self):
+        report = self.assertWithinBudget("get", "/api/weather/summary/")
+        for i in range(3):
+            _insert_dataset(self.cities[0], self.start_date - timedelta(days=20 * (i + 1)),
+                            self.start_date - timedelta(days=20 * (i + 1) - 1))
+        cache.clear()
+        self.assertLessEqual(self.assertWithinBudget("get", "/api/weather/summary/").queries, report.queries)
+
+    def test_export(self):
+        # Rows are streamed after the view returns; the budget covers the dataset lookup
+        self.assertWithinBudget("get", "/api/weather/export/", self.params)
+
+
+@override_settings(ROOT_URLCONF="api.tests.async_urls")
+class TestAsyncEndpointQueryBudgets(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = AsyncClient()
+
+    async def assertWithinBudget(self, method, path, data=None, **extra):
+        with enforce_query_budgets() as reports:
+            resp = await getattr(self.client, method)(path, data, **extra)
+        self.assertEqual(resp.status_code, 200)
+        return reports[0]
+
+    async def test_temperature(self):
+        await self.assertWithinBudget("get", "/api/weather/temperature/", self.params)
+
+    async def test_range(self):
+        report = await self.assertWithinBudget("get", "/api/weather/range/", self.params)
+        self.assertEqual(report.rows, 0)
+
+    async def test_compare(self):
+        await self.assertWithinBudget("get", "/api/weather/compare/", {**self.params, "cities": "Madrid,Paris"})
+
+    async def test_summary(self):
+        await self.assertWithinBudget("get", "/api/weather/summary/")
+
+    async def test_batch(self):
+        items = [{**self.params, "city": city.name} for city in self.cities]
+        await self.assertWithinBudget("post", "/api/weather/batch/", {"items": items},
+                                      content_type="application/json")
+
+
+class TestQueryBudgetEnforcement(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        metrics.reset()
+
+    def test_overrun_is_logged_counted_and_fails_the_helper(self):
+        from api.views import TemperatureStatsView
+
+        with self.assertLogs("api.query_budget", level="WARNING") as logs, \
+                mock.patch.object(TemperatureStatsView, "query_budget", QueryBudget(queries=1, rows=1)):
+            with self.assertRaises(QueryBudgetExceeded) as ctx:
+                with enforce_query_budgets():
+                    resp = self.client.get("/api/weather/temperature/", self.params)
+
+        self.assertEqual(resp.status_code, 200)  # production behaviour: warn, never fail the request
+        self.assertIn("queries:", logs.output[0])
+        self.assertIn("rows: 2 > 1", str(ctx.exception))
+        self.assertIn('FROM "api_weatherhour"', str(ctx.exception))
+        counted = {dict(key)["kind"]: value
+                   for key, value in metrics._registry.values["query_budget_exceeded_total"].items()}
+        self.assertEqual(counted, {"queries": 1, "rows": 1})
+
+    def test_helper_fails_when_no_budgeted_view_was_reached(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            with enforce_query_budgets():
+                self.client.get("/swagger.json")
+
+    @override_settings(QUERY_BUDGET={"ENABLED": False})
+    def test_disabled(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            with enforce_query_budgets():
+                self.client.get("/api/weather/temperature/", self.params)
+
+    def test_session_lookups_are_allowed_for_authenticated_users(self):
+        self.client.force_login(get_user_model().objects.create_user("someone", password="pass"))
+        with enforce_query_budgets() as reports:
+            self.client.get("/api/weather/temperature/", self.params)
+        self.assertEqual(reports[0].max_queries, 3 + 2)
@@ -0,0 +1,110 @@
+import gzip
+from datetime import timedelta
+from unittest import mock
+
+from django.core.cache import cache
+from django.conf import settings
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from api import response_cache
+from api.models import City
+from api.response_cache import accepts_encoding, negotiate_encoding
+from api.tests.test_views import _insert_dataset
+from services.ingest import rebuild_range_index
+
+
+class TestNegotiateEncoding(TestCase):
+    def test_gzip_accepted(self):
+        self.assertEqual(negotiate_encoding("deflate, gzip;q=0.8"), "gzip")
+
+    def test_refused_or_missing(self):
+        self.assertIsNone(negotiate_encoding(""))
+        self.assertIsNone(negotiate_encoding("gzip;q=0"))
+        self.assertIsNone(negotiate_encoding("identity"))
+
+    def test_accepts_a_given_encoding(self):
+        self.assertTrue(accepts_encoding("gzip, deflate", "gzip"))
+        self.assertTrue(accepts_encoding("*", "gzip"))
+        self.assertFalse(accepts_encoding("gzip;q=0", "gzip"))
+        self.assertFalse(accepts_encoding("*, gzip;q=0", "gzip"))
+        self.assertFalse(accepts_encoding("x-gzip", "gzip"))
+
+
+# Tiny test payloads: compress everything
+@override_settings(API_RESPONSE_CACHE={**settings.API_RESPONSE_CACHE, "ENABLED": True, "MIN_SIZE": 0})
+class TestCompressedResponseCache(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        today = timezone.localdate()
+        self.start_date = today - timedelta(days=10)
+        self.end_date = today - timedelta(days=8)
+        self.city = City.objects.create(
+            name="Madrid", latitude=40.4168, longitude=-3.7038, country_code="ES", country="Spain", timezone="UTC",
+        )
+        _insert_dataset(self.city, self.start_date, self.end_date)
+        self.params = {"city": "Madrid", "start_date": str(self.start_date), "end_date": str(self.end_date)}
+
+    def test_hit_is_served_precompressed(self):
+        miss = self.client.get("/api/weather/temperature/", self.params, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(miss.status_code, 200)
+        self.assertEqual(miss["X-Cache"], "MISS")
+        self.assertEqual(miss["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", miss["Vary"])
+        body = gzip.decompress(miss.content)
+
+        with mock.patch.object(response_cache, "_compress", side_effect=AssertionError("recompressed")):
+            hit = self.client.get("/api/weather/temperature/", self.params, HTTP_ACCEPT_ENCODING="gzip")
+            plain = self.client.get("/api/weather/temperature/", self.params)
+
+        self.assertEqual(hit["X-Cache"], "HIT")
+        self.assertEqual(gzip.decompress(hit.content), body)
+        self.assertEqual(plain["X-Cache"], "HIT")
+        self.assertFalse(plain.has_header("Content-Encoding"))
+        self.assertEqual(plain.content, body)
+        self.assertEqual(plain.json()["temperature"]["average"], 15.0)
+
+    def test_entries_are_kept_per_accept_header(self):
+        json_resp = self.client.get("/api/weather/temperature/", self.params, HTTP_ACCEPT="application/json")
+        self.assertEqual((json_resp["X-Cache"], json_resp["Content-Type"]), ("MISS", "application/json"))
+        self.assertIn("Accept", json_resp["Vary"])
+
+        html = self.client.get("/api/weather/temperature/", self.params, HTTP_ACCEPT="text/html")
+        self.assertNotEqual(html.get("X-Cache"), "HIT")
+        self.assertEqual(html["Content-Type"].split(";")[0], "text/html")
+
+        again = self.client.get("/api/weather/temperature/", self.params, HTTP_ACCEPT="application/json")
+        self.assertEqual((again["X-Cache"], again["Content-Type"]), ("HIT", "application/json"))
+
+    def test_ingest_invalidates_entries(self):
+        first = self.client.get("/api/weather/temperature/", self.params)
+        self.assertEqual(first["X-Cache"], "MISS")
+
+        rebuild_range_index(self.city.datasets.get())
+        again = self.client.get("/api/weather/temperature/", self.params)
+        self.assertEqual(again["X-Cache"], "MISS")
+
+    def test_editing_hours_invalidates_entries(self):
+        dataset = self.city.datasets.get()
+        rebuild_range_index(dataset)
+        oslo = City.objects.create(name="Oslo", latitude=59.9, longitude=10.7, country_code="NO", country="Norway",
+                                   timezone="UTC")
+        _insert_dataset(oslo, self.start_date, self.end_date)
+        rebuild_range_index(oslo.datasets.get())  # the latest build: editing Madrid's hours keeps it
+        self.assertEqual(self.client.get("/api/weather/temperature/", self.params)["X-Cache"], "MISS")
+
+        hour = dataset.hours.first()
+        hour.temperature = 40.0
+        hour.save()
+        again = self.client.get("/api/weather/temperature/", self.params)
+        self.assertEqual(again["X-Cache"], "MISS")
+        self.assertEqual(again.json()["temperature"]["max"]["value"], 40.0)
+
+    def test_errors_are_not_cached(self):
+        params = {**self.params, "city": "Paris"}
+        self.assertEqual(self.client.get("/api/weather/temperature/", params).status_code, 404)
+        resp = self.client.get("/api/weather/temperature/", params)
+        self.assertEqual(resp.status_code, 404)
+        self.assertFalse(resp.has_header("X-Cache"))
@@ -0,0 +1,79 @@
+import gzip
+import io
+import json
+import tempfile
+from pathlib import Path
+from unittest.mock import patch
+
+from django.conf import settings
+from django.core.management import call_command, CommandError
+from django.test import TestCase, override_settings
+
+from api import schema
+
+
+class TestOpenAPISchemaView(TestCase):
+    def setUp(self):
+        schema.get_schema_document.cache_clear()
+        self.addCleanup(schema.get_schema_document.cache_clear)
+
+    def test_schema_generated_once_and_served_with_cache_headers(self):
+        with patch("api.schema.render_schema", wraps=schema.render_schema) as render:
+            first = self.client.get("/swagger.json")
+            second = self.client.get("/swagger.json")
+
+        self.assertEqual(render.call_count, 1)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first["Content-Type"], "application/json")
+        self.assertIn("public", first["Cache-Control"])
+        self.assertIn(f"max-age={settings.OPENAPI_SCHEMA['MAX_AGE']}", first["Cache-Control"])
+        self.assertEqual(first["ETag"], second["ETag"])
+        self.assertIn("/temperature/", json.loads(first.content)["paths"])
+
+    def test_revalidation_and_gzip(self):
+        etag = self.client.get("/swagger.json")["ETag"]
+
+        not_modified = self.client.get("/swagger.json", HTTP_IF_NONE_MATCH=f"W/{etag}")
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified.content, b"")
+
+        compressed = self.client.get("/swagger.json", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(compressed["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", compressed["Vary"])
+        self.assertEqual(gzip.decompress(compressed.content), schema.get_schema_document().body)
+
+        refused = self.client.get("/swagger.json", HTTP_ACCEPT_ENCODING="gzip;q=0")
+        self.assertFalse(refused.has_header("Content-Encoding"))
+        self.assertEqual(refused.content, schema.get_schema_document().body)
+
+    def test_prebuilt_file_is_served_without_generating(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            file = Path(tmp) / "openapi.json"
+            file.write_bytes(b'{"swagger": "2.0", "paths": {}}')
+            with override_settings(OPENAPI_SCHEMA={**settings.OPENAPI_SCHEMA, "FILE": str(file)}), \
+                    patch("api.schema.render_schema") as render:
+                response = self.client.get("/swagger.json")
+
+        render.assert_not_called()
+        self.assertEqual(response.content, b'{"swagger": "2.0", "paths": {}}')
+
+    def test_ui_points_to_prebuilt_schema(self):
+        response = self.client.get("/swagger/")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"/swagger.json", response.content)
+
+
+class TestBuildSchemaCommand(TestCase):
+    def test_writes_schema_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            file = Path(tmp) / "nested" / "openapi.json"
+            call_command("buildschema", "--output", str(file), stdout=io.StringIO())
+            document = json.loads(file.read_bytes())
+
+        self.assertEqual(document["swagger"], "2.0")
+        self.assertIn("/distribution/", document["paths"])
+
+    def test_requires_an_output(self):
+        with override_settings(OPENAPI_SCHEMA={**settings.OPENAPI_SCHEMA, "FILE": None}):
+            with self.assertRaisesRegex(CommandError, "No output file"):
+                call_command("buildschema", stdout=io.StringIO())
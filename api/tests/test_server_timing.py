@@ -0,0 +1,108 @@
+import asyncio
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from api.models import City
+from api.tests.test_views import _insert_dataset
+from services import timing
+
+
+def _metrics(header):
+    return {part.split(";")[0].strip(): part for part in header.split(",")}
+
+
+class TestPhaseRecorder(SimpleTestCase):
+    def test_noop_without_recorder(self):
+        self.assertIsNone(timing.current_recorder())
+        self.assertIs(timing.phase("fetch"), timing._NOOP)
+        timing.count("rows", 10)  # ignored
+
+    def test_phases_add_up_and_async_functions_are_timed(self):
+        @timing.timed("compute")
+        async def compute():
+            return 42
+
+        with timing.recording() as recorder:
+            with timing.phase("fetch"):
+                pass
+            with timing.phase("fetch"):
+                pass
+            timing.count("rows", 3)
+            timing.count("rows", 4)
+            self.assertEqual(asyncio.run(compute()), 42)
+
+        self.assertIsNone(timing.current_recorder())
+        self.assertEqual(recorder.phases["fetch"][1], 2)
+        self.assertIn("compute", recorder.phases)
+        self.assertEqual(recorder.counters, {"rows": 7})
+
+
+class TestServerTimingMiddleware(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        today = timezone.localdate()
+        self.start_date = today - timedelta(days=10)
+        self.end_date = today - timedelta(days=8)
+        self.city = City.objects.create(
+            name="Madrid", latitude=40.4168, longitude=-3.7038, country_code="ES", country="Spain", timezone="UTC",
+        )
+        _insert_dataset(self.city, self.start_date, self.end_date)
+        self.params = {"city": "Madrid", "start_date": str(self.start_date), "end_date": str(self.end_date)}
+
+    def test_header_and_log_line(self):
+        with self.assertLogs("app.timing", level="INFO") as logs:
+            resp = self.client.get("/api/weather/temperature/", self.params)
+
+        self.assertEqual(resp.status_code, 200)
+        metrics = _metrics(resp["Server-Timing"])
+        for name in ("resolve", "fetch", "frame", "compute", "serialize", "render", "db", "total"):
+            self.assertIn("dur=", metrics[name], name)
+        self.assertIn('desc="2"', metrics["rows"])
+        self.assertIn("queries", metrics)
+
+        entry = json.loads(logs.output[0].split("request timing ", 1)[1])
+        self.assertEqual(entry["path"], "/api/weather/temperature/")
+        self.assertEqual(entry["status"], 200)
+        self.assertEqual(entry["rows"], 2)
+        self.assertGreaterEqual(entry["queries"], 2)
+        self.assertIn("compute", entry["phases_ms"])
+
+    def test_error_responses_are_timed(self):
+        resp = self.client.get("/api/weather/temperature/", {**self.params, "city": "Atlantis"})
+        self.assertEqual(resp.status_code, 404)
+        self.assertIn("resolve", _metrics(resp["Server-Timing"]))
+
+    def test_header_only_for_internal_clients(self):
+        outside = {"REMOTE_ADDR": "203.0.113.5"}
+        with self.assertLogs("app.timing", level="INFO") as logs:
+            resp = self.client.get("/api/weather/temperature/", self.params, **outside)
+        self.assertEqual(resp.status_code, 200)
+        self.assertFalse(resp.has_header("Server-Timing"))
+        self.assertIn("request timing", logs.output[0])  # still logged
+
+        self.client.force_login(get_user_model().objects.create_user("ops", password="pass", is_staff=True))
+        resp = self.client.get("/api/weather/precipitation/", self.params, **outside)
+        self.assertTrue(resp.has_header("Server-Timing"))
+
+    @override_settings(SERVER_TIMING={**settings.SERVER_TIMING, "HEADER": "all"})
+    def test_header_for_everyone(self):
+        resp = self.client.get("/api/weather/temperature/", self.params, REMOTE_ADDR="203.0.113.5")
+        self.assertTrue(resp.has_header("Server-Timing"))
+
+    @override_settings(SERVER_TIMING={**settings.SERVER_TIMING, "ENABLED": False})
+    def test_disabled(self):
+        resp = self.client.get("/api/weather/temperature/", self.params)
+        self.assertEqual(resp.status_code, 200)
+        self.assertFalse(resp.has_header("Server-Timing"))
+
+    def test_other_paths_untouched(self):
+        resp = self.client.get("/swagger.json")
+        self.assertFalse(resp.has_header("Server-Timing"))
@@ -1,15 +1,22 @@
 from datetime import datetime, timedelta, timezone as pytimezone
 
+import pandas as pd
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 
-from api.models import City, WeatherDataset, WeatherHour
+from api.models import City, WeatherDataset, WeatherDatasetIndex, WeatherHour
 from api.serializers import (
     TemperatureStatsResponseSerializer,
     PrecipitationStatsResponseSerializer,
 )
+from services.analytics import analytics_from_df
 from services.exceptions import DatasetNotFound
-from services.stats import temperature_stats, precipitation_stats
+from services.ingest import rebuild_range_index
+from services.queries import _DAY_LABELS_CACHE, _dataset_hours_to_df, _day_labels, get_dataset_or_raise
+from services.range_index import RangeIndex
+from services.stats import temperature_stats, precipitation_stats, range_stats, compare_stats, distribution_stats
 
 
 class TestServicesStats(TestCase):
@@ -152,3 +159,335 @@ class TestServicesStats(TestCase):
 
         # average daily = total / number_of_days = 7 / 2 = 3.5
         self.assertAlmostEqual(prec["average"], 3.5, places=6)
+
+    def test_range_stats_sub_range_from_index(self):
+        rebuild_range_index(self.dataset)
+        day2 = self.start_date + timedelta(days=1)
+
+        result = range_stats(city_name="madrid", start_date=day2, end_date=day2)
+
+        self.assertEqual(result["hours"], 3)
+        self.assertAlmostEqual(result["temperature"]["average"], 15.0, places=6)
+        self.assertEqual(result["temperature"]["max"]["value"], 25.0)
+        self.assertEqual(result["temperature"]["min"]["value"], 5.0)
+        self.assertAlmostEqual(result["precipitation"]["total"], 4.0, places=6)
+        self.assertEqual(result["precipitation"]["days_with_precipitation"], 1)
+        self.assertNotIn("average_by_day", result["temperature"])
+
+    def test_range_stats_matches_full_range_services(self):
+        result = range_stats(city_name="Madrid", start_date=self.start_date, end_date=self.end_date, daily=True)
+        temp = temperature_stats(city_name="Madrid", start_date=self.start_date, end_date=self.end_date)["temperature"]
+        prec = precipitation_stats(city_name="Madrid", start_date=self.start_date, end_date=self.end_date)["precipitation"]
+
+        self.assertAlmostEqual(result["temperature"]["average"], temp["average"], places=6)
+        self.assertEqual(result["temperature"]["max"], temp["max"])
+        self.assertEqual(result["temperature"]["min"], temp["min"])
+        self.assertEqual(result["temperature"]["average_by_day"], temp["average_by_day"])
+        self.assertEqual(result["precipitation"]["total_by_day"], prec["total_by_day"])
+        self.assertEqual(result["precipitation"]["max"], prec["max"])
+        self.assertAlmostEqual(result["precipitation"]["average"], prec["average"], places=6)
+        # index built lazily on first use and persisted
+        self.assertEqual(WeatherDatasetIndex.objects.get(dataset=self.dataset).hours_count, 6)
+
+    def test_range_stats_outside_dataset_raises(self):
+        with self.assertRaisesRegex(DatasetNotFound, "No dataset covering"):
+            range_stats(city_name="Madrid", start_date=self.start_date - timedelta(days=1), end_date=self.end_date)
+
+    def test_distribution_stats_from_day_histograms(self):
+        day2 = self.start_date + timedelta(days=1)
+
+        result = distribution_stats(
+            city_name="Madrid", start_date=day2, end_date=day2, percentiles=[0, 50, 100], bin_width=10.0,
+        )
+
+        self.assertEqual(result["hours"], 3)
+        self.assertEqual(result["percentiles"]["p0"], 5.0)
+        self.assertEqual(result["percentiles"]["p100"], 25.0)
+        self.assertAlmostEqual(result["percentiles"]["p50"], 15.0, delta=0.5)
+        self.assertEqual(
+            [(b["lower"], b["upper"], b["count"]) for b in result["histogram"]["bins"]],
+            [(0.0, 10.0, 1), (10.0, 20.0, 1), (20.0, 30.0, 1)],
+        )
+
+    def test_distribution_stats_rebuilds_outdated_index(self):
+        rebuild_range_index(self.dataset)
+        WeatherDatasetIndex.objects.filter(dataset=self.dataset).update(version=1)
+        self.dataset.refresh_from_db()
+
+        result = distribution_stats(city_name="Madrid", start_date=self.start_date, end_date=self.end_date)
+
+        self.assertEqual(result["hours"], 6)
+        self.assertEqual(sorted(result["percentiles"]), ["p5", "p50", "p95"])
+        self.assertEqual(WeatherDatasetIndex.objects.get(dataset=self.dataset).version, RangeIndex.VERSION)
+
+    def test_editing_hours_drops_the_range_index(self):
+        day2 = self.start_date + timedelta(days=1)
+
+        def day2_stats():
+            return range_stats(city_name="Madrid", start_date=day2, end_date=day2)
+
+        rebuild_range_index(self.dataset)
+        self.assertEqual(day2_stats()["temperature"]["max"]["value"], 25.0)
+
+        hour = WeatherHour.objects.filter(dataset=self.dataset, temperature=25.0).get()
+        hour.temperature = 40.0
+        hour.save()  # as the admin does
+        self.assertFalse(WeatherDatasetIndex.objects.filter(dataset=self.dataset).exists())
+        self.assertEqual(day2_stats()["temperature"]["max"]["value"], 40.0)
+
+        WeatherHour.objects.filter(dataset=self.dataset, temperature=40.0).delete()
+        self.assertFalse(WeatherDatasetIndex.objects.filter(dataset=self.dataset).exists())
+        self.assertEqual(day2_stats()["hours"], 2)
+
+        WeatherHour.objects.filter(dataset=self.dataset, temperature=15.0).update(temperature=35.0)
+        self.assertEqual(day2_stats()["temperature"]["max"]["value"], 35.0)
+
+    def test_temperature_stats_local_days_follow_city_timezone(self):
+        # UTC+14: the 10:00-12:00 UTC hours fall on the next local day
+        self.city.timezone = "Pacific/Kiritimati"
+        self.city.save()
+
+        result = temperature_stats(
+            city_name="Madrid", start_date=self.start_date, end_date=self.end_date, tz="local",
+        )
+
+        temp = result["temperature"]
+        day2 = (self.start_date + timedelta(days=1)).isoformat()
+        day3 = (self.start_date + timedelta(days=2)).isoformat()
+        self.assertEqual(sorted(temp["average_by_day"]), [day2, day3])
+        self.assertAlmostEqual(temp["average_by_day"][day2], 20.0, places=6)
+        self.assertEqual(temp["max"]["date_time"], f"{day2}T02:00")
+
+    def test_precipitation_stats_utc_is_default(self):
+        self.city.timezone = "Pacific/Kiritimati"
+        self.city.save()
+
+        result = precipitation_stats(city_name="Madrid", start_date=self.start_date, end_date=self.end_date)
+
+        self.assertIn(self.start_date.isoformat(), result["precipitation"]["total_by_day"])
+
+    def test_compare_stats_matches_single_city_services(self):
+        paris = City.objects.create(
+            name="Paris", latitude=48.85, longitude=2.35, country_code="FR", country="France", timezone="UTC",
+        )
+        other = WeatherDataset.objects.create(
+            city=paris, start_date=self.start_date, end_date=self.end_date, source="open-meteo",
+        )
+        base_dt = datetime(self.start_date.year, self.start_date.month, self.start_date.day, tzinfo=pytimezone.utc)
+        WeatherHour.objects.bulk_create([
+            WeatherHour(dataset=other, timestamp=base_dt + timedelta(hours=h), temperature=float(h), precipitation=None)
+            for h in range(4)
+        ])
+
+        result = compare_stats(
+            city_names=["Madrid", "Paris", "Sevilla"],
+            start_date=self.start_date, end_date=self.end_date, above=18.0, below=8.0,
+        )
+
+        self.assertEqual(result["missing"], ["Sevilla"])
+        madrid = result["cities"]["Madrid"]
+        single_temp = temperature_stats(
+            city_name="Madrid", start_date=self.start_date, end_date=self.end_date, above=18.0, below=8.0,
+        )["temperature"]
+        single_prec = precipitation_stats(
+            city_name="Madrid", start_date=self.start_date, end_date=self.end_date,
+        )["precipitation"]
+        for field in ("average", "max", "min", "hours_above_threshold", "hours_below_threshold"):
+            self.assertEqual(madrid["temperature"][field], single_temp[field])
+        for field in ("total", "days_with_precipitation", "max", "average"):
+            self.assertEqual(madrid["precipitation"][field], single_prec[field])
+
+        paris_stats = result["cities"]["Paris"]
+        self.assertEqual(paris_stats["temperature"]["max"]["value"], 3.0)
+        self.assertEqual(paris_stats["precipitation"]["total"], 0.0)
+
+    def test_compare_stats_without_any_dataset_raises(self):
+        with self.assertRaises(DatasetNotFound):
+            compare_stats(city_names=["Sevilla"], start_date=self.start_date, end_date=self.end_date)
+
+
+    def test_temperature_stats_fields_subset_matches_full_result(self):
+        full = temperature_stats(
+            city_name="Madrid", start_date=self.start_date, end_date=self.end_date, above=18.0, below=8.0,
+        )["temperature"]
+
+        for fields in (["average"], ["max", "min"], ["hours_above_threshold"], ["average_by_day", "average"]):
+            result = temperature_stats(
+                city_name="Madrid", start_date=self.start_date, end_date=self.end_date,
+                above=18.0, below=8.0, fields=fields,
+            )["temperature"]
+            self.assertEqual(set(result), set(fields))
+            for name in fields:
+                if name == "average":
+                    self.assertAlmostEqual(result[name], full[name], places=6)
+                else:
+                    self.assertEqual(result[name], full[name])
+
+    def test_temperature_stats_scalar_fields_do_not_read_hours(self):
+        rebuild_range_index(self.dataset)
+
+        with CaptureQueriesContext(connection) as ctx:
+            result = temperature_stats(
+                city_name="Madrid", start_date=self.start_date, end_date=self.end_date,
+                fields=["average", "hours_below_threshold"], below=8.0,
+            )
+
+        self.assertEqual(result["temperature"]["hours_below_threshold"], 1)
+        hour_selects = [q for q in ctx.captured_queries
+                        if 'FROM "api_weatherhour"' in q["sql"] and "COUNT" not in q["sql"]]
+        self.assertEqual(hour_selects, [])
+
+    def test_temperature_stats_fields_local_extrema_in_wall_time(self):
+        self.city.timezone = "Pacific/Kiritimati"
+        self.city.save()
+        day2 = (self.start_date + timedelta(days=1)).isoformat()
+
+        result = temperature_stats(
+            city_name="Madrid", start_date=self.start_date, end_date=self.end_date, tz="local", fields=["max"],
+        )
+
+        self.assertEqual(result["temperature"]["max"]["date_time"], f"{day2}T02:00")
+
+    def test_precipitation_stats_fields_subset_matches_full_result(self):
+        full = precipitation_stats(city_name="Madrid", start_date=self.start_date, end_date=self.end_date)
+
+        for tz in ("utc", "local"):
+            for fields in (["total"], ["max", "average"], ["total_by_day", "days_with_precipitation"]):
+                result = precipitation_stats(
+                    city_name="Madrid", start_date=self.start_date, end_date=self.end_date, tz=tz, fields=fields,
+                )["precipitation"]
+                self.assertEqual(set(result), set(fields))
+                for name in fields:
+                    self.assertEqual(result[name], full["precipitation"][name])
+
+class TestDayLabels(TestCase):
+    def test_local_day_labels_are_dst_aware(self):
+        ts = pd.Series(pd.to_datetime([
+            "2024-03-30T22:30:00Z",  # 23:30 CET (UTC+1)
+            "2024-03-30T23:30:00Z",  # 00:30 CET, Mar 31
+            "2024-10-26T21:30:00Z",  # 23:30 CEST (UTC+2)
+            "2024-10-26T22:30:00Z",  # 00:30 CEST, Oct 27
+        ], utc=True))
+
+        self.assertEqual(
+            list(_day_labels(ts, "Europe/Madrid")),
+            ["2024-03-30", "2024-03-31", "2024-10-26", "2024-10-27"],
+        )
+        self.assertEqual(
+            list(_day_labels(ts, None)),
+            ["2024-03-30", "2024-03-30", "2024-10-26", "2024-10-26"],
+        )
+
+
+class TestLocalDayBounds(TestCase):
+    """Three full UTC days stored; local days must stay within [start_date, end_date]."""
+
+    def setUp(self):
+        _DAY_LABELS_CACHE.clear()
+        self.city = City.objects.create(name="Tokyo", latitude=35.68, longitude=139.69, country_code="JP",
+                                        country="Japan", timezone="Asia/Tokyo")
+        dataset = WeatherDataset.objects.create(city=self.city, start_date="2024-01-10", end_date="2024-01-12",
+                                                source="open-meteo")
+        first = datetime(2024, 1, 10, tzinfo=pytimezone.utc)
+        WeatherHour.objects.bulk_create([
+            WeatherHour(dataset=dataset, timestamp=first + timedelta(hours=h), temperature=float(h), precipitation=1.0)
+            for h in range(72)
+        ])
+        rebuild_range_index(dataset)
+
+    def hours_per_day(self):
+        dataset = get_dataset_or_raise(city_name=self.city.name, start_date="2024-01-10", end_date="2024-01-12")
+        return _dataset_hours_to_df(dataset, tz="local").groupby("date").size().to_dict()
+
+    def test_east_of_utc_drops_the_day_after_end_date(self):
+        # 00:00 UTC is 09:00 in Tokyo: the first local day only has 15 stored hours
+        self.assertEqual(self.hours_per_day(), {"2024-01-10": 15, "2024-01-11": 24, "2024-01-12": 24})
+        self.assertEqual(len(_DAY_LABELS_CACHE._data), 1)  # keyed by the range index version
+        self.assertEqual(self.hours_per_day(), {"2024-01-10": 15, "2024-01-11": 24, "2024-01-12": 24})
+
+        result = precipitation_stats(city_name="Tokyo", start_date="2024-01-10", end_date="2024-01-12", tz="local")
+        self.assertEqual(sorted(result["precipitation"]["total_by_day"]), ["2024-01-10", "2024-01-11", "2024-01-12"])
+        self.assertEqual(result["precipitation"]["days_with_precipitation"], 3)
+
+    def test_west_of_utc_drops_the_day_before_start_date(self):
+        # UTC-8 in January: the last local day ends at 16:00
+        self.city.timezone = "America/Los_Angeles"
+        self.city.save()
+        self.assertEqual(self.hours_per_day(), {"2024-01-10": 24, "2024-01-11": 24, "2024-01-12": 16})
+
+        result = temperature_stats(city_name="Tokyo", start_date="2024-01-10", end_date="2024-01-12", tz="local")
+        self.assertEqual(sorted(result["temperature"]["average_by_day"]), ["2024-01-10", "2024-01-11", "2024-01-12"])
+        self.assertAlmostEqual(result["temperature"]["average_by_day"]["2024-01-10"], sum(range(8, 32)) / 24)
+
+    def test_fields_keep_to_the_local_days(self):
+        args = dict(city_name="Tokyo", start_date="2024-01-10", end_date="2024-01-12", tz="local")
+        temperature = temperature_stats(**args, above=60.0, below=10.0)["temperature"]
+        precipitation = precipitation_stats(**args)["precipitation"]
+        self.assertEqual(temperature["max"], {"value": 62.0, "date_time": "2024-01-12T23:00"})
+
+        for fields in (["average"], ["max", "min"], ["hours_above_threshold", "hours_below_threshold"]):
+            result = temperature_stats(**args, above=60.0, below=10.0, fields=fields)["temperature"]
+            self.assertEqual(result, {name: temperature[name] for name in fields})
+        for fields in (["total"], ["max", "average"]):
+            result = precipitation_stats(**args, fields=fields)["precipitation"]
+            self.assertEqual(result, {name: precipitation[name] for name in fields})
+
+
+class TestAnalytics(TestCase):
+    def _hours(self, daily_temps, precipitation=0.0):
+        # Constant temperature over each day, so daily mean == daily max == the given value
+        start = pd.Timestamp("2024-07-01", tz="UTC")
+        timestamps = pd.date_range(start, periods=24 * len(daily_temps), freq="h")
+        df = pd.DataFrame({
+            "timestamp": timestamps,
+            "temperature": [t for t in daily_temps for _ in range(24)],
+            "precipitation": precipitation,
+        })
+        df["date"] = _day_labels(df["timestamp"], None)
+        return df
+
+    def test_rolling_windows_and_degree_days(self):
+        result = analytics_from_df(self._hours([10, 20, 30, 40]), windows=[2], heating_base=18, cooling_base=21)
+        daily = result["daily"]
+
+        self.assertEqual(list(daily), ["2024-07-01", "2024-07-02", "2024-07-03", "2024-07-04"])
+        self.assertIsNone(daily["2024-07-01"]["temperature_mean_2d"])
+        self.assertEqual(daily["2024-07-02"]["temperature_mean_2d"], 15.0)
+        self.assertEqual(daily["2024-07-04"]["temperature_mean_2d"], 35.0)
+        self.assertEqual(daily["2024-07-04"]["precipitation_sum_2d"], 0.0)
+        self.assertEqual(daily["2024-07-01"]["heating_degree_days"], 8.0)
+        self.assertEqual(result["degree_days"]["heating_total"], 8.0)
+        self.assertEqual(result["degree_days"]["cooling_total"], 9.0 + 19.0)
+
+    def test_default_degree_day_bases_are_the_same(self):
+        result = analytics_from_df(self._hours([10, 18, 26]), windows=[2])
+        daily = result["daily"]
+
+        self.assertEqual(result["degree_days"]["heating_base"], result["degree_days"]["cooling_base"])
+        self.assertEqual([(d["heating_degree_days"], d["cooling_degree_days"]) for d in daily.values()],
+                         [(8.0, 0.0), (0.0, 0.0), (0.0, 8.0)])
+        self.assertEqual((result["degree_days"]["heating_total"], result["degree_days"]["cooling_total"]),
+                         (8.0, 8.0))
+
+    def test_heat_waves(self):
+        temps = [36, 37, 20, 35, 36, 38, 39, 10, 40, 41, 42]
+        result = analytics_from_df(self._hours(temps), heatwave_threshold=35, heatwave_min_days=3)
+
+        self.assertEqual(result["heat_waves"], [
+            {"start_date": "2024-07-04", "end_date": "2024-07-07", "days": 4, "max_temperature": 39.0},
+            {"start_date": "2024-07-09", "end_date": "2024-07-11", "days": 3, "max_temperature": 42.0},
+        ])
+
+    def test_missing_days_break_windows(self):
+        df = self._hours([10, 20, 30])
+        df = df[df["date"] != "2024-07-02"]
+        daily = analytics_from_df(df, windows=[2])["daily"]
+
+        self.assertIsNone(daily["2024-07-02"]["temperature_mean"])
+        self.assertIsNone(daily["2024-07-03"]["temperature_mean_2d"])
+
+    def test_empty(self):
+        df = pd.DataFrame(columns=["timestamp", "date", "temperature", "precipitation"])
+        result = analytics_from_df(df)
+        self.assertEqual(result["daily"], {})
+        self.assertEqual(result["heat_waves"], [])
@@ -0,0 +1,38 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from django.test import SimpleTestCase
+
+from services.lazy import _LazyModule, lazy_module
+
+ROOT = Path(__file__).resolve().parents[2]
+HEAVY = ("pandas", "numpy", "openmeteo_requests", "requests_cache")
+
+
+def _loaded_after(code: str):
+    """Heavy modules imported by `code` in a fresh interpreter with Django set up."""
+    script = (f"import django, json, sys; django.setup(); {code}; "
+              f"print(json.dumps([m for m in {HEAVY!r} if m in sys.modules]))")
+    env = {**os.environ, "DJANGO_SETTINGS_MODULE": "project.settings"}
+    proc = subprocess.run([sys.executable, "-c", script], cwd=ROOT, env=env, capture_output=True, text=True,
+                          check=True)
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+class TestLazyImports(SimpleTestCase):
+    def test_boot_paths_do_not_import_heavy_libraries(self):
+        self.assertEqual(_loaded_after("from django.urls import get_resolver; get_resolver().url_patterns"), [])
+        self.assertEqual(_loaded_after("import api.management.commands.loadcitydata"), [])
+        self.assertEqual(_loaded_after("import clients.open_meteo"), [])
+
+    def test_lazy_module(self):
+        self.assertIs(lazy_module("json"), json)  # already imported: the module itself
+
+        stand_in = _LazyModule("colorsys")
+        self.assertEqual(stand_in.rgb_to_hsv(1, 0, 0), (0.0, 1.0, 1.0))
+        self.assertIn("rgb_to_hsv", vars(stand_in))  # cached on the stand-in
+        with self.assertRaises(ModuleNotFoundError):
+            _LazyModule("services.no_such_module").anything
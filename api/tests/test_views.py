@@ -1,6 +1,10 @@
+import gzip
+import json
 from datetime import datetime, timedelta, timezone as pytimezone
 
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 from rest_framework.test import APIClient
 
@@ -82,6 +86,19 @@ class TestWeatherViews(TestCase):
         body = resp.json()
         self.assertIn("detail", body)
 
+    def test_temperature_invalid_tz_returns_400(self):
+        resp = self.client.get(
+            "/api/weather/temperature/",
+            {
+                "city": "Madrid",
+                "start_date": self.start_date.isoformat(),
+                "end_date": self.end_date.isoformat(),
+                "tz": "Europe/Madrid",
+            },
+        )
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn("tz", resp.json())
+
     def test_temperature_ok_returns_200_and_shape(self):
         _insert_dataset(self.city, self.start_date, self.end_date)
 
@@ -109,6 +126,34 @@ class TestWeatherViews(TestCase):
         self.assertIn("hours_above_threshold", temp)
         self.assertIn("hours_below_threshold", temp)
 
+    def test_temperature_fields_limits_response(self):
+        _insert_dataset(self.city, self.start_date, self.end_date)
+
+        resp = self.client.get(
+            "/api/weather/temperature/",
+            {
+                "city": "Madrid",
+                "start_date": self.start_date.isoformat(),
+                "end_date": self.end_date.isoformat(),
+                "fields": "average,max",
+            },
+        )
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(set(resp.json()["temperature"]), {"average", "max"})
+
+    def test_temperature_unknown_field_returns_400(self):
+        resp = self.client.get(
+            "/api/weather/temperature/",
+            {
+                "city": "Madrid",
+                "start_date": self.start_date.isoformat(),
+                "end_date": self.end_date.isoformat(),
+                "fields": "average,total",
+            },
+        )
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn("fields", resp.json())
+
     # -----------------------
     # Precipitation endpoint
     # -----------------------
@@ -157,6 +202,248 @@ class TestWeatherViews(TestCase):
         self.assertIn("max", prec)
         self.assertIn("average", prec)
 
+    def test_precipitation_fields_limits_response(self):
+        _insert_dataset(self.city, self.start_date, self.end_date)
+
+        resp = self.client.get(
+            "/api/weather/precipitation/",
+            {
+                "city": "Madrid",
+                "start_date": self.start_date.isoformat(),
+                "end_date": self.end_date.isoformat(),
+                "fields": "total",
+            },
+        )
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json(), {"precipitation": {"total": 1.0}})
+
+    # -----------------------
+    # Range endpoint
+    # -----------------------
+
+    def test_range_ok_returns_200_and_daily_on_request(self):
+        _insert_dataset(self.city, self.start_date, self.end_date)
+        params = {
+            "city": "Madrid",
+            "start_date": self.start_date.isoformat(),
+            "end_date": self.start_date.isoformat(),
+        }
+
+        resp = self.client.get("/api/weather/range/", params)
+        self.assertEqual(resp.status_code, 200)
+        body = resp.json()
+        self.assertEqual(body["hours"], 2)
+        self.assertNotIn("total_by_day", body["precipitation"])
+
+        resp = self.client.get("/api/weather/range/", {**params, "daily": "true"})
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn(self.start_date.isoformat(), resp.json()["precipitation"]["total_by_day"])
+
+    def test_range_not_covered_returns_404(self):
+        resp = self.client.get(
+            "/api/weather/range/",
+            {
+                "city": "Madrid",
+                "start_date": self.start_date.isoformat(),
+                "end_date": self.end_date.isoformat(),
+            },
+        )
+        self.assertEqual(resp.status_code, 404)
+
+    # -----------------------
+    # Batch endpoint
+    # -----------------------
+
+    def test_batch_returns_results_in_order_with_per_item_errors(self):
+        _insert_dataset(self.city, self.start_date, self.end_date)
+        ok_item = {"city": "Madrid", "start_date": self.start_date.isoformat(), "end_date": self.end_date.isoformat()}
+
+        resp = self.client.post("/api/weather/batch/", {"items": [
+            {**ok_item, "metrics": ["temperature"], "thresholds": {"above": 15, "below": 0}},
+            {**ok_item, "city": "Sevilla"},
+            {"city": "Madrid"},
+            ok_item,
+        ]}, format="json")
+
+        self.assertEqual(resp.status_code, 200)
+        results = resp.json()["results"]
+        self.assertEqual([r["status"] for r in results], [200, 404, 400, 200])
+        self.assertEqual(results[0]["temperature"]["hours_above_threshold"], 1)
+        self.assertNotIn("precipitation", results[0])
+        self.assertIn("detail", results[1])
+        self.assertIn("start_date", results[2]["errors"])
+        self.assertIn("temperature", results[3])
+        self.assertIn("precipitation", results[3])
+
+    def test_batch_loads_each_dataset_once(self):
+        _insert_dataset(self.city, self.start_date, self.end_date)
+        item = {"city": "Madrid", "start_date": self.start_date.isoformat(), "end_date": self.end_date.isoformat()}
+
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.post("/api/weather/batch/", {"items": [item] * 5}, format="json")
+
+        self.assertEqual(resp.status_code, 200)
+        hour_reads = [q for q in ctx.captured_queries if 'FROM "api_weatherhour"' in q["sql"]]
+        dataset_reads = [q for q in ctx.captured_queries if 'FROM "api_weatherdataset"' in q["sql"]]
+        self.assertEqual(len(hour_reads), 1)
+        self.assertEqual(len(dataset_reads), 1)
+
+    def test_batch_rejects_empty_items(self):
+        resp = self.client.post("/api/weather/batch/", {"items": []}, format="json")
+        self.assertEqual(resp.status_code, 400)
+
+    # -----------------------
+    # Compare endpoint
+    # -----------------------
+
+    def test_compare_ok_returns_200_with_one_hours_query(self):
+        _insert_dataset(self.city, self.start_date, self.end_date)
+        paris = City.objects.create(
+            name="Paris", latitude=48.85, longitude=2.35, country_code="FR", country="France", timezone="UTC",
+        )
+        _insert_dataset(paris, self.start_date, self.end_date)
+
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get(
+                "/api/weather/compare/",
+                {
+                    "cities": "Madrid, Paris,Berlin",
+                    "start_date": self.start_date.isoformat(),
+                    "end_date": self.end_date.isoformat(),
+                },
+            )
+
+        self.assertEqual(resp.status_code, 200)
+        body = resp.json()
+        self.assertEqual(sorted(body["cities"]), ["Madrid", "Paris"])
+        self.assertEqual(body["missing"], ["Berlin"])
+        self.assertEqual(len([q for q in ctx.captured_queries if 'FROM "api_weatherhour"' in q["sql"]]), 1)
+
+    def test_compare_missing_cities_returns_400(self):
+        resp = self.client.get(
+            "/api/weather/compare/",
+            {"cities": " , ", "start_date": self.start_date.isoformat(), "end_date": self.end_date.isoformat()},
+        )
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn("cities", resp.json())
+
+    # -----------------------
+    # Distribution endpoint
+    # -----------------------
+
+    def test_distribution_ok_returns_percentiles_and_histogram(self):
+        _insert_dataset(self.city, self.start_date, self.end_date)
+
+        resp = self.client.get("/api/weather/distribution/", {
+            "city": "Madrid",
+            "start_date": self.start_date.isoformat(),
+            "end_date": self.end_date.isoformat(),
+            "percentiles": "0,100",
+            "bin_width": 5,
+        })
+        self.assertEqual(resp.status_code, 200)
+        body = resp.json()
+        self.assertEqual(body["percentiles"], {"p0": 10.0, "p100": 20.0})
+        self.assertEqual(sum(b["count"] for b in body["histogram"]["bins"]), 2)
+
+    def test_distribution_invalid_bin_width_returns_400(self):
+        resp = self.client.get("/api/weather/distribution/", {
+            "city": "Madrid",
+            "start_date": self.start_date.isoformat(),
+            "end_date": self.end_date.isoformat(),
+            "bin_width": 0.7,
+        })
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn("bin_width", resp.json())
+
+    # -----------------------
+    # Analytics endpoint
+    # -----------------------
+
+    def test_analytics_ok_returns_daily_series(self):
+        _insert_dataset(self.city, self.start_date, self.end_date)
+
+        resp = self.client.get("/api/weather/analytics/", {
+            "city": "Madrid",
+            "start_date": self.start_date.isoformat(),
+            "end_date": self.end_date.isoformat(),
+            "windows": "1,2",
+        })
+        self.assertEqual(resp.status_code, 200)
+        body = resp.json()
+        self.assertEqual(body["windows"], [1, 2])
+        first = body["daily"][self.start_date.isoformat()]
+        self.assertEqual(first["temperature_mean"], 15.0)
+        self.assertEqual(first["temperature_mean_1d"], 15.0)
+        self.assertIsNone(first["temperature_mean_2d"])
+        self.assertEqual(first["heating_degree_days"], 3.0)
+        self.assertEqual(body["heat_waves"], [])
+
+    def test_analytics_invalid_windows_returns_400(self):
+        resp = self.client.get("/api/weather/analytics/", {
+            "city": "Madrid",
+            "start_date": self.start_date.isoformat(),
+            "end_date": self.end_date.isoformat(),
+            "windows": "7,abc",
+        })
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn("windows", resp.json())
+
+    # -----------------------
+    # Export endpoint
+    # -----------------------
+
+    def _export(self, output=None, **headers):
+        params = {"city": "Madrid", "start_date": self.start_date.isoformat(), "end_date": self.end_date.isoformat()}
+        if output:
+            params["output"] = output
+        return self.client.get("/api/weather/export/", params, **headers)
+
+    def test_export_csv_streams_rows(self):
+        _insert_dataset(self.city, self.start_date, self.end_date)
+
+        resp = self._export()
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.streaming)
+        self.assertTrue(resp["Content-Type"].startswith("text/csv"))
+        lines = b"".join(resp.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], "timestamp,temperature,precipitation")
+        self.assertEqual(lines[1], f"{self.start_date.isoformat()}T10:00:00Z,10.0,0.0")
+        self.assertEqual(len(lines), 3)
+
+    def test_export_ndjson_gzip(self):
+        _insert_dataset(self.city, self.start_date, self.end_date)
+
+        resp = self._export("ndjson", HTTP_ACCEPT_ENCODING="gzip, deflate")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp["Content-Encoding"], "gzip")
+        rows = [json.loads(line) for line in gzip.decompress(b"".join(resp.streaming_content)).splitlines()]
+        self.assertEqual([r["temperature"] for r in rows], [10.0, 20.0])
+        self.assertEqual(rows[1]["precipitation"], 1.0)
+
+    def test_export_not_gzipped_when_refused(self):
+        _insert_dataset(self.city, self.start_date, self.end_date)
+
+        resp = self._export("csv", HTTP_ACCEPT_ENCODING="gzip;q=0, identity")
+        self.assertEqual(resp.status_code, 200)
+        self.assertFalse(resp.has_header("Content-Encoding"))
+        self.assertTrue(b"".join(resp.streaming_content).startswith(b"timestamp,"))
+
+    def test_export_arrow_stream(self):
+        import pyarrow as pa
+
+        _insert_dataset(self.city, self.start_date, self.end_date)
+
+        resp = self._export("arrow")
+        self.assertEqual(resp.status_code, 200)
+        table = pa.ipc.open_stream(b"".join(resp.streaming_content)).read_all()
+        self.assertEqual(table.column_names, ["timestamp", "temperature", "precipitation"])
+        self.assertEqual(table.column("temperature").to_pylist(), [10.0, 20.0])
+
+    def test_export_not_covered_returns_404(self):
+        resp = self._export()
+        self.assertEqual(resp.status_code, 404)
+
     # -----------------------
     # Summary endpoint
     # -----------------------
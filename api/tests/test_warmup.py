@@ -0,0 +1,81 @@
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+from django.core.cache import cache
+from django.core.signals import request_finished, request_started
+from django.db import close_old_connections
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from api import schema
+from api.models import City
+from api.tests.test_views import _insert_dataset
+from api.warmup import STEPS, warm_up
+from project import gunicorn
+from services.ingest import rebuild_range_index
+from services.queries import _RANGE_INDEX_CACHE
+
+
+class TestWarmUp(TestCase):
+    def setUp(self):
+        # As the test client does: the request signals would close the test transaction's connection
+        for signal in (request_started, request_finished):
+            signal.disconnect(close_old_connections)
+            self.addCleanup(signal.connect, close_old_connections)
+        cache.clear()
+        _RANGE_INDEX_CACHE.clear()
+        schema.get_schema_document.cache_clear()
+        self.addCleanup(schema.get_schema_document.cache_clear)
+
+        today = timezone.localdate()
+        city = City.objects.create(name="Madrid", latitude=40.4168, longitude=-3.7038, country_code="ES",
+                                   country="Spain", timezone="UTC")
+        _insert_dataset(city, today - timedelta(days=10), today - timedelta(days=8))
+        rebuild_range_index(city.datasets.get())
+
+    def test_fills_the_hot_caches(self):
+        timings = warm_up()
+
+        self.assertEqual(list(timings), [name for name, _ in STEPS])
+        self.assertEqual(len(_RANGE_INDEX_CACHE._data), 1)
+        self.assertEqual(schema.get_schema_document.cache_info().currsize, 1)
+        resp = APIClient().get("/api/weather/summary/", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(resp["X-Cache"], "HIT")
+
+    def test_failing_step_is_skipped(self):
+        with patch("api.schema.get_schema_document", side_effect=RuntimeError("boom")), \
+                self.assertLogs("api.warmup", level="ERROR"):
+            timings = warm_up()
+        self.assertNotIn("schema", timings)
+        self.assertIn("summary", timings)
+
+
+class TestGunicornHooks(TestCase):
+    def _worker(self):
+        worker = SimpleNamespace(pid=1234, alive=True, log=MagicMock())
+        gunicorn.post_fork(None, worker)
+        return worker
+
+    def test_recycles_a_worker_over_its_memory_budget(self):
+        worker = self._worker()
+        with patch.object(gunicorn, "MAX_WORKER_RSS", 100 * 2 ** 20), \
+                patch.object(gunicorn, "rss_bytes", return_value=200 * 2 ** 20) as rss:
+            for _ in range(gunicorn.RSS_CHECK_EVERY - 1):
+                gunicorn.post_request(worker, None, {}, None)
+            self.assertTrue(worker.alive)
+            rss.assert_not_called()  # only every RSS_CHECK_EVERY requests
+
+            gunicorn.post_request(worker, None, {}, None)
+        self.assertFalse(worker.alive)
+        worker.log.info.assert_called_once()
+
+    def test_keeps_a_worker_within_its_memory_budget(self):
+        worker = self._worker()
+        with patch.object(gunicorn, "MAX_WORKER_RSS", 100 * 2 ** 20), \
+                patch.object(gunicorn, "rss_bytes", return_value=50 * 2 ** 20):
+            for _ in range(gunicorn.RSS_CHECK_EVERY * 2):
+                gunicorn.post_request(worker, None, {}, None)
+        self.assertTrue(worker.alive)
+        self.assertGreater(gunicorn.rss_bytes(), 0)
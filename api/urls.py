@@ -1,9 +1,53 @@
+from django.conf import settings
 from django.urls import path
 
-from api.views import TemperatureStatsView, PrecipitationStatsView, SummaryStatsView
+from api.views import (
+    TemperatureStatsView,
+    PrecipitationStatsView,
+    SummaryStatsView,
+    RangeStatsView,
+    BatchStatsView,
+    CompareStatsView,
+    ExportView,
+    AnalyticsView,
+    DistributionStatsView,
+)
+from api.async_views import (
+    AsyncTemperatureStatsView,
+    AsyncPrecipitationStatsView,
+    AsyncSummaryStatsView,
+    AsyncRangeStatsView,
+    AsyncBatchStatsView,
+    AsyncCompareStatsView,
+    AsyncAnalyticsView,
+    AsyncDistributionStatsView,
+    AsyncExportView,
+)
 
-urlpatterns = [
+# DRF views (WSGI). Also what the OpenAPI schema is generated from.
+sync_urlpatterns = [
     path("weather/temperature/", TemperatureStatsView.as_view(), name="weather-temperature-stats"),
     path("weather/precipitation/", PrecipitationStatsView.as_view(), name="weather-precipitation-stats"),
+    path("weather/range/", RangeStatsView.as_view(), name="weather-range-stats"),
+    path("weather/batch/", BatchStatsView.as_view(), name="weather-batch-stats"),
+    path("weather/compare/", CompareStatsView.as_view(), name="weather-compare-stats"),
+    path("weather/distribution/", DistributionStatsView.as_view(), name="weather-distribution-stats"),
+    path("weather/analytics/", AnalyticsView.as_view(), name="weather-analytics"),
+    path("weather/export/", ExportView.as_view(), name="weather-export"),
     path("weather/summary/", SummaryStatsView.as_view(), name="weather-summary-stats"),
-]
\ No newline at end of file
+]
+
+# Same endpoints as native async views, for ASGI deployments (ASYNC_VIEWS=True)
+async_urlpatterns = [
+    path("weather/temperature/", AsyncTemperatureStatsView.as_view(), name="weather-temperature-stats"),
+    path("weather/precipitation/", AsyncPrecipitationStatsView.as_view(), name="weather-precipitation-stats"),
+    path("weather/range/", AsyncRangeStatsView.as_view(), name="weather-range-stats"),
+    path("weather/batch/", AsyncBatchStatsView.as_view(), name="weather-batch-stats"),
+    path("weather/compare/", AsyncCompareStatsView.as_view(), name="weather-compare-stats"),
+    path("weather/distribution/", AsyncDistributionStatsView.as_view(), name="weather-distribution-stats"),
+    path("weather/analytics/", AsyncAnalyticsView.as_view(), name="weather-analytics"),
+    path("weather/export/", AsyncExportView.as_view(), name="weather-export"),
+    path("weather/summary/", AsyncSummaryStatsView.as_view(), name="weather-summary-stats"),
+]
+
+urlpatterns = async_urlpatterns if settings.ASYNC_VIEWS else sync_urlpatterns
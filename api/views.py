@@ -1,19 +1,55 @@
+from django.http import StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_sequence, slugify
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from api.query_budget import QueryBudget
+from api.response_cache import accepts_encoding
 from api.serializers import (
     TemperatureStatsQuerySerializer,
     PrecipitationStatsQuerySerializer,
     SummaryQuerySerializer,
+    RangeStatsQuerySerializer,
+    BatchStatsRequestSerializer,
+    BatchItemSerializer,
+    CompareStatsQuerySerializer,
+    ExportQuerySerializer,
+    AnalyticsQuerySerializer,
+    DistributionQuerySerializer,
     TemperatureStatsResponseSerializer,
     PrecipitationStatsResponseSerializer,
     SummaryStatsResponseSerializer,
+    RangeStatsResponseSerializer,
+    BatchStatsResponseSerializer,
+    CompareStatsResponseSerializer,
+    AnalyticsResponseSerializer,
+    DistributionResponseSerializer,
 )
+from services.analytics import analytics_stats
 from services.exceptions import DatasetNotFound, InvalidDateRange
-from services.stats import temperature_stats, precipitation_stats, summary_stats
+from services.export import (
+    EXPORT_CONTENT_TYPES,
+    EXPORT_ENCODERS,
+    EXPORT_FORMATS,
+    aiter_chunks,
+    arrow_available,
+    export_rows,
+)
+from services.queries import get_covering_dataset_or_raise
+from services.stats import (
+    temperature_stats,
+    precipitation_stats,
+    summary_stats,
+    range_stats,
+    batch_stats,
+    compare_stats,
+    distribution_stats,
+)
+from services.timing import phase
 
 # -----------------------------
 # Swagger (query parameters)
@@ -60,11 +96,125 @@ BELOW_PARAM = openapi.Parameter(
     description="Temperature threshold (default: 0).",
 )
 
+CITIES_PARAM = openapi.Parameter(
+    name="cities",
+    in_=openapi.IN_QUERY,
+    type=openapi.TYPE_STRING,
+    required=True,
+    description="Comma-separated city names (case-insensitive, max 20). Example: Madrid,Paris",
+)
+
+TZ_PARAM = openapi.Parameter(
+    name="tz",
+    in_=openapi.IN_QUERY,
+    type=openapi.TYPE_STRING,
+    enum=["utc", "local"],
+    required=False,
+    description="Day boundaries: utc (default) or local (the city's timezone, DST-aware).",
+)
+
+TEMPERATURE_FIELDS_PARAM = openapi.Parameter(
+    name="fields",
+    in_=openapi.IN_QUERY,
+    type=openapi.TYPE_STRING,
+    required=False,
+    description=(
+        "Comma-separated subset of: average, average_by_day, max, min, hours_above_threshold, "
+        "hours_below_threshold. Only requested stats are computed (default: all)."
+    ),
+)
+
+PRECIPITATION_FIELDS_PARAM = openapi.Parameter(
+    name="fields",
+    in_=openapi.IN_QUERY,
+    type=openapi.TYPE_STRING,
+    required=False,
+    description=(
+        "Comma-separated subset of: total, total_by_day, days_with_precipitation, max, average. "
+        "Only requested stats are computed (default: all)."
+    ),
+)
+
+DAILY_PARAM = openapi.Parameter(
+    name="daily",
+    in_=openapi.IN_QUERY,
+    type=openapi.TYPE_BOOLEAN,
+    required=False,
+    description="Include average_by_day / total_by_day (default: false).",
+)
+
+WINDOWS_PARAM = openapi.Parameter(
+    name="windows",
+    in_=openapi.IN_QUERY,
+    type=openapi.TYPE_STRING,
+    required=False,
+    description="Comma-separated rolling window lengths in days (default: 7, max 5 windows of 1-366 days).",
+)
+
+HEATING_BASE_PARAM = openapi.Parameter(
+    name="heating_base",
+    in_=openapi.IN_QUERY,
+    type=openapi.TYPE_NUMBER,
+    required=False,
+    description="Base temperature (°C) for heating degree days, against the daily mean (default: 18).",
+)
+
+COOLING_BASE_PARAM = openapi.Parameter(
+    name="cooling_base",
+    in_=openapi.IN_QUERY,
+    type=openapi.TYPE_NUMBER,
+    required=False,
+    description="Base temperature (°C) for cooling degree days, against the daily mean (default: 18).",
+)
+
+HEATWAVE_THRESHOLD_PARAM = openapi.Parameter(
+    name="heatwave_threshold",
+    in_=openapi.IN_QUERY,
+    type=openapi.TYPE_NUMBER,
+    required=False,
+    description="Daily max temperature of a heat-wave day (default: 35).",
+)
+
+HEATWAVE_MIN_DAYS_PARAM = openapi.Parameter(
+    name="heatwave_min_days",
+    in_=openapi.IN_QUERY,
+    type=openapi.TYPE_INTEGER,
+    required=False,
+    description="Minimum consecutive days of a heat wave (default: 3).",
+)
+
+PERCENTILES_PARAM = openapi.Parameter(
+    name="percentiles",
+    in_=openapi.IN_QUERY,
+    type=openapi.TYPE_STRING,
+    required=False,
+    description="Comma-separated percentiles in [0, 100] (default: 5,50,95).",
+)
+
+BIN_WIDTH_PARAM = openapi.Parameter(
+    name="bin_width",
+    in_=openapi.IN_QUERY,
+    type=openapi.TYPE_NUMBER,
+    required=False,
+    description="Histogram bin width in degrees, a multiple of 0.5 (default: 1).",
+)
+
+OUTPUT_PARAM = openapi.Parameter(
+    name="output",
+    in_=openapi.IN_QUERY,
+    type=openapi.TYPE_STRING,
+    enum=list(EXPORT_FORMATS),
+    required=False,
+    description="Export format: csv (default), ndjson or arrow (Arrow IPC stream).",
+)
+
 ERROR_400 = openapi.Response(description="Validation error / invalid date range.")
 ERROR_404 = openapi.Response(description="Dataset not found for the requested city/date range.")
 
 
 class TemperatureStatsView(APIView):
+    query_budget = QueryBudget(queries=3, rows_per_hour=1)
+
     @swagger_auto_schema(
         operation_summary="Temperature statistics",
         operation_description=(
@@ -72,7 +222,9 @@ class TemperatureStatsView(APIView):
                 "Includes min/max, averages, and hours above/below thresholds."
         ),
         tags=["Weather"],
-        manual_parameters=[CITY_PARAM, START_DATE_PARAM, END_DATE_PARAM, ABOVE_PARAM, BELOW_PARAM],
+        manual_parameters=[
+            CITY_PARAM, START_DATE_PARAM, END_DATE_PARAM, ABOVE_PARAM, BELOW_PARAM, TZ_PARAM, TEMPERATURE_FIELDS_PARAM,
+        ],
         responses={
             200: TemperatureStatsResponseSerializer,
             400: ERROR_400,
@@ -91,23 +243,28 @@ class TemperatureStatsView(APIView):
                 end_date=data["end_date"],
                 above=data["above"],
                 below=data["below"],
+                tz=data["tz"],
+                fields=data.get("fields"),
             )
         except InvalidDateRange as e:
             return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except DatasetNotFound as e:
             return Response({"detail": str(e)}, status=status.HTTP_404_NOT_FOUND)
 
-        out_ser = TemperatureStatsResponseSerializer(data=result)
-        out_ser.is_valid(raise_exception=True)
-        return Response(out_ser.data, status=status.HTTP_200_OK)
+        with phase("serialize"):
+            out_ser = TemperatureStatsResponseSerializer(data=result, context={"fields": data.get("fields")})
+            out_ser.is_valid(raise_exception=True)
+            return Response(out_ser.data, status=status.HTTP_200_OK)
 
 
 class PrecipitationStatsView(APIView):
+    query_budget = QueryBudget(queries=3, rows_per_hour=1)
+
     @swagger_auto_schema(
         operation_summary="Precipitation statistics",
         operation_description="Returns aggregated precipitation statistics for a given city and date range.",
         tags=["Weather"],
-        manual_parameters=[CITY_PARAM, START_DATE_PARAM, END_DATE_PARAM],
+        manual_parameters=[CITY_PARAM, START_DATE_PARAM, END_DATE_PARAM, TZ_PARAM, PRECIPITATION_FIELDS_PARAM],
         responses={
             200: PrecipitationStatsResponseSerializer,
             400: ERROR_400,
@@ -124,18 +281,300 @@ class PrecipitationStatsView(APIView):
                 city_name=data["city"],
                 start_date=data["start_date"],
                 end_date=data["end_date"],
+                tz=data["tz"],
+                fields=data.get("fields"),
             )
         except InvalidDateRange as e:
             return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except DatasetNotFound as e:
             return Response({"detail": str(e)}, status=status.HTTP_404_NOT_FOUND)
 
-        out_ser = PrecipitationStatsResponseSerializer(data=result)
-        out_ser.is_valid(raise_exception=True)
-        return Response(out_ser.data, status=status.HTTP_200_OK)
+        with phase("serialize"):
+            out_ser = PrecipitationStatsResponseSerializer(data=result, context={"fields": data.get("fields")})
+            out_ser.is_valid(raise_exception=True)
+            return Response(out_ser.data, status=status.HTTP_200_OK)
+
+
+class RangeStatsView(APIView):
+    query_budget = QueryBudget(queries=3, rows=0)
+
+    @swagger_auto_schema(
+        operation_summary="Sub-range statistics",
+        operation_description=(
+                "Returns temperature and precipitation statistics for any date range contained in a stored "
+                "dataset, answered from the precomputed range index. Daily breakdowns only with daily=true."
+        ),
+        tags=["Weather"],
+        manual_parameters=[CITY_PARAM, START_DATE_PARAM, END_DATE_PARAM, DAILY_PARAM],
+        responses={
+            200: RangeStatsResponseSerializer,
+            400: ERROR_400,
+            404: ERROR_404,
+        },
+    )
+    def get(self, request):
+        in_ser = RangeStatsQuerySerializer(data=request.query_params)
+        in_ser.is_valid(raise_exception=True)
+        data = in_ser.validated_data
+
+        try:
+            result = range_stats(
+                city_name=data["city"],
+                start_date=data["start_date"],
+                end_date=data["end_date"],
+                daily=data["daily"],
+            )
+        except InvalidDateRange as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except DatasetNotFound as e:
+            return Response({"detail": str(e)}, status=status.HTTP_404_NOT_FOUND)
+
+        with phase("serialize"):
+            out_ser = RangeStatsResponseSerializer(data=result)
+            out_ser.is_valid(raise_exception=True)
+            return Response(out_ser.data, status=status.HTTP_200_OK)
+
+
+class BatchStatsView(APIView):
+    query_budget = QueryBudget(queries=4, rows_per_hour=1)
+
+    @swagger_auto_schema(
+        operation_summary="Batch statistics",
+        operation_description=(
+                "Answers many {city, start_date, end_date, metrics, thresholds, tz} items in one request. "
+                "Datasets are resolved once and their hours loaded once, shared by all items and metrics. "
+                "Each result carries its own status; invalid or missing items do not fail the batch."
+        ),
+        tags=["Weather"],
+        request_body=BatchStatsRequestSerializer,
+        responses={
+            200: BatchStatsResponseSerializer,
+            400: ERROR_400,
+        },
+    )
+    def post(self, request):
+        in_ser = BatchStatsRequestSerializer(data=request.data)
+        in_ser.is_valid(raise_exception=True)
+
+        results = [None] * len(in_ser.validated_data["items"])
+        valid_items, valid_positions = [], []
+        for i, raw_item in enumerate(in_ser.validated_data["items"]):
+            item_ser = BatchItemSerializer(data=raw_item)
+            if item_ser.is_valid():
+                valid_items.append(item_ser.validated_data)
+                valid_positions.append(i)
+            else:
+                results[i] = {"status": status.HTTP_400_BAD_REQUEST, "errors": item_ser.errors}
+
+        for i, result in zip(valid_positions, batch_stats(valid_items)):
+            results[i] = result
+
+        with phase("serialize"):
+            out_ser = BatchStatsResponseSerializer(data={"results": results})
+            out_ser.is_valid(raise_exception=True)
+            return Response(out_ser.data, status=status.HTTP_200_OK)
+
+
+class CompareStatsView(APIView):
+    query_budget = QueryBudget(queries=3, rows_per_hour=1)
+
+    @swagger_auto_schema(
+        operation_summary="Multi-city comparison",
+        operation_description=(
+                "Returns temperature and precipitation metrics for several cities over the same date range, "
+                "loaded with one query and computed in one grouped pass. Cities without a dataset for the "
+                "range are listed in 'missing'."
+        ),
+        tags=["Weather"],
+        manual_parameters=[CITIES_PARAM, START_DATE_PARAM, END_DATE_PARAM, ABOVE_PARAM, BELOW_PARAM],
+        responses={
+            200: CompareStatsResponseSerializer,
+            400: ERROR_400,
+            404: ERROR_404,
+        },
+    )
+    def get(self, request):
+        in_ser = CompareStatsQuerySerializer(data=request.query_params)
+        in_ser.is_valid(raise_exception=True)
+        data = in_ser.validated_data
+
+        try:
+            result = compare_stats(
+                city_names=data["cities"],
+                start_date=data["start_date"],
+                end_date=data["end_date"],
+                above=data["above"],
+                below=data["below"],
+            )
+        except InvalidDateRange as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except DatasetNotFound as e:
+            return Response({"detail": str(e)}, status=status.HTTP_404_NOT_FOUND)
+
+        with phase("serialize"):
+            out_ser = CompareStatsResponseSerializer(data=result)
+            out_ser.is_valid(raise_exception=True)
+            return Response(out_ser.data, status=status.HTTP_200_OK)
+
+
+class DistributionStatsView(APIView):
+    query_budget = QueryBudget(queries=3, rows=0)
+
+    @swagger_auto_schema(
+        operation_summary="Temperature percentiles and histogram",
+        operation_description=(
+                "Returns temperature percentiles and a histogram for any date range contained in a stored "
+                "dataset, merged from per-day histograms precomputed at ingest (accurate to 0.5 degrees)."
+        ),
+        tags=["Weather"],
+        manual_parameters=[CITY_PARAM, START_DATE_PARAM, END_DATE_PARAM, PERCENTILES_PARAM, BIN_WIDTH_PARAM],
+        responses={
+            200: DistributionResponseSerializer,
+            400: ERROR_400,
+            404: ERROR_404,
+        },
+    )
+    def get(self, request):
+        in_ser = DistributionQuerySerializer(data=request.query_params)
+        in_ser.is_valid(raise_exception=True)
+        data = in_ser.validated_data
+
+        try:
+            result = distribution_stats(
+                city_name=data["city"],
+                start_date=data["start_date"],
+                end_date=data["end_date"],
+                percentiles=data["percentiles"],
+                bin_width=data["bin_width"],
+            )
+        except InvalidDateRange as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except DatasetNotFound as e:
+            return Response({"detail": str(e)}, status=status.HTTP_404_NOT_FOUND)
+
+        with phase("serialize"):
+            out_ser = DistributionResponseSerializer(data=result)
+            out_ser.is_valid(raise_exception=True)
+            return Response(out_ser.data, status=status.HTTP_200_OK)
+
+
+class AnalyticsView(APIView):
+    query_budget = QueryBudget(queries=3, rows_per_hour=1)
+
+    @swagger_auto_schema(
+        operation_summary="Daily analytics",
+        operation_description=(
+                "Returns per-day series for a given city and date range: daily mean temperature and "
+                "precipitation, rolling means/sums over the requested windows, heating/cooling degree days "
+                "(per day and totals) and heat-wave runs."
+        ),
+        tags=["Weather"],
+        manual_parameters=[
+            CITY_PARAM, START_DATE_PARAM, END_DATE_PARAM, WINDOWS_PARAM, HEATING_BASE_PARAM, COOLING_BASE_PARAM,
+            HEATWAVE_THRESHOLD_PARAM, HEATWAVE_MIN_DAYS_PARAM, TZ_PARAM,
+        ],
+        responses={
+            200: AnalyticsResponseSerializer,
+            400: ERROR_400,
+            404: ERROR_404,
+        },
+    )
+    def get(self, request):
+        in_ser = AnalyticsQuerySerializer(data=request.query_params)
+        in_ser.is_valid(raise_exception=True)
+        data = in_ser.validated_data
+
+        try:
+            result = analytics_stats(
+                city_name=data["city"],
+                start_date=data["start_date"],
+                end_date=data["end_date"],
+                windows=data["windows"],
+                heating_base=data["heating_base"],
+                cooling_base=data["cooling_base"],
+                heatwave_threshold=data["heatwave_threshold"],
+                heatwave_min_days=data["heatwave_min_days"],
+                tz=data["tz"],
+            )
+        except InvalidDateRange as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except DatasetNotFound as e:
+            return Response({"detail": str(e)}, status=status.HTTP_404_NOT_FOUND)
+
+        with phase("serialize"):
+            out_ser = AnalyticsResponseSerializer(data=result)
+            out_ser.is_valid(raise_exception=True)
+            return Response(out_ser.data, status=status.HTTP_200_OK)
+
+
+class ExportView(APIView):
+    query_budget = QueryBudget(queries=1)
+
+    @swagger_auto_schema(
+        operation_summary="Hourly export",
+        operation_description=(
+                "Streams the raw hourly rows (timestamp UTC, temperature, precipitation) of a stored dataset "
+                "for any date range it contains, as CSV, NDJSON or Arrow IPC. Rows are read with a server-side "
+                "cursor in constant memory; gzip-compressed on the fly when the client accepts it."
+        ),
+        tags=["Weather"],
+        manual_parameters=[CITY_PARAM, START_DATE_PARAM, END_DATE_PARAM, OUTPUT_PARAM],
+        responses={
+            200: openapi.Response(description="Streamed file (text/csv, application/x-ndjson or Arrow stream)."),
+            400: ERROR_400,
+            404: ERROR_404,
+        },
+    )
+    def get(self, request):
+        in_ser = ExportQuerySerializer(data=request.query_params)
+        in_ser.is_valid(raise_exception=True)
+        data = in_ser.validated_data
+        output = data["output"]
+
+        if output == "arrow" and not arrow_available():
+            return Response({"detail": "Arrow export requires pyarrow."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            dataset = get_covering_dataset_or_raise(
+                city_name=data["city"],
+                start_date=data["start_date"],
+                end_date=data["end_date"],
+            )
+        except InvalidDateRange as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except DatasetNotFound as e:
+            return Response({"detail": str(e)}, status=status.HTTP_404_NOT_FOUND)
+
+        return export_response(request, dataset, data)
+
+
+def export_response(request, dataset, data, asynchronous=False) -> StreamingHttpResponse:
+    """
+    Streamed export of a dataset for validated ExportQuerySerializer data. `asynchronous` streams it
+    from an async iterator (api.async_views.AsyncExportView).
+    """
+    output = data["output"]
+    chunks = EXPORT_ENCODERS[output](export_rows(dataset, data["start_date"], data["end_date"]))
+    if output != "arrow":
+        chunks = (chunk.encode("utf-8") for chunk in chunks)
+
+    gzip = accepts_encoding(request.META.get("HTTP_ACCEPT_ENCODING", ""), "gzip")
+    if gzip:
+        chunks = compress_sequence(chunks)
+
+    response = StreamingHttpResponse(aiter_chunks(chunks) if asynchronous else chunks,
+                                     content_type=EXPORT_CONTENT_TYPES[output])
+    if gzip:
+        response["Content-Encoding"] = "gzip"
+    patch_vary_headers(response, ("Accept-Encoding",))
+    filename = f"{slugify(dataset.city.name)}_{data['start_date']}_{data['end_date']}.{output}"
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
 
 
 class SummaryStatsView(APIView):
+    query_budget = QueryBudget(queries=3)
+
     @swagger_auto_schema(
         operation_summary="Global summary",
         operation_description="Returns a global summary across all stored datasets.",
@@ -151,6 +590,7 @@ class SummaryStatsView(APIView):
         in_ser.is_valid(raise_exception=True)
 
         result = summary_stats()
-        out_ser = SummaryStatsResponseSerializer(data=result)
-        out_ser.is_valid(raise_exception=True)
-        return Response(out_ser.data, status=status.HTTP_200_OK)
+        with phase("serialize"):
+            out_ser = SummaryStatsResponseSerializer(data=result)
+            out_ser.is_valid(raise_exception=True)
+            return Response(out_ser.data, status=status.HTTP_200_OK)
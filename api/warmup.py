@@ -0,0 +1,108 @@
+"""
+Warm-up of the per-process hot structures before a server process takes traffic.
+
+Run by the gunicorn configuration (project/gunicorn.py): in the master before the workers are
+forked when the app is preloaded, so every worker starts with them already built and shares
+their memory copy-on-write; in each worker after it loads the app otherwise. Steps:
+
+  - urlconf: import the URLconf, views, serializers and services (and pandas/numpy with them)
+  - range_indexes: deserialize the range indexes of the newest datasets into the process cache
+  - schema: load (or generate) the OpenAPI document
+  - summary: serve /api/weather/summary/ once through the full middleware stack, which stores
+    it in the response cache and fills the admission cost cache
+
+A failing step is logged and skipped: warm-up never prevents the server from starting.
+"""
+from __future__ import annotations
+
+import io
+import logging
+import sys
+import time
+from typing import Callable, Dict, List, Tuple
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PATH = "/api/weather/summary/"
+
+
+def _urlconf() -> None:
+    from django.urls import get_resolver
+
+    get_resolver().url_patterns
+
+
+def _range_indexes() -> None:
+    from api.models import WeatherDataset
+    from services.queries import _RANGE_INDEX_CACHE, load_range_index
+
+    datasets = WeatherDataset.objects.select_related("range_index").order_by("-created_at")
+    for dataset in datasets[:_RANGE_INDEX_CACHE.maxsize]:
+        load_range_index(dataset)
+
+
+def _schema() -> None:
+    from api.schema import get_schema_document
+
+    get_schema_document()
+
+
+def _host() -> str:
+    for host in settings.ALLOWED_HOSTS:
+        if host and host != "*":
+            return host.lstrip(".")
+    return "localhost"
+
+
+def wsgi_get(path: str, **headers: str) -> str:
+    """GET `path` through a WSGI handler of this process; returns the status line."""
+    from django.core.handlers.wsgi import WSGIHandler
+
+    host = _host()
+    environ = {
+        "REQUEST_METHOD": "GET", "SCRIPT_NAME": "", "PATH_INFO": path, "QUERY_STRING": "",
+        "SERVER_NAME": host, "SERVER_PORT": "80", "SERVER_PROTOCOL": "HTTP/1.1", "HTTP_HOST": host,
+        "REMOTE_ADDR": "127.0.0.1", "wsgi.version": (1, 0), "wsgi.url_scheme": "http",
+        "wsgi.input": io.BytesIO(), "wsgi.errors": sys.stderr,
+        "wsgi.multithread": False, "wsgi.multiprocess": True, "wsgi.run_once": False,
+        **headers,
+    }
+    statuses: List[str] = []
+    body = WSGIHandler()(environ, lambda status, response_headers, exc_info=None: statuses.append(status))
+    try:
+        for _ in body:
+            pass
+    finally:
+        body.close()  # request_finished: closes the DB connection
+    return statuses[0]
+
+
+def _summary() -> None:
+    status = wsgi_get(SUMMARY_PATH, HTTP_ACCEPT_ENCODING="gzip")
+    if not status.startswith("200"):
+        raise RuntimeError(f"GET {SUMMARY_PATH} answered {status}")
+
+
+STEPS: Tuple[Tuple[str, Callable[[], None]], ...] = (
+    ("urlconf", _urlconf),
+    ("range_indexes", _range_indexes),
+    ("schema", _schema),
+    ("summary", _summary),
+)
+
+
+def warm_up() -> Dict[str, float]:
+    """Run the warm-up steps; returns the milliseconds of those that succeeded."""
+    timings = {}
+    for name, step in STEPS:
+        started = time.perf_counter()
+        try:
+            step()
+        except Exception:  # noqa: BLE001 - never fail the boot
+            logger.exception("Warm-up step %s failed", name)
+            continue
+        timings[name] = round((time.perf_counter() - started) * 1000, 1)
+    logger.info("Warm-up done: %s", ", ".join(f"{name} {ms} ms" for name, ms in timings.items()))
+    return timings
@@ -0,0 +1,73 @@
+"""
+Benchmark the analytics computation (services.analytics.analytics_from_df) on multi-decade
+synthetic hourly series, without touching the database.
+
+Usage:
+    python benchmarks/bench_analytics.py [--years 10 30 50] [--windows 7,30,365] [--repeat 3]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "project.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from services.analytics import analytics_from_df  # noqa: E402
+from services.queries import _day_labels  # noqa: E402
+
+
+def synthetic_hours(years: int, seed: int = 0) -> pd.DataFrame:
+    """Hourly frame shaped like _dataset_hours_to_df output: seasonal + daily cycle + noise."""
+    rng = np.random.default_rng(seed)
+    timestamps = pd.date_range("1970-01-01", periods=years * 8766, freq="h", tz="UTC")
+    hours = np.arange(len(timestamps))
+    seasonal = 15 + 10 * np.sin(2 * np.pi * hours / 8766)
+    daily = 5 * np.sin(2 * np.pi * (hours % 24) / 24)
+    df = pd.DataFrame({
+        "timestamp": timestamps,
+        "temperature": seasonal + daily + rng.normal(0, 3, len(hours)),
+        "precipitation": np.where(rng.random(len(hours)) < 0.08, rng.gamma(1.5, 1.2, len(hours)), 0.0),
+    })
+    df["date"] = _day_labels(df["timestamp"], None)
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--years", type=int, nargs="+", default=[10, 30, 50])
+    parser.add_argument("--windows", type=str, default="7,30,365")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    windows = [int(w) for w in args.windows.split(",")]
+
+    results = []
+    for years in args.years:
+        df = synthetic_hours(years)
+        timings = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            out = analytics_from_df(df, windows=windows)
+            timings.append(time.perf_counter() - started)
+        results.append({
+            "years": years,
+            "hours": len(df),
+            "days": len(out["daily"]),
+            "windows": windows,
+            "best_seconds": round(min(timings), 4),
+            "median_seconds": round(float(np.median(timings)), 4),
+        })
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
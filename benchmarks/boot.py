@@ -0,0 +1,216 @@
+"""
+First-request latency and memory per worker of the gunicorn configuration (project/gunicorn.py),
+cold (no preload, no warm-up: every worker imports and builds everything on its own) against
+warm (preloaded and warmed in the master before forking).
+
+For each variant, gunicorn is started over a seeded SQLite database; once its workers have
+booted, the first request to each endpoint is timed (the one a user hits after a deploy or a
+worker recycle), then --repeat more for the steady-state median. Memory is read from /proc per
+process: RSS counts the pages shared copy-on-write with the master in full, PSS splits them
+between the processes sharing them, so PSS is what each worker really adds (Linux only).
+
+Usage:
+    python benchmarks/boot.py [--cities 5] [--years 2] [--workers 2] [--threads 4] [--repeat 20]
+                              [--db path/to/bench.sqlite3] [--output boot.json]
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timezone as dt_timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+
+VARIANTS = {
+    "cold": {"GUNICORN_PRELOAD": "0", "GUNICORN_WARMUP": "0"},
+    "warm": {"GUNICORN_PRELOAD": "1", "GUNICORN_WARMUP": "1"},
+}
+
+
+def _git(*args):
+    try:
+        return subprocess.run(["git", *args], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _children(pid: int) -> List[int]:
+    children = []
+    for stat in Path("/proc").glob("[0-9]*/stat"):
+        try:
+            fields = stat.read_text().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[1]) == pid:
+            children.append(int(stat.parent.name))
+    return sorted(children)
+
+
+def _memory_kb(pid: int) -> Dict[str, Optional[int]]:
+    """VmRSS and Pss of a process in kB (None when /proc does not have them)."""
+    memory: Dict[str, Optional[int]] = {"rss_kb": None, "pss_kb": None}
+    for name, field, key in (("status", "VmRSS:", "rss_kb"), ("smaps_rollup", "Pss:", "pss_kb")):
+        try:
+            for line in Path(f"/proc/{pid}/{name}").read_text().splitlines():
+                if line.startswith(field):
+                    memory[key] = int(line.split()[1])
+                    break
+        except OSError:
+            pass
+    return memory
+
+
+def _get(port: int, path: str, timeout: float = 60) -> float:
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=timeout)
+    started = time.perf_counter()
+    conn.request("GET", path, headers={"Accept-Encoding": "gzip"})
+    response = conn.getresponse()
+    response.read()
+    elapsed = time.perf_counter() - started
+    conn.close()
+    if response.status != 200:
+        raise SystemExit(f"GET {path} answered {response.status}")
+    return elapsed
+
+
+def _wait_for_workers(proc: subprocess.Popen, port: int, workers: int, timeout: float, log: Path) -> List[int]:
+    """Wait until the master listens and every worker has logged that it booted."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit(f"gunicorn exited with {proc.returncode}:\n{log.read_text()[-3000:]}")
+        pids = _children(proc.pid)
+        booted = log.read_text().count("Booting worker")
+        if len(pids) >= workers and booted >= workers:
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=1).close()
+                return pids
+            except OSError:
+                pass
+        time.sleep(0.05)
+    raise SystemExit(f"gunicorn did not boot {workers} workers in {timeout}s")
+
+
+def run_variant(name: str, args, paths: List[str], env: Dict[str, str]) -> Dict:
+    port = _free_port()
+    log = Path(tempfile.mkstemp(prefix=f"boot-{name}-", suffix=".log")[1])
+    variant_env = {**env, **VARIANTS[name], "GUNICORN_BIND": f"127.0.0.1:{port}",
+                   "GUNICORN_WORKERS": str(args.workers), "GUNICORN_THREADS": str(args.threads)}
+    started = time.perf_counter()
+    with log.open("w") as out:
+        proc = subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", "python:project.gunicorn",
+                                 "project.wsgi:application"], cwd=ROOT, env=variant_env, stdout=out,
+                                stderr=subprocess.STDOUT)
+    try:
+        workers = _wait_for_workers(proc, port, args.workers, args.timeout, log)
+        time.sleep(args.settle)  # cold workers load the app after logging "Booting worker"
+        boot_seconds = time.perf_counter() - started
+
+        endpoints = {}
+        for path in paths:
+            first = _get(port, path)
+            steady = [_get(port, path) for _ in range(args.repeat)]
+            endpoints[path] = {"first_ms": round(first * 1000, 2),
+                               "steady_median_ms": round(statistics.median(steady) * 1000, 2)}
+        memory = {"master": _memory_kb(proc.pid), "workers": [_memory_kb(pid) for pid in workers]}
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        log.unlink()
+
+    worker_pss = [m["pss_kb"] for m in memory["workers"] if m["pss_kb"] is not None]
+    worker_rss = [m["rss_kb"] for m in memory["workers"] if m["rss_kb"] is not None]
+    return {
+        "variant": name,
+        "env": VARIANTS[name],
+        "boot_seconds": round(boot_seconds, 3),
+        "endpoints": endpoints,
+        "memory_kb": memory,
+        "worker_rss_kb_mean": round(statistics.fmean(worker_rss)) if worker_rss else None,
+        "worker_pss_kb_mean": round(statistics.fmean(worker_pss)) if worker_pss else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--cities", type=int, default=5)
+    parser.add_argument("--years", type=int, default=2)
+    parser.add_argument("--end-year", type=int, default=date.today().year - 1)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=20, help="Requests per endpoint after the first")
+    parser.add_argument("--settle", type=float, default=3.0, help="Seconds to wait after the workers booted")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--variants", nargs="+", default=list(VARIANTS), choices=list(VARIANTS))
+    parser.add_argument("--db", type=str, default=None, help="Seeded SQLite file to (re)use (default: temporary)")
+    parser.add_argument("--output", type=str, default=None, help="JSON results file (default: stdout)")
+    args = parser.parse_args()
+
+    tmpdir = tempfile.TemporaryDirectory(prefix="boot-")
+    db = args.db or str(Path(tmpdir.name) / "bench.sqlite3")
+    env = {**os.environ, "DJANGO_SETTINGS_MODULE": "project.settings", "SQLITE_PATH": db, "DJANGO_DEBUG": "0",
+           "METRICS_DIR": str(Path(tmpdir.name) / "metrics"), "PROFILES_DIR": str(Path(tmpdir.name) / "profiles")}
+    manage = [sys.executable, "manage.py"]
+    subprocess.run([*manage, "migrate", "--verbosity", "0"], cwd=ROOT, env=env, check=True)
+    subprocess.run([*manage, "seedsynthetic", "--cities", str(args.cities), "--years", str(args.years),
+                    "--end-year", str(args.end_year)], cwd=ROOT, env=env, check=True, stdout=subprocess.DEVNULL)
+
+    first_year = args.end_year - args.years + 1
+    dataset = f"city=Madrid&start_date={first_year}-01-01&end_date={args.end_year}-12-31"
+    paths = [
+        "/api/weather/summary/",
+        f"/api/weather/temperature/?{dataset}",
+        f"/api/weather/range/?city=Madrid&start_date={args.end_year}-03-01&end_date={args.end_year}-05-31",
+        "/swagger.json",
+    ]
+
+    results = []
+    for name in args.variants:
+        results.append(run_variant(name, args, paths, env))
+        summary = results[-1]
+        print(f"{name}: first requests {[e['first_ms'] for e in summary['endpoints'].values()]} ms, "
+              f"worker PSS {summary['worker_pss_kb_mean']} kB, RSS {summary['worker_rss_kb_mean']} kB",
+              file=sys.stderr)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(dt_timezone.utc).isoformat(timespec="seconds"),
+            "git_commit": _git("rev-parse", "HEAD"),
+            "git_dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "params": {"cities": args.cities, "years": args.years, "workers": args.workers, "threads": args.threads,
+                   "repeat": args.repeat},
+        "variants": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+    tmpdir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
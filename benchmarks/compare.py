@@ -0,0 +1,50 @@
+"""
+Compare two benchmark result files written by benchmarks/run.py (median times).
+
+Usage:
+    python benchmarks/compare.py base.json new.json [--threshold 0.10] [--fail-on-regression]
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+
+def _load(path):
+    report = json.loads(Path(path).read_text(encoding="utf-8"))
+    return report["meta"], {b["name"]: b for b in report["benchmarks"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("base")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative slowdown reported as regression")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Exit with status 1 on regressions")
+    args = parser.parse_args()
+
+    base_meta, base = _load(args.base)
+    new_meta, new = _load(args.new)
+    print(f"base {str(base_meta.get('git_commit'))[:10]}  vs  new {str(new_meta.get('git_commit'))[:10]}")
+    print(f"{'benchmark':32} {'base (s)':>10} {'new (s)':>10} {'change':>8}")
+
+    regressions = []
+    for name in [n for n in base if n in new]:
+        before, after = base[name]["median"], new[name]["median"]
+        change = (after - before) / before if before else 0.0
+        flag = ""
+        if change > args.threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        elif change < -args.threshold:
+            flag = "  faster"
+        print(f"{name:32} {before:10.4f} {after:10.4f} {change:+8.1%}{flag}")
+    for name in sorted(set(base) ^ set(new)):
+        print(f"{name:32} only in {'base' if name in base else 'new'}")
+
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
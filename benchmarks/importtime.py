@@ -0,0 +1,136 @@
+"""
+Startup import cost of manage.py commands and of the WSGI boot, from `python -X importtime`.
+
+Each target runs --repeat times in a fresh interpreter; the time is the sum of the top-level
+cumulative import times (what the process spends importing, not running). The report also lists
+the heavy libraries each target loaded and its slowest top-level imports, so a new eager import
+of pandas/numpy/openmeteo_requests in a hot path shows up by name.
+
+Results use the benchmarks/run.py format, so two runs compare with benchmarks/compare.py:
+    python benchmarks/importtime.py --output base.json
+    # ... changes ...
+    python benchmarks/importtime.py --output new.json
+    python benchmarks/compare.py base.json new.json --threshold 0.10
+
+Usage:
+    python benchmarks/importtime.py [--repeat 5] [--only wsgi] [--output results.json]
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+from datetime import datetime, timezone as dt_timezone
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Loaded lazily by the code: their presence in a boot path is worth flagging
+HEAVY_MODULES = ("pandas", "numpy", "pyarrow", "openmeteo_requests", "requests_cache", "flatbuffers")
+
+_WSGI = "import project.wsgi"
+TARGETS = {
+    "manage.py check": ["manage.py", "check"],
+    "manage.py loadcitydata --help": ["manage.py", "loadcitydata", "--help"],
+    "manage.py seedsynthetic --help": ["manage.py", "seedsynthetic", "--help"],
+    "wsgi boot": ["-c", _WSGI],
+    # What the first request adds on top of the boot: the URLconf, views, serializers and services
+    "wsgi boot + urlconf": ["-c", f"{_WSGI}; from django.urls import get_resolver; get_resolver().url_patterns"],
+}
+
+_LINE_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def _git(*args):
+    try:
+        return subprocess.run(["git", *args], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_importtime(stderr: str) -> Tuple[float, List[Tuple[str, float]], List[str]]:
+    """(total seconds, top-level modules with cumulative seconds, all imported module names)."""
+    total = 0
+    top_level = []
+    modules = []
+    for line in stderr.splitlines():
+        match = _LINE_RE.match(line)
+        if not match:
+            continue
+        cumulative, indent, name = int(match[2]), len(match[3]), match[4]
+        modules.append(name)
+        if indent == 1:
+            total += cumulative
+            top_level.append((name, cumulative / 1e6))
+    return total / 1e6, top_level, modules
+
+
+def measure(argv: List[str], env: Dict[str, str]) -> Tuple[float, List[Tuple[str, float]], List[str]]:
+    proc = subprocess.run([sys.executable, "-X", "importtime", *argv], cwd=ROOT, env=env,
+                          capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise SystemExit(f"{' '.join(argv)} failed:\n{proc.stderr[-2000:]}")
+    return parse_importtime(proc.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="Slowest top-level imports kept per target")
+    parser.add_argument("--only", type=str, nargs="+", default=None, help="Run targets whose name contains any")
+    parser.add_argument("--output", type=str, default=None, help="JSON results file (default: stdout)")
+    args = parser.parse_args()
+
+    env = {**os.environ, "DJANGO_SETTINGS_MODULE": os.environ.get("DJANGO_SETTINGS_MODULE", "project.settings")}
+    results = []
+    for name, argv in TARGETS.items():
+        if args.only and not any(part in name for part in args.only):
+            continue
+        runs, slowest, modules = [], {}, set()
+        for _ in range(args.repeat):
+            total, top_level, imported = measure(argv, env)
+            runs.append(total)
+            modules.update(imported)
+            for module, seconds in top_level:
+                slowest.setdefault(module, []).append(seconds)
+        results.append({
+            "name": f"import: {name}",
+            "command": " ".join(["python", *argv]),
+            "runs": [round(r, 6) for r in runs],
+            "min": round(min(runs), 6),
+            "median": round(statistics.median(runs), 6),
+            "mean": round(statistics.fmean(runs), 6),
+            "stdev": round(statistics.stdev(runs), 6) if len(runs) > 1 else 0.0,
+            "modules": len(modules),
+            "heavy_modules": sorted(m for m in HEAVY_MODULES if m in modules),
+            "slowest": [{"module": module, "median": round(statistics.median(times), 6)}
+                        for module, times in sorted(slowest.items(), key=lambda item: -statistics.median(item[1]))
+                        [:args.top]],
+        })
+        print(f"{name}: median {results[-1]['median']:.4f}s, heavy: {', '.join(results[-1]['heavy_modules']) or '-'}",
+              file=sys.stderr)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(dt_timezone.utc).isoformat(timespec="seconds"),
+            "git_commit": _git("rev-parse", "HEAD"),
+            "git_dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "params": {"repeat": args.repeat},
+        "benchmarks": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+"""
+Load generator for a running instance: a weighted mix of temperature, precipitation and summary
+requests, with Zipf-distributed city popularity and varied range lengths.
+
+The temperature and precipitation endpoints answer stored date ranges only, so the range
+lengths come from the seeded datasets: seed the target with several per city, e.g.
+`python manage.py seedsynthetic --cities 10 --years 3 --ranges 7,30,90,365`. The datasets are
+discovered once from /api/weather/summary/. Each request picks a city by Zipf rank (weight
+1/rank^s, cities in name order), then one of its datasets (range lengths) uniformly.
+
+Workers keep one connection each (closed loop); with --rate, requests follow a fixed schedule
+and latency is measured from the scheduled start, so a slow server is not hidden by workers
+sending less (coordinated omission).
+
+The JSON report has throughput, latency percentiles, error rates and response cache hits,
+overall and per endpoint, to compare worker/thread settings (docker-compose.prod.yml).
+
+Usage:
+    python benchmarks/loadtest.py [--url http://localhost:8000] [--duration 60] [--concurrency 8]
+                                  [--rate 50] [--mix temperature=0.6,precipitation=0.3,summary=0.1]
+                                  [--zipf 1.1] [--label "2x4"] [--output report.json]
+"""
+import argparse
+import http.client
+import json
+import math
+import platform
+import random
+import re
+import statistics
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import date, datetime, timezone as dt_timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlencode, urlsplit
+
+ENDPOINTS = {
+    "temperature": "/api/weather/temperature/",
+    "precipitation": "/api/weather/precipitation/",
+    "summary": "/api/weather/summary/",
+}
+PERCENTILES = (50, 90, 95, 99)
+_SUMMARY_KEY_RE = re.compile(r"^(?P<city>.+) \((?P<start>\d{4}-\d{2}-\d{2})\.\.(?P<end>\d{4}-\d{2}-\d{2})\)$")
+
+
+@dataclass(frozen=True)
+class Dataset:
+    city: str
+    start: date
+    end: date
+
+
+@dataclass
+class Sample:
+    endpoint: str
+    started: float
+    latency: float
+    status: int  # 0: connection error
+    cache: Optional[str] = None
+
+
+@dataclass
+class Plan:
+    cities: List[List[Dataset]]  # datasets per city, in Zipf rank order
+    city_weights: List[float]
+    mix: List[Tuple[str, float]]
+    rng: random.Random = field(default_factory=random.Random)
+
+    def next_request(self) -> Tuple[str, str]:
+        """(endpoint name, path with query string) of a random request."""
+        endpoint = self.rng.choices([name for name, _ in self.mix], [w for _, w in self.mix])[0]
+        if endpoint == "summary":
+            return endpoint, ENDPOINTS[endpoint]
+        dataset = self.rng.choice(self.rng.choices(self.cities, self.city_weights)[0])
+        params = {"city": dataset.city, "start_date": str(dataset.start), "end_date": str(dataset.end)}
+        if endpoint == "temperature" and self.rng.random() < 0.5:
+            params.update(above=self.rng.choice((25, 30, 35)), below=self.rng.choice((-5, 0, 5)))
+        return endpoint, f"{ENDPOINTS[endpoint]}?{urlencode(params)}"
+
+
+def zipf_weights(n: int, s: float) -> List[float]:
+    return [1 / (rank ** s) for rank in range(1, n + 1)]
+
+
+def parse_mix(text: str) -> List[Tuple[str, float]]:
+    mix = []
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise SystemExit(f"Unknown endpoint in --mix: {name!r} (expected {', '.join(ENDPOINTS)})")
+        mix.append((name, float(weight or 1)))
+    return mix
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    k = max(0, math.ceil(p / 100 * len(sorted_values)) - 1)
+    return sorted_values[k]
+
+
+class Connection:
+    """One persistent HTTP connection per worker, reopened after errors or server-side closes."""
+
+    def __init__(self, url: str, timeout: float, gzip: bool):
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port
+        self.https = parts.scheme == "https"
+        self.timeout = timeout
+        self.headers = {"Accept": "application/json", "Accept-Encoding": "gzip" if gzip else "identity"}
+        self.conn = None
+
+    def get(self, path: str) -> Tuple[int, Optional[str], bytes]:
+        if self.conn is None:
+            cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+            self.conn = cls(self.host, self.port, timeout=self.timeout)
+        try:
+            self.conn.request("GET", path, headers=self.headers)
+            response = self.conn.getresponse()
+            body = response.read()
+        except (OSError, http.client.HTTPException):
+            self.close()
+            raise
+        if response.getheader("Connection", "").lower() == "close":
+            self.close()
+        return response.status, response.getheader("X-Cache"), body
+
+    def close(self) -> None:
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+def discover_datasets(url: str, timeout: float) -> List[List[Dataset]]:
+    status, _, body = Connection(url, timeout, gzip=False).get(ENDPOINTS["summary"])
+    if status != 200:
+        raise SystemExit(f"GET {ENDPOINTS['summary']} answered {status}: is the instance up and seeded?")
+    datasets = []
+    for key in json.loads(body):
+        match = _SUMMARY_KEY_RE.match(key)
+        if match:
+            datasets.append(Dataset(match["city"], date.fromisoformat(match["start"]),
+                                    date.fromisoformat(match["end"])))
+    if not datasets:
+        raise SystemExit("No datasets on the target: seed it first (manage.py seedsynthetic).")
+    by_city: Dict[str, List[Dataset]] = {}
+    for ds in datasets:
+        by_city.setdefault(ds.city, []).append(ds)
+    return [by_city[city] for city in sorted(by_city)]
+
+
+def run_load(args, plan: Plan) -> Tuple[List[Sample], float]:
+    samples: List[Sample] = []
+    lock = threading.Lock()
+    sequence = iter(range(sys.maxsize))
+    started = time.perf_counter()
+    warmup_end = started + args.warmup
+    deadline = warmup_end + args.duration
+
+    def worker(seed: int):
+        conn = Connection(args.url, args.timeout, args.gzip)
+        rng = random.Random(seed)
+        local_plan = Plan(plan.cities, plan.city_weights, plan.mix, rng)
+        local = []
+        while True:
+            if args.rate:
+                with lock:
+                    i = next(sequence)
+                scheduled = started + i / args.rate
+                if scheduled >= deadline:
+                    break
+                time.sleep(max(0.0, scheduled - time.perf_counter()))
+            else:
+                scheduled = time.perf_counter()
+                if scheduled >= deadline:
+                    break
+            endpoint, path = local_plan.next_request()
+            try:
+                status, cache, _ = conn.get(path)
+            except (OSError, http.client.HTTPException):
+                status, cache = 0, None
+            if scheduled >= warmup_end:
+                local.append(Sample(endpoint, scheduled, time.perf_counter() - scheduled, status, cache))
+        conn.close()
+        with lock:
+            samples.extend(local)
+
+    threads = [threading.Thread(target=worker, args=(args.seed * 1000 + i,), daemon=True)
+               for i in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - warmup_end
+    return samples, max(elapsed, 1e-9)
+
+
+def summarize(samples: List[Sample], elapsed: float) -> Dict:
+    latencies = sorted(s.latency * 1000 for s in samples)
+    statuses: Dict[str, int] = {}
+    for s in samples:
+        statuses[str(s.status)] = statuses.get(str(s.status), 0) + 1
+    errors = sum(1 for s in samples if s.status == 0 or s.status >= 400)
+    cached = [s.cache for s in samples if s.cache]
+    return {
+        "requests": len(samples),
+        "throughput_rps": round(len(samples) / elapsed, 2),
+        "errors": errors,
+        "error_rate": round(errors / len(samples), 4) if samples else 0.0,
+        "statuses": statuses,
+        "latency_ms": {
+            **{f"p{p}": round(percentile(latencies, p), 2) for p in PERCENTILES},
+            "mean": round(statistics.fmean(latencies), 2) if latencies else 0.0,
+            "max": round(latencies[-1], 2) if latencies else 0.0,
+        },
+        "cache_hit_ratio": round(cached.count("HIT") / len(cached), 4) if cached else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--duration", type=float, default=60, help="Measured seconds (after --warmup)")
+    parser.add_argument("--warmup", type=float, default=5, help="Seconds of load before measuring")
+    parser.add_argument("--concurrency", type=int, default=8, help="Workers (connections)")
+    parser.add_argument("--rate", type=float, default=None, help="Target requests/s (default: as fast as possible)")
+    parser.add_argument("--mix", default="temperature=0.6,precipitation=0.3,summary=0.1")
+    parser.add_argument("--zipf", type=float, default=1.1, help="Zipf exponent of the city popularity")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--no-gzip", dest="gzip", action="store_false", help="Do not send Accept-Encoding: gzip")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--label", default=None, help="Free text stored in the report (e.g. '2 workers x 4')")
+    parser.add_argument("--output", default=None, help="JSON report file (default: stdout)")
+    args = parser.parse_args()
+
+    cities = discover_datasets(args.url, args.timeout)
+    plan = Plan(cities, zipf_weights(len(cities), args.zipf), parse_mix(args.mix))
+    print(f"{len(cities)} cities, {sum(map(len, cities))} datasets; "
+          f"{args.concurrency} workers for {args.warmup}+{args.duration}s", file=sys.stderr)
+
+    samples, elapsed = run_load(args, plan)
+    by_endpoint = {name: summarize([s for s in samples if s.endpoint == name], elapsed)
+                   for name, _ in plan.mix}
+    report = {
+        "meta": {
+            "timestamp": datetime.now(dt_timezone.utc).isoformat(timespec="seconds"),
+            "label": args.label,
+            "url": args.url,
+            "python": platform.python_version(),
+        },
+        "params": {
+            "duration": args.duration, "warmup": args.warmup, "concurrency": args.concurrency, "rate": args.rate,
+            "mix": dict(plan.mix), "zipf": args.zipf, "gzip": args.gzip, "seed": args.seed,
+            "datasets": {datasets[0].city: sorted((ds.end - ds.start).days + 1 for ds in datasets)
+                         for datasets in cities},
+        },
+        "overall": summarize(samples, elapsed),
+        "endpoints": by_endpoint,
+    }
+    overall = report["overall"]
+    print(f"{overall['requests']} requests, {overall['throughput_rps']} req/s, "
+          f"p95 {overall['latency_ms']['p95']} ms, errors {overall['error_rate']:.2%}", file=sys.stderr)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""
+Benchmark suite: stats services, API views end-to-end and loadcitydata ingest, over synthetic
+datasets (services.synthetic) stored in a dedicated SQLite database.
+
+Results are written as JSON (with the git commit and library versions) so runs can be
+compared across commits with benchmarks/compare.py.
+
+Usage:
+    python benchmarks/run.py [--cities 3] [--years 2] [--repeat 5] [--only view] [--output results.json]
+                             [--db path/to/bench.sqlite3]
+
+Without --db a temporary database is created, migrated and seeded on every run; with --db the
+seeded data is reused between runs. The response cache is disabled so the view benchmarks
+measure the actual computation.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timezone as dt_timezone
+from pathlib import Path
+from unittest import mock
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+
+def _git(*args):
+    try:
+        return subprocess.run(["git", *args], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _timed(func, *, repeat, warmup):
+    for _ in range(warmup):
+        func()
+    runs = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        runs.append(time.perf_counter() - started)
+    return {
+        "runs": [round(r, 6) for r in runs],
+        "min": round(min(runs), 6),
+        "median": round(statistics.median(runs), 6),
+        "mean": round(statistics.fmean(runs), 6),
+        "stdev": round(statistics.stdev(runs), 6) if len(runs) > 1 else 0.0,
+    }
+
+
+def build_benchmarks(datasets, end_year):
+    """(name, callable, extra info) for every benchmark, over the first seeded dataset."""
+    from django.core.management import call_command
+    from django.test import Client
+
+    from services.stats import precipitation_stats, summary_stats, temperature_stats
+    from services.synthetic import synthetic_city_weather
+
+    dataset = datasets[0]
+    query = {"city": dataset.city.name, "start_date": str(dataset.start_date), "end_date": str(dataset.end_date)}
+    hours = dataset.hours.count()
+    client = Client(HTTP_HOST="localhost")
+
+    def get(url, params=None):
+        def call():
+            response = client.get(url, params or {})
+            assert response.status_code == 200, (url, response.status_code, response.content[:200])
+        return call
+
+    # One year through the real command, with the Open-Meteo client replaced by synthetic data
+    ingest_start, ingest_end = date(end_year, 1, 1), date(end_year, 12, 31)
+    weather = synthetic_city_weather(0, ingest_start, ingest_end, seed=1)
+    weather["city"] = "Benchmark Ingest"
+
+    def ingest():
+        fake = {**weather, "hourly_data": weather["hourly_data"].copy()}
+        with mock.patch("api.management.commands.loadcitydata.get_city_weather", return_value=fake):
+            call_command("loadcitydata", "Benchmark Ingest", str(ingest_start), str(ingest_end), "--replace",
+                         stdout=io.StringIO())
+
+    return [
+        ("service.temperature_stats", lambda: temperature_stats(city_name=query["city"],
+                                                                start_date=dataset.start_date,
+                                                                end_date=dataset.end_date), {"hours": hours}),
+        ("service.precipitation_stats", lambda: precipitation_stats(city_name=query["city"],
+                                                                    start_date=dataset.start_date,
+                                                                    end_date=dataset.end_date), {"hours": hours}),
+        ("service.summary_stats", summary_stats, {"datasets": len(datasets)}),
+        ("view.temperature", get("/api/weather/temperature/", query), {"hours": hours}),
+        ("view.precipitation", get("/api/weather/precipitation/", query), {"hours": hours}),
+        ("view.summary", get("/api/weather/summary/"), {"datasets": len(datasets)}),
+        ("ingest.loadcitydata", ingest, {"hours": len(weather["hourly_data"])}),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--cities", type=int, default=3)
+    parser.add_argument("--years", type=int, default=2)
+    parser.add_argument("--end-year", type=int, default=date.today().year - 1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--only", type=str, nargs="+", default=None, help="Run benchmarks whose name contains any")
+    parser.add_argument("--db", type=str, default=None, help="SQLite file to (re)use (default: temporary)")
+    parser.add_argument("--output", type=str, default=None, help="JSON results file (default: stdout)")
+    args = parser.parse_args()
+
+    tmpdir = None
+    if args.db is None:
+        tmpdir = tempfile.TemporaryDirectory(prefix="bench-")
+        args.db = str(Path(tmpdir.name) / "bench.sqlite3")
+    os.environ["SQLITE_PATH"] = args.db
+    # The benchmarked requests and ingests count metrics: keep them out of log/metrics
+    metrics_dir = tempfile.TemporaryDirectory(prefix="bench-metrics-")
+    os.environ["METRICS_DIR"] = metrics_dir.name
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "project.settings")
+    os.environ["DJANGO_RESPONSE_CACHE"] = "0"
+
+    import django
+
+    django.setup()
+
+    import numpy as np
+    import pandas as pd
+    from django.core.management import call_command
+
+    from services.synthetic import seed_synthetic_data
+
+    call_command("migrate", verbosity=0)
+    started = time.perf_counter()
+    datasets = seed_synthetic_data(cities=args.cities, years=args.years, end_year=args.end_year, seed=args.seed)
+    seed_seconds = time.perf_counter() - started
+
+    results = []
+    for name, func, info in build_benchmarks(datasets, args.end_year):
+        if args.only and not any(part in name for part in args.only):
+            continue
+        results.append({"name": name, **info, **_timed(func, repeat=args.repeat, warmup=args.warmup)})
+        print(f"{name}: median {results[-1]['median']:.4f}s", file=sys.stderr)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(dt_timezone.utc).isoformat(timespec="seconds"),
+            "git_commit": _git("rev-parse", "HEAD"),
+            "git_dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "params": {"cities": args.cities, "years": args.years, "end_year": args.end_year, "seed": args.seed,
+                   "repeat": args.repeat, "warmup": args.warmup, "seed_seconds": round(seed_seconds, 3)},
+        "benchmarks": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+    if tmpdir is not None:
+        tmpdir.cleanup()
+    from services import metrics
+
+    metrics.reset()  # nothing left to write at exit into the removed directory
+    metrics_dir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
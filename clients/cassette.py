@@ -0,0 +1,84 @@
+"""
+Record/replay of the Open-Meteo HTTP traffic, so ingest can run and be tested without the network.
+
+CassetteSession wraps the client session (it only needs `get`). In "record" mode every response
+is passed through and stored; in "replay" mode responses are served from the stored files and a
+request that was never recorded raises CassetteMiss instead of reaching the network.
+
+One JSON file per request in the cassette directory, named by the SHA-256 of the normalized
+request (method, URL and query parameters, see clients.http_cache.normalize_url): status, headers, the prepared URL (for
+humans) and the base64 body (archive responses are binary FlatBuffers).
+"""
+from __future__ import annotations
+
+import base64
+import hashlib
+import json
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from clients.http_cache import normalize_url
+
+MODES = ("live", "record", "replay")
+_KEPT_HEADERS = ("Content-Type",)
+
+
+class CassetteMiss(LookupError):
+    """Replay mode and no recorded response for the request."""
+
+
+def _normalized_url(url: str, params: Optional[Dict[str, Any]]) -> str:
+    # Same normalization as the HTTP cache keys: the order of repeated values is kept
+    return normalize_url(requests.Request("GET", url, params=params).prepare().url)
+
+
+class CassetteSession:
+    def __init__(self, session, directory: str, mode: str):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown cassette mode {mode!r} (expected 'record' or 'replay').")
+        self.session = session
+        self.directory = Path(directory)
+        self.mode = mode
+
+    def _path(self, method: str, url: str) -> Path:
+        return self.directory / f"{hashlib.sha256(f'{method} {url}'.encode('utf-8')).hexdigest()}.json"
+
+    def get(self, url: str, params: Optional[Dict[str, Any]] = None, **kwargs) -> requests.Response:
+        normalized = _normalized_url(url, params)
+        path = self._path("GET", normalized)
+        if self.mode == "replay":
+            return self._load(path, normalized)
+
+        response = self.session.get(url, params=params, **kwargs)
+        if response.status_code < 500:  # server errors are transient: never replay them
+            self._store(path, normalized, response)
+        return response
+
+    def _store(self, path: Path, url: str, response: requests.Response) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps({
+            "method": "GET",
+            "url": url,
+            "status": response.status_code,
+            "headers": {h: response.headers[h] for h in _KEPT_HEADERS if h in response.headers},
+            "body": base64.b64encode(response.content).decode("ascii"),
+        }, indent=1), encoding="utf-8")
+
+    def _load(self, path: Path, url: str) -> requests.Response:
+        try:
+            entry = json.loads(path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            raise CassetteMiss(f"No recorded response for GET {url} in {self.directory}") from None
+        response = requests.Response()
+        response.status_code = entry["status"]
+        response.headers = CaseInsensitiveDict(entry["headers"])
+        response._content = base64.b64decode(entry["body"])
+        response.url = entry["url"]
+        response.encoding = "utf-8"
+        return response
+
+    def close(self) -> None:
+        self.session.close()
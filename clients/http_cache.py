@@ -0,0 +1,340 @@
+"""
+Bounded HTTP response cache of the Open-Meteo client.
+
+BoundedCachedSession is a requests_cache session with one policy per kind of request
+("archive", "geocoding", told apart by URL prefix): how long its responses stay fresh and how
+many bytes of them are kept. Past that budget, the least recently used responses of the kind
+are evicted. Access times and sizes, a running byte total per kind and the hit/miss/eviction
+counters live in LruIndex, two tables next to the responses (in the same SQLite file, for the
+sqlite backend), so recency and statistics survive across runs and are shared by the processes
+using the cache; `manage.py openmeteocache` shows them.
+
+Cache keys come from cache_key(): query parameters are ordered by name, but the values of a
+repeated (or comma-separated) parameter keep their order, since Open-Meteo returns variables in
+the order requested; numbers are written canonically (40.41680 and 40.4168 hit the same entry).
+requests_cache's default key sorts the (name, value) pairs, so `hourly=a&hourly=b` and
+`hourly=b&hourly=a` would share an entry.
+
+Configuration (environment, see CacheConfig.from_env):
+  OPEN_METEO_CACHE_BACKEND            sqlite (default), filesystem, memory or none
+  OPEN_METEO_CACHE_PATH               cache location (default: cache/open_meteo in the project)
+  OPEN_METEO_CACHE_ARCHIVE_MB         archive budget (default 256)
+  OPEN_METEO_CACHE_ARCHIVE_EXPIRE     seconds, -1 = never (default: never, past weather is final)
+  OPEN_METEO_CACHE_GEOCODING_MB       geocoding budget (default 8)
+  OPEN_METEO_CACHE_GEOCODING_EXPIRE   seconds (default 30 days)
+"""
+from __future__ import annotations
+
+import contextlib
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests_cache
+
+BACKENDS = ("sqlite", "filesystem", "memory", "none")
+DEFAULT_LOCATION = Path(__file__).resolve().parent.parent / "cache" / "open_meteo"
+
+# Parameters Open-Meteo accepts both repeated and comma-separated
+_LIST_PARAMS = frozenset({"hourly", "daily", "current", "minutely_15", "models"})
+_NUMBER = re.compile(r"^[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?$")
+_COUNTERS = ("hits", "misses", "evictions")
+
+
+@dataclass(frozen=True)
+class CachePolicy:
+    expire_after: int  # seconds; -1: never expires
+    max_bytes: int  # response bodies kept; 0: unbounded
+
+
+@dataclass(frozen=True)
+class CacheConfig:
+    backend: str = "sqlite"
+    location: str = str(DEFAULT_LOCATION)
+    policies: Dict[str, CachePolicy] = field(default_factory=dict)
+
+    @classmethod
+    def from_env(cls) -> "CacheConfig":
+        backend = os.environ.get("OPEN_METEO_CACHE_BACKEND", "sqlite")
+        if backend not in BACKENDS:
+            raise ValueError(f"OPEN_METEO_CACHE_BACKEND must be one of {', '.join(BACKENDS)}, not {backend!r}.")
+
+        def policy(kind: str, megabytes: int, expire_after: int) -> CachePolicy:
+            prefix = f"OPEN_METEO_CACHE_{kind.upper()}"
+            return CachePolicy(expire_after=int(os.environ.get(f"{prefix}_EXPIRE") or expire_after),
+                               max_bytes=int(float(os.environ.get(f"{prefix}_MB") or megabytes) * 2 ** 20))
+
+        return cls(
+            backend=backend,
+            location=os.environ.get("OPEN_METEO_CACHE_PATH") or str(DEFAULT_LOCATION),
+            policies={"archive": policy("archive", 256, -1), "geocoding": policy("geocoding", 8, 30 * 86400)},
+        )
+
+
+# -----------------------
+# Cache keys
+# -----------------------
+
+def _canonical(value: str) -> str:
+    if _NUMBER.match(value):
+        number = float(value)
+        return str(int(number)) if number.is_integer() and abs(number) < 2 ** 53 else repr(number)
+    return value
+
+
+def normalize_url(url: str) -> str:
+    """`url` with its query parameters ordered by name (values of each name in their order)."""
+    parts = urlsplit(url)
+    params: List[Tuple[str, str]] = []
+    for name, value in parse_qsl(parts.query, keep_blank_values=True):
+        values = value.split(",") if name in _LIST_PARAMS else [value]
+        params.extend((name, _canonical(v.strip())) for v in values)
+    params.sort(key=lambda item: item[0])  # stable: repeated values keep their order
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, urlencode(params), ""))
+
+
+def cache_key(request, serializer: Any = None, **kwargs) -> str:
+    """key_fn for requests_cache: method, normalized URL and body."""
+    body = request.body or b""
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    digest = hashlib.blake2b(digest_size=8)
+    for part in ((request.method or "GET").encode("ascii"), normalize_url(request.url).encode("utf-8"), body,
+                 str(serializer).encode("utf-8")):
+        digest.update(part)
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _bare(url: str) -> str:
+    return url.split("://", 1)[-1]
+
+
+# -----------------------
+# LRU index
+# -----------------------
+
+class LruIndex:
+    """
+    Size and last access of every cached response, plus per kind a running byte total and the
+    hit/miss/eviction counters, in SQLite. Each update is a single statement or transaction, so
+    processes sharing the cache keep consistent totals, and checking a budget reads one row.
+    """
+
+    def __init__(self, path: str):
+        self._db = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS lru_entries (
+                key TEXT PRIMARY KEY, kind TEXT NOT NULL, bytes INTEGER NOT NULL, atime REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS lru_entries_kind_atime ON lru_entries (kind, atime);
+            CREATE TABLE IF NOT EXISTS lru_stats (
+                kind TEXT PRIMARY KEY, bytes INTEGER NOT NULL DEFAULT 0, hits INTEGER NOT NULL DEFAULT 0,
+                misses INTEGER NOT NULL DEFAULT 0, evictions INTEGER NOT NULL DEFAULT 0
+            );
+        """)
+
+    @contextlib.contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            yield self._db
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        self._db.execute("COMMIT")
+
+    def count(self, kind: str, counter: str, n: int = 1) -> None:
+        if counter not in _COUNTERS:
+            raise ValueError(f"Unknown counter {counter!r}")
+        self._db.execute(f"INSERT INTO lru_stats (kind, {counter}) VALUES (?, ?) "
+                         f"ON CONFLICT (kind) DO UPDATE SET {counter} = {counter} + excluded.{counter}", (kind, n))
+
+    def touch(self, key: str, kind: str, size: int) -> None:
+        """Record an access to `key` (size `size`), keeping the byte total of its kind."""
+        now = time.time()
+        if self._db.execute("UPDATE lru_entries SET atime = ? WHERE key = ? AND kind = ? AND bytes = ?",
+                            (now, key, kind, size)).rowcount:
+            return  # the usual hit: same response, newer access
+        with self._transaction() as db:
+            old = db.execute("SELECT kind, bytes FROM lru_entries WHERE key = ?", (key,)).fetchone()
+            if old is not None:
+                db.execute("UPDATE lru_stats SET bytes = bytes - ? WHERE kind = ?", (old[1], old[0]))
+            db.execute("INSERT INTO lru_entries (key, kind, bytes, atime) VALUES (?, ?, ?, ?) "
+                       "ON CONFLICT (key) DO UPDATE SET kind = excluded.kind, bytes = excluded.bytes, "
+                       "atime = excluded.atime", (key, kind, size, now))
+            db.execute("INSERT INTO lru_stats (kind, bytes) VALUES (?, ?) "
+                       "ON CONFLICT (kind) DO UPDATE SET bytes = bytes + excluded.bytes", (kind, size))
+
+    def evict(self, kind: str, max_bytes: int) -> List[str]:
+        """Drop the least recently used entries of `kind` until it fits `max_bytes`; returns their keys."""
+        with self._transaction() as db:
+            row = db.execute("SELECT bytes FROM lru_stats WHERE kind = ?", (kind,)).fetchone()
+            total = row[0] if row else 0
+            if total <= max_bytes:
+                return []
+            evicted, freed = [], 0
+            for key, size in db.execute("SELECT key, bytes FROM lru_entries WHERE kind = ? ORDER BY atime",
+                                        (kind,)):
+                if total - freed <= max_bytes:
+                    break
+                evicted.append(key)
+                freed += size
+            db.executemany("DELETE FROM lru_entries WHERE key = ?", [(key,) for key in evicted])
+            db.execute("UPDATE lru_stats SET bytes = bytes - ?, evictions = evictions + ? WHERE kind = ?",
+                       (freed, len(evicted), kind))
+            return evicted
+
+    def keys(self) -> Set[str]:
+        return {key for key, in self._db.execute("SELECT key FROM lru_entries")}
+
+    def forget(self, keys: Iterable[str]) -> None:
+        with self._transaction() as db:
+            db.executemany("DELETE FROM lru_entries WHERE key = ?", [(key,) for key in keys])
+
+    def recount(self) -> None:
+        """Recompute the byte totals from the entries (after entries were dropped or added in bulk)."""
+        with self._transaction() as db:
+            db.execute("INSERT OR IGNORE INTO lru_stats (kind) SELECT DISTINCT kind FROM lru_entries")
+            db.execute("UPDATE lru_stats SET bytes = "
+                       "(SELECT COALESCE(SUM(bytes), 0) FROM lru_entries WHERE lru_entries.kind = lru_stats.kind)")
+
+    def summary(self) -> Dict[str, Dict[str, int]]:
+        """Per kind: entries, bytes and the counters."""
+        out = {kind: {"entries": 0, "bytes": total, "hits": hits, "misses": misses, "evictions": evictions}
+               for kind, total, hits, misses, evictions
+               in self._db.execute("SELECT kind, bytes, hits, misses, evictions FROM lru_stats")}
+        for kind, n in self._db.execute("SELECT kind, COUNT(*) FROM lru_entries GROUP BY kind"):
+            out.setdefault(kind, {"entries": 0, "bytes": 0, "hits": 0, "misses": 0, "evictions": 0})["entries"] = n
+        return out
+
+    def clear(self) -> None:
+        with self._transaction() as db:
+            db.execute("DELETE FROM lru_entries")
+            db.execute("DELETE FROM lru_stats")
+
+    def close(self) -> None:
+        self._db.close()
+
+
+# -----------------------
+# Session
+# -----------------------
+
+class BoundedCachedSession(requests_cache.CachedSession):
+    """
+    CachedSession with per-kind expiry and byte budgets (LRU eviction). `kinds` maps a URL
+    prefix to its kind; requests to other URLs are cached without a budget.
+    """
+
+    def __init__(self, config: CacheConfig, kinds: Dict[str, str]):
+        self.config = config
+        self.kinds = {_bare(prefix): kind for prefix, kind in kinds.items()}
+        super().__init__(
+            cache_name=config.location,
+            backend=config.backend,
+            expire_after=-1,
+            urls_expire_after={prefix: config.policies[kind].expire_after
+                               for prefix, kind in self.kinds.items() if kind in config.policies},
+            key_fn=cache_key,
+        )
+        self.index = LruIndex(self._index_path())
+        self._index_lock = threading.Lock()  # one index connection per session, shared by its threads
+
+    def _index_path(self) -> str:
+        from requests_cache.backends.filesystem import FileCache
+        from requests_cache.backends.sqlite import SQLiteCache
+
+        if isinstance(self.cache, SQLiteCache):
+            return str(self.cache.db_path)
+        if isinstance(self.cache, FileCache):
+            return str(Path(self.cache.cache_dir) / "lru_index.sqlite")
+        return ":memory:"
+
+    def kind_of(self, url: str) -> Optional[str]:
+        bare = _bare(url)
+        for prefix, kind in self.kinds.items():
+            if bare.startswith(prefix):
+                return kind
+        return None
+
+    def send(self, request, **kwargs):
+        response = super().send(request, **kwargs)
+        kind = self.kind_of(request.url)
+        key = getattr(response, "cache_key", None)
+        if kind is None or key is None:
+            return response
+        with self._index_lock:
+            if getattr(response, "from_cache", False):
+                self.index.count(kind, "hits")
+                self.index.touch(key, kind, len(response.content))
+            else:
+                self.index.count(kind, "misses")
+                if self.cache.contains(key):  # stored (not an error, not filtered out)
+                    self.index.touch(key, kind, len(response.content))
+                    self._evict(kind)
+        return response
+
+    def _evict(self, kind: str) -> int:
+        policy = self.config.policies.get(kind)
+        if policy is None or not policy.max_bytes:
+            return 0
+        evicted = self.index.evict(kind, policy.max_bytes)
+        if evicted:
+            self.cache.delete(*evicted)
+        return len(evicted)
+
+    def prune(self) -> Dict[str, int]:
+        """
+        Drop expired responses, index the responses the index does not know (written by an
+        older version or another tool, as used now), forget index entries whose response is gone,
+        and evict every kind down to its budget. Returns the evictions per kind.
+        """
+        with self._index_lock:
+            self.cache.delete(expired=True)
+            stored = set(self.cache.responses.keys())
+            known = self.index.keys()
+            self.index.forget(known - stored)
+            for key in stored - known:
+                response = self.cache.responses.get(key)
+                kind = self.kind_of(response.url) if response is not None else None
+                if kind is not None:
+                    self.index.touch(key, kind, len(response.content))
+            self.index.recount()
+            return {kind: self._evict(kind) for kind in self.config.policies}
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Per kind: entries, bytes, budget and the hit/miss/eviction counters."""
+        with self._index_lock:
+            summary = self.index.summary()
+        stats = {}
+        for kind, policy in self.config.policies.items():
+            s = summary.get(kind, {"entries": 0, "bytes": 0, "hits": 0, "misses": 0, "evictions": 0})
+            lookups = s["hits"] + s["misses"]
+            stats[kind] = {
+                "entries": s["entries"],
+                "bytes": s["bytes"],
+                "max_bytes": policy.max_bytes,
+                "expire_after": policy.expire_after,
+                **{counter: s[counter] for counter in _COUNTERS},
+                "hit_ratio": round(s["hits"] / lookups, 4) if lookups else None,
+            }
+        return stats
+
+    def clear(self) -> None:
+        """Delete every response, the index and its counters."""
+        with self._index_lock:
+            self.cache.clear()
+            self.index.clear()
+
+    def close(self) -> None:
+        super().close()
+        with self._index_lock:
+            self.index.close()
@@ -1,15 +1,107 @@
-import openmeteo_requests
-import pandas as pd
-import requests_cache
-from retry_requests import retry
+"""
+Open-Meteo archive and geocoding client.
 
-# Setup session with caching and retries
-cache_session = requests_cache.CachedSession('.cache', expire_after=-1)
-session = retry(cache_session, retries=5, backoff_factor=0.2)
+Importing this module is cheap and has no side effects: openmeteo_requests, pandas and the
+HTTP session (with its response cache, clients/http_cache.py) are only loaded on the first request.
+
+Ingest telemetry goes through services.timing: the "geocode", "fetch" and "transform" phases
+and the http_bytes / http_cache_hits / http_cache_misses counters are recorded when a recorder
+is bound (e.g. `loadcitydata -v 2`), and cost a context variable lookup otherwise.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import threading
+from typing import TYPE_CHECKING
+
+from services import timing
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Base URLs, overridable to point at a local stand-in (clients/open_meteo_standin.py)
+ARCHIVE_URL = "https://archive-api.open-meteo.com/v1/archive"
+GEOCODING_URL = "https://geocoding-api.open-meteo.com/v1/search"
+
+logger = logging.getLogger(__name__)
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def archive_url() -> str:
+    return os.environ.get("OPEN_METEO_ARCHIVE_URL", ARCHIVE_URL)
+
+
+def geocoding_url() -> str:
+    return os.environ.get("OPEN_METEO_GEOCODING_URL", GEOCODING_URL)
+
+
+def cache_kinds() -> dict:
+    """URL prefix -> HTTP cache policy (clients/http_cache.py)."""
+    return {archive_url(): "archive", geocoding_url(): "geocoding"}
+
+
+def _build_session():
+    import requests
+    from retry_requests import retry
+
+    from clients.cassette import MODES, CassetteSession
+    from clients.http_cache import BoundedCachedSession, CacheConfig
+
+    # Setup session with caching (clients/http_cache.py, OPEN_METEO_CACHE_* settings) and retries
+    config = CacheConfig.from_env()
+    if config.backend == "none":
+        cache_session = requests.Session()
+    else:
+        cache_session = BoundedCachedSession(config, cache_kinds())
+    session = retry(cache_session, retries=5, backoff_factor=0.2)
+
+    # OPEN_METEO_MODE=record stores every response in OPEN_METEO_CASSETTE_DIR, =replay serves them back offline
+    mode = os.environ.get("OPEN_METEO_MODE", "live")
+    if mode not in MODES:
+        raise ValueError(f"OPEN_METEO_MODE must be one of {', '.join(MODES)}, not {mode!r}.")
+    if mode != "live":
+        session = CassetteSession(session, os.environ.get("OPEN_METEO_CASSETTE_DIR", "cassettes/open_meteo"), mode)
+    return session
+
+
+def get_session():
+    """The shared HTTP session, created on first use."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+
+class _CountingSession:
+    """Adds the size and HTTP cache status of every response to the current recorder."""
+
+    def __init__(self, session, recorder: timing.PhaseRecorder):
+        self.session = session
+        self.recorder = recorder
+
+    def get(self, url, **kwargs):
+        response = self.session.get(url, **kwargs)
+        self.recorder.count("http_bytes", len(response.content))
+        # requests_cache marks cached responses; plain and replayed ones are misses
+        self.recorder.count("http_cache_hits" if getattr(response, "from_cache", False) else "http_cache_misses")
+        return response
+
+
+def _http():
+    recorder = timing.current_recorder()
+    return get_session() if recorder is None else _CountingSession(get_session(), recorder)
 
 
 def archive(latitude: float, longitude: float, start_date: str, end_date: str) -> pd.DataFrame:
-    url = "https://archive-api.open-meteo.com/v1/archive"
+    import openmeteo_requests
+    import pandas as pd
+
+    url = archive_url()
     if not latitude or not longitude:
         raise ValueError("Latitude and longitude are required.")
     if not start_date or not end_date:
@@ -21,32 +113,33 @@ def archive(latitude: float, longitude: float, start_date: str, end_date: str) -
         "end_date": end_date,
         "hourly": ["precipitation", "temperature_2m"],
     }
-    responses = openmeteo_requests.Client(session=session).weather_api(url, params=params)
+    with timing.phase("fetch"):
+        responses = openmeteo_requests.Client(session=_http()).weather_api(url, params=params)
     # Process first location. Add a for-loop for multiple locations or weather models
     response = responses[0]
-    print(f"Coordinates: {response.Latitude()}°N {response.Longitude()}°E")
-    print(f"Elevation: {response.Elevation()} m asl")
-    print(f"Timezone difference to GMT+0: {response.UtcOffsetSeconds()}s")
-    # Process hourly data. The order of variables needs to be the same as requested.
-    hourly = response.Hourly()
-    hourly_precipitation = hourly.Variables(0).ValuesAsNumpy()
-    hourly_temperature_2m = hourly.Variables(1).ValuesAsNumpy()
-    hourly_data = {"date": pd.date_range(
-        start=pd.to_datetime(hourly.Time(), unit="s", utc=True),
-        end=pd.to_datetime(hourly.TimeEnd(), unit="s", utc=True),
-        freq=pd.Timedelta(seconds=hourly.Interval()),
-        inclusive="left"
-    )}
-    hourly_data["precipitation"] = hourly_precipitation
-    hourly_data["temperature_2m"] = hourly_temperature_2m
-
-    hourly_dataframe = pd.DataFrame(data=hourly_data)
-    print("\nHourly data\n", hourly_dataframe)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Archive response for %s°N %s°E (elevation %s m, UTC offset %ss)", response.Latitude(),
+                     response.Longitude(), response.Elevation(), response.UtcOffsetSeconds())
+    with timing.phase("transform"):
+        # Process hourly data. The order of variables needs to be the same as requested.
+        hourly = response.Hourly()
+        hourly_precipitation = hourly.Variables(0).ValuesAsNumpy()
+        hourly_temperature_2m = hourly.Variables(1).ValuesAsNumpy()
+        hourly_data = {"date": pd.date_range(
+            start=pd.to_datetime(hourly.Time(), unit="s", utc=True),
+            end=pd.to_datetime(hourly.TimeEnd(), unit="s", utc=True),
+            freq=pd.Timedelta(seconds=hourly.Interval()),
+            inclusive="left"
+        )}
+        hourly_data["precipitation"] = hourly_precipitation
+        hourly_data["temperature_2m"] = hourly_temperature_2m
+
+        hourly_dataframe = pd.DataFrame(data=hourly_data)
     return hourly_dataframe
 
 
 def geocode(name, countryCode: str = None, language: str = 'EN', count: int = 10) -> dict:
-    url = "https://geocoding-api.open-meteo.com/v1/search"
+    url = geocoding_url()
     params = {
         "name": name,
         "language": language,
@@ -55,9 +148,10 @@ def geocode(name, countryCode: str = None, language: str = 'EN', count: int = 10
     if countryCode:
         params["countryCode"] = countryCode
     try:
-        response = session.get(url, params=params)
-        response.raise_for_status()
-        response = response.json()
+        with timing.phase("geocode"):
+            response = _http().get(url, params=params)
+            response.raise_for_status()
+            response = response.json()
         return response["results"][0]
     except Exception:
         raise ValueError(f"City '{name}' not found for country code '{countryCode}'.")
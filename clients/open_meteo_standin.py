@@ -0,0 +1,253 @@
+"""
+Local stand-in for the Open-Meteo geocoding and archive APIs, for offline ingest tests and benchmarks.
+
+Serves the two endpoints clients.open_meteo uses, in the formats it parses:
+  - GET /v1/search   geocoding JSON ({"results": [...]}, no "results" key when nothing matches)
+  - GET /v1/archive  archive responses as size-prefixed FlatBuffers WeatherApiResponse messages
+                     (format=flatbuffers, what openmeteo_requests requests and decodes)
+
+Cities and hourly values come from the caller (see the openmeteostandin management command,
+which serves services.synthetic data). Latency, random server errors and a rate limit (429,
+like the real API) are configurable, to exercise the client's retries and measure ingest.
+
+Point the client at it with OPEN_METEO_GEOCODING_URL=http://127.0.0.1:<port>/v1/search and
+OPEN_METEO_ARCHIVE_URL=http://127.0.0.1:<port>/v1/archive.
+"""
+from __future__ import annotations
+
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import date, datetime, timezone as dt_timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import flatbuffers
+import numpy as np
+import pandas as pd
+from openmeteo_sdk.Unit import Unit
+from openmeteo_sdk.Variable import Variable
+
+# Archive variable name -> (Variable, Unit, altitude)
+HOURLY_VARIABLES: Dict[str, Tuple[int, int, int]] = {
+    "temperature_2m": (Variable.temperature, Unit.celsius, 2),
+    "precipitation": (Variable.precipitation, Unit.millimetre, 0),
+}
+
+# (latitude, longitude, start, end) -> frame with one column per HOURLY_VARIABLES name, one row per hour
+HourlyProvider = Callable[[float, float, date, date], pd.DataFrame]
+
+
+# -----------------------
+# FlatBuffers encoding (openmeteo_sdk ships readers only)
+# -----------------------
+
+def encode_weather_response(
+        *,
+        latitude: float,
+        longitude: float,
+        start: datetime,
+        interval: int,
+        variables: Sequence[Tuple[int, int, int, np.ndarray]],
+        elevation: float = 0.0,
+        timezone: str = "GMT",
+        utc_offset_seconds: int = 0,
+) -> bytes:
+    """
+    One size-prefixed WeatherApiResponse with an hourly block; variables are
+    (Variable, Unit, altitude, float32 values), all of the same length.
+    Field slots follow the openmeteo_sdk readers (slot = (vtable offset - 4) / 2).
+    """
+    n = len(variables[0][3]) if variables else 0
+    builder = flatbuffers.Builder(1024 + sum(len(v[3]) * 4 + 64 for v in variables))
+
+    variable_offsets = []
+    for variable, unit, altitude, values in variables:
+        values_vector = builder.CreateNumpyVector(np.asarray(values, dtype=np.float32))
+        builder.StartObject(12)  # VariableWithValues
+        builder.PrependUint8Slot(0, variable, 0)
+        builder.PrependUint8Slot(1, unit, 0)
+        builder.PrependUOffsetTRelativeSlot(3, values_vector, 0)
+        builder.PrependInt16Slot(5, altitude, 0)
+        variable_offsets.append(builder.EndObject())
+
+    builder.StartVector(4, len(variable_offsets), 4)
+    for offset in reversed(variable_offsets):
+        builder.PrependUOffsetTRelative(offset)
+    variables_vector = builder.EndVector()
+
+    time_start = int(start.timestamp())
+    builder.StartObject(4)  # VariablesWithTime
+    builder.PrependInt64Slot(0, time_start, 0)
+    builder.PrependInt64Slot(1, time_start + n * interval, 0)
+    builder.PrependInt32Slot(2, interval, 0)
+    builder.PrependUOffsetTRelativeSlot(3, variables_vector, 0)
+    hourly = builder.EndObject()
+
+    timezone_string = builder.CreateString(timezone)
+    abbreviation_string = builder.CreateString(timezone)
+    builder.StartObject(15)  # WeatherApiResponse
+    builder.PrependFloat32Slot(0, latitude, 0.0)
+    builder.PrependFloat32Slot(1, longitude, 0.0)
+    builder.PrependFloat32Slot(2, elevation, 0.0)
+    builder.PrependFloat32Slot(3, 0.1, 0.0)  # generation time (ms)
+    builder.PrependInt32Slot(6, utc_offset_seconds, 0)
+    builder.PrependUOffsetTRelativeSlot(7, timezone_string, 0)
+    builder.PrependUOffsetTRelativeSlot(8, abbreviation_string, 0)
+    builder.PrependUOffsetTRelativeSlot(11, hourly, 0)
+    builder.FinishSizePrefixed(builder.EndObject())
+    return bytes(builder.Output())
+
+
+def geocoding_result(index: int, city: Dict[str, Any]) -> Dict[str, Any]:
+    """A geocoding `results` entry (fields read by clients.open_meteo.get_city_weather, and a few more)."""
+    return {
+        "id": index + 1,
+        "name": city["name"],
+        "latitude": city["latitude"],
+        "longitude": city["longitude"],
+        "elevation": city.get("elevation", 0.0),
+        "feature_code": "PPLA",
+        "country_code": city["country_code"],
+        "timezone": city["timezone"],
+        "country": city["country"],
+    }
+
+
+# -----------------------
+# Server
+# -----------------------
+
+@dataclass
+class StandInConfig:
+    cities: List[Dict[str, Any]]  # name, latitude, longitude, country_code, country, timezone
+    hourly: HourlyProvider
+    latency: float = 0.0  # seconds added to every response
+    jitter: float = 0.0  # up to this many extra seconds, uniformly
+    error_rate: float = 0.0  # share of requests answered with a 500
+    rate_limit: Optional[float] = None  # requests/second (token bucket, burst = 1 second); 429 beyond
+    seed: Optional[int] = None
+
+
+@dataclass
+class _Bucket:
+    rate: float
+    tokens: float
+    updated: float = field(default_factory=time.monotonic)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def take(self) -> bool:
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], config: StandInConfig):
+        super().__init__(address, _Handler)
+        self.config = config
+        self.random = random.Random(config.seed)
+        self.bucket = _Bucket(config.rate_limit, config.rate_limit) if config.rate_limit else None
+        self.stats: Dict[str, int] = {}
+        self.stats_lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, key: str) -> None:
+        with self.stats_lock:
+            self.stats[key] = self.stats.get(key, 0) + 1
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: StandInServer
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        params = parse_qs(url.query)
+        config = self.server.config
+
+        if self.server.bucket is not None and not self.server.bucket.take():
+            return self._json(429, {"error": True, "reason": "Minutely API request limit exceeded. "
+                                                              "Please try again in one minute."})
+        delay = config.latency + (self.server.random.uniform(0, config.jitter) if config.jitter else 0.0)
+        if delay:
+            time.sleep(delay)
+        if config.error_rate and self.server.random.random() < config.error_rate:
+            return self._json(500, {"error": True, "reason": "Simulated server error"})
+
+        if url.path == "/v1/search":
+            return self._search(params)
+        if url.path == "/v1/archive":
+            return self._archive(params)
+        return self._json(404, {"error": True, "reason": "Not Found"})
+
+    def _search(self, params: Dict[str, List[str]]):
+        name = params.get("name", [""])[0].strip().lower()
+        country_code = params.get("countryCode", [""])[0].upper()
+        count = int(params.get("count", ["10"])[0])
+        results = [
+            geocoding_result(i, city) for i, city in enumerate(self.server.config.cities)
+            if name and city["name"].lower().startswith(name)
+            and (not country_code or city["country_code"] == country_code)
+        ][:count]
+        body: Dict[str, Any] = {"generationtime_ms": 0.1}
+        if results:
+            body["results"] = results
+        return self._json(200, body)
+
+    def _archive(self, params: Dict[str, List[str]]):
+        try:
+            latitude = float(params["latitude"][0])
+            longitude = float(params["longitude"][0])
+            start = date.fromisoformat(params["start_date"][0])
+            end = date.fromisoformat(params["end_date"][0])
+        except (KeyError, ValueError) as e:
+            return self._json(400, {"error": True, "reason": f"Invalid or missing parameter: {e}"})
+        if end < start:
+            return self._json(400, {"error": True, "reason": "End-date must be larger or equals than start-date"})
+        if params.get("format", [""])[0] != "flatbuffers":
+            return self._json(400, {"error": True, "reason": "The stand-in only serves format=flatbuffers"})
+
+        names = [n for value in params.get("hourly", []) for n in value.split(",") if n]
+        unknown = [n for n in names if n not in HOURLY_VARIABLES]
+        if unknown:
+            return self._json(400, {"error": True, "reason": f"Cannot initialize WeatherVariable from invalid "
+                                                             f"String value {unknown[0]}"})
+
+        frame = self.server.config.hourly(latitude, longitude, start, end)
+        body = encode_weather_response(
+            latitude=latitude,
+            longitude=longitude,
+            start=datetime(start.year, start.month, start.day, tzinfo=dt_timezone.utc),
+            interval=3600,
+            variables=[(*HOURLY_VARIABLES[n], frame[n].to_numpy()) for n in names],
+        )
+        self._send(200, body, "application/octet-stream")
+
+    def _json(self, status: int, payload: Dict[str, Any]):
+        self._send(status, json.dumps(payload).encode("utf-8"), "application/json; charset=utf-8")
+
+    def _send(self, status: int, body: bytes, content_type: str):
+        self.server.count(f"{urlsplit(self.path).path} {status}")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):  # noqa: A002 - BaseHTTPRequestHandler signature
+        pass  # counted in server.stats instead
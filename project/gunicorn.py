@@ -0,0 +1,131 @@
+"""
+Gunicorn configuration for production:
+
+    gunicorn -c python:project.gunicorn project.wsgi:application
+
+- The application is preloaded in the master (GUNICORN_PRELOAD=1) and warmed there before the
+  workers fork (api/warmup.py: URLconf and pandas, range indexes, OpenAPI schema, summary
+  response), so workers start warm and share those pages copy-on-write. The master then closes
+  its database connections and freezes the garbage collector's view of the warmed objects
+  (gc.freeze), so collections in the workers do not touch, and copy, the shared pages.
+  Without preload, each worker warms itself after loading the app (GUNICORN_WARMUP=0 disables it).
+- Workers are recycled after GUNICORN_MAX_REQUESTS requests (plus up to
+  GUNICORN_MAX_REQUESTS_JITTER, so they do not all restart together) and, when
+  GUNICORN_MAX_WORKER_RSS_MB is set, once their resident memory exceeds it (checked every
+  RSS_CHECK_EVERY requests; the worker finishes its requests and exits gracefully).
+- The metrics directory (services/metrics.py) is cleared when the master starts and the file of
+  every exited worker is folded into one (workers also do it at exit, unless killed), so recycling
+  does not pile up files.
+
+benchmarks/boot.py measures the first-request latency and the memory per worker of this
+configuration with and without preload/warm-up.
+"""
+import gc
+import os
+import random
+
+RSS_CHECK_EVERY = 50  # requests
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.environ.get(name) or default)
+
+
+def _env_flag(name: str, default: bool) -> bool:
+    return os.environ.get(name, "1" if default else "0") == "1"
+
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+workers = _env_int("GUNICORN_WORKERS", 2)
+threads = _env_int("GUNICORN_THREADS", 4)
+timeout = _env_int("GUNICORN_TIMEOUT", 60)
+preload_app = _env_flag("GUNICORN_PRELOAD", True)
+max_requests = _env_int("GUNICORN_MAX_REQUESTS", 5000)
+max_requests_jitter = _env_int("GUNICORN_MAX_REQUESTS_JITTER", max_requests // 10)
+
+WARM_UP = _env_flag("GUNICORN_WARMUP", True)
+MAX_WORKER_RSS = _env_int("GUNICORN_MAX_WORKER_RSS_MB", 0) * 1024 * 1024  # 0: no memory budget
+
+
+def rss_bytes() -> int:
+    """Current resident set size of this process (Linux /proc; peak RSS elsewhere)."""
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        import resource
+        import sys
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _metrics_enabled() -> bool:
+    from django.conf import settings
+
+    return bool(settings.METRICS["ENABLED"])
+
+
+# -----------------------
+# Server hooks
+# -----------------------
+
+def on_starting(server):
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "project.settings")
+    if _metrics_enabled():
+        from services import metrics
+
+        metrics.clear_files()
+
+
+def when_ready(server):
+    # Runs in the master once it listens, before the first workers are forked
+    if not preload_app:
+        return
+    from django.db import connections
+
+    from api.warmup import warm_up
+    from services import metrics
+
+    if WARM_UP:
+        warm_up()
+    # Nothing the master opened or counted may be inherited by the workers
+    connections.close_all()
+    if _metrics_enabled():
+        metrics.reset()
+        metrics.clear_files()  # only the master has run so far
+    gc.collect()
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    random.seed()  # the profiling sample draws would otherwise repeat across workers
+    worker.requests_since_rss_check = 0
+
+
+def post_worker_init(worker):
+    if WARM_UP and not preload_app:
+        from api.warmup import warm_up
+
+        warm_up()
+
+
+def post_request(worker, req, environ, resp):
+    if not MAX_WORKER_RSS:
+        return
+    worker.requests_since_rss_check = getattr(worker, "requests_since_rss_check", 0) + 1
+    if worker.requests_since_rss_check < RSS_CHECK_EVERY:
+        return
+    worker.requests_since_rss_check = 0
+    rss = rss_bytes()
+    if rss > MAX_WORKER_RSS and worker.alive:
+        worker.log.info("Worker %s over its memory budget (%.0f MB > %.0f MB): recycling", worker.pid,
+                        rss / 2 ** 20, MAX_WORKER_RSS / 2 ** 20)
+        worker.alive = False
+
+
+def child_exit(server, worker):
+    if _metrics_enabled():
+        from services import metrics
+
+        metrics.retire(worker.pid)
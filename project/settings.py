@@ -26,10 +26,17 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "api.server_timing.ServerTimingMiddleware",
+    "api.metrics.MetricsMiddleware",
+    "api.query_budget.QueryBudgetMiddleware",
+    # Lazy: the user is only loaded when asked for (the response cache asks for ?_profile=1 requests)
     "django.contrib.sessions.middleware.SessionMiddleware",
+    "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "api.response_cache.CompressedResponseCacheMiddleware",
     "django.middleware.common.CommonMiddleware",
+    "api.admission.AdmissionControlMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
-    "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "api.profiling.ProfilingMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "debug_toolbar.middleware.DebugToolbarMiddleware",
@@ -37,6 +44,95 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = "project.urls"
 
+# Keeps the metrics/profile files of test runs out of LOG_DIR
+TEST_RUNNER = "project.test_runner.TestRunner"
+
+# Route /api/weather/* to the native async views (serve project.asgi with an ASGI server)
+ASYNC_VIEWS = os.environ.get("DJANGO_ASYNC_VIEWS", "0") == "1"
+# Threads for the pandas aggregations offloaded by the async views
+STATS_EXECUTOR_WORKERS = int(os.environ.get("STATS_EXECUTOR_WORKERS", os.cpu_count() or 2))
+
+# Server-Timing header + one "app.timing" log line per request, with the phases recorded by
+# services.timing (api/server_timing.py). Disabled, the instrumentation is a no-op.
+SERVER_TIMING = {
+    "ENABLED": os.environ.get("DJANGO_SERVER_TIMING", "1") == "1",
+    "PATHS": ("/api/weather/",),
+    "LOG": True,
+    # Who gets the header: "internal" (METRICS["ALLOWED_IPS"] and staff users), "all" or "none"
+    "HEADER": os.environ.get("DJANGO_SERVER_TIMING_HEADER", "internal"),
+}
+
+# Prometheus metrics (api/metrics.py, services/metrics.py): every process writes its values to
+# DIR/<pid>-<id>.json (at most every FLUSH_INTERVAL seconds), folded into DIR/retired.json when it
+# exits, and /internal/metrics merges them.
+METRICS = {
+    "ENABLED": os.environ.get("DJANGO_METRICS", "1") == "1",
+    "DIR": os.environ.get("METRICS_DIR", str(BASE_DIR / "log" / "metrics")),
+    "FLUSH_INTERVAL": 1.0,  # seconds
+    "PATHS": ("/api/",),
+    "ALLOWED_IPS": os.environ.get("METRICS_ALLOWED_IPS", "127.0.0.1,::1").split(","),
+}
+
+# Per-view SQL query / hourly row budgets (api/query_budget.py): overruns are logged and
+# counted in the query_budget_exceeded_total metric; tests fail on them.
+QUERY_BUDGET = {
+    "ENABLED": os.environ.get("DJANGO_QUERY_BUDGET", "1") == "1",
+    "PATHS": ("/api/weather/",),
+}
+
+# cProfile reports of single requests (staff: X-Profile: 1 header or ?_profile=1) and of a
+# sampled fraction of the requests to PATHS (api/profiling.py); listed at /internal/profiles/.
+PROFILING = {
+    "ENABLED": os.environ.get("DJANGO_PROFILING", "1") == "1",
+    "SAMPLE_RATE": float(os.environ.get("PROFILING_SAMPLE_RATE", "0")),  # 0..1
+    "PATHS": ("/api/weather/",),
+    "DIR": os.environ.get("PROFILES_DIR", str(BASE_DIR / "log" / "profiles")),
+    "MAX_REPORTS": 200,
+}
+
+# Compressed API responses; successful weather GETs cached with their gzip/br bodies
+# per data version (api/response_cache.py). Entries live in CACHES[CACHE_ALIAS].
+API_RESPONSE_CACHE = {
+    "ENABLED": os.environ.get("DJANGO_RESPONSE_CACHE", "1") == "1",
+    "CACHE_ALIAS": "default",
+    "TIMEOUT": 300,  # seconds
+    "MIN_SIZE": 512,  # bytes; smaller bodies are sent uncompressed
+    "COMPRESS_PATHS": ("/api/",),
+    "CACHE_PATHS": ("/api/weather/",),
+    "EXCLUDE_PATHS": ("/api/weather/export/",),  # streamed, compressed by the view itself
+}
+
+# Cost-aware concurrency limits per worker process (api/admission.py).
+# Cost = scanned hours / COST_UNIT_HOURS (min 1), clamped to the endpoint capacity.
+ADMISSION_CONTROL = {
+    "ENABLED": os.environ.get("DJANGO_ADMISSION_CONTROL", "1") == "1",
+    "COST_UNIT_HOURS": 24 * 365,
+    "QUEUE_TIMEOUT": 2.0,  # seconds a request may wait for capacity
+    "RETRY_AFTER": 5,  # seconds, sent with 503/429
+    "PER_CLIENT_MAX_COST": 8,  # units in flight per client address
+    "ENDPOINTS": {
+        "weather-temperature-stats": {"capacity": 8, "queue": 8},
+        "weather-precipitation-stats": {"capacity": 8, "queue": 8},
+        "weather-range-stats": {"capacity": 16, "queue": 16},
+        "weather-distribution-stats": {"capacity": 16, "queue": 16},
+        "weather-batch-stats": {"capacity": 8, "queue": 4},
+        "weather-compare-stats": {"capacity": 8, "queue": 4},
+        "weather-analytics": {"capacity": 8, "queue": 4},
+        "weather-export": {"capacity": 4, "queue": 4},
+        "weather-summary-stats": {"capacity": 2, "queue": 2},
+    },
+}
+
+# OpenAPI schema served by api.schema.OpenAPISchemaView, rendered once per process.
+# FILE is written by `manage.py buildschema` at deploy time; without it the schema is
+# generated on the first request.
+OPENAPI_SCHEMA = {
+    "FILE": os.environ.get("OPENAPI_SCHEMA_FILE") or None,
+    "MAX_AGE": int(os.environ.get("OPENAPI_SCHEMA_MAX_AGE", 3600)),  # seconds, Cache-Control
+}
+SWAGGER_SETTINGS = {"SPEC_URL": "swagger-json"}
+REDOC_SETTINGS = {"SPEC_URL": "swagger-json"}
+
 TEMPLATES = [
     {
         "BACKEND": "django.template.backends.django.DjangoTemplates",
@@ -0,0 +1,25 @@
+"""Test runner: the metrics and profiles written during a test run go to a temporary directory."""
+import tempfile
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._tmp = tempfile.TemporaryDirectory(prefix="openmeteo-tests-")
+        self._overrides = override_settings(
+            METRICS={**settings.METRICS, "DIR": f"{self._tmp.name}/metrics"},
+            PROFILING={**settings.PROFILING, "DIR": f"{self._tmp.name}/profiles"},
+        )
+        self._overrides.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        from services import metrics
+
+        metrics.reset()  # nothing left for the at-exit flush, which would use the real directory
+        self._overrides.disable()
+        self._tmp.cleanup()
+        super().teardown_test_environment(**kwargs)
@@ -1,24 +1,19 @@
 from django.contrib import admin
 from django.urls import include, path
-from drf_yasg import openapi
-from drf_yasg.views import get_schema_view
-from rest_framework import permissions
 
-schema_view = get_schema_view(
-    openapi.Info(
-        title="OpenMeteoAPI",
-        default_version="v1",
-        description="Weather statistics API (Open-Meteo) – Django/DRF",
-    ),
-    public=True,
-    permission_classes=[permissions.AllowAny],
-)
+from api.metrics import metrics_view
+from api.profiling import profile_download_view, profiles_list_view
+from api.schema import OpenAPISchemaView, schema_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('api.urls')),
+    # The UI pages load the prebuilt schema from swagger.json (SPEC_URL in settings)
     path("swagger/", schema_view.with_ui("swagger", cache_timeout=0), name="swagger-ui"),
     path("redoc/", schema_view.with_ui("redoc", cache_timeout=0), name="redoc"),
-    path("swagger.json", schema_view.without_ui(cache_timeout=0), name="swagger-json"),
+    path("swagger.json", OpenAPISchemaView.as_view(), name="swagger-json"),
+    path("internal/metrics", metrics_view, name="metrics"),
+    path("internal/profiles/", profiles_list_view, name="profiles"),
+    path("internal/profiles/<str:report_id>/", profile_download_view, name="profile-download"),
     path('__debug__/', include('debug_toolbar.urls')),
 ]
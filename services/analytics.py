@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+from typing import Any, Dict, Iterable, List, Tuple
+
+from services.lazy import lazy_module
+from services.queries import get_dataset_or_raise, _dataset_hours_to_df, TZ_UTC
+from services.timing import timed
+
+np = lazy_module("numpy")
+pd = lazy_module("pandas")
+
+DEFAULT_WINDOWS = (7,)
+# Degree-day base temperatures (°C, compared with the daily mean): one base for both, the usual
+# single-base convention (18 °C, about 65 °F), so that a day's heating + cooling degree days is
+# its distance to the base. Both are query parameters of the analytics endpoint.
+DEGREE_DAY_BASE = 18.0
+HEATING_BASE = DEGREE_DAY_BASE
+COOLING_BASE = DEGREE_DAY_BASE
+HEATWAVE_THRESHOLD = 35.0
+HEATWAVE_MIN_DAYS = 3
+
+
+def daily_series(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Per-day frame over every calendar day of the hourly frame (missing days are NaN rows):
+    temperature_mean, temperature_max, precipitation.
+    """
+    if df.empty:
+        return pd.DataFrame(columns=["temperature_mean", "temperature_max", "precipitation"],
+                            index=pd.DatetimeIndex([]), dtype="float64")
+
+    grouped = df.groupby("date")
+    daily = pd.DataFrame({
+        "temperature_mean": grouped["temperature"].mean(),
+        "temperature_max": grouped["temperature"].max(),
+        "precipitation": grouped["precipitation"].sum(min_count=1),
+    })
+    daily.index = pd.to_datetime(daily.index)
+    # Rolling windows count calendar days, not stored days
+    return daily.asfreq("D")
+
+
+def heat_wave_runs(hot: np.ndarray, min_days: int) -> List[Tuple[int, int]]:
+    """(start, end) positions (inclusive) of runs of at least min_days consecutive True values."""
+    padded = np.concatenate(([False], hot, [False])).astype(np.int8)
+    edges = np.diff(padded)
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1) - 1
+    keep = (ends - starts + 1) >= min_days
+    return list(zip(starts[keep].tolist(), ends[keep].tolist()))
+
+
+@timed("compute")
+def analytics_from_df(
+        df: pd.DataFrame,
+        *,
+        windows: Iterable[int] = DEFAULT_WINDOWS,
+        heating_base: float = HEATING_BASE,
+        cooling_base: float = COOLING_BASE,
+        heatwave_threshold: float = HEATWAVE_THRESHOLD,
+        heatwave_min_days: int = HEATWAVE_MIN_DAYS,
+) -> Dict[str, Any]:
+    """
+    Daily analytics over a frame built by _dataset_hours_to_df, with vectorized window operations:
+      - rolling mean of the daily mean temperature and rolling precipitation sum per window (days);
+        null until a window is full, and over windows touching a day without data
+      - heating/cooling degree days from the daily mean temperature (per day and totals):
+        max(heating_base - mean, 0) and max(mean - cooling_base, 0), both bases 18 °C by default
+      - heat waves: runs of at least heatwave_min_days days with daily max >= heatwave_threshold
+    """
+    windows = sorted(set(windows))
+    daily = daily_series(df)
+
+    mean = daily["temperature_mean"]
+    hdd = (heating_base - mean).clip(lower=0)
+    cdd = (mean - cooling_base).clip(lower=0)
+
+    columns = {
+        "temperature_mean": mean,
+        "precipitation": daily["precipitation"],
+        "heating_degree_days": hdd,
+        "cooling_degree_days": cdd,
+    }
+    for w in windows:
+        columns[f"temperature_mean_{w}d"] = mean.rolling(w, min_periods=w).mean()
+        columns[f"precipitation_sum_{w}d"] = daily["precipitation"].rolling(w, min_periods=w).sum()
+    table = pd.DataFrame(columns)
+
+    # Build the per-day dicts from plain arrays (much faster than iterating rows)
+    days = daily.index.strftime("%Y-%m-%d").tolist()
+    names = list(table.columns)
+    values = table.to_numpy(dtype="float64")
+    by_day = {
+        day: {name: (None if np.isnan(v) else float(v)) for name, v in zip(names, row)}
+        for day, row in zip(days, values)
+    }
+
+    hot = (daily["temperature_max"] >= heatwave_threshold).to_numpy()
+    heat_waves = [
+        {
+            "start_date": days[start],
+            "end_date": days[end],
+            "days": end - start + 1,
+            "max_temperature": float(daily["temperature_max"].iloc[start:end + 1].max()),
+        }
+        for start, end in heat_wave_runs(hot, heatwave_min_days)
+    ]
+
+    return {
+        "windows": windows,
+        "daily": by_day,
+        "degree_days": {
+            "heating_base": heating_base,
+            "cooling_base": cooling_base,
+            "heating_total": float(hdd.sum()),
+            "cooling_total": float(cdd.sum()),
+        },
+        "heat_waves": heat_waves,
+    }
+
+
+def analytics_stats(
+        *,
+        city_name: str,
+        start_date: Any,
+        end_date: Any,
+        windows: Iterable[int] = DEFAULT_WINDOWS,
+        heating_base: float = HEATING_BASE,
+        cooling_base: float = COOLING_BASE,
+        heatwave_threshold: float = HEATWAVE_THRESHOLD,
+        heatwave_min_days: int = HEATWAVE_MIN_DAYS,
+        tz: str = TZ_UTC,
+) -> Dict[str, Any]:
+    """
+    Rolling-window, degree-day and heat-wave analytics for a city and date range, at daily
+    resolution (days follow the city's timezone with tz="local").
+
+    Output:
+    {
+      "city": "...", "start_date": "...", "end_date": "...", "windows": [7],
+      "daily": {"YYYY-MM-DD": {"temperature_mean": ..., "precipitation": ..., "heating_degree_days": ...,
+                               "cooling_degree_days": ..., "temperature_mean_7d": ..., "precipitation_sum_7d": ...}},
+      "degree_days": {"heating_base": ..., "cooling_base": ..., "heating_total": ..., "cooling_total": ...},
+      "heat_waves": [{"start_date": "...", "end_date": "...", "days": ..., "max_temperature": ...}]
+    }
+    """
+    dataset = get_dataset_or_raise(city_name=city_name, start_date=start_date, end_date=end_date)
+    df = _dataset_hours_to_df(dataset, tz=tz)
+    result = analytics_from_df(
+        df,
+        windows=windows,
+        heating_base=heating_base,
+        cooling_base=cooling_base,
+        heatwave_threshold=heatwave_threshold,
+        heatwave_min_days=heatwave_min_days,
+    )
+    return {"city": dataset.city.name, "start_date": str(dataset.start_date), "end_date": str(dataset.end_date),
+            **result}
@@ -0,0 +1,149 @@
+"""
+Async entry points for the weather stats, used by the ASGI views (api/async_views.py).
+
+Dataset resolution and hourly row fetches go through Django's async ORM; the pandas work is
+offloaded to a bounded thread pool so the event loop keeps serving other requests meanwhile.
+Paths whose DB access is interleaved with computation (range index loading/rebuild, DB
+aggregates, grouped compare/batch, summary) run the sync services via sync_to_async.
+"""
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from api.models import WeatherDataset
+from services.analytics import analytics_from_df
+from services.queries import (
+    aget_covering_dataset_or_raise,
+    aget_dataset_or_raise,
+    load_range_index,
+    _ahours_rows,
+    _hours_rows_to_df,
+    TZ_UTC,
+)
+from services.stats import (
+    DEFAULT_PERCENTILES,
+    batch_stats,
+    compare_stats,
+    summary_stats,
+    _distribution_from_index,
+    _precipitation_from_df,
+    _precipitation_stats_for_dataset,
+    _range_stats_from_index,
+    _temperature_from_df,
+    _temperature_stats_for_dataset,
+)
+
+
+@functools.lru_cache(maxsize=None)
+def _executor() -> ThreadPoolExecutor:
+    # Created on first use, so pre-forking servers do not share it across workers
+    return ThreadPoolExecutor(max_workers=settings.STATS_EXECUTOR_WORKERS, thread_name_prefix="stats")
+
+
+async def run_cpu(func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """Run CPU-bound, query-free work in the stats thread pool (in a copy of the current context)."""
+    loop = asyncio.get_running_loop()
+    # run_in_executor does not propagate context variables (e.g. the request's phase recorder)
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(_executor(), functools.partial(context.run, func, *args, **kwargs))
+
+
+def _temperature_from_rows(dataset: WeatherDataset, rows: List[Dict[str, Any]], *, tz: str, above: float,
+                           below: float) -> Dict[str, Any]:
+    return _temperature_from_df(_hours_rows_to_df(dataset, rows, tz=tz), above=above, below=below)
+
+
+def _precipitation_from_rows(dataset: WeatherDataset, rows: List[Dict[str, Any]], *, tz: str) -> Dict[str, Any]:
+    return _precipitation_from_df(_hours_rows_to_df(dataset, rows, tz=tz))
+
+
+def _analytics_from_rows(dataset: WeatherDataset, rows: List[Dict[str, Any]], *, tz: str,
+                         **options: Any) -> Dict[str, Any]:
+    return analytics_from_df(_hours_rows_to_df(dataset, rows, tz=tz), **options)
+
+
+async def atemperature_stats(
+        *,
+        city_name: str,
+        start_date: Any,
+        end_date: Any,
+        above: float = 30.0,
+        below: float = 0.0,
+        tz: str = TZ_UTC,
+        fields: Optional[Iterable[str]] = None,
+) -> Dict[str, Any]:
+    """Async temperature_stats (same output)."""
+    dataset = await aget_dataset_or_raise(city_name=city_name, start_date=start_date, end_date=end_date)
+    if fields is not None:
+        return await sync_to_async(_temperature_stats_for_dataset)(
+            dataset, above=above, below=below, tz=tz, fields=fields)
+
+    rows = await _ahours_rows(dataset, ("temperature", "precipitation"))
+    return await run_cpu(_temperature_from_rows, dataset, rows, tz=tz, above=above, below=below)
+
+
+async def aprecipitation_stats(
+        *,
+        city_name: str,
+        start_date: Any,
+        end_date: Any,
+        tz: str = TZ_UTC,
+        fields: Optional[Iterable[str]] = None,
+) -> Dict[str, Any]:
+    """Async precipitation_stats (same output)."""
+    dataset = await aget_dataset_or_raise(city_name=city_name, start_date=start_date, end_date=end_date)
+    if fields is not None:
+        return await sync_to_async(_precipitation_stats_for_dataset)(dataset, tz=tz, fields=fields)
+
+    rows = await _ahours_rows(dataset, ("temperature", "precipitation"))
+    return await run_cpu(_precipitation_from_rows, dataset, rows, tz=tz)
+
+
+async def aanalytics_stats(
+        *,
+        city_name: str,
+        start_date: Any,
+        end_date: Any,
+        tz: str = TZ_UTC,
+        **options: Any,
+) -> Dict[str, Any]:
+    """Async analytics_stats (same output); options are the analytics_from_df keyword arguments."""
+    dataset = await aget_dataset_or_raise(city_name=city_name, start_date=start_date, end_date=end_date)
+    rows = await _ahours_rows(dataset, ("temperature", "precipitation"))
+    result = await run_cpu(_analytics_from_rows, dataset, rows, tz=tz, **options)
+    return {"city": dataset.city.name, "start_date": str(dataset.start_date), "end_date": str(dataset.end_date),
+            **result}
+
+
+async def arange_stats(*, city_name: str, start_date: Any, end_date: Any, daily: bool = False) -> Dict[str, Any]:
+    """Async range_stats (same output)."""
+    dataset = await aget_covering_dataset_or_raise(city_name=city_name, start_date=start_date, end_date=end_date)
+    index = await sync_to_async(load_range_index)(dataset)
+    return await run_cpu(_range_stats_from_index, dataset, index, start_date, end_date, daily=daily)
+
+
+async def adistribution_stats(
+        *,
+        city_name: str,
+        start_date: Any,
+        end_date: Any,
+        percentiles: Iterable[float] = DEFAULT_PERCENTILES,
+        bin_width: float = 1.0,
+) -> Dict[str, Any]:
+    """Async distribution_stats (same output)."""
+    dataset = await aget_covering_dataset_or_raise(city_name=city_name, start_date=start_date, end_date=end_date)
+    index = await sync_to_async(load_range_index)(dataset)
+    return await run_cpu(_distribution_from_index, dataset, index, start_date, end_date,
+                         percentiles=percentiles, bin_width=bin_width)
+
+
+abatch_stats = sync_to_async(batch_stats)
+acompare_stats = sync_to_async(compare_stats)
+asummary_stats = sync_to_async(summary_stats)
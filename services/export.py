@@ -0,0 +1,143 @@
+"""
+Streaming export of the hourly series of a dataset (CSV, NDJSON, Arrow IPC stream).
+
+Rows come from a server-side cursor (QuerySet.iterator) and are encoded chunk by chunk,
+so memory stays constant whatever the length of the range. Under ASGI, aiter_chunks() drives
+the same pipeline one chunk at a time from the event loop.
+"""
+from __future__ import annotations
+
+import csv
+import importlib.util
+import io
+import json
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from itertools import islice
+from typing import AsyncIterator, Iterable, Iterator, List, Optional, Tuple, TypeVar
+
+from asgiref.sync import sync_to_async
+
+from api.models import WeatherDataset, WeatherHour
+
+EXPORT_FORMATS = ("csv", "ndjson", "arrow")
+EXPORT_CONTENT_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+EXPORT_COLUMNS = ("timestamp", "temperature", "precipitation")
+# Rows per DB fetch and per encoded chunk
+EXPORT_CHUNK_ROWS = 2000
+
+Row = Tuple[datetime, Optional[float], Optional[float]]
+T = TypeVar("T")
+
+
+def export_rows(dataset: WeatherDataset, start_d: date, end_d: date) -> Iterator[Row]:
+    """(timestamp, temperature, precipitation) of the dataset hours within [start_d, end_d] (UTC days)."""
+    start_dt = datetime.combine(start_d, time.min, tzinfo=dt_timezone.utc)
+    end_dt = datetime.combine(end_d + timedelta(days=1), time.min, tzinfo=dt_timezone.utc)
+    qs = (
+        WeatherHour.objects.filter(dataset=dataset, timestamp__gte=start_dt, timestamp__lt=end_dt)
+        .order_by("timestamp")
+        .values_list(*EXPORT_COLUMNS)
+    )
+    return qs.iterator(chunk_size=EXPORT_CHUNK_ROWS)
+
+
+def _chunks(rows: Iterable[Row], size: int = EXPORT_CHUNK_ROWS) -> Iterator[List[Row]]:
+    rows = iter(rows)
+    while chunk := list(islice(rows, size)):
+        yield chunk
+
+
+def _fmt_ts(ts: datetime) -> str:
+    return ts.astimezone(dt_timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def iter_csv(rows: Iterable[Row]) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(EXPORT_COLUMNS)
+    for chunk in _chunks(rows):
+        writer.writerows((_fmt_ts(ts), temp, precip) for ts, temp, precip in chunk)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        # header only (no rows)
+        yield buffer.getvalue()
+
+
+def iter_ndjson(rows: Iterable[Row]) -> Iterator[str]:
+    for chunk in _chunks(rows):
+        yield "".join(
+            json.dumps({"timestamp": _fmt_ts(ts), "temperature": temp, "precipitation": precip}) + "\n"
+            for ts, temp, precip in chunk
+        )
+
+
+class _ChunkSink:
+    """Write-only file object collecting what the Arrow IPC writer emits, drained after each batch."""
+    closed = False
+
+    def __init__(self):
+        self.parts: List[bytes] = []
+
+    def write(self, data) -> int:
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self.parts)
+        self.parts.clear()
+        return data
+
+
+def arrow_available() -> bool:
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def iter_arrow(rows: Iterable[Row]) -> Iterator[bytes]:
+    """Arrow IPC stream: schema, then one record batch per chunk (requires pyarrow)."""
+    import pyarrow as pa
+
+    schema = pa.schema([
+        ("timestamp", pa.timestamp("s", tz="UTC")),
+        ("temperature", pa.float64()),
+        ("precipitation", pa.float64()),
+    ])
+    sink = _ChunkSink()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        for chunk in _chunks(rows):
+            timestamps, temperatures, precipitations = zip(*chunk)
+            writer.write_batch(pa.record_batch(
+                [pa.array(timestamps, schema.field(0).type), pa.array(temperatures, pa.float64()),
+                 pa.array(precipitations, pa.float64())],
+                schema=schema,
+            ))
+            yield sink.drain()
+    yield sink.drain()
+
+
+EXPORT_ENCODERS = {"csv": iter_csv, "ndjson": iter_ndjson, "arrow": iter_arrow}
+
+
+async def aiter_chunks(chunks: Iterator[T]) -> AsyncIterator[T]:
+    """
+    Async iterator over a sync chunk iterator (DB cursor, encoder, compressor): each chunk is
+    produced by one trip to the sync thread, which keeps the cursor. Django would otherwise read a
+    sync streaming response whole with sync_to_async(list) before sending the first byte.
+    """
+    done = object()
+    next_chunk = sync_to_async(next, thread_sensitive=True)
+    try:
+        while (chunk := await next_chunk(chunks, done)) is not done:
+            yield chunk
+    finally:
+        close = getattr(chunks, "close", None)
+        if close is not None:  # release the cursor if the client went away early
+            await sync_to_async(close, thread_sensitive=True)()
@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional, Set, Tuple
+
+from api.models import WeatherDataset, WeatherDatasetIndex, WeatherHour
+from services.lazy import lazy_module
+from services.range_index import RangeIndex
+from services.timing import PhaseRecorder
+
+np = lazy_module("numpy")
+pd = lazy_module("pandas")
+
+BULK_BATCH_SIZE = 2000
+
+# (rows inserted so far, rows to insert), called after every batch
+ProgressCallback = Callable[[int, int], None]
+
+INGEST_PHASES = ("geocode", "fetch", "transform", "insert", "index")
+
+
+def _nullable_floats(values) -> list:
+    # NaN is how pandas/numpy represent missing values; the DB wants NULL.
+    arr = np.asarray(values, dtype="float64")
+    return [None if np.isnan(v) else float(v) for v in arr]
+
+
+def existing_timestamps(dataset: WeatherDataset) -> Set[datetime]:
+    """Timestamps already stored for a dataset."""
+    return set(WeatherHour.objects.filter(dataset=dataset).order_by().values_list("timestamp", flat=True))
+
+
+def bulk_insert_hours(
+        dataset: WeatherDataset,
+        df: pd.DataFrame,
+        *,
+        skip_existing: bool = False,
+        existing: Optional[Set[datetime]] = None,
+        batch_size: int = BULK_BATCH_SIZE,
+        progress: Optional[ProgressCallback] = None,
+) -> Tuple[int, int]:
+    """
+    Insert hourly rows for a dataset using bulk_create.
+
+    Expects a DataFrame with columns:
+      - timestamp (tz-aware, UTC)
+      - temperature
+      - precipitation
+
+    When skip_existing is True, timestamps already stored for the dataset are skipped
+    (used when re-loading a dataset without --replace). Callers inserting a dataset in several
+    calls pass `existing` (from existing_timestamps(), loaded once): it replaces the query and
+    gets the inserted timestamps added.
+    With a progress callback, rows are written one batch per bulk_create so it can be
+    called after each. Returns (created, skipped).
+    """
+    if df.empty:
+        return 0, 0
+
+    timestamps = pd.to_datetime(df["timestamp"], utc=True).dt.to_pydatetime()
+    temperatures = _nullable_floats(df["temperature"])
+    precipitations = _nullable_floats(df["precipitation"])
+
+    existing_ts = set()
+    if existing is not None:
+        existing_ts = existing
+    elif skip_existing:
+        existing_ts = existing_timestamps(dataset)
+
+    hours_to_create, skipped = [], 0
+    for ts, temp, prec in zip(timestamps, temperatures, precipitations):
+        if existing_ts and ts in existing_ts:
+            skipped += 1
+            continue
+        hours_to_create.append(
+            WeatherHour(dataset=dataset, timestamp=ts, temperature=temp, precipitation=prec)
+        )
+
+    if existing is not None:
+        existing.update(hour.timestamp for hour in hours_to_create)
+
+    if progress is not None:
+        total = len(hours_to_create)
+        for start in range(0, total, batch_size):
+            WeatherHour.objects.bulk_create(hours_to_create[start:start + batch_size])
+            progress(min(start + batch_size, total), total)
+    elif hours_to_create:
+        WeatherHour.objects.bulk_create(hours_to_create, batch_size=batch_size)
+    return len(hours_to_create), skipped
+
+
+def rebuild_range_index(dataset: WeatherDataset) -> WeatherDatasetIndex:
+    """
+    (Re)build the precomputed range index for a dataset from its stored hours.
+    Called at ingest time, after the hourly rows are written.
+    """
+    rows = dataset.hours.order_by("timestamp").values_list("timestamp", "temperature", "precipitation")
+    df = pd.DataFrame.from_records(rows.iterator(chunk_size=10_000),
+                                   columns=["timestamp", "temperature", "precipitation"])
+    index = RangeIndex.from_dataframe(df)
+    obj, _ = WeatherDatasetIndex.objects.update_or_create(
+        dataset=dataset,
+        defaults={"version": RangeIndex.VERSION, "hours_count": len(index), "payload": index.to_bytes()},
+    )
+    return obj
+
+
+def ingest_telemetry(recorder: PhaseRecorder, rows: int) -> Dict[str, Any]:
+    """
+    Structured summary of one ingest timed with services.timing.recording(): per-phase
+    milliseconds, insert throughput, bytes downloaded and HTTP cache hits/misses.
+    """
+    phases = recorder.durations_ms()
+    insert_seconds = recorder.phases.get("insert", [0.0])[0]
+    counters = recorder.counters
+    return {
+        "phases_ms": {name: phases.get(name, 0.0) for name in INGEST_PHASES},
+        "rows": rows,
+        "rows_per_second": round(rows / insert_seconds, 1) if insert_seconds else None,
+        "bytes_downloaded": counters.get("http_bytes", 0),
+        "http_cache": {"hits": counters.get("http_cache_hits", 0), "misses": counters.get("http_cache_misses", 0)},
+    }
@@ -0,0 +1,34 @@
+"""
+Deferred imports of heavy libraries (pandas, numpy) in the service modules.
+
+`pd = lazy_module("pandas")` binds a stand-in that imports the real module on the first
+attribute access, so importing the services (URLconf, serializers, management commands,
+system checks) does not pay for pandas/numpy until a request or command actually computes
+something. Annotations are not evaluated (`from __future__ import annotations`), so module
+level code must not touch the stand-in.
+
+The import itself goes through importlib.import_module, whose per-module lock makes concurrent
+first accesses from request threads safe; each attribute is then cached on the stand-in, so
+`pd.DataFrame` costs the same as with a plain import afterwards.
+"""
+from __future__ import annotations
+
+import importlib
+import sys
+from types import ModuleType
+
+
+class _LazyModule(ModuleType):
+    def __getattr__(self, attr: str):
+        # Only called for attributes not cached yet
+        value = getattr(importlib.import_module(self.__name__), attr)
+        setattr(self, attr, value)
+        return value
+
+    def __repr__(self) -> str:
+        return f"<lazy module {self.__name__!r}>"
+
+
+def lazy_module(name: str) -> ModuleType:
+    """The module itself when already imported, otherwise a stand-in importing it on first use."""
+    return sys.modules.get(name) or _LazyModule(name)
@@ -0,0 +1,363 @@
+"""
+Process-local metrics (counters, gauges, histograms) aggregated across worker processes.
+
+Each process keeps its values in memory and writes them, at most every FLUSH_INTERVAL seconds,
+to its own `<pid>-<random id>.json` file in settings.METRICS["DIR"] (the id keeps a reused pid
+from overwriting the file of an earlier process). render_prometheus() merges every file of the
+directory, so any gunicorn worker (or a management command such as loadcitydata) contributes to
+what the metrics endpoint exposes. Counters and histograms add up across files; gauges add up
+or keep the most recently written value (per metric); summed gauges (state such as admission
+units in use) of a process that is gone are ignored.
+
+At exit a process folds its values into `retired.json` (retire()), so commands and scripts do
+not leave a file each and counters never go backwards. The gunicorn master does the same for
+workers that died without running their exit handlers, and clears the directory when it starts
+(project/gunicorn.py).
+"""
+from __future__ import annotations
+
+import atexit
+import contextlib
+import copy
+import json
+import math
+import os
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+
+try:  # POSIX only
+    import fcntl
+except ImportError:  # pragma: no cover - depends on the platform
+    fcntl = None
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ROWS_BUCKETS = (0, 24, 24 * 31, 24 * 366, 24 * 366 * 5, 24 * 366 * 20, 24 * 366 * 50)
+FETCH_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+@dataclass(frozen=True)
+class MetricSpec:
+    name: str
+    kind: str  # counter | gauge | histogram
+    help: str
+    buckets: Tuple[float, ...] = ()
+    merge: str = "sum"  # gauges only: sum | latest
+
+
+SPECS: Dict[str, MetricSpec] = {spec.name: spec for spec in (
+    MetricSpec("http_requests_total", "counter", "API requests by endpoint, method and status."),
+    MetricSpec("http_request_errors_total", "counter", "API responses with status >= 400."),
+    MetricSpec("http_request_duration_seconds", "histogram", "API request latency.", LATENCY_BUCKETS),
+    MetricSpec("http_request_rows_scanned", "histogram", "Hourly rows read per API request.", ROWS_BUCKETS),
+    MetricSpec("query_budget_exceeded_total", "counter", "Requests over their view's query/row budget, by kind."),
+    MetricSpec("response_cache_requests_total", "counter", "Response cache lookups by result (hit/miss)."),
+    MetricSpec("ingest_rows_total", "counter", "Hourly rows stored by ingest commands."),
+    MetricSpec("ingest_fetch_duration_seconds", "histogram", "Open-Meteo fetch time per ingest.", FETCH_BUCKETS),
+    MetricSpec("ingest_duration_seconds", "histogram", "Total time per ingest (fetch + write).", FETCH_BUCKETS),
+    MetricSpec("ingest_rows_per_second", "gauge", "Write throughput of the last ingest.", merge="latest"),
+    MetricSpec("admission_capacity_units", "gauge", "Admission capacity (units, summed over workers)."),
+    MetricSpec("admission_in_use_units", "gauge", "Admission units in use."),
+    MetricSpec("admission_waiting_requests", "gauge", "Requests waiting in the admission queue."),
+    MetricSpec("admission_requests_total", "counter", "Admission decisions by result."),
+    MetricSpec("admission_wait_seconds_total", "counter", "Time spent waiting for admission."),
+)}
+
+
+class _Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values: Dict[str, Dict[LabelKey, Any]] = {}
+        self.last_flush = 0.0
+
+    def _series(self, name: str) -> Dict[LabelKey, Any]:
+        if name not in SPECS:
+            raise KeyError(f"Unknown metric {name!r}")
+        return self.values.setdefault(name, {})
+
+
+_registry = _Registry()
+_collectors: List[Callable[[], None]] = []
+
+
+def _key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def inc(name: str, value: float = 1, **labels: Any) -> None:
+    with _registry.lock:
+        series = _registry._series(name)
+        key = _key(labels)
+        series[key] = series.get(key, 0) + value
+
+
+def set_value(name: str, value: float, **labels: Any) -> None:
+    """Set a gauge (or a counter whose total is tracked elsewhere, e.g. admission counters)."""
+    with _registry.lock:
+        _registry._series(name)[_key(labels)] = value
+
+
+def observe(name: str, value: float, **labels: Any) -> None:
+    buckets = SPECS[name].buckets
+    with _registry.lock:
+        series = _registry._series(name)
+        key = _key(labels)
+        entry = series.get(key)
+        if entry is None:
+            entry = series[key] = [[0] * (len(buckets) + 1), 0.0, 0]  # per-bucket counts (+Inf), sum, count
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                entry[0][i] += 1
+                break
+        else:
+            entry[0][-1] += 1
+        entry[1] += value
+        entry[2] += 1
+
+
+def register_collector(func: Callable[[], None]) -> None:
+    """func() is called before each flush to refresh values kept elsewhere (via set_value)."""
+    if func not in _collectors:
+        _collectors.append(func)
+
+
+def reset() -> None:
+    """Forget this process's values (tests)."""
+    with _registry.lock:
+        _registry.values.clear()
+        _registry.last_flush = 0.0
+
+
+# -----------------------
+# Shared store
+# -----------------------
+
+def _metrics_dir() -> Path:
+    return Path(settings.METRICS["DIR"])
+
+
+_file_id: Dict[str, Any] = {"pid": None, "name": None}
+
+
+def _file_name() -> str:
+    """`<pid>-<random id>`, new in every process (forked children included)."""
+    pid = os.getpid()
+    if _file_id["pid"] != pid:
+        _file_id.update(pid=pid, name=f"{pid}-{uuid.uuid4().hex[:12]}")
+    return _file_id["name"]
+
+
+@contextlib.contextmanager
+def _retired_lock(directory: Path) -> Iterator[None]:
+    """Serializes the read-modify-write of retired.json between processes."""
+    if fcntl is None:
+        yield
+        return
+    with open(directory / ".retired.lock", "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def flush(force: bool = False) -> None:
+    """Write this process's values to its file (throttled to FLUSH_INTERVAL unless force)."""
+    now = time.monotonic()
+    if not force and now - _registry.last_flush < settings.METRICS["FLUSH_INTERVAL"]:
+        return
+    for collector in _collectors:
+        collector()
+    with _registry.lock:
+        _registry.last_flush = now
+        payload = json.dumps({
+            "pid": os.getpid(),
+            "updated": time.time(),
+            "metrics": {name: [[dict(key), value] for key, value in series.items()]
+                        for name, series in _registry.values.items()},
+        })
+    directory = _metrics_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    name = _file_name()
+    tmp = directory / f".{name}.json.tmp"
+    tmp.write_text(payload, encoding="utf-8")
+    tmp.replace(directory / f"{name}.json")
+
+
+def _flush_at_exit() -> None:
+    try:
+        if settings.METRICS["ENABLED"] and _registry.values:
+            flush(force=True)
+            retire(os.getpid())
+    except Exception:  # noqa: BLE001 - never fail interpreter shutdown
+        pass
+
+
+atexit.register(_flush_at_exit)
+
+
+def _read_file(path: Path) -> Optional[Dict[str, Any]]:
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None  # missing, being replaced or unreadable
+
+
+def _read_files(directory: Path) -> List[Dict[str, Any]]:
+    files = [f for f in map(_read_file, directory.glob("*.json")) if f is not None]
+    files.sort(key=lambda f: f.get("updated", 0))  # latest last, for "latest" gauges
+    return files
+
+
+def _alive(pid: Optional[int]) -> bool:
+    if pid is None:
+        return False
+    if pid == os.getpid() or os.name == "nt":  # os.kill(pid, 0) would terminate it on Windows
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # exists, owned by another user
+    except OSError:
+        return False
+    return True
+
+
+def _merge(files: List[Dict[str, Any]], *, gauges: bool = True) -> Dict[str, Dict[LabelKey, Any]]:
+    merged: Dict[str, Dict[LabelKey, Any]] = {}
+    for payload in files:
+        exited = not _alive(payload.get("pid"))
+        for name, series in payload.get("metrics", {}).items():
+            spec = SPECS.get(name)
+            if spec is None:
+                continue
+            # A summed gauge of an exited process would stay in the total forever
+            if spec.kind == "gauge" and (not gauges or (exited and spec.merge == "sum")):
+                continue
+            target = merged.setdefault(name, {})
+            for labels, value in series:
+                key = _key(labels)
+                current = target.get(key)
+                if current is None or (spec.kind == "gauge" and spec.merge == "latest"):
+                    target[key] = copy.deepcopy(value)
+                elif spec.kind == "histogram":
+                    if len(current[0]) != len(value[0]):  # bucket layout changed: keep the newest
+                        target[key] = copy.deepcopy(value)
+                        continue
+                    current[0] = [a + b for a, b in zip(current[0], value[0])]
+                    current[1] += value[1]
+                    current[2] += value[2]
+                else:
+                    target[key] = current + value
+    return merged
+
+
+def collect() -> Dict[str, Dict[LabelKey, Any]]:
+    """Merge the values of every process file (after flushing this process's)."""
+    flush(force=True)
+    return _merge(_read_files(_metrics_dir()))
+
+
+def retire(pid: int) -> None:
+    """
+    Fold the file of an exited (or exiting) process into `retired.json`: counters and histograms;
+    its gauges described a process that is gone. Called at exit by every process, and by the
+    gunicorn master when a worker exits (project/gunicorn.py), for workers killed before.
+    """
+    directory = _metrics_dir()
+    retired_path = directory / "retired.json"
+    with _retired_lock(directory):
+        paths = list(directory.glob(f"{pid}-*.json"))
+        exited = [f for f in map(_read_file, paths) if f is not None]
+        if not exited:
+            return
+        files = [f for f in [_read_file(retired_path), *exited] if f is not None]
+        payload = json.dumps({
+            "pid": None,
+            "updated": 0,  # never the "latest" value of a gauge
+            "metrics": {name: [[dict(key), value] for key, value in series.items()]
+                        for name, series in _merge(files, gauges=False).items()},
+        })
+        tmp = directory / ".retired.json.tmp"
+        tmp.write_text(payload, encoding="utf-8")
+        tmp.replace(retired_path)
+        for path in paths:
+            path.unlink(missing_ok=True)
+
+
+def clear_files() -> None:
+    """Delete every process file: the counters of a new deployment start from zero."""
+    for path in _metrics_dir().glob("*.json"):
+        path.unlink(missing_ok=True)
+
+
+# -----------------------
+# Prometheus text format
+# -----------------------
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _number(value: float) -> str:
+    if isinstance(value, float) and math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_prometheus() -> str:
+    """All merged metrics in the Prometheus text exposition format (0.0.4)."""
+    merged = collect()
+    lines: List[str] = []
+    for name, spec in SPECS.items():
+        series = merged.get(name)
+        if not series:
+            continue
+        lines.append(f"# HELP {name} {spec.help}")
+        lines.append(f"# TYPE {name} {spec.kind}")
+        for key in sorted(series):
+            value = series[key]
+            if spec.kind != "histogram":
+                lines.append(f"{name}{_labels(key)} {_number(value)}")
+                continue
+            counts, total, n = value
+            cumulative = 0
+            for bound, c in zip(list(spec.buckets) + [math.inf], counts):
+                cumulative += c
+                le = "+Inf" if math.isinf(bound) else _number(float(bound))
+                lines.append(f"{name}_bucket{_labels(key, ('le', le))} {cumulative}")
+            lines.append(f"{name}_sum{_labels(key)} {_number(float(total))}")
+            lines.append(f"{name}_count{_labels(key)} {n}")
+
+    hits = sum(v for k, v in merged.get("response_cache_requests_total", {}).items() if ("result", "hit") in k)
+    lookups = sum(merged.get("response_cache_requests_total", {}).values())
+    if lookups:
+        lines.append("# HELP response_cache_hit_ratio Response cache hits / lookups since the counters started.")
+        lines.append("# TYPE response_cache_hit_ratio gauge")
+        lines.append(f"response_cache_hit_ratio {_number(hits / lookups)}")
+    return "\n".join(lines) + "\n"
+
+
+def record_ingest(*, source: str, rows: int, fetch_seconds: float, total_seconds: float) -> None:
+    """Metrics of one ingest run (loadcitydata)."""
+    write_seconds = max(total_seconds - fetch_seconds, 1e-9)
+    inc("ingest_rows_total", rows, source=source)
+    observe("ingest_fetch_duration_seconds", fetch_seconds, source=source)
+    observe("ingest_duration_seconds", total_seconds, source=source)
+    set_value("ingest_rows_per_second", rows / write_seconds, source=source)
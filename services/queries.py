@@ -1,13 +1,64 @@
 from __future__ import annotations
 
+import itertools
+import logging
+import operator
+import threading
+from collections import OrderedDict
 from datetime import date
-from typing import Any
+from typing import Any, Dict, Hashable, Iterable, Iterator, List, Optional, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
-import pandas as pd
+from django.db.models import Count, Q
 from django.utils import timezone
 
-from api.models import WeatherDataset, City
+from api.models import WeatherDataset, WeatherDatasetIndex, WeatherHour, City
 from services.exceptions import InvalidDateRange, DatasetNotFound
+from services.ingest import rebuild_range_index
+from services.lazy import lazy_module
+from services.range_index import RangeIndex
+from services.timing import count, phase, timed
+
+np = lazy_module("numpy")
+pd = lazy_module("pandas")
+
+logger = logging.getLogger('app')
+
+TZ_UTC = "utc"
+TZ_LOCAL = "local"
+
+
+class _BoundedCache:
+    """Small thread-safe LRU used for per-process caches of derived dataset structures."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Any:
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+# Deserialized range indexes, keyed by (dataset id, built_at)
+_RANGE_INDEX_CACHE = _BoundedCache(maxsize=32)
+# Local day labels (and in-range mask) per dataset, keyed by (dataset id, tz, range index built_at)
+_DAY_LABELS_CACHE = _BoundedCache(maxsize=64)
 
 
 def _parse_date(value: Any) -> date:
@@ -32,47 +83,337 @@ def _validate_past_range(start_d: date, end_d: date) -> None:
         raise InvalidDateRange(f"end_date must be in the past (today is {today.isoformat()})")
 
 
+def dataset_key(city_name: str, start_date: Any, end_date: Any) -> Tuple[str, date, date]:
+    """Validated, normalized (city, start, end) lookup key for a dataset."""
+    start_d = _parse_date(start_date)
+    end_d = _parse_date(end_date)
+    _validate_past_range(start_d, end_d)
+    return city_name.strip().lower(), start_d, end_d
+
+
+def dataset_not_found(city_name: str, start_d: date, end_d: date) -> DatasetNotFound:
+    return DatasetNotFound(
+        f"No dataset found for city='{city_name}' start_date='{start_d}' end_date='{end_d}'. "
+        "Run: python manage.py loadcitydata <city> <start> <end> --replace"
+    )
+
+
+def _datasets_qs():
+    # The range index metadata comes along (it versions the cached local day labels), not its payload
+    return WeatherDataset.objects.select_related("city", "range_index").defer("range_index__payload")
+
+
+@timed("resolve")
 def get_dataset_or_raise(*, city_name: str, start_date: Any, end_date: Any) -> WeatherDataset:
     """
     Resolve the dataset for a city and a date range.
     The dataset must exist (it should have been created by loadcitydata command).
     """
+    _, start_d, end_d = dataset_key(city_name, start_date, end_date)
+
+    dataset = _datasets_qs().filter(city__name__iexact=city_name, start_date=start_d, end_date=end_d).first()
+    if not dataset:
+        raise dataset_not_found(city_name, start_d, end_d)
+
+    return dataset
+
+
+@timed("resolve")
+async def aget_dataset_or_raise(*, city_name: str, start_date: Any, end_date: Any) -> WeatherDataset:
+    """Async ORM variant of get_dataset_or_raise, for the ASGI views."""
+    _, start_d, end_d = dataset_key(city_name, start_date, end_date)
+
+    dataset = await _datasets_qs().filter(city__name__iexact=city_name, start_date=start_d, end_date=end_d).afirst()
+    if not dataset:
+        raise dataset_not_found(city_name, start_d, end_d)
+
+    return dataset
+
+
+@timed("resolve")
+def get_datasets_by_keys(keys: Iterable[Tuple[str, date, date]]) -> Dict[Tuple[str, date, date], WeatherDataset]:
+    """
+    Resolve many dataset keys (see dataset_key) with a single query.
+    Keys without a stored dataset are simply missing from the result.
+    """
+    keys = set(keys)
+    if not keys:
+        return {}
+
+    condition = Q()
+    for city_name, start_d, end_d in keys:
+        condition |= Q(city__name__iexact=city_name, start_date=start_d, end_date=end_d)
+
+    found: Dict[Tuple[str, date, date], WeatherDataset] = {}
+    for dataset in _datasets_qs().defer("data").filter(condition):
+        key = (dataset.city.name.lower(), dataset.start_date, dataset.end_date)
+        # Same precedence as get_dataset_or_raise: default ordering, first match wins
+        if key in keys:
+            found.setdefault(key, dataset)
+    return found
+
+
+@timed("resolve")
+def get_covering_dataset_or_raise(*, city_name: str, start_date: Any, end_date: Any) -> WeatherDataset:
+    """
+    Resolve a dataset whose range contains [start_date, end_date] (any sub-range of a stored dataset).
+    Picks the tightest one; the range index metadata is joined, its payload is not loaded.
+    """
+    start_d = _parse_date(start_date)
+    end_d = _parse_date(end_date)
+    _validate_past_range(start_d, end_d)
+
+    dataset = _covering_datasets_qs(city_name, start_d, end_d).first()
+    if not dataset:
+        raise _covering_not_found(city_name, start_d, end_d)
+
+    return dataset
+
+
+@timed("resolve")
+async def aget_covering_dataset_or_raise(*, city_name: str, start_date: Any, end_date: Any) -> WeatherDataset:
+    """Async ORM variant of get_covering_dataset_or_raise, for the ASGI views."""
     start_d = _parse_date(start_date)
     end_d = _parse_date(end_date)
     _validate_past_range(start_d, end_d)
 
-    dataset = WeatherDataset.objects.select_related('city').filter(city__name__iexact=city_name, start_date=start_d, end_date=end_d).first()
+    dataset = await _covering_datasets_qs(city_name, start_d, end_d).afirst()
     if not dataset:
-        raise DatasetNotFound(
-            f"No dataset found for city='{city_name}' start_date='{start_d}' end_date='{end_d}'. "
-            "Run: python manage.py loadcitydata <city> <start> <end> --replace"
-        )
+        raise _covering_not_found(city_name, start_d, end_d)
 
     return dataset
 
 
-def _dataset_hours_to_df(dataset: WeatherDataset) -> pd.DataFrame:
+def _covering_datasets_qs(city_name: str, start_d: date, end_d: date):
+    return (
+        WeatherDataset.objects.select_related("city", "range_index")
+        .defer("data", "range_index__payload")
+        .filter(city__name__iexact=city_name, start_date__lte=start_d, end_date__gte=end_d)
+        .order_by("-start_date", "end_date")
+    )
+
+
+def _covering_not_found(city_name: str, start_d: date, end_d: date) -> DatasetNotFound:
+    return DatasetNotFound(
+        f"No dataset covering city='{city_name}' start_date='{start_d}' end_date='{end_d}'. "
+        "Run: python manage.py loadcitydata <city> <start> <end> --replace"
+    )
+
+
+@timed("index")
+def load_range_index(dataset: WeatherDataset) -> RangeIndex:
+    """
+    Return the deserialized range index for a dataset, from the process cache when possible.
+    Datasets loaded before indexes existed get theirs built (and persisted) on first use.
+    """
+    try:
+        meta = dataset.range_index
+    except WeatherDatasetIndex.DoesNotExist:
+        meta = None
+    if meta is None or meta.version != RangeIndex.VERSION:
+        meta = rebuild_range_index(dataset)
+
+    key = (dataset.pk, meta.built_at.isoformat())
+    index = _RANGE_INDEX_CACHE.get(key)
+    if index is not None:
+        return index
+
+    if "payload" in meta.get_deferred_fields():
+        payload = WeatherDatasetIndex.objects.values_list("payload", flat=True).get(pk=meta.pk)
+    else:
+        payload = meta.payload
+    index = RangeIndex.from_bytes(payload)
+    _RANGE_INDEX_CACHE.put(key, index)
+    return index
+
+
+def resolve_tz(dataset: WeatherDataset, tz: Optional[str]) -> Optional[str]:
+    """
+    Map the tz query mode to an IANA timezone name (None means UTC).
+    "local" uses the dataset city's timezone; unknown zones fall back to UTC.
+    """
+    if tz != TZ_LOCAL:
+        return None
+    name = dataset.city.timezone
+    if not name or name.upper() in ("UTC", "GMT"):
+        return None
+    try:
+        ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        logger.warning("Unknown timezone %r for city %s, using UTC days", name, dataset.city)
+        return None
+    return name
+
+
+def _day_labels(timestamps: pd.Series, tz_name: Optional[str]) -> np.ndarray:
+    """
+    YYYY-MM-DD label per row, vectorized: convert to wall time (DST-aware when tz_name is set),
+    truncate to days, and format each distinct day once instead of every row.
+    """
+    wall = timestamps.dt.tz_convert(tz_name) if tz_name else timestamps
+    days = wall.dt.tz_localize(None).to_numpy().astype("datetime64[D]")
+    unique_days, inverse = np.unique(days, return_inverse=True)
+    labels = np.datetime_as_string(unique_days, unit="D").astype(object)
+    return labels[inverse]
+
+
+def _dataset_hours_to_df(
+        dataset: WeatherDataset,
+        tz: Optional[str] = None,
+        columns: Tuple[str, ...] = ("temperature", "precipitation"),
+) -> pd.DataFrame:
     """
     Load all WeatherHour rows for a dataset into a pandas DataFrame.
 
     Columns:
-      - timestamp (datetime, tz-aware)
-      - date (YYYY-MM-DD string)
-      - temperature
-      - precipitation
+      - timestamp (datetime, tz-aware; in the city's timezone when tz="local")
+      - date (YYYY-MM-DD string; UTC date, or local date when tz="local")
+      - temperature (unless excluded via columns)
+      - precipitation (unless excluded via columns)
     """
+    with phase("fetch"):
+        rows = list(_hours_rows_qs(dataset, columns))
+    count("rows", len(rows))
+    return _hours_rows_to_df(dataset, rows, tz=tz, columns=columns)
+
+
+def _hours_rows_qs(dataset: WeatherDataset, columns: Tuple[str, ...]):
     # Fetch only the fields we need, ordered by timestamp asc for stable min/max picking
-    qs = dataset.hours.all().only("timestamp", "temperature", "precipitation").order_by("timestamp")
-    rows = list(qs.values("timestamp", "temperature", "precipitation"))
+    return dataset.hours.all().only("timestamp", *columns).order_by("timestamp").values("timestamp", *columns)
+
+
+async def _ahours_rows(dataset: WeatherDataset, columns: Tuple[str, ...]) -> List[Dict[str, Any]]:
+    """Async ORM fetch of the rows consumed by _hours_rows_to_df."""
+    with phase("fetch"):
+        rows = [row async for row in _hours_rows_qs(dataset, columns)]
+    count("rows", len(rows))
+    return rows
 
+
+@timed("frame")
+def _hours_rows_to_df(
+        dataset: WeatherDataset,
+        rows: List[Dict[str, Any]],
+        tz: Optional[str] = None,
+        columns: Tuple[str, ...] = ("temperature", "precipitation"),
+) -> pd.DataFrame:
+    """Build the _dataset_hours_to_df frame from already fetched rows (CPU only, no queries)."""
     if not rows:
-        return pd.DataFrame(columns=["timestamp", "date", "temperature", "precipitation"])
+        return pd.DataFrame(columns=["timestamp", "date", *columns])
 
     df = pd.DataFrame(rows)
     # Ensure timestamp is datetime, and keep timezone awareness
     df["timestamp"] = pd.to_datetime(df["timestamp"], utc=True)
 
-    # Get YYYY-MM-DD string from timestamp, for easier grouping and plotting.
-    df["date"] = df["timestamp"].dt.strftime("%Y-%m-%d")
+    tz_name = resolve_tz(dataset, tz)
+    if not tz_name:
+        # Get YYYY-MM-DD string from timestamp, for easier grouping and plotting.
+        df["date"] = _day_labels(df["timestamp"], None)
+        return df
 
+    df["timestamp"] = df["timestamp"].dt.tz_convert(tz_name)
+    # The stored hours cover UTC days: the local days just outside [start_date, end_date] (the day
+    # after end_date east of UTC, the day before start_date west of it) only have a few of their
+    # hours and are dropped. Labels and mask are cached per dataset version, so the local-day path
+    # costs no more than the UTC one.
+    version = _hours_version(dataset)
+    key = (dataset.pk, tz_name, version, len(df))
+    cached = _DAY_LABELS_CACHE.get(key) if version is not None else None
+    if cached is None:
+        labels = _day_labels(df["timestamp"], tz_name)
+        in_range = (labels >= dataset.start_date.isoformat()) & (labels <= dataset.end_date.isoformat())
+        cached = (labels, in_range.astype(bool))
+        if version is not None:
+            _DAY_LABELS_CACHE.put(key, cached)
+    labels, in_range = cached
+    df["date"] = labels
+    if not in_range.all():
+        df = df.loc[in_range].reset_index(drop=True)
     return df
+
+
+def _hours_version(dataset: WeatherDataset) -> Optional[str]:
+    """
+    built_at of the dataset's range index when it was loaded along with the dataset (no query),
+    else None. The index is rebuilt on every ingest and dropped when hours change, so it versions
+    the stored hours.
+    """
+    if not WeatherDataset.range_index.is_cached(dataset):
+        return None
+    meta = WeatherDataset.range_index.related.get_cached_value(dataset)
+    return meta.built_at.isoformat() if meta is not None else None
+
+
+@timed("aggregate")
+def threshold_counts(dataset: WeatherDataset, *, above: float, below: float) -> Dict[str, int]:
+    """Hours above/below the temperature thresholds, counted by the DB in one aggregate query."""
+    counts = dataset.hours.order_by().aggregate(
+        hours_above_threshold=Count("pk", filter=Q(temperature__gt=above)),
+        hours_below_threshold=Count("pk", filter=Q(temperature__lt=below)),
+    )
+    return {name: int(value or 0) for name, value in counts.items()}
+
+
+def _datasets_hours_to_df(datasets: Iterable[WeatherDataset]) -> pd.DataFrame:
+    """
+    Load the WeatherHour rows of several datasets with a single query.
+
+    Columns: dataset_id, timestamp (UTC), date (UTC YYYY-MM-DD), temperature, precipitation.
+    Rows are ordered by dataset then timestamp, for stable min/max picking per dataset.
+    """
+    ids = [ds.pk for ds in datasets]
+    columns = ["dataset_id", "timestamp", "date", "temperature", "precipitation"]
+    if not ids:
+        return pd.DataFrame(columns=columns)
+
+    rows = (
+        WeatherHour.objects.filter(dataset_id__in=ids)
+        .order_by("dataset_id", "timestamp")
+        .values_list("dataset_id", "timestamp", "temperature", "precipitation")
+    )
+    with phase("fetch"):
+        df = pd.DataFrame.from_records(rows.iterator(chunk_size=10_000),
+                                       columns=["dataset_id", "timestamp", "temperature", "precipitation"])
+    count("rows", len(df))
+    if df.empty:
+        return pd.DataFrame(columns=columns)
+
+    df["timestamp"] = pd.to_datetime(df["timestamp"], utc=True)
+    df["temperature"] = pd.to_numeric(df["temperature"], errors="coerce")
+    df["precipitation"] = pd.to_numeric(df["precipitation"], errors="coerce")
+    df["date"] = _day_labels(df["timestamp"], None)
+    return df[columns]
+
+
+def _iter_datasets_hours_rows(
+        datasets: Iterable[WeatherDataset],
+) -> Iterator[Tuple[WeatherDataset, List[Dict[str, Any]]]]:
+    """
+    (dataset, rows for _hours_rows_to_df) for every dataset with hours, from a single query.
+
+    Rows are streamed ordered by dataset, so only one dataset's rows are held at a time
+    (unlike _datasets_hours_to_df). Rows also carry the dataset_id.
+    """
+    by_id = {ds.pk: ds for ds in datasets}
+    if not by_id:
+        return
+
+    rows = (
+        WeatherHour.objects.filter(dataset_id__in=list(by_id))
+        .order_by("dataset_id", "timestamp")
+        .values("dataset_id", "timestamp", "temperature", "precipitation")
+        .iterator(chunk_size=10_000)
+    )
+    for dataset_id, group in itertools.groupby(rows, key=operator.itemgetter("dataset_id")):
+        with phase("fetch"):
+            dataset_rows = list(group)
+        count("rows", len(dataset_rows))
+        yield by_id[dataset_id], dataset_rows
+
+
+def _iter_datasets_hours_dfs(
+        datasets: Iterable[WeatherDataset],
+) -> Iterator[Tuple[WeatherDataset, pd.DataFrame]]:
+    """(dataset, _dataset_hours_to_df frame in UTC) for every dataset with hours, from a single query."""
+    for dataset, rows in _iter_datasets_hours_rows(datasets):
+        yield dataset, _hours_rows_to_df(dataset, rows)
@@ -0,0 +1,315 @@
+from __future__ import annotations
+
+import io
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from typing import Any, Dict, Iterable, Optional
+
+from services.lazy import lazy_module
+
+np = lazy_module("numpy")
+
+# Hours per block for the min/max sparse tables. Partial blocks at the edges of a query
+# are scanned directly (at most 2 * BLOCK values), full blocks are answered by the table.
+BLOCK = 32
+
+# Fixed temperature histogram per UTC day (mergeable by addition): HIST_BINS bins of HIST_STEP
+# degrees from HIST_MIN; values outside the range fall into the edge bins.
+HIST_MIN = -60.0
+HIST_STEP = 0.5
+HIST_BINS = 240
+
+_EPOCH = date(1970, 1, 1)
+_DAY_SECONDS = 86400
+
+
+def _prefix(values: np.ndarray, dtype) -> np.ndarray:
+    out = np.zeros(len(values) + 1, dtype=dtype)
+    np.cumsum(values, out=out[1:])
+    return out
+
+
+def _sparse_table(keys: np.ndarray, level0: np.ndarray) -> np.ndarray:
+    """
+    Sparse table of arg-best indices. keys are comparison values (larger is better),
+    level0[i] is the arg-best position for slot i. Ties keep the leftmost position.
+    """
+    n = len(level0)
+    levels = [level0.astype(np.int32)]
+    span = 1
+    while span * 2 <= n:
+        prev = levels[-1]
+        left, right = prev[:n - span * 2 + 1], prev[span:n - span + 1]
+        levels.append(np.where(keys[left] >= keys[right], left, right).astype(np.int32))
+        span *= 2
+    # Pad levels to a rectangle so the table can be stored as one array
+    table = np.zeros((len(levels), max(n, 1)), dtype=np.int32)
+    for k, level in enumerate(levels):
+        table[k, :len(level)] = level
+    return table
+
+
+def _sparse_query(table: np.ndarray, keys: np.ndarray, lo: int, hi: int) -> int:
+    """Arg-best over slots [lo, hi] (inclusive) in O(1)."""
+    k = (hi - lo + 1).bit_length() - 1
+    a, b = int(table[k, lo]), int(table[k, hi - (1 << k) + 1])
+    return a if keys[a] >= keys[b] else b
+
+
+class RangeIndex:
+    """
+    Precomputed per-dataset index answering [start_date, end_date] sub-range stats
+    without scanning the hourly rows:
+
+      - prefix sums/counts for temperature average and precipitation total (O(1))
+      - block sparse tables for temperature max/min with argmax/argmin (O(1) + 2 * BLOCK scan)
+      - per-day (UTC) precipitation totals with prefix sums and a sparse table for the wettest day
+      - per-day temperature sums/counts, so daily averages are a slice when asked for
+      - per-day fixed-bin temperature histograms, merged for percentiles/histograms (O(days * bins))
+
+    Day boundaries are UTC dates, like the rest of the stats services.
+    """
+
+    VERSION = 2
+
+    def __init__(self, arrays: Dict[str, np.ndarray]):
+        self.a = arrays
+        # Comparison keys for the min/max tables, derived once per loaded index
+        temp = arrays["temp"]
+        self._max_keys = np.where(np.isnan(temp), -np.inf, temp)
+        self._min_keys = np.where(np.isnan(temp), -np.inf, -temp)
+
+    # -----------------------
+    # Build / (de)serialize
+    # -----------------------
+
+    @classmethod
+    def build(cls, timestamps: np.ndarray, temperature: np.ndarray, precipitation: np.ndarray) -> "RangeIndex":
+        """timestamps: epoch seconds (UTC) sorted ascending; values may contain NaN."""
+        ts = np.asarray(timestamps, dtype=np.int64)
+        temp = np.asarray(temperature, dtype=np.float64)
+        prec = np.asarray(precipitation, dtype=np.float64)
+
+        temp_ok = ~np.isnan(temp)
+        prec_ok = ~np.isnan(prec)
+        temp0 = np.where(temp_ok, temp, 0.0)
+        prec0 = np.where(prec_ok, prec, 0.0)
+
+        # Max/min keys: NaN never wins. Min is stored as a max over negated values.
+        max_keys = np.where(temp_ok, temp, -np.inf)
+        min_keys = np.where(temp_ok, -temp, -np.inf)
+
+        n = len(ts)
+        nblocks = (n + BLOCK - 1) // BLOCK
+        padded = nblocks * BLOCK
+        block_max0 = np.zeros(nblocks, dtype=np.int32)
+        block_min0 = np.zeros(nblocks, dtype=np.int32)
+        if nblocks:
+            starts = np.arange(nblocks) * BLOCK
+            pad = np.full(padded - n, -np.inf)
+            block_max0 = (starts + np.argmax(np.concatenate([max_keys, pad]).reshape(nblocks, BLOCK), axis=1))
+            block_min0 = (starts + np.argmax(np.concatenate([min_keys, pad]).reshape(nblocks, BLOCK), axis=1))
+
+        days = (ts // _DAY_SECONDS).astype(np.int32)
+        day_values, day_start, day_pos = np.unique(days, return_index=True, return_inverse=True)
+        day_prec = np.add.reduceat(prec0, day_start) if n else np.zeros(0)
+        day_tsum = np.add.reduceat(temp0, day_start) if n else np.zeros(0)
+        day_tcnt = np.add.reduceat(temp_ok.astype(np.int32), day_start) if n else np.zeros(0, dtype=np.int32)
+
+        # A UTC day holds at most 24 hourly rows, so uint8 counts are enough
+        hist_bins = np.clip(np.floor((temp0 - HIST_MIN) / HIST_STEP), 0, HIST_BINS - 1).astype(np.int64)
+        flat = np.bincount(day_pos[temp_ok] * HIST_BINS + hist_bins[temp_ok], minlength=len(day_values) * HIST_BINS)
+        day_hist = flat.reshape(len(day_values), HIST_BINS).astype(np.uint8)
+
+        arrays = {
+            "version": np.array([cls.VERSION], dtype=np.int32),
+            "ts": ts,
+            "temp": temp,
+            "temp_sum": _prefix(temp0, np.float64),
+            "temp_cnt": _prefix(temp_ok.astype(np.int32), np.int32),
+            "temp_max_st": _sparse_table(max_keys, block_max0),
+            "temp_min_st": _sparse_table(min_keys, block_min0),
+            "prec_sum": _prefix(prec0, np.float64),
+            "day": day_values.astype(np.int32),
+            "day_prec": day_prec.astype(np.float64),
+            "day_wet_cnt": _prefix((day_prec > 0).astype(np.int32), np.int32),
+            "day_prec_max_st": _sparse_table(day_prec, np.arange(len(day_values), dtype=np.int32)),
+            "day_temp_sum": day_tsum.astype(np.float64),
+            "day_temp_cnt": day_tcnt.astype(np.int32),
+            "day_hist": day_hist,
+        }
+        return cls(arrays)
+
+    @classmethod
+    def from_dataframe(cls, df) -> "RangeIndex":
+        """Build from a DataFrame with timestamp (tz-aware), temperature and precipitation columns."""
+        import pandas as pd
+
+        if df.empty:
+            return cls.build(np.zeros(0, dtype=np.int64), np.zeros(0), np.zeros(0))
+        ts = pd.to_datetime(df["timestamp"], utc=True)
+        seconds = ts.astype("datetime64[s, UTC]").astype("int64").to_numpy()
+        return cls.build(
+            seconds,
+            pd.to_numeric(df["temperature"], errors="coerce").to_numpy(dtype="float64", na_value=np.nan),
+            pd.to_numeric(df["precipitation"], errors="coerce").to_numpy(dtype="float64", na_value=np.nan),
+        )
+
+    def to_bytes(self) -> bytes:
+        buf = io.BytesIO()
+        np.savez_compressed(buf, **self.a)
+        return buf.getvalue()
+
+    @classmethod
+    def from_bytes(cls, payload: bytes) -> "RangeIndex":
+        with np.load(io.BytesIO(bytes(payload))) as data:
+            return cls({k: data[k] for k in data.files})
+
+    def __len__(self) -> int:
+        return len(self.a["ts"])
+
+    # -----------------------
+    # Queries
+    # -----------------------
+
+    def _row_bounds(self, start_d: date, end_d: date):
+        lo_s = (start_d - _EPOCH).days * _DAY_SECONDS
+        hi_s = ((end_d - _EPOCH).days + 1) * _DAY_SECONDS
+        ts = self.a["ts"]
+        return int(np.searchsorted(ts, lo_s, "left")), int(np.searchsorted(ts, hi_s, "left"))
+
+    def _day_bounds(self, start_d: date, end_d: date):
+        day = self.a["day"]
+        return (int(np.searchsorted(day, (start_d - _EPOCH).days, "left")),
+                int(np.searchsorted(day, (end_d - _EPOCH).days, "right")))
+
+    def _arg_best(self, table: np.ndarray, keys: np.ndarray, lo: int, hi: int) -> int:
+        """Arg-best over rows [lo, hi) using partial block scans + the block sparse table."""
+        bl, br = lo // BLOCK, (hi - 1) // BLOCK
+        if bl == br:
+            return lo + int(np.argmax(keys[lo:hi]))
+        # left partial, middle full blocks, right partial; ties keep the leftmost row
+        left_end = (bl + 1) * BLOCK
+        best = lo + int(np.argmax(keys[lo:left_end]))
+        if bl + 1 <= br - 1:
+            mid = _sparse_query(table, keys, bl + 1, br - 1)
+            if keys[mid] > keys[best]:
+                best = mid
+        right = br * BLOCK + int(np.argmax(keys[br * BLOCK:hi]))
+        if keys[right] > keys[best]:
+            best = right
+        return best
+
+    def _fmt_ts(self, row: int) -> str:
+        dt = datetime.fromtimestamp(int(self.a["ts"][row]), tz=dt_timezone.utc)
+        return dt.strftime("%Y-%m-%dT%H:%M")
+
+    def _fmt_day(self, day_pos: int) -> str:
+        return (_EPOCH + timedelta(days=int(self.a["day"][day_pos]))).isoformat()
+
+    def query(self, start_date: date, end_date: date, *, daily: bool = False) -> Dict[str, Any]:
+        """Stats for rows whose UTC date is within [start_date, end_date]."""
+        lo, hi = self._row_bounds(start_date, end_date)
+        d_lo, d_hi = self._day_bounds(start_date, end_date)
+        return self._query(lo, hi, d_lo, d_hi, daily=daily)
+
+    def query_all(self, *, daily: bool = False) -> Dict[str, Any]:
+        """Stats over every row of the dataset."""
+        return self._query(0, len(self.a["ts"]), 0, len(self.a["day"]), daily=daily)
+
+    def _query(self, lo: int, hi: int, d_lo: int, d_hi: int, *, daily: bool) -> Dict[str, Any]:
+        a = self.a
+        temp_cnt = int(a["temp_cnt"][hi] - a["temp_cnt"][lo])
+        temp_avg: Optional[float] = None
+        temp_max = temp_min = None
+        if temp_cnt:
+            temp_avg = float((a["temp_sum"][hi] - a["temp_sum"][lo]) / temp_cnt)
+            temp = a["temp"]
+            i_max = self._arg_best(a["temp_max_st"], self._max_keys, lo, hi)
+            i_min = self._arg_best(a["temp_min_st"], self._min_keys, lo, hi)
+            temp_max = {"value": float(temp[i_max]), "date_time": self._fmt_ts(i_max)}
+            temp_min = {"value": float(temp[i_min]), "date_time": self._fmt_ts(i_min)}
+
+        num_days = d_hi - d_lo
+        prec_total = float(a["prec_sum"][hi] - a["prec_sum"][lo])
+        prec_max = None
+        if num_days:
+            i_day = _sparse_query(a["day_prec_max_st"], a["day_prec"], d_lo, d_hi - 1)
+            prec_max = {"value": float(a["day_prec"][i_day]), "date": self._fmt_day(i_day)}
+
+        out = {
+            "hours": hi - lo,
+            "temperature": {
+                "average": temp_avg,
+                "max": temp_max,
+                "min": temp_min,
+            },
+            "precipitation": {
+                "total": prec_total,
+                "days_with_precipitation": int(a["day_wet_cnt"][d_hi] - a["day_wet_cnt"][d_lo]),
+                "max": prec_max,
+                "average": float(prec_total / max(1, num_days)),
+            },
+        }
+
+        if daily:
+            out["temperature"]["average_by_day"] = {
+                self._fmt_day(i): float(a["day_temp_sum"][i] / a["day_temp_cnt"][i])
+                for i in range(d_lo, d_hi) if a["day_temp_cnt"][i]
+            }
+            out["precipitation"]["total_by_day"] = {
+                self._fmt_day(i): float(a["day_prec"][i]) for i in range(d_lo, d_hi)
+            }
+        return out
+
+    def distribution(
+            self,
+            start_date: date,
+            end_date: date,
+            *,
+            percentiles: Iterable[float] = (5, 50, 95),
+            bin_width: float = 1.0,
+    ) -> Dict[str, Any]:
+        """
+        Temperature percentiles and histogram for UTC dates within [start_date, end_date], from the
+        merged per-day histograms. Percentiles interpolate linearly inside a bin (error <= HIST_STEP)
+        and are clamped to the exact min/max of the range.
+        bin_width must be a multiple of HIST_STEP; bins are aligned to HIST_MIN.
+        """
+        lo, hi = self._row_bounds(start_date, end_date)
+        d_lo, d_hi = self._day_bounds(start_date, end_date)
+        counts = self.a["day_hist"][d_lo:d_hi].sum(axis=0, dtype=np.int64)
+        n = int(counts.sum())
+
+        out: Dict[str, Any] = {"hours": n, "percentiles": {}, "histogram": {"bin_width": bin_width, "bins": []}}
+        if not n:
+            out["percentiles"] = {_percentile_key(q): None for q in percentiles}
+            return out
+
+        temp = self.a["temp"]
+        t_min = float(temp[self._arg_best(self.a["temp_min_st"], self._min_keys, lo, hi)])
+        t_max = float(temp[self._arg_best(self.a["temp_max_st"], self._max_keys, lo, hi)])
+        cum = np.cumsum(counts)
+        for q in percentiles:
+            target = q / 100.0 * n
+            b = min(int(np.searchsorted(cum, target, "left")), HIST_BINS - 1)
+            below = cum[b] - counts[b]
+            frac = (target - below) / counts[b] if counts[b] else 0.0
+            value = HIST_MIN + (b + frac) * HIST_STEP
+            out["percentiles"][_percentile_key(q)] = float(min(max(value, t_min), t_max))
+
+        factor = max(1, int(round(bin_width / HIST_STEP)))
+        padded = np.zeros(-(-HIST_BINS // factor) * factor, dtype=np.int64)
+        padded[:HIST_BINS] = counts
+        merged = padded.reshape(-1, factor).sum(axis=1)
+        nonzero = np.flatnonzero(merged)
+        width = factor * HIST_STEP
+        out["histogram"]["bins"] = [
+            {"lower": HIST_MIN + i * width, "upper": HIST_MIN + (i + 1) * width, "count": int(merged[i])}
+            for i in range(int(nonzero[0]), int(nonzero[-1]) + 1)
+        ]
+        return out
+
+
+def _percentile_key(q: float) -> str:
+    # 5 -> "p5", 99.9 -> "p99.9"
+    return f"p{q:g}"
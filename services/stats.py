@@ -1,11 +1,31 @@
 from __future__ import annotations
 
-from typing import Any, Dict
-
-import pandas as pd
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
 
 from api.models import WeatherDataset
-from services.queries import get_dataset_or_raise, _dataset_hours_to_df
+from services.exceptions import InvalidDateRange, StatsError
+from services.lazy import lazy_module
+from services.range_index import RangeIndex
+from services.queries import (
+    dataset_key,
+    dataset_not_found,
+    get_dataset_or_raise,
+    get_datasets_by_keys,
+    get_covering_dataset_or_raise,
+    load_range_index,
+    _dataset_hours_to_df,
+    _datasets_hours_to_df,
+    _hours_rows_to_df,
+    _iter_datasets_hours_dfs,
+    _iter_datasets_hours_rows,
+    _parse_date,
+    resolve_tz,
+    threshold_counts,
+    TZ_UTC,
+)
+from services.timing import timed
+
+pd = lazy_module("pandas")
 
 
 # -----------------------
@@ -15,7 +35,7 @@ from services.queries import get_dataset_or_raise, _dataset_hours_to_df
 
 def _fmt_dt(dt: pd.Timestamp) -> str:
     # PDF uses "YYYY-MM-DDTHH:00" without timezone (example: 2024-07-01T15:00) :contentReference[oaicite:5]{index=5}
-    # We format in UTC consistently.
+    # We format in UTC, or in the city's wall time when tz="local".
     return dt.strftime("%Y-%m-%dT%H:%M")
 
 
@@ -23,6 +43,12 @@ def _fmt_dt(dt: pd.Timestamp) -> str:
 # Temperature stats
 # -----------------------
 
+TEMPERATURE_FIELDS = (
+    "average", "average_by_day", "max", "min", "hours_above_threshold", "hours_below_threshold",
+)
+PRECIPITATION_FIELDS = ("total", "total_by_day", "days_with_precipitation", "max", "average")
+
+
 def temperature_stats(
         *,
         city_name: str,
@@ -30,9 +56,17 @@ def temperature_stats(
         end_date: Any,
         above: float = 30.0,
         below: float = 0.0,
+        tz: str = TZ_UTC,
+        fields: Optional[Iterable[str]] = None,
 ) -> Dict[str, Any]:
     """
     Compute temperature statistics for a city and date range.
+    With tz="local", days and max/min date_time follow the city's timezone.
+
+    fields limits the output to a subset of TEMPERATURE_FIELDS. Only what is requested is
+    computed, from the cheapest source: the range index for average/max/min (and UTC daily
+    averages) and one DB aggregate for the threshold counts. With tz="local" they come from
+    the hourly DataFrame, which alone keeps to the requested local days.
 
     Output matches the PDF structure:
     {
@@ -47,52 +81,92 @@ def temperature_stats(
     }
     """
     dataset = get_dataset_or_raise(city_name=city_name, start_date=start_date, end_date=end_date)
-    df = _dataset_hours_to_df(dataset)
+    return _temperature_stats_for_dataset(dataset, above=above, below=below, tz=tz, fields=fields)
+
+
+def _temperature_stats_for_dataset(
+        dataset: WeatherDataset,
+        *,
+        above: float,
+        below: float,
+        tz: str,
+        fields: Optional[Iterable[str]],
+) -> Dict[str, Any]:
+    if fields is None:
+        df = _dataset_hours_to_df(dataset, tz=tz)
+        return _temperature_from_df(df, above=above, below=below)
+
+    requested = set(fields)
+    if resolve_tz(dataset, tz):
+        # Local days: only the hours of [start_date, end_date] in the city's wall time count, which
+        # the UTC index and the DB aggregate cannot select
+        df = _dataset_hours_to_df(dataset, tz=tz, columns=("temperature",))
+        return _temperature_from_df(df, above=above, below=below, fields=requested)
+
+    out: Dict[str, Any] = {}
+    if requested & {"average", "average_by_day", "max", "min"}:
+        indexed = load_range_index(dataset).query_all(daily="average_by_day" in requested)["temperature"]
+        for name in ("average", "average_by_day", "max", "min"):
+            if name in requested:
+                out[name] = indexed[name]
+    if requested & {"hours_above_threshold", "hours_below_threshold"}:
+        counts = threshold_counts(dataset, above=above, below=below)
+        for name in ("hours_above_threshold", "hours_below_threshold"):
+            if name in requested:
+                out[name] = counts[name]
+    return {"temperature": out}
+
+
+@timed("compute")
+def _temperature_from_df(
+        df: pd.DataFrame,
+        *,
+        above: float,
+        below: float,
+        fields: Optional[Iterable[str]] = None,
+) -> Dict[str, Any]:
+    """Temperature stats over a frame built by _dataset_hours_to_df (only the requested fields)."""
+    requested = set(fields) if fields is not None else set(TEMPERATURE_FIELDS)
 
     if df.empty:
         # Keep consistent schema but no data
-        return {
-            "temperature": {
-                "average": None,
-                "average_by_day": {},
-                "max": None,
-                "min": None,
-                "hours_above_threshold": 0,
-                "hours_below_threshold": 0,
-            }
+        empty = {
+            "average": None,
+            "average_by_day": {},
+            "max": None,
+            "min": None,
+            "hours_above_threshold": 0,
+            "hours_below_threshold": 0,
         }
+        return {"temperature": {k: v for k, v in empty.items() if k in requested}}
+
+    out: Dict[str, Any] = {}
 
     # global average
-    avg = float(df["temperature"].mean())
+    if "average" in requested:
+        out["average"] = float(df["temperature"].mean())
 
     # average by day
-    avg_by_day_series = df.groupby("date")["temperature"].mean()
-    avg_by_day = {day: float(val) for day, val in avg_by_day_series.items()}
+    if "average_by_day" in requested:
+        avg_by_day_series = df.groupby("date")["temperature"].mean()
+        out["average_by_day"] = {day: float(val) for day, val in avg_by_day_series.items()}
 
     # max/min with timestamp
-    idx_max = df["temperature"].idxmax()
-    idx_min = df["temperature"].idxmin()
-
-    max_row = df.loc[idx_max]
-    min_row = df.loc[idx_min]
-
-    max_obj = {"value": float(max_row["temperature"]), "date_time": _fmt_dt(pd.Timestamp(max_row["timestamp"]))}
-    min_obj = {"value": float(min_row["temperature"]), "date_time": _fmt_dt(pd.Timestamp(min_row["timestamp"]))}
+    if "max" in requested:
+        max_row = df.loc[df["temperature"].idxmax()]
+        out["max"] = {"value": float(max_row["temperature"]), "date_time": _fmt_dt(pd.Timestamp(max_row["timestamp"]))}
+    if "min" in requested:
+        min_row = df.loc[df["temperature"].idxmin()]
+        out["min"] = {"value": float(min_row["temperature"]), "date_time": _fmt_dt(pd.Timestamp(min_row["timestamp"]))}
 
     # hours above/below thresholds
-    hours_above = int((df["temperature"] > above).sum())
-    hours_below = int((df["temperature"] < below).sum())
+    if "hours_above_threshold" in requested:
+        out["hours_above_threshold"] = int((df["temperature"] > above).sum())
+    if "hours_below_threshold" in requested:
+        out["hours_below_threshold"] = int((df["temperature"] < below).sum())
 
-    return {
-        "temperature": {
-            "average": avg,
-            "average_by_day": avg_by_day,
-            "max": max_obj,
-            "min": min_obj,
-            "hours_above_threshold": hours_above,
-            "hours_below_threshold": hours_below,
-        }
-    }
+    # keep the documented key order
+    return {"temperature": {k: out[k] for k in TEMPERATURE_FIELDS if k in out}}
 
 
 # -----------------------
@@ -104,8 +178,15 @@ def precipitation_stats(
         city_name: str,
         start_date: Any,
         end_date: Any,
+        tz: str = TZ_UTC,
+        fields: Optional[Iterable[str]] = None,
 ) -> Dict[str, Any]:
     """
+    With tz="local", days follow the city's timezone.
+
+    fields limits the output to a subset of PRECIPITATION_FIELDS. Requested fields come from
+    the range index (UTC days), and from the hourly DataFrame with tz="local".
+
     Output matches PDF structure:
     {
       "precipitation": {
@@ -118,48 +199,350 @@ def precipitation_stats(
     }
     """
     dataset = get_dataset_or_raise(city_name=city_name, start_date=start_date, end_date=end_date)
-    df = _dataset_hours_to_df(dataset)
+    return _precipitation_stats_for_dataset(dataset, tz=tz, fields=fields)
+
+
+def _precipitation_stats_for_dataset(
+        dataset: WeatherDataset,
+        *,
+        tz: str,
+        fields: Optional[Iterable[str]],
+) -> Dict[str, Any]:
+    if fields is None:
+        df = _dataset_hours_to_df(dataset, tz=tz)
+        return _precipitation_from_df(df)
+
+    requested = set(fields)
+    if resolve_tz(dataset, tz):  # local days: see _temperature_stats_for_dataset
+        df = _dataset_hours_to_df(dataset, tz=tz, columns=("precipitation",))
+        return _precipitation_from_df(df, fields=requested)
+
+    indexed = load_range_index(dataset).query_all(daily="total_by_day" in requested)["precipitation"]
+    return {"precipitation": {k: indexed[k] for k in PRECIPITATION_FIELDS if k in requested}}
+
+
+@timed("compute")
+def _precipitation_from_df(df: pd.DataFrame, *, fields: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+    """Precipitation stats over a frame built by _dataset_hours_to_df (only the requested fields)."""
+    requested = set(fields) if fields is not None else set(PRECIPITATION_FIELDS)
 
     if df.empty:
-        return {
-            "precipitation": {
-                "total": 0.0,
-                "total_by_day": {},
-                "days_with_precipitation": 0,
-                "max": None,
-                "average": 0.0,
-            }
+        empty = {
+            "total": 0.0,
+            "total_by_day": {},
+            "days_with_precipitation": 0,
+            "max": None,
+            "average": 0.0,
         }
+        return {"precipitation": {k: v for k, v in empty.items() if k in requested}}
 
+    out: Dict[str, Any] = {}
     total = float(df["precipitation"].sum())
+    if "total" in requested:
+        out["total"] = total
+
+    # every other field is day-based
+    if requested - {"total"}:
+        total_by_day_series = df.groupby("date")["precipitation"].sum()
+
+        if "total_by_day" in requested:
+            out["total_by_day"] = {day: float(val) for day, val in total_by_day_series.items()}
+
+        # days with precipitation > 0mm (daily sum > 0)
+        if "days_with_precipitation" in requested:
+            out["days_with_precipitation"] = int((total_by_day_series > 0).sum())
+
+        # max precipitation day (by daily total)
+        if "max" in requested:
+            if len(total_by_day_series) > 0:
+                day_max = total_by_day_series.idxmax()
+                val_max = float(total_by_day_series.max())
+                out["max"] = {"value": val_max, "date": str(day_max)}
+            else:
+                out["max"] = None
+
+        # average precipitation in the range: interpret as average daily precipitation
+        # (matches sample: average ~ total / number_of_days)
+        if "average" in requested:
+            num_days = max(1, len(total_by_day_series))
+            out["average"] = float(total / num_days)
+
+    return {"precipitation": {k: out[k] for k in PRECIPITATION_FIELDS if k in out}}
+
+
+# -----------------------
+# Batch stats (many city/range queries, shared dataset loads)
+# -----------------------
+
+def batch_stats(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Answer many {city, start_date, end_date, metrics, thresholds, tz} items in one call.
+
+    Datasets for all items are resolved with a single query and the hours of all of them are
+    loaded with another, whatever the number of datasets. Each dataset gets one DataFrame per
+    tz mode no matter how many items/metrics use it (temperature and precipitation for the
+    same dataset share one DataFrame).
+
+    Returns one entry per item, in order:
+      {"status": 200, "temperature": {...}, "precipitation": {...}}  (only requested metrics)
+      {"status": 400|404, "detail": "..."}
+    """
+    keys = []
+    for item in items:
+        try:
+            keys.append(dataset_key(item["city"], item["start_date"], item["end_date"]))
+        except StatsError as e:
+            keys.append(e)
+    datasets = get_datasets_by_keys([k for k in keys if not isinstance(k, StatsError)])
+
+    # tz modes wanted per dataset, then every frame from one hours query
+    tz_modes: Dict[int, Set[str]] = {}
+    for item, key in zip(items, keys):
+        dataset = datasets.get(key) if not isinstance(key, StatsError) else None
+        if dataset is not None:
+            tz_modes.setdefault(dataset.pk, set()).add(item.get("tz", TZ_UTC))
+    used = [ds for ds in datasets.values() if ds.pk in tz_modes]
+    rows_by_id = {ds.pk: [] for ds in used}
+    for dataset, rows in _iter_datasets_hours_rows(used):
+        rows_by_id[dataset.pk] = rows
+    frames: Dict[Tuple[int, str], pd.DataFrame] = {
+        (ds.pk, tz): _hours_rows_to_df(ds, rows_by_id[ds.pk], tz=tz) for ds in used for tz in tz_modes[ds.pk]
+    }
+
+    results: List[Dict[str, Any]] = []
+    for item, key in zip(items, keys):
+        if isinstance(key, InvalidDateRange):
+            results.append({"status": 400, "detail": str(key)})
+            continue
+        dataset = datasets.get(key)
+        if dataset is None:
+            results.append({"status": 404, "detail": str(dataset_not_found(item["city"], key[1], key[2]))})
+            continue
+
+        df = frames[(dataset.pk, item.get("tz", TZ_UTC))]
+
+        result: Dict[str, Any] = {"status": 200}
+        thresholds = item.get("thresholds") or {}
+        if "temperature" in item["metrics"]:
+            result.update(_temperature_from_df(
+                df, above=thresholds.get("above", 30.0), below=thresholds.get("below", 0.0),
+            ))
+        if "precipitation" in item["metrics"]:
+            result.update(_precipitation_from_df(df))
+        results.append(result)
+
+    return results
+
+
+# -----------------------
+# Multi-city comparison (one query, one grouped computation)
+# -----------------------
+
+def compare_stats(
+        *,
+        city_names: List[str],
+        start_date: Any,
+        end_date: Any,
+        above: float = 30.0,
+        below: float = 0.0,
+) -> Dict[str, Any]:
+    """
+    Temperature and precipitation metrics for several cities over the same date range.
+
+    All hours are loaded with one query and every metric is computed with a single
+    groupby over dataset_id, so the cost does not grow with one DataFrame per city.
+
+    Output:
+    {
+      "start_date": "...", "end_date": "...",
+      "cities": {
+        "Madrid": {
+          "temperature": {"average", "max", "min", "hours_above_threshold", "hours_below_threshold"},
+          "precipitation": {"total", "days_with_precipitation", "max", "average"}
+        },
+        ...
+      },
+      "missing": [...]   # requested cities without a dataset for the range
+    }
+    """
+    keys = {name: dataset_key(name, start_date, end_date) for name in city_names}
+    datasets = get_datasets_by_keys(keys.values())
 
-    total_by_day_series = df.groupby("date")["precipitation"].sum()
-    total_by_day = {day: float(val) for day, val in total_by_day_series.items()}
+    found = {name: datasets[key] for name, key in keys.items() if key in datasets}
+    missing = [name for name, key in keys.items() if key not in datasets]
+    if not found:
+        _, start_d, end_d = next(iter(keys.values()))
+        raise dataset_not_found(",".join(city_names), start_d, end_d)
 
-    # days with precipitation > 0mm (daily sum > 0)
-    days_with_precip = int((total_by_day_series > 0).sum())
+    df = _datasets_hours_to_df(found.values())
+    metrics = _grouped_metrics(df, above=above, below=below)
 
-    # max precipitation day (by daily total)
-    if len(total_by_day_series) > 0:
-        day_max = total_by_day_series.idxmax()
-        val_max = float(total_by_day_series.max())
-        max_obj = {"value": val_max, "date": str(day_max)}
-    else:
-        max_obj = None
+    _, start_d, end_d = next(iter(keys.values()))
+    return {
+        "start_date": str(start_d),
+        "end_date": str(end_d),
+        "cities": {name: metrics.get(ds.pk, _empty_compare_metrics()) for name, ds in found.items()},
+        "missing": missing,
+    }
 
-    # average precipitation in the range: interpret as average daily precipitation
-    # (matches sample: average ~ total / number_of_days)
-    num_days = max(1, len(total_by_day_series))
-    avg = float(total / num_days)
 
+def _empty_compare_metrics() -> Dict[str, Any]:
     return {
-        "precipitation": {
+        "temperature": {
+            "average": None, "max": None, "min": None,
+            "hours_above_threshold": 0, "hours_below_threshold": 0,
+        },
+        "precipitation": {"total": 0.0, "days_with_precipitation": 0, "max": None, "average": 0.0},
+    }
+
+
+@timed("compute")
+def _grouped_metrics(df: pd.DataFrame, *, above: float, below: float) -> Dict[int, Dict[str, Any]]:
+    """Per-dataset metrics from a frame built by _datasets_hours_to_df, one vectorized pass per metric."""
+    if df.empty:
+        return {}
+
+    by_ds = df.groupby("dataset_id", sort=False)
+    temp_rows = df[df["temperature"].notna()]
+    temp_group = temp_rows.groupby("dataset_id", sort=False)["temperature"]
+    temp_avg = temp_group.mean()
+    temp_idxmax = temp_group.idxmax()
+    temp_idxmin = temp_group.idxmin()
+    hours_above = (df["temperature"] > above).groupby(df["dataset_id"]).sum()
+    hours_below = (df["temperature"] < below).groupby(df["dataset_id"]).sum()
+
+    precip_total = by_ds["precipitation"].sum()
+    daily = df.groupby(["dataset_id", "date"], sort=True)["precipitation"].sum()
+    daily_by_ds = daily.groupby(level="dataset_id")
+    num_days = daily_by_ds.size()
+    wet_days = (daily > 0).groupby(level="dataset_id").sum()
+    daily_idxmax = daily_by_ds.idxmax()
+
+    out: Dict[int, Dict[str, Any]] = {}
+    for ds_id in by_ds.groups:
+        metrics = _empty_compare_metrics()
+        if ds_id in temp_avg.index:
+            i_max, i_min = temp_idxmax[ds_id], temp_idxmin[ds_id]
+            metrics["temperature"].update({
+                "average": float(temp_avg[ds_id]),
+                "max": {"value": float(df.at[i_max, "temperature"]),
+                        "date_time": _fmt_dt(pd.Timestamp(df.at[i_max, "timestamp"]))},
+                "min": {"value": float(df.at[i_min, "temperature"]),
+                        "date_time": _fmt_dt(pd.Timestamp(df.at[i_min, "timestamp"]))},
+            })
+        metrics["temperature"]["hours_above_threshold"] = int(hours_above[ds_id])
+        metrics["temperature"]["hours_below_threshold"] = int(hours_below[ds_id])
+
+        total = float(precip_total[ds_id])
+        _, max_day = daily_idxmax[ds_id]
+        metrics["precipitation"] = {
             "total": total,
-            "total_by_day": total_by_day,
-            "days_with_precipitation": days_with_precip,
-            "max": max_obj,
-            "average": avg,
+            "days_with_precipitation": int(wet_days[ds_id]),
+            "max": {"value": float(daily[(ds_id, max_day)]), "date": str(max_day)},
+            "average": float(total / max(1, int(num_days[ds_id]))),
         }
+        out[int(ds_id)] = metrics
+    return out
+
+
+# -----------------------
+# Sub-range stats (precomputed range index)
+# -----------------------
+
+def range_stats(
+        *,
+        city_name: str,
+        start_date: Any,
+        end_date: Any,
+        daily: bool = False,
+) -> Dict[str, Any]:
+    """
+    Stats for any [start_date, end_date] inside a stored dataset, answered from the
+    dataset's range index in constant/logarithmic time (no hourly scan).
+
+    Output:
+    {
+      "city": "...", "start_date": "...", "end_date": "...", "hours": ...,
+      "temperature": {"average": ..., "max": {...}, "min": {...}, ["average_by_day": {...}]},
+      "precipitation": {"total": ..., "days_with_precipitation": ..., "max": {...}, "average": ...,
+                        ["total_by_day": {...}]}
+    }
+    Daily breakdowns are only built when daily=True.
+    """
+    dataset = get_covering_dataset_or_raise(city_name=city_name, start_date=start_date, end_date=end_date)
+    return _range_stats_from_index(dataset, load_range_index(dataset), start_date, end_date, daily=daily)
+
+
+@timed("compute")
+def _range_stats_from_index(
+        dataset: WeatherDataset,
+        index: RangeIndex,
+        start_date: Any,
+        end_date: Any,
+        *,
+        daily: bool,
+) -> Dict[str, Any]:
+    start_d, end_d = _parse_date(start_date), _parse_date(end_date)
+
+    result = index.query(start_d, end_d, daily=daily)
+    return {
+        "city": dataset.city.name,
+        "start_date": str(start_d),
+        "end_date": str(end_d),
+        **result,
+    }
+
+
+# -----------------------
+# Temperature distribution (per-day histograms of the range index)
+# -----------------------
+
+DEFAULT_PERCENTILES = (5.0, 50.0, 95.0)
+
+
+def distribution_stats(
+        *,
+        city_name: str,
+        start_date: Any,
+        end_date: Any,
+        percentiles: Iterable[float] = DEFAULT_PERCENTILES,
+        bin_width: float = 1.0,
+) -> Dict[str, Any]:
+    """
+    Temperature percentiles and histogram for any [start_date, end_date] inside a stored dataset,
+    merged from the per-day histograms of the range index: cost grows with days, not hours.
+    Percentiles are accurate to the index bin step (HIST_STEP degrees).
+
+    Output:
+    {
+      "city": "...", "start_date": "...", "end_date": "...", "hours": ...,
+      "percentiles": {"p5": ..., "p50": ..., "p95": ...},
+      "histogram": {"bin_width": ..., "bins": [{"lower": ..., "upper": ..., "count": ...}, ...]}
+    }
+    """
+    dataset = get_covering_dataset_or_raise(city_name=city_name, start_date=start_date, end_date=end_date)
+    return _distribution_from_index(dataset, load_range_index(dataset), start_date, end_date,
+                                    percentiles=percentiles, bin_width=bin_width)
+
+
+@timed("compute")
+def _distribution_from_index(
+        dataset: WeatherDataset,
+        index: RangeIndex,
+        start_date: Any,
+        end_date: Any,
+        *,
+        percentiles: Iterable[float],
+        bin_width: float,
+) -> Dict[str, Any]:
+    start_d, end_d = _parse_date(start_date), _parse_date(end_date)
+
+    result = index.distribution(start_d, end_d, percentiles=percentiles, bin_width=bin_width)
+    return {
+        "city": dataset.city.name,
+        "start_date": str(start_d),
+        "end_date": str(end_d),
+        **result,
     }
 
 
@@ -190,47 +573,49 @@ def summary_stats() -> Dict[str, Any]:
     """
     out: Dict[str, Any] = {}
 
-    # Prefetch hours for fewer queries (still can be large, but ok for MVP scale)
-    datasets = WeatherDataset.objects.select_related("city").all()
+    datasets = list(WeatherDataset.objects.select_related("city").all())
 
+    # Hours of every dataset in one streamed query (datasets without hours are skipped)
+    summaries = {ds.pk: _summary_from_df(ds, df) for ds, df in _iter_datasets_hours_dfs(datasets)}
     for ds in datasets:
-        df = _dataset_hours_to_df(ds)
-        if df.empty:
-            continue
-
-        # daily totals for precipitation
-        daily_precip = df.groupby("date")["precipitation"].sum()
-
-        precip_total = float(df["precipitation"].sum())
-        days_with_precip = int((daily_precip > 0).sum())
-
-        # max precip day
-        precip_max_date = daily_precip.idxmax()
-        precip_max_val = float(daily_precip.max())
-        precip_max = {"date": str(precip_max_date), "value": precip_max_val}
-
-        # temperature average
-        temp_avg = float(df["temperature"].mean())
-
-        # temperature max/min by hour -> report day + value (PDF wants day in summary) :contentReference[oaicite:7]{index=7}
-        idx_tmax = df["temperature"].idxmax()
-        idx_tmin = df["temperature"].idxmin()
-        tmax_row = df.loc[idx_tmax]
-        tmin_row = df.loc[idx_tmin]
-
-        tmax = {"date": str(tmax_row["date"]), "value": float(tmax_row["temperature"])}
-        tmin = {"date": str(tmin_row["date"]), "value": float(tmin_row["temperature"])}
-
-        key = f"{ds.city.name} ({ds.start_date}..{ds.end_date})"
-        out[key] = {
-            "start_date": str(ds.start_date),
-            "end_date": str(ds.end_date),
-            "temperature_average": temp_avg,
-            "precipitation_total": precip_total,
-            "days_with_precipitation": days_with_precip,
-            "precipitation_max": precip_max,
-            "temperature_max": tmax,
-            "temperature_min": tmin,
-        }
+        if ds.pk in summaries:
+            out[f"{ds.city.name} ({ds.start_date}..{ds.end_date})"] = summaries[ds.pk]
 
     return out
+
+
+@timed("compute")
+def _summary_from_df(ds: WeatherDataset, df: pd.DataFrame) -> Dict[str, Any]:
+    # daily totals for precipitation
+    daily_precip = df.groupby("date")["precipitation"].sum()
+
+    precip_total = float(df["precipitation"].sum())
+    days_with_precip = int((daily_precip > 0).sum())
+
+    # max precip day
+    precip_max_date = daily_precip.idxmax()
+    precip_max_val = float(daily_precip.max())
+    precip_max = {"date": str(precip_max_date), "value": precip_max_val}
+
+    # temperature average
+    temp_avg = float(df["temperature"].mean())
+
+    # temperature max/min by hour -> report day + value (PDF wants day in summary) :contentReference[oaicite:7]{index=7}
+    idx_tmax = df["temperature"].idxmax()
+    idx_tmin = df["temperature"].idxmin()
+    tmax_row = df.loc[idx_tmax]
+    tmin_row = df.loc[idx_tmin]
+
+    tmax = {"date": str(tmax_row["date"]), "value": float(tmax_row["temperature"])}
+    tmin = {"date": str(tmin_row["date"]), "value": float(tmin_row["temperature"])}
+
+    return {
+        "start_date": str(ds.start_date),
+        "end_date": str(ds.end_date),
+        "temperature_average": temp_avg,
+        "precipitation_total": precip_total,
+        "days_with_precipitation": days_with_precip,
+        "precipitation_max": precip_max,
+        "temperature_max": tmax,
+        "temperature_min": tmin,
+    }
@@ -0,0 +1,152 @@
+"""
+Synthetic Open-Meteo-like weather data, for benchmarks and local load tests.
+
+Hourly series are deterministic for a given seed and shaped like the archive client output
+(clients.open_meteo.archive): a `date` column (UTC) plus `temperature_2m` and `precipitation`.
+Temperatures follow a latitude-dependent seasonal cycle, a daily cycle and autocorrelated
+noise; precipitation comes in multi-hour events. A small share of hours is missing (NaN),
+as in real archive responses.
+"""
+from __future__ import annotations
+
+import zlib
+from datetime import date, timedelta
+from typing import Any, Dict, List, Sequence
+
+from django.db import transaction
+
+from api.models import City, WeatherDataset, WeatherHour
+from services.ingest import bulk_insert_hours, rebuild_range_index
+from services.lazy import lazy_module
+
+np = lazy_module("numpy")
+pd = lazy_module("pandas")
+
+SYNTHETIC_SOURCE = "synthetic"
+
+# name, country code, country, latitude, longitude, timezone
+SYNTHETIC_CITIES = [
+    ("Madrid", "ES", "Spain", 40.4168, -3.7038, "Europe/Madrid"),
+    ("Paris", "FR", "France", 48.8566, 2.3522, "Europe/Paris"),
+    ("Berlin", "DE", "Germany", 52.52, 13.405, "Europe/Berlin"),
+    ("Oslo", "NO", "Norway", 59.9139, 10.7522, "Europe/Oslo"),
+    ("Cairo", "EG", "Egypt", 30.0444, 31.2357, "Africa/Cairo"),
+    ("Mumbai", "IN", "India", 19.076, 72.8777, "Asia/Kolkata"),
+    ("Tokyo", "JP", "Japan", 35.6762, 139.6503, "Asia/Tokyo"),
+    ("Sydney", "AU", "Australia", -33.8688, 151.2093, "Australia/Sydney"),
+    ("New York", "US", "United States", 40.7128, -74.006, "America/New_York"),
+    ("Sao Paulo", "BR", "Brazil", -23.5505, -46.6333, "America/Sao_Paulo"),
+]
+
+
+def _seed_for(name: str, seed: int) -> int:
+    # Stable across processes (unlike hash())
+    return zlib.crc32(name.encode("utf-8")) ^ seed
+
+
+def synthetic_hourly_frame(
+        start_date: date,
+        end_date: date,
+        *,
+        latitude: float = 40.0,
+        seed: int = 0,
+        missing_ratio: float = 0.002,
+) -> pd.DataFrame:
+    """Hourly frame (date, precipitation, temperature_2m) covering start_date..end_date (UTC days)."""
+    rng = np.random.default_rng(seed)
+    timestamps = pd.date_range(pd.Timestamp(start_date, tz="UTC"), pd.Timestamp(end_date, tz="UTC")
+                               + pd.Timedelta(hours=23), freq="h")
+    n = len(timestamps)
+    day_of_year = timestamps.dayofyear.to_numpy()
+    hour = timestamps.hour.to_numpy()
+
+    # Warmer and less seasonal near the equator; seasons flip in the southern hemisphere
+    mean = 28 - 0.4 * abs(latitude)
+    amplitude = 2 + 0.25 * abs(latitude)
+    season = -np.cos(2 * np.pi * (day_of_year - 15) / 365.25) * np.sign(latitude or 1)
+    daily = -np.cos(2 * np.pi * (hour - 3) / 24)
+    # AR(1) noise: weather persists for days
+    shocks = rng.normal(0, 0.35, n)
+    noise = np.empty(n)
+    level = 0.0
+    for i in range(n):
+        level = 0.98 * level + shocks[i]
+        noise[i] = level
+    temperature = mean + amplitude * season + 4 * daily + noise
+
+    # Rain events start in ~1% of the hours and last a few hours
+    starts = rng.random(n) < 0.01
+    durations = rng.integers(1, 12, n)
+    raining = np.zeros(n, dtype=bool)
+    for i in np.flatnonzero(starts):
+        raining[i:i + durations[i]] = True
+    precipitation = np.where(raining, np.round(rng.gamma(1.2, 1.1, n), 1), 0.0)
+
+    missing = rng.random(n) < missing_ratio
+    temperature[missing] = np.nan
+    precipitation[missing] = np.nan
+    return pd.DataFrame({
+        "date": timestamps,
+        "precipitation": precipitation.astype("float32"),
+        "temperature_2m": np.round(temperature, 1).astype("float32"),
+    })
+
+
+def synthetic_city_weather(city_index: int, start_date: date, end_date: date, *, seed: int = 0) -> Dict[str, Any]:
+    """Same shape as clients.open_meteo.get_city_weather, for a synthetic city."""
+    name, code, country, latitude, longitude, tz = SYNTHETIC_CITIES[city_index % len(SYNTHETIC_CITIES)]
+    if city_index >= len(SYNTHETIC_CITIES):
+        name = f"{name} {city_index // len(SYNTHETIC_CITIES) + 1}"
+    return {
+        "city": name,
+        "country": country,
+        "country_iso": code,
+        "latitude": latitude,
+        "longitude": longitude,
+        "timezone": tz,
+        "hourly_data": synthetic_hourly_frame(start_date, end_date, latitude=latitude,
+                                              seed=_seed_for(name, seed)),
+    }
+
+
+def seed_synthetic_data(
+        *,
+        cities: int,
+        years: int,
+        end_year: int,
+        seed: int = 0,
+        replace: bool = False,
+        ranges: Sequence[int] = (),
+) -> List[WeatherDataset]:
+    """
+    Store one dataset per synthetic city covering `years` full years up to end_year
+    (hours + range index, like loadcitydata). Existing datasets are kept unless replace.
+
+    `ranges` adds, per city, datasets of those lengths (days) ending on end_year-12-31 (same
+    hourly values), so exact-range endpoints can be queried over varied lengths (load tests).
+    """
+    start_d, end_d = date(end_year - years + 1, 1, 1), date(end_year, 12, 31)
+    datasets = []
+    for i in range(cities):
+        info = synthetic_city_weather(i, start_d, end_d, seed=seed)
+        hours_df = info["hourly_data"].rename(columns={"date": "timestamp", "temperature_2m": "temperature"})
+        with transaction.atomic():
+            city, _ = City.objects.get_or_create(
+                name=info["city"],
+                country_code=info["country_iso"],
+                defaults={"latitude": info["latitude"], "longitude": info["longitude"],
+                          "country": info["country"], "timezone": info["timezone"]},
+            )
+            for days in sorted({(end_d - start_d).days + 1, *ranges}, reverse=True):
+                range_start = max(start_d, end_d - timedelta(days=days - 1))
+                dataset, created = WeatherDataset.objects.get_or_create(
+                    city=city, start_date=range_start, end_date=end_d, defaults={"source": SYNTHETIC_SOURCE},
+                )
+                if created or replace:
+                    WeatherHour.objects.filter(dataset=dataset).delete()
+                    in_range = hours_df["timestamp"] >= pd.Timestamp(range_start, tz="UTC")
+                    bulk_insert_hours(dataset, hours_df[in_range].reset_index(drop=True))
+                    rebuild_range_index(dataset)
+                if dataset not in datasets:
+                    datasets.append(dataset)
+    return datasets
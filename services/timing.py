@@ -0,0 +1,131 @@
+"""
+Per-request phase timings (dataset resolution, hourly fetch, frame building, computation...).
+
+A PhaseRecorder is bound to the current context by recording() (see
+api.server_timing.ServerTimingMiddleware); the services mark their phases with phase()/timed()
+and counters with count(). Without an active recorder these are a context variable lookup
+returning a shared no-op, so instrumented code costs next to nothing when timing is disabled.
+Phases with the same name add up; "db" (SQL time) and "queries" overlap the other phases.
+
+SQL is counted by query_wrapper(), an execute wrapper installed on every database connection
+(see api.apps): it records into the recorder of the current context when that recorder tracks
+queries, so the queries the async ORM runs in worker threads (which copy the context) count too.
+"""
+from __future__ import annotations
+
+import contextlib
+import functools
+import inspect
+import time
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional
+
+_recorder: ContextVar[Optional["PhaseRecorder"]] = ContextVar("phase_recorder", default=None)
+_NOOP = contextlib.nullcontext()
+
+
+class PhaseRecorder:
+    __slots__ = ("phases", "counters", "track_queries", "statements")
+
+    def __init__(self, track_queries: bool = False):
+        self.phases: Dict[str, List[float]] = {}  # name -> [seconds, calls]
+        self.counters: Dict[str, int] = {}
+        self.track_queries = track_queries
+        self.statements: Optional[List[str]] = None  # SQL of the tracked queries, when set to a list
+
+    def add(self, name: str, seconds: float) -> None:
+        entry = self.phases.get(name)
+        if entry is None:
+            self.phases[name] = [seconds, 1]
+        else:
+            entry[0] += seconds
+            entry[1] += 1
+
+    def count(self, name: str, n: int = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def query_wrapper(self, execute, sql, params, many, context):
+        """connection.execute_wrapper hook: SQL time as the "db" phase, plus a query counter."""
+        if self.statements is not None:
+            self.statements.append(sql)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.add("db", time.perf_counter() - started)
+            self.count("queries")
+
+    def durations_ms(self) -> Dict[str, float]:
+        return {name: round(seconds * 1000, 3) for name, (seconds, _) in self.phases.items()}
+
+
+class _Phase:
+    __slots__ = ("recorder", "name", "started")
+
+    def __init__(self, recorder: PhaseRecorder, name: str):
+        self.recorder = recorder
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.recorder.add(self.name, time.perf_counter() - self.started)
+        return False
+
+
+def current_recorder() -> Optional[PhaseRecorder]:
+    return _recorder.get()
+
+
+def phase(name: str):
+    """Context manager timing a phase of the current request (no-op when not recording)."""
+    recorder = _recorder.get()
+    if recorder is None:
+        return _NOOP
+    return _Phase(recorder, name)
+
+
+def count(name: str, n: int = 1) -> None:
+    """Add n to a counter of the current request (e.g. rows read)."""
+    recorder = _recorder.get()
+    if recorder is not None:
+        recorder.count(name, n)
+
+
+def query_wrapper(execute, sql, params, many, context):
+    """Execute wrapper of every connection: counts into the current recorder if it tracks queries."""
+    recorder = _recorder.get()
+    if recorder is None or not recorder.track_queries:
+        return execute(sql, params, many, context)
+    return recorder.query_wrapper(execute, sql, params, many, context)
+
+
+def timed(name: str) -> Callable:
+    """Decorator: every call of the (sync or async) function is timed as phase `name`."""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with phase(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with phase(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextlib.contextmanager
+def recording(track_queries: bool = False) -> Iterator[PhaseRecorder]:
+    """Bind a new PhaseRecorder to the current context for the duration of the block."""
+    recorder = PhaseRecorder(track_queries)
+    token = _recorder.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _recorder.reset(token)